@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class BiometricDataConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "biometric_data"
+
+    def ready(self):
+        import biometric_data.signals
@@ -0,0 +1,23 @@
+# biometric_data/management/commands/rebuild_daily_rollups.py
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from biometric_data.rollup import rebuild
+
+
+class Command(BaseCommand):
+    help = (
+        "A napi összesítő (AthleteDailyRollup) újraépítése a nyers biometrikus táblákból "
+        "(bevezetéskor, illetve bulk importok / közvetlen SQL módosítások után)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=None, help="Csak az utolsó N nap (alapértelmezés: teljes történet).")
+        parser.add_argument("--user", type=int, action="append", dest="user_ids", help="Csak a megadott user ID(k).")
+
+    def handle(self, *args, **options):
+        since = timezone.now().date() - timedelta(days=options["days"]) if options["days"] else None
+        count = rebuild(since=since, user_ids=options["user_ids"])
+        self.stdout.write(self.style.SUCCESS(f"✅ {count} napi összesítő sor mentve."))
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.5 on 2026-10-17 11:20
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('biometric_data', '0006_alter_hrvandsleepdata_recorded_at_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AthleteDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='Nap')),
+                ('morning_weight', models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True)),
+                ('body_fat_percentage', models.DecimalField(blank=True, decimal_places=1, max_digits=4, null=True)),
+                ('muscle_percentage', models.DecimalField(blank=True, decimal_places=1, max_digits=4, null=True)),
+                ('hrv', models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True)),
+                ('sleep_quality', models.IntegerField(blank=True, null=True)),
+                ('alertness', models.IntegerField(blank=True, null=True)),
+                ('right_grip_strength', models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True)),
+                ('left_grip_strength', models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True)),
+                ('workout_intensity', models.IntegerField(blank=True, null=True)),
+                ('pace_sec_per_km', models.FloatField(blank=True, null=True)),
+                ('run_avg_hr', models.IntegerField(blank=True, null=True)),
+                ('form_score', models.FloatField(blank=True, null=True)),
+                ('injury_risk_index', models.FloatField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_rollups', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Napi összesítő',
+                'verbose_name_plural': 'Napi összesítők',
+                'ordering': ['user', 'day'],
+                'constraints': [models.UniqueConstraint(fields=('user', 'day'), name='biometric_rollup_unique_user_day')],
+            },
+        ),
+    ]
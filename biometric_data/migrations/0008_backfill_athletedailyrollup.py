@@ -0,0 +1,22 @@
+# Generated by Django 5.2.5 on 2026-10-17 14:05
+
+from django.db import migrations
+
+
+def backfill_daily_rollups(apps, schema_editor):
+    """Az új napi összesítő feltöltése a meglévő nyers adatokból (a dashboardok csak ebből olvasnak)."""
+    from biometric_data.rollup import rebuild
+
+    rebuild(registry=apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('biometric_data', '0007_athletedailyrollup'),
+        ('ml_engine', '0006_userpredictionresult_coach_advice_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_daily_rollups, migrations.RunPython.noop),
+    ]
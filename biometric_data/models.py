@@ -123,4 +123,45 @@ class RunningPerformance(models.Model):
         ordering = ['-run_date']
 
     def __str__(self):
-        return f"{self.user.username} - {self.run_distance_km} km ({self.run_date})"
\ No newline at end of file
+        return f"{self.user.username} - {self.run_distance_km} km ({self.run_date})"
+
+class AthleteDailyRollup(models.Model):
+    """
+    🆕 Sportolónkénti napi összesítő a dashboard grafikonokhoz (egy sor / user / nap).
+    A nyers biometriai sorok mentésekor inkrementálisan frissül (biometric_data.rollup),
+    így a 7/14/30/90 napos ablak egyetlen indexelt tartomány-olvasás.
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="daily_rollups")
+    day = models.DateField(verbose_name="Nap")
+
+    # WeightData (a nap legutolsó mérése)
+    morning_weight = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True)
+    body_fat_percentage = models.DecimalField(max_digits=4, decimal_places=1, null=True, blank=True)
+    muscle_percentage = models.DecimalField(max_digits=4, decimal_places=1, null=True, blank=True)
+    # HRVandSleepData
+    hrv = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True)
+    sleep_quality = models.IntegerField(null=True, blank=True)
+    alertness = models.IntegerField(null=True, blank=True)
+    # WorkoutFeedback
+    right_grip_strength = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True)
+    left_grip_strength = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True)
+    workout_intensity = models.IntegerField(null=True, blank=True)
+    # RunningPerformance (a nap összes futása: össz idő / össz táv)
+    pace_sec_per_km = models.FloatField(null=True, blank=True)
+    run_avg_hr = models.IntegerField(null=True, blank=True)
+    # UserFeatureSnapshot (ml_engine)
+    form_score = models.FloatField(null=True, blank=True)
+    injury_risk_index = models.FloatField(null=True, blank=True)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Napi összesítő"
+        verbose_name_plural = "Napi összesítők"
+        ordering = ['user', 'day']
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'day'], name='biometric_rollup_unique_user_day'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} - {self.day} összesítő"
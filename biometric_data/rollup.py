@@ -0,0 +1,178 @@
+# biometric_data/rollup.py
+"""
+Sportolónkénti napi összesítő (AthleteDailyRollup) karbantartása és olvasása.
+
+- refresh_day: egy (user, nap) újraszámolása a nyers sorokból – a signalok hívják mentés/törlés után;
+- update_form_scores: a napi feature snapshotok formaindexének tömeges beírása (ml_engine batch);
+- rebuild: teljes / időszakos újraépítés halmazalapon (management parancs, bevezető adatmigráció);
+- rollup_window: a dashboard grafikonok 7/14/30/90 napos ablaka egy indexelt tartomány-olvasással.
+"""
+import logging
+from collections import defaultdict
+from datetime import timedelta
+
+from django.apps import apps
+from django.db import connection
+from django.db.models import Avg, Sum
+from django.utils import timezone
+
+from .models import AthleteDailyRollup, HRVandSleepData, RunningPerformance, WeightData, WorkoutFeedback
+
+logger = logging.getLogger(__name__)
+
+WEIGHT_FIELDS = ("morning_weight", "body_fat_percentage", "muscle_percentage")
+HRV_FIELDS = ("hrv", "sleep_quality", "alertness")
+FEEDBACK_FIELDS = ("right_grip_strength", "left_grip_strength", "workout_intensity")
+RUNNING_FIELDS = ("pace_sec_per_km", "run_avg_hr")
+FORM_FIELDS = ("form_score", "injury_risk_index")
+ROLLUP_FIELDS = WEIGHT_FIELDS + HRV_FIELDS + FEEDBACK_FIELDS + RUNNING_FIELDS + FORM_FIELDS
+
+
+def _snapshot_model():
+    return apps.get_model("ml_engine", "UserFeatureSnapshot")
+
+
+def form_values(features) -> dict:
+    """A snapshot features JSON-ből a formaindex és a sérülési kockázat (dict vagy lista első eleme)."""
+    if isinstance(features, list):
+        features = features[0] if features and isinstance(features[0], dict) else {}
+    if not isinstance(features, dict):
+        return {"form_score": None, "injury_risk_index": None}
+    values = {}
+    for field in FORM_FIELDS:
+        try:
+            values[field] = float(features[field]) if features.get(field) is not None else None
+        except (TypeError, ValueError):
+            values[field] = None
+    return values
+
+
+def _running_values(total_seconds, total_km, avg_hr) -> dict:
+    pace = total_seconds / float(total_km) if total_seconds and total_km else None
+    return {"pace_sec_per_km": pace, "run_avg_hr": round(avg_hr) if avg_hr is not None else None}
+
+
+def _upsert(rows, update_fields=ROLLUP_FIELDS, batch_size=500, model=AthleteDailyRollup):
+    """(user, day) egyedi kulcsú upsert; MySQL-en a unique_fields nem adható meg (ON DUPLICATE KEY)."""
+    unique_fields = ["user", "day"] if connection.features.supports_update_conflicts_with_target else None
+    model.objects.bulk_create(
+        rows,
+        batch_size=batch_size,
+        update_conflicts=True,
+        update_fields=list(update_fields) + ["updated_at"],
+        unique_fields=unique_fields,
+    )
+
+
+# -----------------------------------------------------------
+# Inkrementális frissítés (signalok)
+# -----------------------------------------------------------
+
+def compute_day(user_id, day) -> dict:
+    """Egy nap összes oszlopa a nyers sorokból (a nap utolsó mérése / futásoknál összesítés)."""
+    values = dict.fromkeys(ROLLUP_FIELDS)
+
+    weight = (WeightData.objects.filter(user_id=user_id, workout_date=day)
+              .order_by("-created_at", "-id").values(*WEIGHT_FIELDS).first())
+    hrv = HRVandSleepData.objects.filter(user_id=user_id, recorded_at=day).order_by("-id").values(*HRV_FIELDS).first()
+    feedback = (WorkoutFeedback.objects.filter(user_id=user_id, workout_date=day)
+                .order_by("-id").values(*FEEDBACK_FIELDS).first())
+    running = RunningPerformance.objects.filter(user_id=user_id, run_date=day).aggregate(
+        total_km=Sum("run_distance_km"), total_duration=Sum("run_duration"), avg_hr=Avg("run_avg_hr"),
+    )
+    snapshot = _snapshot_model().objects.filter(user_id=user_id, snapshot_date=day).values_list("features", flat=True).first()
+
+    for row in (weight, hrv, feedback):
+        if row:
+            values.update(row)
+    if running["total_km"]:
+        values.update(_running_values(
+            running["total_duration"].total_seconds() if running["total_duration"] else None,
+            running["total_km"], running["avg_hr"],
+        ))
+    if snapshot is not None:
+        values.update(form_values(snapshot))
+    return values
+
+
+def refresh_day(user_id, day):
+    """Egy (user, nap) összesítő újraszámolása; ha már nincs mögötte adat, a sor törlődik."""
+    values = compute_day(user_id, day)
+    if all(value is None for value in values.values()):
+        AthleteDailyRollup.objects.filter(user_id=user_id, day=day).delete()
+        return
+    _upsert([AthleteDailyRollup(user_id=user_id, day=day, **values)])
+
+
+def update_form_scores(snapshot_date, features_by_user: dict):
+    """A napi snapshotok formaindexének tömeges beírása (a többi oszlop érintetlen marad)."""
+    rows = [
+        AthleteDailyRollup(user_id=user_id, day=snapshot_date, **form_values(features))
+        for user_id, features in features_by_user.items()
+    ]
+    if rows:
+        _upsert(rows, update_fields=FORM_FIELDS)
+
+
+# -----------------------------------------------------------
+# Teljes újraépítés (halmazalapon)
+# -----------------------------------------------------------
+
+def rebuild(since=None, user_ids=None, registry=None) -> int:
+    """
+    Az összesítő újraépítése a nyers táblákból (forrásonként egy lekérdezés).
+    :param registry: modell registry (adatmigrációban a történeti `apps`; alapértelmezés: az élő modellek)
+    :return: a mentett sorok száma
+    """
+    get_model = (registry or apps).get_model
+    rollup_model = get_model("biometric_data", "AthleteDailyRollup")
+
+    def scoped(queryset, date_field):
+        if since is not None:
+            queryset = queryset.filter(**{f"{date_field}__gte": since})
+        if user_ids is not None:
+            queryset = queryset.filter(user_id__in=user_ids)
+        return queryset
+
+    rows = defaultdict(lambda: dict.fromkeys(ROLLUP_FIELDS))
+
+    # Növekvő sorrendben bejárva a nap utolsó sora írja felül a korábbiakat
+    for source, date_field, order, fields in (
+        ("WeightData", "workout_date", ("created_at", "id"), WEIGHT_FIELDS),
+        ("HRVandSleepData", "recorded_at", ("id",), HRV_FIELDS),
+        ("WorkoutFeedback", "workout_date", ("id",), FEEDBACK_FIELDS),
+    ):
+        source = get_model("biometric_data", source)
+        for row in scoped(source.objects.all(), date_field).order_by(*order).values("user_id", date_field, *fields).iterator():
+            rows[(row.pop("user_id"), row.pop(date_field))].update(row)
+
+    running = (
+        scoped(get_model("biometric_data", "RunningPerformance").objects.all(), "run_date")
+        .order_by().values("user_id", "run_date")
+        .annotate(total_km=Sum("run_distance_km"), total_duration=Sum("run_duration"), avg_hr=Avg("run_avg_hr"))
+    )
+    for row in running:
+        if row["total_km"]:
+            rows[(row["user_id"], row["run_date"])].update(_running_values(
+                row["total_duration"].total_seconds() if row["total_duration"] else None,
+                row["total_km"], row["avg_hr"],
+            ))
+
+    snapshots = scoped(get_model("ml_engine", "UserFeatureSnapshot").objects.all(), "snapshot_date").values_list("user_id", "snapshot_date", "features")
+    for user_id, snapshot_date, features in snapshots.iterator():
+        rows[(user_id, snapshot_date)].update(form_values(features))
+
+    objects = [rollup_model(user_id=user_id, day=day, **values) for (user_id, day), values in rows.items()]
+    _upsert(objects, model=rollup_model)
+    logger.info(f"📊 [ROLLUP] {len(objects)} napi összesítő újraépítve")
+    return len(objects)
+
+
+# -----------------------------------------------------------
+# Olvasás (dashboardok)
+# -----------------------------------------------------------
+
+def rollup_window(user, days: int):
+    """Az utolsó `days` nap összesítői növekvő sorrendben (egy indexelt tartomány-olvasás)."""
+    since = timezone.now().date() - timedelta(days=days)
+    return list(AthleteDailyRollup.objects.filter(user=user, day__gte=since).order_by("day"))
@@ -0,0 +1,61 @@
+# biometric_data/signals.py
+"""
+A napi összesítő (AthleteDailyRollup) inkrementális frissítése a nyers mérések mentésekor / törlésekor.
+A frissítés a tranzakció lezárása után fut, így a már commitolt sorokból számol.
+"""
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import rollup
+from .models import HRVandSleepData, RunningPerformance, WeightData, WorkoutFeedback
+
+# Modell -> a nap mezője
+ROLLUP_SOURCES = {
+    WeightData: "workout_date",
+    HRVandSleepData: "recorded_at",
+    WorkoutFeedback: "workout_date",
+    RunningPerformance: "run_date",
+}
+
+
+def _schedule_refresh(user_id, days):
+    for day in {day for day in days if day is not None}:
+        transaction.on_commit(lambda day=day: rollup.refresh_day(user_id, day))
+
+
+def _day_of(instance, date_field):
+    day = getattr(instance, date_field, None)
+    # A default=timezone.now mezők mentés előtt datetime-ot is tartalmazhatnak
+    return day.date() if hasattr(day, "date") and callable(day.date) else day
+
+
+def remember_rollup_day(sender, instance, **kwargs):
+    """Módosításkor a régi (user, nap) párt is újra kell számolni, ha megváltozott."""
+    if instance.pk is not None:
+        instance._rollup_previous = (
+            sender.objects.filter(pk=instance.pk).values_list("user_id", ROLLUP_SOURCES[sender]).first()
+        )
+
+
+def refresh_rollup_on_save(sender, instance, **kwargs):
+    previous = getattr(instance, "_rollup_previous", None)
+    if previous and previous != (instance.user_id, _day_of(instance, ROLLUP_SOURCES[sender])):
+        _schedule_refresh(previous[0], [previous[1]])
+    _schedule_refresh(instance.user_id, [_day_of(instance, ROLLUP_SOURCES[sender])])
+
+
+def refresh_rollup_on_delete(sender, instance, **kwargs):
+    _schedule_refresh(instance.user_id, [_day_of(instance, ROLLUP_SOURCES[sender])])
+
+
+for _model in ROLLUP_SOURCES:
+    pre_save.connect(remember_rollup_day, sender=_model, dispatch_uid=f"rollup_pre_save_{_model.__name__}")
+    post_save.connect(refresh_rollup_on_save, sender=_model, dispatch_uid=f"rollup_post_save_{_model.__name__}")
+    post_delete.connect(refresh_rollup_on_delete, sender=_model, dispatch_uid=f"rollup_post_delete_{_model.__name__}")
+
+
+@receiver(post_save, sender="ml_engine.UserFeatureSnapshot")
+def refresh_rollup_form_score(sender, instance, **kwargs):
+    """Egyedi snapshot mentés (a batch a bulk upsert miatt közvetlenül hívja az update_form_scores-t)."""
+    transaction.on_commit(lambda: rollup.update_form_scores(instance.snapshot_date, {instance.user_id: instance.features}))
@@ -12,6 +12,7 @@ from .forms import (
     OccasionalWeightForm, OccasionalFeedbackForm, RunningPerformanceForm 
 )
 from .models import WeightData, HRVandSleepData, WorkoutFeedback, RunningPerformance
+from .rollup import rollup_window
 from django.db.models import Avg, Max, Min, Q
 from users.models import UserRole
 from datetime import date, timedelta
@@ -284,48 +285,39 @@ def generate_grip_feedback(weight_queryset, feedback_queryset):
     return "Nincs rögzített **testösszetétel** adat. Kérlek, végezz el egy mérést a visszajelzéshez."
 
     # C. HRV és Alvás Grafikon adatok előkészítése
-def generate_hrv_sleep_chart_data(user):
-    # Utolsó 30 nap adatai
-    start_date = timezone.now().date() - timedelta(days=30)
-    data = HRVandSleepData.objects.filter(user=user, recorded_at__gte=start_date).order_by('recorded_at')
+def _chart_rollups(user, rollups, days=30):
+    """📊 A grafikonok a napi összesítőből olvasnak (egy tartomány-olvasás, a dashboard egyszer adja át)."""
+    return rollups if rollups is not None else rollup_window(user, days)
 
-    labels = [d.recorded_at.strftime("%m-%d") for d in data]
-    
-    # Adatok előkészítése float-ként.
-    # HIBA JAVÍTVA: 'hrv_ms' helyett 'hrv' mezőre hivatkozunk
-    hrv_data = [float(d.hrv) if d.hrv else None for d in data] 
-    
-    sleep_quality_data = [d.sleep_quality for d in data] 
-    alertness_data = [d.alertness for d in data] 
+
+def generate_hrv_sleep_chart_data(user, rollups=None):
+    # Utolsó 30 nap adatai
+    data = [r for r in _chart_rollups(user, rollups) if r.hrv is not None or r.sleep_quality is not None or r.alertness is not None]
 
     chart_data = {
-        'labels': labels,
-        'hrv_data': hrv_data,
-        'sleep_quality_data': sleep_quality_data,
-        'alertness_data': alertness_data,
+        'labels': [d.day.strftime("%m-%d") for d in data],
+        'hrv_data': [float(d.hrv) if d.hrv else None for d in data],
+        'sleep_quality_data': [d.sleep_quality for d in data],
+        'alertness_data': [d.alertness for d in data],
     }
     return chart_data
 
 
     # D. Marokerő és Intenzitás Grafikon adatok előkészítése
-def generate_grip_intensity_chart_data(user):
+def generate_grip_intensity_chart_data(user, rollups=None):
     # Utolsó 30 nap adatai
-    start_date = timezone.now().date() - timedelta(days=30)
-    data = WorkoutFeedback.objects.filter(user=user, workout_date__gte=start_date).order_by('workout_date')
-
-    labels = [d.workout_date.strftime("%m-%d") for d in data]
-    
-    # Marokerő (kg)
-    right_grip_data = [float(d.right_grip_strength) if d.right_grip_strength else None for d in data] 
-    left_grip_data = [float(d.left_grip_strength) if d.left_grip_strength else None for d in data] 
-    # Intenzitás (1-10)
-    intensity_data = [d.workout_intensity for d in data] 
+    data = [
+        r for r in _chart_rollups(user, rollups)
+        if r.right_grip_strength is not None or r.left_grip_strength is not None or r.workout_intensity is not None
+    ]
 
     chart_data = {
-        'labels': labels,
-        'right_grip_data': right_grip_data,
-        'left_grip_data': left_grip_data,
-        'intensity_data': intensity_data,
+        'labels': [d.day.strftime("%m-%d") for d in data],
+        # Marokerő (kg)
+        'right_grip_data': [float(d.right_grip_strength) if d.right_grip_strength else None for d in data],
+        'left_grip_data': [float(d.left_grip_strength) if d.left_grip_strength else None for d in data],
+        # Intenzitás (1-10)
+        'intensity_data': [d.workout_intensity for d in data],
     }
     return chart_data
 
@@ -336,27 +328,14 @@ def duration_to_seconds(duration):
     return None
 
     # E. Futóteljesítmény Grafikon adatok előkészítése
-def generate_running_chart_data(user):
-    # Utolsó 30 nap adatai
-    start_date = timezone.now().date() - timedelta(days=30)
-    data = RunningPerformance.objects.filter(user=user, run_date__gte=start_date).order_by('run_date')
-
-    labels = [d.run_date.strftime("%m-%d") for d in data]
-    
-    pace_data = []
-    for d in data:
-        if d.run_distance_km and d.run_duration:
-            # Tempó számítása: (teljes idő másodpercben) / (távolság km-ben) -> eredmény: másodperc/km
-            pace_data.append(duration_to_seconds(d.run_duration) / float(d.run_distance_km))
-        else:
-            pace_data.append(None)
-            
-    avg_hr_data = [d.run_avg_hr for d in data]
+def generate_running_chart_data(user, rollups=None):
+    # Utolsó 30 nap adatai; a tempó napi szinten: össz idő / össz táv (másodperc/km)
+    data = [r for r in _chart_rollups(user, rollups) if r.pace_sec_per_km is not None]
 
     chart_data = {
-        'labels': labels,
-        'pace_data': pace_data, # Másodperc/km formátumban adjuk át a Chart.js-nek
-        'avg_hr_data': avg_hr_data,
+        'labels': [d.day.strftime("%m-%d") for d in data],
+        'pace_data': [d.pace_sec_per_km for d in data], # Másodperc/km formátumban adjuk át a Chart.js-nek
+        'avg_hr_data': [d.run_avg_hr for d in data],
     }
     return chart_data
 
@@ -388,20 +367,22 @@ def athlete_dashboard(request):
     
     # 3. GRAFIKON ADATOK GENERÁLÁSA
     
-    # A. Testsúly grafikon adatok (30 napos trend)
-    # Figyelem! A queryset-et itt újra 'workout_date' szerint rendezzük, de NÖVEKVŐ sorrendben a grafikon miatt.
-    weight_data_asc = weight_queryset.order_by('workout_date')
+    # 📊 Minden grafikon ugyanabból a 30 napos napi összesítő ablakból (egy indexelt olvasás)
+    rollups = rollup_window(user, 30)
+
+    # A. Testsúly grafikon adatok (30 napos trend, növekvő sorrendben)
+    weight_days = [r for r in rollups if r.morning_weight is not None]
     weight_chart_data = {
-        'labels': [d.workout_date.strftime("%m-%d") for d in weight_data_asc],
-        'weights': [float(d.morning_weight) for d in weight_data_asc],
-        'body_fat_data': [float(d.body_fat_percentage) if d.body_fat_percentage else None for d in weight_data_asc],
-        'muscle_data': [float(d.muscle_percentage) if d.muscle_percentage else None for d in weight_data_asc],
+        'labels': [d.day.strftime("%m-%d") for d in weight_days],
+        'weights': [float(d.morning_weight) for d in weight_days],
+        'body_fat_data': [float(d.body_fat_percentage) if d.body_fat_percentage else None for d in weight_days],
+        'muscle_data': [float(d.muscle_percentage) if d.muscle_percentage else None for d in weight_days],
     }
     
     # B. Új adatok generálása a segédfüggvényekkel
-    hrv_sleep_chart_data = generate_hrv_sleep_chart_data(user)
-    grip_intensity_chart_data = generate_grip_intensity_chart_data(user)
-    running_chart_data = generate_running_chart_data(user)
+    hrv_sleep_chart_data = generate_hrv_sleep_chart_data(user, rollups)
+    grip_intensity_chart_data = generate_grip_intensity_chart_data(user, rollups)
+    running_chart_data = generate_running_chart_data(user, rollups)
     
     app_context = 'biometrics_dashboard'
     ditta_query = "Kérlek, nézd át az utolsó 30 napos trendjeimet és adj egy rövid helyzetjelentést!"
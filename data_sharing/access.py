@@ -0,0 +1,212 @@
+# data_sharing/access.py
+"""
+Adatmegosztási jogosultság-motor.
+
+Egy sportoló teljes engedélykészlete egy lekérdezéssel töltődik be, és (megtekintő, szerepkör)
+páronként három bitmaszkba fordul: létező cellák, sportolói és szülői beleegyezés. A bitek a
+SHAREABLE_DATA_MODELS oszlopai. A tényleges hozzáférés ebből számolódik:
+
+- felnőtt sportoló: a sportoló beleegyezése elég;
+- kiskorú: sportolói ÉS szülői beleegyezés kell, és a "főkapcsoló" – a gyerek legalább egy
+  adatot megosztott valamelyik szülőjével (UserRole.parent).
+
+A lefordított engedélykészlet sportolónként cache-elt (DATA_SHARING_ACCESS_CACHE_TTL); a
+toggle_permission és a szerepkör / engedély törlések (data_sharing.signals) érvénytelenítik.
+Az is_adult nem cache-elt: a kiértékeléskor a sportoló aktuális profiljából számolódik.
+"""
+import logging
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+
+from users.models import UserRole
+
+from .models import DataSharingPermission
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "sharing_access"
+
+
+def _key(athlete_id) -> str:
+    return f"{KEY_PREFIX}:{athlete_id}"
+
+
+def _role_key(role_id):
+    # A szülői cella szerepkör nélkül (None) is létezhet; a sharing center 0-val jelöli
+    return role_id or None
+
+
+def invalidate_access(athlete_ids):
+    """Az érintett sportolók lefordított engedélykészletének törlése a cache-ből."""
+    keys = [_key(athlete_id) for athlete_id in set(athlete_ids) if athlete_id is not None]
+    if keys:
+        cache.delete_many(keys)
+
+
+def _compile(rows, parent_ids) -> dict:
+    """
+    :param rows: (target_person_id, target_role_id, app_name, table_name, athlete_consent, parent_consent)
+    :return: cache-elhető dict: oszlopok, szülők, {(viewer, role): [létező, sportoló, szülő] bitmaszk}
+    """
+    columns = [(app, table) for app, tables in getattr(settings, 'SHAREABLE_DATA_MODELS', {}).items() for table in tables]
+    index = {column: bit for bit, column in enumerate(columns)}
+    cells = {}
+    for viewer_id, role_id, app_name, table_name, athlete_consent, parent_consent in rows:
+        column = (app_name, table_name)
+        if column not in index:
+            # A beállításokból azóta kikerült tábla is kiértékelhető marad
+            index[column] = len(columns)
+            columns.append(column)
+        bit = 1 << index[column]
+        masks = cells.setdefault((viewer_id, _role_key(role_id)), [0, 0, 0])
+        masks[0] |= bit
+        if athlete_consent:
+            masks[1] |= bit
+        if parent_consent:
+            masks[2] |= bit
+    return {"columns": columns, "parent_ids": sorted(set(parent_ids)), "cells": cells}
+
+
+def _load_compiled(athlete_ids) -> dict:
+    """A cache-ből hiányzó sportolók engedélykészlete két lekérdezéssel (engedélyek + szülők)."""
+    athlete_ids = list(set(athlete_ids))
+    found = cache.get_many([_key(athlete_id) for athlete_id in athlete_ids])
+    compiled = {athlete_id: found[_key(athlete_id)] for athlete_id in athlete_ids if _key(athlete_id) in found}
+    missing = [athlete_id for athlete_id in athlete_ids if athlete_id not in compiled]
+    if not missing:
+        return compiled
+
+    rows = {athlete_id: [] for athlete_id in missing}
+    for athlete_id, *row in DataSharingPermission.objects.filter(athlete_id__in=missing).values_list(
+        'athlete_id', 'target_person_id', 'target_role_id', 'app_name', 'table_name', 'athlete_consent', 'parent_consent'
+    ):
+        rows[athlete_id].append(row)
+
+    parents = {athlete_id: [] for athlete_id in missing}
+    for athlete_id, parent_id in UserRole.objects.filter(user_id__in=missing, parent__isnull=False).values_list(
+        'user_id', 'parent_id'
+    ).distinct():
+        parents[athlete_id].append(parent_id)
+
+    fresh = {athlete_id: _compile(rows[athlete_id], parents[athlete_id]) for athlete_id in missing}
+    cache.set_many(
+        {_key(athlete_id): entry for athlete_id, entry in fresh.items()},
+        timeout=getattr(settings, 'DATA_SHARING_ACCESS_CACHE_TTL', 600),
+    )
+    compiled.update(fresh)
+    return compiled
+
+
+class AccessMatrix:
+    """Egy sportoló lefordított engedélykészlete és a belőle számolt tényleges hozzáférés."""
+
+    def __init__(self, athlete, compiled):
+        self.athlete = athlete
+        self.is_adult = getattr(athlete, 'is_adult', True)
+        self.columns = compiled["columns"]
+        self._index = {tuple(column): bit for bit, column in enumerate(self.columns)}
+        self._cells = defaultdict(dict)
+        for (viewer_id, role_id), masks in compiled["cells"].items():
+            self._cells[viewer_id][role_id] = masks
+
+        # Kiskorú főkapcsoló: megosztott-e a gyerek bármilyen adatot legalább egy szülővel?
+        self.parental_main_access = any(
+            masks[1] for parent_id in compiled["parent_ids"] for masks in self._cells.get(parent_id, {}).values()
+        )
+
+    def _effective(self, masks) -> int:
+        if self.is_adult:
+            return masks[1]
+        if not self.parental_main_access:
+            return 0
+        return masks[1] & masks[2]
+
+    def mask(self, viewer_id, role_ids=None) -> int:
+        """
+        A megtekintő tényleges hozzáférési bitmaszkja.
+        :param role_ids: csak ezeken a szerepkörökön át (None: bármelyik szerepkörén át)
+        """
+        if role_ids is not None:
+            role_ids = {_role_key(role_id) for role_id in role_ids}
+        result = 0
+        for role_id, masks in self._cells.get(viewer_id, {}).items():
+            if role_ids is None or role_id in role_ids:
+                result |= self._effective(masks)
+        return result
+
+    def tables(self, viewer_id, role_ids=None) -> list:
+        """A megtekintő számára látható táblák nevei (az oszlopok sorrendjében)."""
+        mask = self.mask(viewer_id, role_ids)
+        tables = []
+        for bit, (_, table_name) in enumerate(self.columns):
+            if mask >> bit & 1 and table_name not in tables:
+                tables.append(table_name)
+        return tables
+
+    def allows(self, viewer_id, table_names, role_ids=None) -> bool:
+        """Hozzáfér-e a megtekintő a megadott táblák legalább egyikéhez."""
+        if isinstance(table_names, str):
+            table_names = [table_names]
+        return any(table_name in table_names for table_name in self.tables(viewer_id, role_ids))
+
+    def _masks(self, viewer_id, role_id):
+        return self._cells.get(viewer_id, {}).get(_role_key(role_id))
+
+    def has_cell(self, viewer_id, role_id, app_name, table_name) -> bool:
+        bit = self._index.get((app_name, table_name))
+        masks = self._masks(viewer_id, role_id)
+        return bit is not None and masks is not None and bool(masks[0] >> bit & 1)
+
+    def cell(self, viewer_id, role_id, app_name, table_name) -> dict:
+        """Egy (megtekintő, szerepkör, tábla) cella kapcsolóállapota a sharing centerhez."""
+        bit = self._index.get((app_name, table_name))
+        masks = self._masks(viewer_id, role_id) or (0, 0, 0)
+        if bit is None:
+            return {'athlete_consent': False, 'parent_consent': False, 'enabled': False}
+        return {
+            'athlete_consent': bool(masks[1] >> bit & 1),
+            'parent_consent': bool(masks[2] >> bit & 1),
+            'enabled': bool(self._effective(masks) >> bit & 1),
+        }
+
+
+def load_access(athletes) -> dict:
+    """
+    Több sportoló hozzáférési mátrixa; a cache-ből hiányzókra összesen két lekérdezés.
+    :param athletes: User példányok (az is_adult miatt a profile előtöltve)
+    :return: {athlete_id: AccessMatrix}
+    """
+    athletes = {athlete.pk: athlete for athlete in athletes}
+    compiled = _load_compiled(athletes)
+    return {athlete_id: AccessMatrix(athlete, compiled[athlete_id]) for athlete_id, athlete in athletes.items()}
+
+
+def get_access(athlete) -> AccessMatrix:
+    return load_access([athlete])[athlete.pk]
+
+
+def ensure_cells(access, cells):
+    """
+    A hiányzó (megtekintő, szerepkör, app, tábla) cellák létrehozása egyetlen bulk_create-tel.
+    Az új cellák beleegyezései kikapcsoltak, így az access kiértékelése változatlan marad;
+    a cache-elt készlet csak a cellák létezése miatt érvénytelenítődik.
+    :return: a létrehozott sorok száma
+    """
+    athlete_id = access.athlete.pk
+    missing = [
+        DataSharingPermission(
+            athlete_id=athlete_id, target_person_id=viewer_id, target_role_id=role_id,
+            app_name=app_name, table_name=table_name,
+        )
+        for viewer_id, role_id, app_name, table_name in dict.fromkeys(
+            (viewer_id, _role_key(role_id), app_name, table_name) for viewer_id, role_id, app_name, table_name in cells
+        )
+        if not access.has_cell(viewer_id, role_id, app_name, table_name)
+    ]
+    if missing:
+        DataSharingPermission.objects.bulk_create(missing, ignore_conflicts=True)
+        invalidate_access([athlete_id])
+        logger.info(f"🆕 [DATA_SHARING] {len(missing)} hiányzó engedélycella létrehozva (sportoló: {athlete_id})")
+    return len(missing)
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class DataSharingConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "data_sharing"
+
+    def ready(self):
+        import data_sharing.signals
@@ -15,8 +15,12 @@ from assessment.models import PlaceholderAthlete, PhysicalAssessment
 from assessment.forms import PlaceholderAthleteForm, PlaceholderAthleteImportForm
 from training_log.models import TrainingSession, Attendance, TrainingSchedule, AbsenceSchedule
 from training_log.forms import TrainingScheduleForm, AbsenceScheduleForm, TrainingSessionForm
-from training_log.utils import get_attendance_summary, TIME_PERIODS, calculate_next_training_sessions
-from data_sharing.models import DataSharingPermission
+from training_log.utils import get_attendance_summary, TIME_PERIODS
+from training_log.schedule_expansion import expand_schedules, resolve_occurrence_status
+from training_log.attendance_export import AttendanceReport, is_async_range
+from training_log.tasks import export_attendance_report_task, export_status_key, set_export_status
+from data_sharing.access import get_access
+from data_sharing.summary_loader import AthleteSummaryLoader
 from datetime import date, datetime, time
 from users.models import User, UserRole, ParentChild
 from users.utils import get_coach_clubs_and_sports
@@ -25,6 +29,9 @@ import pandas as pd
 import io 
 import calendar
 import json
+import uuid
+from django.core.cache import cache
+from django.core.files.storage import default_storage
 from django.core.serializers.json import DjangoJSONEncoder
 from biometric_data.analytics import (
     generate_weight_feedback, 
@@ -55,37 +62,16 @@ def coach_dashboard(request):
         status='approved'
     ).exclude(role__name__in=['Szülő', 'Edző', 'Egyesületi vezető']).select_related('user__profile', 'club', 'sport')
 
+    # 2. Engedélyek, utolsó súly, forma és jelenlét az összes sportolóra egyszerre
+    # Nem szűrünk a target_role-ra, mert a személy (target_person) a lényeg
+    summaries = AthleteSummaryLoader(coach).load(
+        [role.user for role in athlete_roles], [(role.user_id, role.club_id) for role in athlete_roles]
+    )
+
     athletes_data = []
     for role in athlete_roles:
         athlete = role.user
-        is_adult = athlete.is_adult
-        
-        # 2. Engedélyek lekérése - EGYSZERŰSÍTVE
-        # Nem szűrünk a target_role-ra, mert a személy (target_person) a lényeg
-        permissions_qs = DataSharingPermission.objects.filter(
-            athlete=athlete,
-            target_person=coach,
-            athlete_consent=True
-        )
-        
-        # Ha kiskorú, kell a szülői beleegyezés is
-        if not is_adult:
-            permissions_qs = permissions_qs.filter(parent_consent=True)
-            
-        # Alakítsuk listává a táblaneveket az ikonokhoz
-        permissions = list(permissions_qs.values_list('table_name', flat=True))
-        
-        # 3. Adatok lekérése a dashboardhoz
-        last_weight = WeightData.objects.filter(user=athlete).order_by('-workout_date').first()
-        
-        attendance_stats = None
-        if 'Attendance' in permissions:
-            from training_log.utils import get_attendance_summary
-            attendance_stats = get_attendance_summary(athlete, days=30)
-        
-        ditta_score = None
-        if 'UserFeatureSnapshot' in permissions:
-            ditta_score = UserFeatureSnapshot.objects.filter(user=athlete).order_by('-generated_at').first()
+        summary = summaries[athlete.id]
 
         athletes_data.append({
             'athlete_object': athlete,
@@ -94,11 +80,11 @@ def coach_dashboard(request):
             'athlete_sport': role.sport,
             'role_id': role.id, 
             'athlete_id': athlete.id,
-            'athlete_type': 'adult' if is_adult else 'junior', 
-            'last_weight': last_weight,
-            'permissions': permissions,
-            'attendance_stats': attendance_stats,
-            'ditta_score': ditta_score,
+            'athlete_type': 'adult' if summary['is_adult'] else 'junior', 
+            'last_weight': summary['last_weight'],
+            'permissions': summary['permissions'],
+            'attendance_stats': summary['attendance_by_club'].get(role.club_id),
+            'ditta_score': summary['ditta_score'],
         })
             
     context = {
@@ -116,37 +102,15 @@ def coach_athlete_details(request, athlete_id, role_id):
     athlete = get_object_or_404(User, id=athlete_id)
     role = get_object_or_404(UserRole, id=role_id, coach=coach)
 
-    # Engedélyek ellenőrzése (athlete_consent + ha kiskorú, akkor parent_consent)
-    permissions_qs = DataSharingPermission.objects.filter(
-        athlete=athlete,
-        target_person=coach,
-        athlete_consent=True
-    )
+    # Engedélyek ellenőrzése (athlete_consent + ha kiskorú, akkor parent_consent és szülői főkapcsoló)
+    permissions = get_access(athlete).tables(coach.id)
 
-    if not athlete.is_adult:
-        permissions_qs = permissions_qs.filter(parent_consent=True)
-    
     # Nézzük meg, maradt-e bármilyen engedélyünk
-    if not permissions_qs.exists():
+    if not permissions:
         # Itt dob vissza, ha valami nem stimmel
-        from django.contrib import messages
         messages.warning(request, f"Nincs érvényes, jóváhagyott engedélyed {athlete.get_full_name()} adataihoz.")
         return redirect('data_sharing:coach_dashboard')
 
-    # Ha idáig eljut a kód, akkor VAN engedély.
-    # Most szedjük ki a táblaneveket a listába:
-    permissions = list(permissions_qs.values_list('table_name', flat=True))
-
-    if not getattr(athlete, 'is_adult', True):
-        permissions_qs = permissions_qs.filter(parent_consent=True)
-        
-    permissions = list(permissions_qs.values_list('table_name', flat=True))
-
-    if not permissions:
-        from django.contrib import messages
-        messages.error(request, "Nincs jogosultságod a sportoló adataihoz.")
-        return redirect('data_sharing:coach_dashboard')
-
     context = {
         'athlete': athlete,
         'role': role,
@@ -448,21 +412,6 @@ class AttendanceExportForm(forms.Form):
     start_date = forms.DateField(widget=forms.DateInput(attrs={'type': 'date', 'class': 'form-control'}), label="Kezdő dátum")
     end_date = forms.DateField(widget=forms.DateInput(attrs={'type': 'date', 'class': 'form-control'}), label="Befejező dátum")
 
-def get_attendance_status(attendance):
-    """Jelenléti rekord alapján visszaadja az Excel kódokat."""
-    if not attendance or not attendance.is_present:
-        if attendance:
-            if attendance.is_injured:
-                return "S"  # Sérült
-            if attendance.is_guest:
-                return "V"  # Vendég
-        return "H"  # Hiányzik
-    if attendance.is_guest:
-        return "V"
-    if attendance.is_injured:
-        return "S"
-    return "J"  # Jelen
-
 @login_required
 @role_required("Edző")
 def export_attendance_report(request, club_pk, sport_pk, start_date_str, end_date_str):
@@ -487,148 +436,52 @@ def export_attendance_report(request, club_pk, sport_pk, start_date_str, end_dat
         messages.error(request, "Nincs jogosultságod ehhez a jelentéshez.")
         return redirect("data_sharing:coach_dashboard")
 
-    # --- 3. Edzésszessionök ---
-    sessions = (
-        TrainingSession.objects.filter(
-            session_date__range=(start_date, end_date),
-            coach__user_roles__club_id=club_pk,
-            coach__user_roles__sport_id=sport_pk,
-            coach__user_roles__role__name="Edző",
-            coach__user_roles__status="approved",
-        )
-        .order_by("session_date", "start_time")
-        .distinct()
-    )
-    sessions_list = list(sessions)
-    total_sessions = len(sessions_list)
-    if not sessions_list:
+    # --- 3. Hosszú időszak: háttérfeladat, letöltési linkkel ---
+    if is_async_range(start_date, end_date):
+        token = uuid.uuid4().hex
+        set_export_status(token, user_id=coach.id, status="pending")
+        export_attendance_report_task.delay(token, coach.id, club.pk, sport.pk, start_date_str, end_date_str)
+        messages.info(request, "A jelenléti ív a háttérben készül, a letöltési link ezen az oldalon jelenik meg.")
+        return redirect("data_sharing:attendance_export_status", token=token)
+
+    # --- 4. Edzések, majd (sportoló × edzés) mátrix és soronként írt munkafüzet ---
+    report = AttendanceReport(club, sport, start_date, end_date, fallback_coach_name=coach.get_full_name())
+    if not report.load_sessions():
         messages.error(request, "A feltételeknek megfelelő edzések nem találhatók a megadott időszakban.")
         return redirect("data_sharing:attendance_export_form", club_pk=club_pk, sport_pk=sport_pk)
 
-    # --- 4. Jelenléti rekordok ---
-    attendance_records = Attendance.objects.filter(session__in=sessions).select_related(
-        "registered_athlete__profile", "placeholder_athlete", "session"
-    )
+    # --- 5. Streamelt FileResponse (a spooled fájlt a válasz zárja le) ---
+    return FileResponse(report.load().build_file(), as_attachment=True, filename=report.filename)
 
-    # --- 5. Sportolók (User + Placeholder) ---
-    athlete_map = {}
-    registered_athletes = (
-        User.objects.filter(
-            user_roles__role__name="Sportoló",
-            user_roles__status="approved",
-            user_roles__club_id=club_pk,
-            user_roles__sport_id=sport_pk,
-        )
-        .select_related("profile")
-        .distinct()
-    )
-    for athlete in registered_athletes:
-        athlete_map[f"r_{athlete.id}"] = {
-            "id": athlete.id,
-            "type": "registered",
-            "name": f"{athlete.profile.first_name} {athlete.profile.last_name} ",
-            "birth_year": athlete.profile.date_of_birth.year if athlete.profile.date_of_birth else "N/A",
-        }
-
-    placeholder_athletes = PlaceholderAthlete.objects.filter(club_id=club_pk, sport_id=sport_pk)
-    for ph in placeholder_athletes:
-        athlete_map[f"p_{ph.id}"] = {
-            "id": ph.id,
-            "type": "placeholder",
-            "name": f"{ph.first_name} {ph.last_name} (PH)",
-            "birth_year": ph.birth_date.year if ph.birth_date else "N/A",
-        }
-
-    athlete_list = sorted(athlete_map.values(), key=lambda x: x["name"])
-
-    # --- 6. Táblázat adatok ---
-    session_cols = [f"{s.session_date.strftime('%m-%d')} {s.start_time.strftime('%H:%M')}" for s in sessions_list]
-    columns = ["Név", "Születési Év"] + session_cols + ["Összes Edzés", "Jelen (J)", "Sérült (S)", "Vendég (V)", "Hiányzott (H)"]
-
-    data = []
-    for athlete_data in athlete_list:
-        row = {"Név": athlete_data["name"], "Születési Év": athlete_data["birth_year"]}
-        total_present = total_injured = total_guest = 0
-
-        if athlete_data["type"] == "registered":
-            athlete_attendance = {
-                att.session_id: att for att in attendance_records if att.registered_athlete_id == athlete_data["id"]
-            }
-        else:
-            athlete_attendance = {
-                att.session_id: att for att in attendance_records if att.placeholder_athlete_id == athlete_data["id"]
-            }
-
-        for session in sessions_list:
-            att = athlete_attendance.get(session.id)
-            status_code = get_attendance_status(att)
-            if status_code == "J":
-                total_present += 1
-            elif status_code == "S":
-                total_injured += 1
-            elif status_code == "V":
-                total_guest += 1
-            row[f"{session.session_date.strftime('%m-%d')} {session.start_time.strftime('%H:%M')}"] = status_code
-
-        total_attended = total_present + total_injured + total_guest
-        total_absent = total_sessions - total_attended
-        row["Összes Edzés"] = total_sessions
-        row["Jelen (J)"] = f"{total_present} alk."
-        row["Sérült (S)"] = f"{total_injured} alk."
-        row["Vendég (V)"] = f"{total_guest} alk."
-        row["Hiányzott (H)"] = f"{total_absent} alk."
-        data.append(row)
-
-    df = pd.DataFrame(data, columns=columns)
-
-    # --- 7. Excel generálás ---
-    output = io.BytesIO()
-    with pd.ExcelWriter(output, engine="xlsxwriter") as writer:
-        sheet_name = f"Jelenlét_{start_date.strftime('%Y%m')}-{end_date.strftime('%Y%m')}"
-        df.to_excel(writer, sheet_name=sheet_name, startrow=6, index=False)
 
-        workbook = writer.book
-        worksheet = writer.sheets[sheet_name]
-
-        # --- Fejléc formátum ---
-        header_format = workbook.add_format({"bold": True, "font_size": 14, "align": "center"})
-        info_format = workbook.add_format({"font_size": 10, "align": "left"})
-        footer_format = workbook.add_format({"italic": True, "align": "center"})
-
-        # Klubvezető neve
-        club_leader_role = UserRole.objects.filter(
-            role__name="Egyesületi vezető", club=club, status="approved"
-        ).select_related("user__profile").first()
-        leader_name = f"{club_leader_role.user.profile.first_name} {club_leader_role.user.profile.last_name}" if club_leader_role else "Nincs megadva"
-
-        # Edzők neve
-        coaches_qs = UserRole.objects.filter(
-            role__name="Edző", status="approved", club_id=club_pk, sport_id=sport_pk
-        ).select_related("user__profile")
-        coach_names = ", ".join([f"{c.user.profile.first_name} {c.user.profile.last_name}" for c in coaches_qs])
-
-        # Fejléc írása
-        worksheet.merge_range("A1:D1", f"Egyesület: {club.name} / {sport.name}", header_format)
-        worksheet.write("A2", "Cím:", info_format)
-        worksheet.write("B2", club.address, info_format)
-        worksheet.write("A3", "Vezető:", info_format)
-        worksheet.write("B3", leader_name, info_format)
-        worksheet.write("A4", "Edző(k):", info_format)
-        worksheet.write("B4", coach_names if coach_names else coach.get_full_name(), info_format)
-
-        # Időszak
-        worksheet.merge_range("A6:F6", f"Jelentési időszak: {start_date_str} - {end_date_str}", header_format)
-
-        # --- Lábléc ---
-        footer_row = len(df) + 9
-        worksheet.merge_range(footer_row, 0, footer_row, len(columns) - 1, "Készült a digiTTrain2025 programmal.", footer_format)
-        worksheet.merge_range(footer_row + 1, 0, footer_row + 1, len(columns) - 1, "DigiTTrain Logó Helye", footer_format)
+def _get_export_status(request, token):
+    status = cache.get(export_status_key(token))
+    if not status or status.get("user_id") != request.user.id:
+        raise Http404("Az export nem található vagy lejárt.")
+    return status
+
+
+@login_required
+@role_required("Edző")
+def attendance_export_status(request, token):
+    """A háttérben készülő jelenléti ív állapota; elkészülte után a letöltési link."""
+    status = _get_export_status(request, token)
+    context = {
+        "page_title": "Jelenléti ív exportálása",
+        "token": token,
+        "status": status["status"],
+        "filename": status.get("filename"),
+    }
+    return render(request, "data_sharing/coach/attendance_export_status.html", context)
 
-    output.seek(0)
 
-    # --- 8. FileResponse ---
-    file_name = f"Jelenléti_ív_{start_date.strftime('%Y%m%d')}-{end_date.strftime('%Y%m%d')}_{club.short_name}.xlsx"
-    return FileResponse(output, as_attachment=True, filename=file_name)
+@login_required
+@role_required("Edző")
+def download_attendance_export(request, token):
+    status = _get_export_status(request, token)
+    if status["status"] != "ready":
+        return redirect("data_sharing:attendance_export_status", token=token)
+    return FileResponse(default_storage.open(status["path"], "rb"), as_attachment=True, filename=status["filename"])
 
 @login_required
 @role_required('Edző')
@@ -708,50 +561,22 @@ def manage_schedules(request):
             schedule_filter |= Q(club_id=role.club.id, sport_id=role.sport.id)
 
     # Csak az engedélyezett klub/sport párosítások edzésrendjei
-    schedules_qs = TrainingSchedule.objects.filter(
+    schedules_qs = list(TrainingSchedule.objects.filter(
         schedule_filter
-    ).select_related('club', 'sport', 'coach__profile').order_by('club__name', 'sport__name', 'days_of_week', 'start_time')
-    
+    ).select_related('club', 'sport', 'coach__profile').order_by('club__name', 'sport__name', 'days_of_week', 'start_time'))
+
+    # Az elmúlt 30 nap edzései ÉS a következő 5 jövőbeli edzés az összes edzésrendre egyszerre,
+    # a rögzített / elmulasztott státusz egyetlen lekérdezéssel (szüneteknél nincs státusz)
+    expanded = resolve_occurrence_status(
+        expand_schedules(schedules_qs, today, future_limit=5, past_days=30),
+        today,
+    )
+
     schedules_with_sessions = []
     
     for schedule in schedules_qs:
-        # Kiszámoljuk az elmúlt 30 nap edzéseit ÉS a következő 5 jövőbeli edzést (UX javítás)
-        next_sessions = calculate_next_training_sessions(
-            schedule.id, 
-            schedule.club_id, 
-            future_limit=5, # Következő 5 jövőbeli EDZÉS (nem szünet)
-            past_days=30    # Utolsó 30 nap összes alkalma
-        )
+        next_sessions = expanded[schedule.id]
 
-        for session in next_sessions:
-            # Szünetek esetén nincs szükség státuszellenőrzésre
-            if session.get('is_absence', False): 
-                continue 
-            
-            session_date = session['date']
-            
-            # 1. Megkeressük a TrainingSession-t (A link generálásához szükség van rá, de nem kötelező a státuszhoz)
-            training_session = TrainingSession.objects.filter(
-                coach=schedule.coach, 
-                session_date=session_date, 
-                start_time=schedule.start_time 
-            ).first()
-            
-            # 2. JELENLÉT ELLENŐRZÉSE (FIXED: Közvetlen szűrés az Attendance táblán)
-            # Ez a fix garantálja, hogy a zöld pipa akkor is megjelenjen, ha a TrainingSession 
-            # adatai helyesek, függetlenül a tranzakciós/creation logikától.
-            has_attendance = Attendance.objects.filter(
-                session__session_date=session_date,
-                session__start_time=schedule.start_time,
-                is_present=True
-            ).exists()
-            
-            # 3. Hozzáadjuk a státuszokat a session dict-hez
-            session['is_recorded'] = has_attendance # Zöld pipa
-            
-            # Sárga felkiáltójel: Akkor elmulasztott, ha a dátum már ELMÚLT ÉS NINCS rögzítve.
-            session['is_missed'] = (session_date < today) and (not has_attendance) 
-        
         # Edző teljes nevének formázása
         full_coach_name = (
             f"{schedule.coach.profile.first_name} {schedule.coach.profile.last_name}"
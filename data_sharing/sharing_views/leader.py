@@ -12,7 +12,8 @@ from biometric_data.models import WeightData, HRVandSleepData, RunningPerformanc
 from users.models import UserRole, User 
 from users.utils import _check_user_role 
 from assessment.models import PlaceholderAthlete, PhysicalAssessment
-from data_sharing.models import DataSharingPermission
+from data_sharing.access import get_access
+from data_sharing.summary_loader import AthleteSummaryLoader
 from training_log.models import Attendance
 from training_log.utils import get_attendance_summary
 from diagnostics_jobs.models import DiagnosticJob
@@ -27,102 +28,61 @@ def calculate_age(born):
     today = date.today()
     return today.year - born.year - ((today.month, today.day) < (born.month, born.day))
 
-def has_biometric_permission(data_owner, data_viewer, table_names):
-    """
-    Ellenőrzi, hogy a data_viewer rendelkezik-e engedéllyel a data_owner 
-    megadott tábláinak (table_names) legalább egyikéhez.
-    """
-    if not data_owner or not data_viewer:
-        return False
-
-    # 1. Lekérjük a megtekintő (edző/vezető) összes aktív szerepkörét
-    viewer_roles = UserRole.objects.filter(
-        user=data_viewer, 
-        status='approved'
-    )
-
-    # 2. Lekérjük az összes vonatkozó engedélyt ezekhez a szerepkörökhöz
-    permissions = DataSharingPermission.objects.filter(
-        athlete=data_owner,
-        target_person=data_viewer,
-        target_role__in=viewer_roles,
-        table_name__in=table_names
-    )
-
-    if not permissions.exists():
-        return False
-
-    # 3. Életkor alapú ellenőrzés
-    is_adult = getattr(data_owner, 'is_adult', True) # Alapértelmezett True, ha nincs ilyen property
-
-    for perm in permissions:
-        if is_adult:
-            # Felnőttnél elég a sportoló beleegyezése
-            if perm.athlete_consent:
-                return True
-        else:
-            # Kiskorúnál mindkettő kell
-            if perm.athlete_consent and perm.parent_consent:
-                return True
-
-    return False
-
 @login_required
 def leader_dashboard(request):
     leader = request.user
     
     # 1. Megkeressük az összes olyan klubot, ahol "Egyesületi vezető" vagy
     # Fontos: a státusznak 'approved'-nek kell lennie
-    leader_roles = UserRole.objects.filter(
+    leader_roles = list(UserRole.objects.filter(
         user=leader, 
         role__name="Egyesületi vezető",
         status="approved"
-    )
+    ))
     
     # Kigyűjtjük a klubok ID-it
-    club_ids = list(leader_roles.values_list('club_id', flat=True))
-    
-    print(f"DEBUG: Leader ID: {leader.id}, Klubjai: {club_ids}")
+    club_ids = [leader_role.club_id for leader_role in leader_roles]
+    leader_role_id = leader_roles[0].id if leader_roles else None
 
     # 2. Megkeressük az összes sportolót, aki ezekbe a klubokba tartozik
     # Itt a szerepkör neve a kódod alapján: "Sportoló"
-    all_club_athletes = User.objects.filter(
-        user_roles__club_id__in=club_ids,
-        user_roles__role__name="Sportoló",
-        user_roles__status="approved"
-    ).distinct()
-    
-    print(f"DEBUG: Klubban talált jóváhagyott sportolók: {all_club_athletes.count()}")
+    # Sportolónként az első (legfrissebb) szerepkör adja a klubot és a sportágat
+    athlete_roles = {}
+    for ath_role in UserRole.objects.filter(
+        club_id__in=club_ids,
+        role__name="Sportoló",
+        status="approved"
+    ).select_related('user__profile', 'club', 'sport'):
+        athlete_roles.setdefault(ath_role.user_id, ath_role)
 
-    athletes_data = []
-    for athlete in all_club_athletes:
-        # 1. Megnézzük, van-e engedély (de nem ugrunk ki, ha nincs!)
-        permissions_qs = DataSharingPermission.objects.filter(
-            athlete=athlete,
-            target_person=leader,
-            athlete_consent=True
-        )
-        
-        if not athlete.is_adult:
-            permissions_qs = permissions_qs.filter(parent_consent=True)
+    # Engedélyek, utolsó súly, forma és jelenlét az összes sportolóra egyszerre
+    summaries = AthleteSummaryLoader(leader).load(
+        [ath_role.user for ath_role in athlete_roles.values()],
+        [(athlete_id, ath_role.club_id) for athlete_id, ath_role in athlete_roles.items()],
+    )
 
-        # Itt a változtatás: kikerül az 'if permissions_qs.exists():' blokkból a hozzáadás
-        permissions = list(permissions_qs.values_list('table_name', flat=True)) if permissions_qs.exists() else []
-        has_any_permission = len(permissions) > 0
+    athletes_data = []
+    for ath_role in athlete_roles.values():
+        athlete = ath_role.user
+        summary = summaries[athlete.id]
+        # Nem ugrunk ki, ha nincs engedély – a kártya zárolva jelenik meg
+        permissions = summary['permissions']
+        profile = getattr(athlete, 'profile', None)
 
-        ath_role = athlete.user_roles.filter(role__name__icontains='Sportoló').first()
-        
         athletes_data.append({
             'athlete_object': athlete,
             'profile_data': {
-                'first_name': athlete.profile.first_name if hasattr(athlete, 'profile') else athlete.first_name,
-                'last_name': athlete.profile.last_name if hasattr(athlete, 'profile') else athlete.last_name,
+                'first_name': profile.first_name if profile else athlete.first_name,
+                'last_name': profile.last_name if profile else athlete.last_name,
             },
-            'athlete_club': ath_role.club if ath_role else None,
-            'athlete_sport': ath_role.sport if ath_role else None,
+            'athlete_club': ath_role.club,
+            'athlete_sport': ath_role.sport,
+            'last_weight': summary['last_weight'],
+            'attendance_stats': summary['attendance_by_club'].get(ath_role.club_id),
+            'ditta_score': summary['ditta_score'],
             'permissions': permissions,
-            'has_permission': has_any_permission,  # Új flag a HTML-nek
-            'role_id': leader_roles.first().id if leader_roles.exists() else None
+            'has_permission': len(permissions) > 0,  # Új flag a HTML-nek
+            'role_id': leader_role_id
         })
 
     return render(request, 'data_sharing/leader/leader_dashboard.html', {
@@ -141,35 +101,13 @@ def leader_athlete_details(request, athlete_id, role_id):
     # Ellenőrizzük, hogy a role valóban a leaderé-e és jóvá van-e hagyva
     role = get_object_or_404(UserRole, id=role_id, user=leader, status='approved')
 
-    # Engedélyek ellenőrzése
-    permissions_qs = DataSharingPermission.objects.filter(
-        athlete=athlete,
-        target_person=leader, # leader nézzük
-        athlete_consent=True
-    )
+    # Engedélyek ellenőrzése (athlete_consent + ha kiskorú, akkor parent_consent és szülői főkapcsoló)
+    permissions = get_access(athlete).tables(leader.id)
 
-    if not athlete.is_adult:
-        permissions_qs = permissions_qs.filter(parent_consent=True)
-    
-    if not permissions_qs.exists():
-        from django.contrib import messages
+    if not permissions:
         messages.warning(request, f"Nincs érvényes, jóváhagyott engedélyed {athlete.get_full_name()} adataihoz.")
         return redirect('data_sharing:leader_dashboard')
 
-    # Ha idáig eljut a kód, akkor VAN engedély.
-    # Most szedjük ki a táblaneveket a listába:
-    permissions = list(permissions_qs.values_list('table_name', flat=True))
-
-    if not getattr(athlete, 'is_adult', True):
-        permissions_qs = permissions_qs.filter(parent_consent=True)
-        
-    permissions = list(permissions_qs.values_list('table_name', flat=True))
-
-    if not permissions:
-        from django.contrib import messages
-        messages.error(request, "Nincs jogosultságod a sportoló adataihoz.")
-        return redirect('data_sharing:coach_dashboard')
-
     context = {
         'athlete': athlete,
         'role': role,
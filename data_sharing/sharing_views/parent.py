@@ -10,7 +10,8 @@ import json
 # Modellek importálása
 from biometric_data.models import HRVandSleepData, WeightData, WorkoutFeedback
 from users.models import User, UserRole
-from data_sharing.models import DataSharingPermission  # FRISSÍTVE: Új modellnév
+from data_sharing.access import get_access
+from data_sharing.summary_loader import AthleteSummaryLoader
 from training_log.models import Attendance
 from assessment.models import PhysicalAssessment
 from training_log.utils import get_attendance_summary
@@ -46,31 +47,16 @@ def parent_dashboard(request):
         status='approved'
     ).select_related('user__profile', 'club', 'sport').order_by('user__profile__last_name')
     
+    # 2. Engedélyek (kiskorúnál Sportoló ÉS Szülő engedélyezte), utolsó súly, forma és jelenlét egyszerre
+    summaries = AthleteSummaryLoader(parent).load(
+        [role.user for role in children_roles], [(role.user_id, role.club_id) for role in children_roles]
+    )
+
     children_data = []
     
     for role in children_roles:
         athlete = role.user
-        
-        # 2. Engedélyek szűrése (Nincs 'enabled' mező, ezért Q objektumokat használunk)
-        # Feltétel: (Sportoló engedélyezte ÉS Szülő engedélyezte)
-        permissions_qs = DataSharingPermission.objects.filter(
-            athlete=athlete, 
-            target_person=parent,
-            athlete_consent=True,
-            parent_consent=True
-        )
-        permissions = list(permissions_qs.values_list('table_name', flat=True))
-
-        # 3. Alapadatok begyűjtése a dashboardhoz
-        last_weight = WeightData.objects.filter(user=athlete).order_by('-workout_date').first()
-        
-        attendance_stats = None
-        if 'Attendance' in permissions:
-            attendance_stats = get_attendance_summary(athlete, days=30)
-
-        ditta_score = None
-        if 'UserFeatureSnapshot' in permissions:
-            ditta_score = UserFeatureSnapshot.objects.filter(user=athlete).order_by('-generated_at').first()
+        summary = summaries[athlete.id]
 
         # Csak kiskorúakat listázunk (vagy akit a szülő felügyel)
         children_data.append({
@@ -78,10 +64,10 @@ def parent_dashboard(request):
             'profile_data': athlete.profile,
             'athlete_club': role.club,
             'athlete_sport': role.sport,
-            'last_weight': last_weight,
-            'permissions': permissions,
-            'attendance_stats': attendance_stats,
-            'ditta_score': ditta_score,
+            'last_weight': summary['last_weight'],
+            'permissions': summary['permissions'],
+            'attendance_stats': summary['attendance_by_club'].get(role.club_id),
+            'ditta_score': summary['ditta_score'],
         })
             
     context = {
@@ -105,14 +91,8 @@ def parent_athlete_details(request, athlete_id):
     if not is_authorized_parent:
         return render(request, '403.html', {'message': 'Nincs jogosultsága a sportoló adataihoz.'})
 
-    # Engedélyek lekérése (Szigorú: mindkét fél beleegyezése kell)
-    permissions_qs = DataSharingPermission.objects.filter(
-        athlete=athlete, 
-        target_person=parent,
-        athlete_consent=True,
-        parent_consent=True
-    )
-    permissions = list(permissions_qs.values_list('table_name', flat=True))
+    # Engedélyek lekérése (kiskorúnál mindkét fél beleegyezése kell)
+    permissions = get_access(athlete).tables(parent.id)
 
     context = {
         'athlete': athlete,
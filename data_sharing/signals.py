@@ -0,0 +1,23 @@
+# data_sharing/signals.py
+"""
+A sportolónként cache-elt engedélykészlet (data_sharing.access) érvénytelenítése azoknál a
+változásoknál, amelyek nem a toggle_permission-ön át érkeznek:
+- a sportoló szerepkörei (UserRole.parent – kiskorú főkapcsoló);
+- engedélysorok törlése (pl. a célszemély szerepkörének törlésekor kaszkádolva).
+"""
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .access import invalidate_access
+
+
+@receiver(post_save, sender="users.UserRole", dispatch_uid="sharing_access_role_save")
+@receiver(post_delete, sender="users.UserRole", dispatch_uid="sharing_access_role_delete")
+def invalidate_access_on_role_change(sender, instance, **kwargs):
+    transaction.on_commit(lambda: invalidate_access([instance.user_id]))
+
+
+@receiver(post_delete, sender="data_sharing.DataSharingPermission", dispatch_uid="sharing_access_permission_delete")
+def invalidate_access_on_permission_delete(sender, instance, **kwargs):
+    transaction.on_commit(lambda: invalidate_access([instance.athlete_id]))
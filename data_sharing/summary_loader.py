@@ -0,0 +1,109 @@
+# data_sharing/summary_loader.py
+"""
+A coach / parent / leader dashboard sportolókártyáinak adatai egy listányi sportolóra.
+
+A lekérdezések száma független a sportolók számától (legfeljebb 7):
+1. a legfrissebb WeightData és UserFeatureSnapshot id-ja sportolónként (korrelált Subquery-k –
+   MySQL-en nincs DISTINCT ON);
+2-3. a hozzájuk tartozó sorok (in_bulk);
+4-5. a cache-ből hiányzó sportolók engedélykészlete (data_sharing.access: engedélyek + szülők);
+6-7. jelenlét klubonként: a klub edzésszáma + csoportosított feltételes aggregátum
+   (training_log.utils.get_attendance_summaries – klubonként / naponként cache-elt).
+
+A jelenlét (sportoló, klub) páronként készül: a több klubban szereplő sportoló minden
+kártyája a saját klubja edzéseit mutatja.
+
+Az is_adult a sportolóval együtt betöltött profilból számolódik (a hívó select_related('profile')-lal adja át).
+"""
+from collections import defaultdict
+
+from django.db.models import OuterRef, Subquery
+
+from biometric_data.models import WeightData
+from ml_engine.models import UserFeatureSnapshot
+from training_log.utils import get_attendance_summaries
+from users.models import User
+
+from .access import load_access
+
+
+def _latest_id(model, *order_by):
+    return Subquery(model.objects.filter(user=OuterRef('pk')).order_by(*order_by).values('pk')[:1])
+
+
+class AthleteSummaryLoader:
+    """
+    :param viewer: a dashboard tulajdonosa (edző, szülő, vezető) – az engedélyek célszemélye
+    :param attendance_period: a jelenléti összesítő időszaka (TIME_PERIODS kulcs)
+    """
+
+    def __init__(self, viewer, attendance_period='1M'):
+        self.viewer = viewer
+        self.attendance_period = attendance_period
+
+    def _permissions(self, athletes):
+        """{athlete_id: [table_name, ...]} – a megtekintő bármelyik szerepkörén át látható táblák."""
+        access = load_access(athletes.values())
+        return {athlete_id: access[athlete_id].tables(self.viewer.pk) for athlete_id in athletes}
+
+    def _attendance(self, athletes, memberships):
+        """{athlete_id: {club_id: összesítő}} – páronként a klub edzéseire, klubonként egy (cache-elt) számolás."""
+        by_club = defaultdict(dict)
+        for athlete_id, club_id in memberships:
+            if club_id is not None and athlete_id in athletes:
+                by_club[club_id][athlete_id] = athletes[athlete_id]
+        attendance = defaultdict(dict)
+        for club_id, club_athletes in by_club.items():
+            for athlete, periods in get_attendance_summaries(club_athletes.values(), club_id).items():
+                attendance[athlete.pk][club_id] = periods[self.attendance_period]
+        return attendance
+
+    def load(self, athletes, memberships) -> dict:
+        """
+        :param athletes: User példányok (profile előtöltve); ismétlődés megengedett
+        :param memberships: (athlete_id, club_id) párok – a jelenlét páronként az adott klub edzéseire számolódik
+        :return: {athlete_id: {'athlete', 'is_adult', 'permissions', 'last_weight', 'ditta_score', 'attendance_by_club'}}
+                 ahol attendance_by_club: {club_id: összesítő} (engedély nélkül üres)
+        """
+        athletes = {athlete.pk: athlete for athlete in athletes}
+        if not athletes:
+            return {}
+
+        latest = (
+            User.objects
+            .filter(pk__in=list(athletes))
+            .annotate(
+                latest_weight_id=_latest_id(WeightData, '-workout_date', '-created_at'),
+                latest_snapshot_id=_latest_id(UserFeatureSnapshot, '-generated_at'),
+            )
+            .values_list('pk', 'latest_weight_id', 'latest_snapshot_id')
+        )
+        weight_ids, snapshot_ids = {}, {}
+        for athlete_id, weight_id, snapshot_id in latest:
+            weight_ids[athlete_id] = weight_id
+            snapshot_ids[athlete_id] = snapshot_id
+
+        weights = WeightData.objects.in_bulk([pk for pk in weight_ids.values() if pk])
+        permissions = self._permissions(athletes)
+
+        # A forma és a jelenlét csak engedéllyel töltődik
+        snapshots = UserFeatureSnapshot.objects.in_bulk([
+            snapshot_ids[athlete_id] for athlete_id, tables in permissions.items()
+            if 'UserFeatureSnapshot' in tables and snapshot_ids.get(athlete_id)
+        ])
+        attendance = self._attendance(
+            {athlete_id: athletes[athlete_id] for athlete_id, tables in permissions.items() if 'Attendance' in tables},
+            memberships,
+        )
+
+        return {
+            athlete_id: {
+                'athlete': athlete,
+                'is_adult': athlete.is_adult,
+                'permissions': permissions[athlete_id],
+                'last_weight': weights.get(weight_ids.get(athlete_id)),
+                'ditta_score': snapshots.get(snapshot_ids.get(athlete_id)),
+                'attendance_by_club': attendance.get(athlete_id, {}),
+            }
+            for athlete_id, athlete in athletes.items()
+        }
@@ -1,3 +1,217 @@
+from datetime import date, time, timedelta
+
+from django.core.cache import cache
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from biometric_data.models import WeightData
+from ml_engine.models import UserFeatureSnapshot
+from training_log.models import AbsenceSchedule, Attendance, TrainingSchedule, TrainingSession
+from users.models import Club, Role, Sport, User, UserRole
+
+from .models import DataSharingPermission
+from .summary_loader import AthleteSummaryLoader
+
+SHARED_TABLES = ('WeightData', 'Attendance', 'UserFeatureSnapshot')
+
+
+class AthleteSummaryLoaderQueryCountTests(TestCase):
+    """A dashboardok lekérdezésszáma nem nőhet a sportolók számával (N+1 regresszió)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.sport = Sport.objects.create(name='Birkózás')
+        cls.club = Club.objects.create(name='Teszt SE', short_name='TSE', address='Budapest')
+        cls.athlete_role = Role.objects.create(name='Sportoló')
+        cls.leader_role = Role.objects.create(name='Egyesületi vezető')
+        Role.objects.create(name='Edző')
+
+        cls.coach = User.objects.create_user(username='coach', password='pw')
+        cls.parent = User.objects.create_user(username='parent', password='pw')
+        cls.leader = User.objects.create_user(username='leader', password='pw')
+        UserRole.objects.create(user=cls.leader, role=cls.leader_role, club=cls.club, sport=cls.sport, status='approved')
+
+        schedule = TrainingSchedule.objects.create(
+            club=cls.club, sport=cls.sport, coach=cls.coach, name='U16', days_of_week='1,3',
+            start_time=time(17, 0), end_time=time(18, 30), birth_years='2010,2011', genders='M',
+        )
+        cls.session = TrainingSession.objects.create(
+            coach=cls.coach, schedule=schedule, session_date=timezone.localdate() - timedelta(days=1),
+            start_time=time(17, 0), duration_minutes=90,
+        )
+        cls.initial_athletes = [cls.create_athlete(index) for index in range(3)]
+
+    def setUp(self):
+        self.athletes = list(self.initial_athletes)
+        # Hideg engedély-cache: a mérések a legrosszabb esetet rögzítik
+        cache.clear()
+
+    def add_athletes(self, count):
+        for _ in range(count):
+            self.athletes.append(self.create_athlete(len(self.athletes)))
+
+    @classmethod
+    def create_athlete(cls, index):
+        athlete = User.objects.create_user(username=f'athlete{index}', password='pw')
+        athlete.profile.date_of_birth = date(2012 if index % 2 else 1995, 1, 1)
+        athlete.profile.save()
+        UserRole.objects.create(
+            user=athlete, role=cls.athlete_role, club=cls.club, sport=cls.sport,
+            coach=cls.coach, parent=cls.parent, status='approved',
+        )
+        WeightData.objects.create(user=athlete, morning_weight=70 + index)
+        UserFeatureSnapshot.objects.create(user=athlete, features={'form_score': 50 + index})
+        Attendance.objects.create(session=cls.session, registered_athlete=athlete, is_present=True)
+        for viewer in (cls.coach, cls.parent, cls.leader):
+            for table_name in SHARED_TABLES:
+                DataSharingPermission.objects.create(
+                    athlete=athlete, target_person=viewer, app_name='any', table_name=table_name,
+                    athlete_consent=True, parent_consent=True,
+                )
+        return athlete
+
+    def _load(self, viewer):
+        cache.clear()
+        athletes = User.objects.select_related('profile').filter(pk__in=[a.pk for a in self.athletes])
+        return AthleteSummaryLoader(viewer).load(list(athletes), [(a.pk, self.club.pk) for a in self.athletes])
+
+    def test_loader_uses_constant_number_of_queries(self):
+        # sportolók (profil), súly/forma id-k, súlyok, engedélyek, szülők, formák, klub edzésszám, jelenlét-aggregátum
+        with self.assertNumQueries(8):
+            summaries = self._load(self.coach)
+        self.add_athletes(5)
+        with self.assertNumQueries(8):
+            summaries = self._load(self.coach)
+
+        self.assertEqual(len(summaries), 8)
+        for athlete in self.athletes:
+            summary = summaries[athlete.pk]
+            self.assertCountEqual(summary['permissions'], SHARED_TABLES)
+            self.assertIsNotNone(summary['last_weight'])
+            self.assertIsNotNone(summary['ditta_score'])
+            self.assertEqual(summary['attendance_by_club'][self.club.pk]['sessions_attended'], 1)
+            self.assertEqual(summary['attendance_by_club'][self.club.pk]['time_spent_minutes'], 90)
+
+    def test_minor_requires_parent_consent(self):
+        minor = next(a for a in self.athletes if not a.is_adult)
+        DataSharingPermission.objects.filter(athlete=minor, target_person=self.coach).update(parent_consent=False)
+        summaries = self._load(self.coach)
+        self.assertEqual(summaries[minor.pk]['permissions'], [])
+        self.assertIsNone(summaries[minor.pk]['ditta_score'])
+        self.assertEqual(summaries[minor.pk]['attendance_by_club'], {})
+
+    def test_attendance_is_per_club_for_multi_club_athlete(self):
+        athlete = self.athletes[0]
+        other_club = Club.objects.create(name='Másik SE', short_name='MSE', address='Debrecen')
+        UserRole.objects.create(
+            user=athlete, role=self.athlete_role, club=other_club, sport=self.sport,
+            coach=self.coach, status='approved',
+        )
+        other_schedule = TrainingSchedule.objects.create(
+            club=other_club, sport=self.sport, coach=self.coach, name='Felnőtt', days_of_week='2',
+            start_time=time(18, 0), end_time=time(19, 0), birth_years='1995', genders='M',
+        )
+        for days_ago in (1, 2):
+            session = TrainingSession.objects.create(
+                coach=self.coach, schedule=other_schedule, session_date=timezone.localdate() - timedelta(days=days_ago),
+                start_time=time(18, 0), duration_minutes=60,
+            )
+            Attendance.objects.create(session=session, registered_athlete=athlete, is_present=days_ago == 1)
+
+        cache.clear()
+        athletes = list(User.objects.select_related('profile').filter(pk=athlete.pk))
+        summary = AthleteSummaryLoader(self.coach).load(
+            athletes, [(athlete.pk, self.club.pk), (athlete.pk, other_club.pk)]
+        )[athlete.pk]
+        own, other = summary['attendance_by_club'][self.club.pk], summary['attendance_by_club'][other_club.pk]
+        self.assertEqual((own['sessions_attended'], own['total_sessions'], own['time_spent_minutes']), (1, 1, 90))
+        self.assertEqual((other['sessions_attended'], other['total_sessions'], other['time_spent_minutes']), (1, 2, 60))
+
+        # A coach dashboard mindkét kártyája a saját klubja jelenlétét mutatja
+        self.client.force_login(self.coach)
+        response = self.client.get(reverse('data_sharing:coach_dashboard'))
+        cards = {
+            card['athlete_club'].pk: card['attendance_stats']
+            for card in response.context['athletes_data'] if card['athlete_id'] == athlete.pk
+        }
+        self.assertEqual(cards[self.club.pk]['total_sessions'], 1)
+        self.assertEqual(cards[other_club.pk]['total_sessions'], 2)
+
+    def _dashboard_queries(self, viewer, url_name):
+        self.client.force_login(viewer)
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse(url_name))
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_dashboards_do_not_scale_with_athlete_count(self):
+        for viewer, url_name in (
+            (self.coach, 'data_sharing:coach_dashboard'),
+            (self.parent, 'data_sharing:parent_dashboard'),
+            (self.leader, 'data_sharing:leader_dashboard'),
+        ):
+            with self.subTest(url_name=url_name):
+                before = self._dashboard_queries(viewer, url_name)
+                self.add_athletes(4)
+                self.assertEqual(self._dashboard_queries(viewer, url_name), before)
+
+
+class ManageSchedulesQueryCountTests(TestCase):
+    """Az edzésrend-lista lekérdezésszáma nem nőhet az edzésrendek és alkalmak számával."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.sport = Sport.objects.create(name='Birkózás')
+        cls.club = Club.objects.create(name='Teszt SE', short_name='TSE', address='Budapest')
+        coach_role = Role.objects.create(name='Edző')
+        cls.coach = User.objects.create_user(username='coach', password='pw')
+        UserRole.objects.create(user=cls.coach, role=coach_role, club=cls.club, sport=cls.sport, status='approved')
+        cls.athlete = User.objects.create_user(username='athlete', password='pw')
+        AbsenceSchedule.objects.create(
+            name='Tavaszi szünet', start_date=timezone.localdate() + timedelta(days=3),
+            end_date=timezone.localdate() + timedelta(days=9), club=cls.club,
+        )
+        AbsenceSchedule.objects.create(
+            name='Nemzeti ünnep', start_date=timezone.localdate() - timedelta(days=10),
+            end_date=timezone.localdate() - timedelta(days=10),
+        )
+        cls.create_schedule(0)
+
+    @classmethod
+    def create_schedule(cls, index):
+        schedule = TrainingSchedule.objects.create(
+            club=cls.club, sport=cls.sport, coach=cls.coach, name=f'U{10 + index}', days_of_week='1,2,3,4,5',
+            start_time=time(17, 0), end_time=time(18, 30), birth_years='2010', genders='M',
+            start_date=timezone.localdate() - timedelta(days=60),
+        )
+        # Néhány rögzített múltbéli alkalom jelenléttel
+        for days_ago in (1, 2, 5):
+            session = TrainingSession.objects.create(
+                coach=cls.coach, schedule=schedule, session_date=timezone.localdate() - timedelta(days=days_ago),
+                start_time=time(17, 0), duration_minutes=90,
+            )
+            Attendance.objects.create(session=session, registered_athlete=cls.athlete, is_present=True)
+        return schedule
+
+    def _queries(self):
+        self.client.force_login(self.coach)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('data_sharing:manage_schedules'))
+        self.assertEqual(response.status_code, 200)
+        return len(queries), response
+
+    def test_query_count_does_not_scale_with_schedules(self):
+        before, response = self._queries()
+        sessions = response.context['schedules'][0]['next_sessions']
+        self.assertTrue(any(session.get('is_recorded') for session in sessions))
+        self.assertTrue(any(session['is_absence'] for session in sessions))
 
-# Create your tests here.
+        for index in range(1, 5):
+            self.create_schedule(index)
+        after, response = self._queries()
+        self.assertEqual(len(response.context['schedules']), 5)
+        self.assertEqual(after, before)
@@ -46,6 +46,8 @@ urlpatterns = [
      coach.attendance_export_form, name='attendance_export_form'),
     path('export/attendance/<int:club_pk>/<int:sport_pk>/<str:start_date_str>/<str:end_date_str>/', 
      coach.export_attendance_report, name='export_attendance_report'), 
+    path('export/attendance/status/<str:token>/', coach.attendance_export_status, name='attendance_export_status'),
+    path('export/attendance/download/<str:token>/', coach.download_attendance_export, name='download_attendance_export'),
     
     # 4. Fizikai felmérés rögzítése
     path('coach/add_physical_assessment/', coach.add_physical_assessment, name='add_physical_assessment'),
@@ -1,8 +1,7 @@
 # data_sharing/utils.py
 from django.apps import apps
 from django.conf import settings
-from .models import DataSharingPermission
-from users.models import UserRole
+from .access import ensure_cells, get_access
 
 def get_model_display_name(app_name, table_name):
     translations = {
@@ -26,41 +25,23 @@ def get_model_display_name(app_name, table_name):
 def get_shareable_models():
     return getattr(settings, 'SHAREABLE_DATA_MODELS', {})
 
-def is_permission_active(permission_obj):
-    """
-    Kiszámolja a végleges 'enabled' állapotot a kiskorú/felnőtt logika alapján.
-    """
-    athlete = permission_obj.athlete
-    is_adult = getattr(athlete, 'is_adult', True) 
-
-    # 1. HA FELNŐTT: Csak a sportoló döntése számít
-    if is_adult:
-        return permission_obj.athlete_consent
-
-    # 2. HA KISKORÚ: Kell a sportolói ÉS a szülői beleegyezés is
-    if not (permission_obj.athlete_consent and permission_obj.parent_consent):
-        return False
-    
-    # 3. KISKORÚ FŐKAPCSOLÓ: 
-    # Megosztott-e a gyerek bármilyen adatot legalább egy szülővel?
-    parent_ids = UserRole.objects.filter(
-        user=athlete, 
-        parent__isnull=False
-    ).values_list('parent_id', flat=True).distinct()
-
-    has_parental_main_access = DataSharingPermission.objects.filter(
-        athlete=athlete,
-        target_person_id__in=parent_ids,
-        athlete_consent=True
-    ).exists()
-    
-    return has_parental_main_access
-
 def build_sharing_matrix(data_owner, target_list):
     """
     target_list: [{'user_id': 1, 'role_id': 5, 'name': 'Kovács Edző', ...}, ...]
+    A sportoló engedélykészlete egyszer töltődik be (data_sharing.access); a hiányzó cellák
+    egyetlen bulk_create-tel jönnek létre.
     """
     shareable_models = get_shareable_models()
+    columns = [(app_name, table_name) for app_name, table_names in shareable_models.items() for table_name in table_names]
+    access = get_access(data_owner)
+
+    # Hiányzó engedélyek létrehozása alapértelmezetten False-szal (szerepkörre is szűrünk)
+    ensure_cells(access, [
+        (target['user_id'], target['role_id'], app_name, table_name)
+        for target in target_list
+        for app_name, table_name in columns
+    ])
+
     matrix_rows = []
 
     # Végigmegyünk a célpontokon (minden sor egy Edző/Vezető egy adott szerepkörben)
@@ -75,27 +56,15 @@ def build_sharing_matrix(data_owner, target_list):
         }
 
         # Minden célponthoz végignézzük az összes oszlopot (adattípust)
-        for app_name, table_names in shareable_models.items():
-            for table_name in table_names:
-                # Lekérjük az aktuális engedélyt (ha nincs, létrehozzuk alapértelmezetten False-szal)
-                perm, _ = DataSharingPermission.objects.get_or_create(
-                    athlete=data_owner,
-                    target_person_id=target['user_id'],
-                    target_role_id=target['role_id'], # MOST MÁR SZEREPKÖRRE IS SZŰRÜNK
-                    app_name=app_name,
-                    table_name=table_name
-                )
-
-                # A cella tartalmazza a kapcsoló állapotát
-                row['cells'].append({
-                    'app_name': app_name,
-                    'table_name': table_name,
-                    'display_name': get_model_display_name(app_name, table_name),
-                    'athlete_consent': perm.athlete_consent,
-                    'parent_consent': perm.parent_consent,
-                    'enabled': is_permission_active(perm)
-                })
+        for app_name, table_name in columns:
+            # A cella tartalmazza a kapcsoló állapotát
+            row['cells'].append({
+                'app_name': app_name,
+                'table_name': table_name,
+                'display_name': get_model_display_name(app_name, table_name),
+                **access.cell(target['user_id'], target['role_id'], app_name, table_name),
+            })
 
         matrix_rows.append(row)
 
-    return matrix_rows
\ No newline at end of file
+    return matrix_rows
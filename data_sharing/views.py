@@ -9,6 +9,7 @@ from users.models import UserRole, User
 from .models import DataSharingPermission  # FRISSÍTVE
 from django.conf import settings
 from django.urls import reverse
+from .access import get_access, invalidate_access
 from .utils import build_sharing_matrix, get_model_display_name
 
 @login_required
@@ -64,15 +65,18 @@ def toggle_permission(request):
             else:
                 return JsonResponse({'success': False, 'error': 'Nincs jogosultsága.'}, status=403)
 
-            # Mentés (a modell is_permission_active logikája alapján frissül)
+            # Mentés, majd a sportoló cache-elt engedélykészletének érvénytelenítése
             permission.save() 
-            
-            # A biztonság kedvéért hívjuk meg az utils-t a válaszhoz
-            from .utils import is_permission_active
+            invalidate_access([data_owner.id])
+
+            # A tényleges állapot a friss engedélykészletből (kiskorú / szülői főkapcsoló logika)
+            cell = get_access(data_owner).cell(
+                target_user.id, permission.target_role_id, permission.app_name, permission.table_name
+            )
 
             return JsonResponse({
                 'success': True, 
-                'enabled': is_permission_active(permission),
+                'enabled': cell['enabled'],
                 'athlete_consent': permission.athlete_consent,
                 'parent_consent': permission.parent_consent,
                 'is_minor': not getattr(data_owner, 'is_adult', True),
@@ -1,3 +1,270 @@
-from django.test import TestCase
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.test import SimpleTestCase
+
+from diagnostics.utils import kinematics
+from diagnostics.utils.geometry import calculate_angle_3d, calculate_horizontal_tilt, get_landmark_coords
+from diagnostics.utils.pose_sequence import PoseSequence
+from diagnostics_jobs.services.posture_assessment import PostureAssessmentService
+from diagnostics_jobs.services.shoulder_circumduction_assessment import ShoulderCircumductionService
+from diagnostics_jobs.services.single_leg_stance_service import SingleLegStanceAssessmentService
+from diagnostics_jobs.services.squat_assessment import SquatAssessmentService
+
+# A service-ek csak a job azonosítóját használják (logolás); a snapshot mentés képek híján nem fut
+STUB_JOB = SimpleNamespace(id=0)
+
+
+def random_raw_keypoints(frames=240, seed=7):
+    """Véletlen raw_keypoints lista (frame-enként 33 {x, y, z, v} dict), részben láthatatlan pontokkal."""
+    rng = np.random.default_rng(seed)
+    coords = rng.normal(size=(frames, 33, 3))
+    visibility = rng.uniform(0.3, 1.0, size=(frames, 33))
+    # Nulla csípőtávolság és pontosan vízszintes vállak is előfordulnak
+    coords[3, 24] = coords[3, 23]
+    coords[5, 12, [0, 2]] = coords[5, 11, [0, 2]]
+    # A PoseSequence float32-ben tárol: mindkét út ugyanazokat a bemeneti értékeket kapja
+    coords = coords.astype(np.float32).astype(np.float64)
+    visibility = visibility.astype(np.float32).astype(np.float64)
+    return [
+        [{"x": x, "y": y, "z": z, "v": v} for (x, y, z), v in zip(frame_coords.tolist(), frame_visibility.tolist())]
+        for frame_coords, frame_visibility in zip(coords, visibility)
+    ]
+
+
+def legacy_posture_metrics(raw_keypoints):
+    """A vektorizálás előtti, frame-enkénti testtartás ciklus (referencia)."""
+    shoulder_tilts, hip_tilts, ap_proxies, lateral_shifts = [], [], [], []
+    max_shoulder_tilt = max_hip_tilt = max_ap_proxy = max_lateral_shift = 0.0
+    for frame_data in raw_keypoints:
+        left_shoulder = get_landmark_coords(frame_data, 'left_shoulder')
+        right_shoulder = get_landmark_coords(frame_data, 'right_shoulder')
+        left_hip = get_landmark_coords(frame_data, 'left_hip')
+        right_hip = get_landmark_coords(frame_data, 'right_hip')
+        left_ankle = get_landmark_coords(frame_data, 'left_ankle')
+        right_ankle = get_landmark_coords(frame_data, 'right_ankle')
+        nose = get_landmark_coords(frame_data, 'nose')
+
+        if left_shoulder is not None and right_shoulder is not None:
+            shoulder_tilt = calculate_horizontal_tilt(left_shoulder, right_shoulder)
+            shoulder_tilts.append(shoulder_tilt)
+            if abs(shoulder_tilt) > abs(max_shoulder_tilt):
+                max_shoulder_tilt = shoulder_tilt
+        if left_hip is not None and right_hip is not None:
+            hip_tilt = calculate_horizontal_tilt(left_hip, right_hip)
+            hip_tilts.append(hip_tilt)
+            if abs(hip_tilt) > abs(max_hip_tilt):
+                max_hip_tilt = hip_tilt
+        if all(p is not None for p in [left_hip, right_hip, left_ankle, right_ankle, nose]):
+            hip_distance = np.linalg.norm(left_hip[:2] - right_hip[:2])
+            mid_ankle = (left_ankle + right_ankle) / 2
+            if hip_distance > 0:
+                ap_proxy = (nose[2] - mid_ankle[2]) / hip_distance
+                ap_proxies.append(ap_proxy)
+                if abs(ap_proxy) > abs(max_ap_proxy):
+                    max_ap_proxy = ap_proxy
+                lateral_shift = abs((left_hip[0] + right_hip[0]) / 2 - mid_ankle[0]) / hip_distance
+                lateral_shifts.append(lateral_shift)
+                if lateral_shift > max_lateral_shift:
+                    max_lateral_shift = lateral_shift
+
+    avg_shoulder_tilt = np.mean(np.abs(shoulder_tilts)) if shoulder_tilts else 0.0
+    avg_hip_tilt = np.mean(np.abs(hip_tilts)) if hip_tilts else 0.0
+    return {
+        "average_shoulder_tilt": round(avg_shoulder_tilt, 1),
+        "average_hip_tilt": round(avg_hip_tilt, 1),
+        "max_shoulder_tilt": round(max_shoulder_tilt, 1),
+        "max_hip_tilt": round(max_hip_tilt, 1),
+        "posture_score": round(max(0.0, 100.0 - ((avg_shoulder_tilt + avg_hip_tilt) / 2.0) * 5), 1),
+        "average_ap_proxy": round(np.mean(ap_proxies) if ap_proxies else 0.0, 2),
+        "max_ap_proxy": round(max_ap_proxy, 2),
+        "average_lateral_shift": round(np.mean(lateral_shifts) if lateral_shifts else 0.0, 3),
+        "max_lateral_shift": round(max_lateral_shift, 3),
+    }
+
+
+def legacy_squat_metrics(raw_keypoints, correction_factor):
+    """A vektorizálás előtti, frame-enkénti guggolás ciklus (referencia)."""
+    min_knee_angle, max_trunk_lean = 180.0, 0.0
+    for frame_data in raw_keypoints:
+        lower_body = [
+            get_landmark_coords(frame_data, name)
+            for name in ['left_hip', 'left_knee', 'left_ankle', 'right_hip', 'right_knee', 'right_ankle']
+        ]
+        left_hip, left_knee, left_ankle, right_hip, right_knee, right_ankle = [
+            np.array(p) * correction_factor if p is not None else None for p in lower_body
+        ]
+        left_shoulder = get_landmark_coords(frame_data, 'left_shoulder')
+        right_shoulder = get_landmark_coords(frame_data, 'right_shoulder')
+
+        if all(np.any(p) for p in [left_hip, left_knee, left_ankle]):
+            left_knee_angle = calculate_angle_3d(left_hip, left_knee, left_ankle)
+        else:
+            left_knee_angle = 180.0
+        if all(np.any(p) for p in [right_hip, right_knee, right_ankle]):
+            right_knee_angle = calculate_angle_3d(right_hip, right_knee, right_ankle)
+        else:
+            right_knee_angle = 180.0
+        min_knee_angle = min(min_knee_angle, (left_knee_angle + right_knee_angle) / 2.0)
+
+        if all(np.any(p) for p in [left_shoulder, right_shoulder, left_hip, right_hip]):
+            mid_shoulder = (left_shoulder + right_shoulder) / 2.0
+            mid_hip = (left_hip + right_hip) / 2.0
+            vertical_ref = np.array([mid_hip[0], mid_hip[1] + 100, mid_hip[2]])
+            max_trunk_lean = max(max_trunk_lean, 180.0 - calculate_angle_3d(mid_shoulder, mid_hip, vertical_ref))
+
+    return {"min_knee_angle": round(min_knee_angle, 1), "max_trunk_lean": round(max_trunk_lean, 1)}
+
+
+def legacy_sls_metrics(raw_keypoints, is_left_stance, correction_factor):
+    """A vektorizálás előtti, frame-enkénti egylábon állás ciklus (referencia)."""
+    side, opp = ("left", "right") if is_left_stance else ("right", "left")
+    pelvic_drop_angles, knee_valgus_angles, sway = [], [], []
+    for frame_data in raw_keypoints:
+        stance_hip, stance_knee, stance_ankle, opp_hip = [
+            np.array(p) * correction_factor if p is not None else None
+            for p in (get_landmark_coords(frame_data, name) for name in [
+                f'{side}_hip', f'{side}_knee', f'{side}_ankle', f'{opp}_hip',
+            ])
+        ]
+        if stance_hip is not None and opp_hip is not None:
+            drop_angle = calculate_horizontal_tilt(stance_hip, opp_hip) if is_left_stance \
+                else calculate_horizontal_tilt(opp_hip, stance_hip)
+            pelvic_drop_angles.append(abs(drop_angle))
+        if stance_hip is not None and stance_knee is not None and stance_ankle is not None:
+            knee_valgus_angles.append(max(0.0, 180.0 - calculate_angle_3d(stance_hip, stance_knee, stance_ankle)))
+        if stance_ankle is not None:
+            sway.append(stance_ankle)
+
+    sway_points = np.array(sway)
+    return {
+        "max_pelvic_drop_deg": float(np.max(pelvic_drop_angles)) if pelvic_drop_angles else 0.0,
+        "max_knee_valgus_deg": float(np.max(knee_valgus_angles)) if knee_valgus_angles else 0.0,
+        "ankle_sway_amplitude": float(np.std(sway_points[:, [0, 2]]) * 100) if sway_points.size else 0.0,
+        "stance_time_sec": len(raw_keypoints) / 30,
+    }
+
+
+def legacy_shoulder_metrics(raw_keypoints):
+    """
+    A vektorizálás előtti, frame-enkénti vállkörzés ciklus (referencia). A jobb oldal csak a bal
+    oldali feltétel teljesülésekor számít; hiányzó jobb oldali pont a maximumot nem változtatja.
+    """
+    max_elevation_l = max_elevation_r = max_asymmetry = 0.0
+    for frame_data in raw_keypoints:
+        l_shoulder, l_elbow, l_wrist, l_hip, r_shoulder, r_elbow, r_hip = [
+            get_landmark_coords(frame_data, name) for name in [
+                'left_shoulder', 'left_elbow', 'left_wrist', 'left_hip', 'right_shoulder', 'right_elbow', 'right_hip',
+            ]
+        ]
+        if all(p is not None for p in [l_shoulder, l_hip, l_wrist]):
+            l_elev = 180.0 - calculate_angle_3d(l_hip, l_shoulder, l_elbow) if l_elbow is not None else 0.0
+            max_elevation_l = max(max_elevation_l, l_elev)
+            if all(p is not None for p in [r_hip, r_shoulder, r_elbow]):
+                max_elevation_r = max(max_elevation_r, 180.0 - calculate_angle_3d(r_hip, r_shoulder, r_elbow))
+        if all(p is not None for p in [l_shoulder, r_shoulder, l_hip, r_hip]):
+            tilt = calculate_horizontal_tilt(l_shoulder, r_shoulder)
+            if abs(tilt) > abs(max_asymmetry):
+                max_asymmetry = tilt
+
+    return {
+        "max_elevation_angle_left": round(max_elevation_l, 1),
+        "max_elevation_angle_right": round(max_elevation_r, 1),
+        "max_asymmetry": round(abs(max_asymmetry), 1),
+    }
+
+
+class KinematicsMatchesGeometryTests(SimpleTestCase):
+    """A vektorizált kernelek a geometry.py frame-enkénti függvényeivel azonos eredményt adnak."""
+
+    def setUp(self):
+        self.raw_keypoints = random_raw_keypoints()
+        self.keypoints = PoseSequence.from_raw_keypoints(self.raw_keypoints).keypoints
+
+    def _legacy(self, name):
+        return [get_landmark_coords(frame, name) for frame in self.raw_keypoints]
+
+    def test_gather_matches_get_landmark_coords(self):
+        coords, visible = kinematics.gather(self.keypoints, ['left_knee'])
+        for row, legacy in enumerate(self._legacy('left_knee')):
+            self.assertEqual(bool(visible[row, 0]), legacy is not None)
+            if legacy is not None:
+                np.testing.assert_allclose(coords[row, 0], legacy, atol=1e-6)
+
+    def test_joint_angles_and_tilts(self):
+        coords, visible = kinematics.gather(self.keypoints, ['left_hip', 'left_knee', 'left_ankle'])
+        angles = kinematics.joint_angles(coords[:, 0], coords[:, 1], coords[:, 2])
+        tilts = kinematics.horizontal_tilts(coords[:, 0], coords[:, 2])
+        for row, points in enumerate(zip(*(self._legacy(name) for name in ('left_hip', 'left_knee', 'left_ankle')))):
+            if not visible[row].all():
+                continue
+            self.assertAlmostEqual(angles[row], calculate_angle_3d(*points), places=4)
+            self.assertAlmostEqual(tilts[row], calculate_horizontal_tilt(points[0], points[2]), places=4)
+
+    def test_running_extreme_matches_loop(self):
+        rng = np.random.default_rng(3)
+        values = rng.normal(size=500)
+        mask = rng.uniform(size=500) > 0.3
+        for mode in ("max", "min", "absmax"):
+            best, best_row = 0.0, None
+            for row, value in enumerate(values):
+                if not mask[row]:
+                    continue
+                score, reference = {
+                    "max": (value, best), "min": (-value, -best), "absmax": (abs(value), abs(best)),
+                }[mode]
+                if score > reference:
+                    best, best_row = value, row
+            with self.subTest(mode=mode):
+                self.assertEqual(kinematics.running_extreme(values, mask=mask, mode=mode), (best, best_row))
+
+
+class PostureVectorizedMatchesLegacyTests(SimpleTestCase):
+    def test_metrics_match_per_frame_loop(self):
+        for seed in range(5):
+            raw_keypoints = random_raw_keypoints(seed=seed)
+            service = PostureAssessmentService(job=STUB_JOB)
+            metrics = service._analyze_posture_keypoints(raw_keypoints, None, 1.0, {})["metrics"]
+            for key, expected in legacy_posture_metrics(raw_keypoints).items():
+                with self.subTest(seed=seed, metric=key):
+                    self.assertAlmostEqual(metrics[key], expected, places=9)
+
+
+class AssessmentKernelsMatchLegacyTests(SimpleTestCase):
+    """A guggolás, egylábon állás és vállkörzés vektorizált elemzése a frame-enkénti ciklusokkal egyezik."""
+
+    GENERAL_FACTOR, LEG_FACTOR = 1.0, 1.2
+
+    def test_squat_matches_per_frame_loop(self):
+        service = SquatAssessmentService(job=STUB_JOB)
+        for seed in range(5):
+            raw_keypoints = random_raw_keypoints(seed=seed)
+            result = service._analyze_squat(raw_keypoints, STUB_JOB, self.GENERAL_FACTOR, self.LEG_FACTOR)
+            expected = legacy_squat_metrics(raw_keypoints, self.LEG_FACTOR / self.GENERAL_FACTOR)
+            for key, value in expected.items():
+                with self.subTest(seed=seed, metric=key):
+                    self.assertAlmostEqual(result[key], value, places=9)
+
+    def test_single_leg_stance_matches_per_frame_loop(self):
+        service = SingleLegStanceAssessmentService(job=STUB_JOB)
+        for seed in range(5):
+            raw_keypoints = random_raw_keypoints(seed=seed)
+            for is_left_stance in (True, False):
+                # A pontozás változatlan: a számolt metrikákat a _score_sls bemenetén hasonlítjuk össze
+                with mock.patch.object(service, '_score_sls', wraps=service._score_sls) as score_sls:
+                    service._calculate_sls_metrics(raw_keypoints, is_left_stance, self.GENERAL_FACTOR, self.LEG_FACTOR)
+                metrics = score_sls.call_args.args[0]
+                expected = legacy_sls_metrics(raw_keypoints, is_left_stance, self.LEG_FACTOR / self.GENERAL_FACTOR)
+                for key, value in expected.items():
+                    with self.subTest(seed=seed, left=is_left_stance, metric=key):
+                        self.assertAlmostEqual(metrics[key], value, places=9)
+
+    def test_shoulder_matches_per_frame_loop(self):
+        service = ShoulderCircumductionService(job=STUB_JOB)
+        for seed in range(5):
+            raw_keypoints = random_raw_keypoints(seed=seed)
+            result = service._analyze_shoulder_circumduction(raw_keypoints, STUB_JOB, self.GENERAL_FACTOR, self.LEG_FACTOR)
+            for key, value in legacy_shoulder_metrics(raw_keypoints).items():
+                with self.subTest(seed=seed, metric=key):
+                    self.assertAlmostEqual(result[key], value, places=9)
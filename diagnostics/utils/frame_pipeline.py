@@ -0,0 +1,184 @@
+# diagnostics/utils/frame_pipeline.py
+"""
+Producer/consumer videó pipeline: háttérszálas dekódolás és kódolás korlátos sorokkal.
+
+Az OpenCV dekódolás/kódolás és a MediaPipe inferencia nagyrészt elengedi a GIL-t,
+így a dekóder szál, a fő (inferencia/rajzoló) szál és az enkóder szál párhuzamosan fut.
+A frame-ek egy fix számú, előre lefoglalt pufferkészletben keringenek: ha a fogyasztó
+lassabb, a dekóder a szabad pufferre várva blokkol (backpressure).
+Az eredmények a szekvenciális feldolgozással azonosak, a frame-ek sorrendje megmarad.
+"""
+import logging
+import queue
+import threading
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+_END = object()
+_POLL_SECONDS = 0.1
+
+
+def pipeline_enabled() -> bool:
+    return getattr(settings, "VIDEO_PIPELINE_ENABLED", True)
+
+
+def pipeline_buffers() -> int:
+    return max(2, int(getattr(settings, "VIDEO_PIPELINE_BUFFERS", 8)))
+
+
+def iter_frames(cap, frame_stride: int = 1):
+    """
+    Szekvenciális (egy szálas) megfelelő: ugyanazokat a (frame_number, None, image) hármasokat adja,
+    mint a FrameDecoder, puffer index nélkül.
+    """
+    frame_number = 0
+    while cap.isOpened():
+        if frame_number % frame_stride != 0:
+            if not cap.grab():
+                break
+            frame_number += 1
+            continue
+        success, image = cap.read()
+        if not success:
+            break
+        yield frame_number, None, image
+        frame_number += 1
+
+
+class FrameDecoder:
+    """
+    Háttérszálas dekóder. Iterálva (frame_number, buffer_index, image) hármasokat ad;
+    a fogyasztónak a puffert a release(buffer_index) hívással kell visszaadnia.
+    A `frame_stride`-on kívüli frame-eket csak grab()-bel lépteti (dekódolás nélkül).
+    """
+
+    def __init__(self, cap, frame_stride: int = 1, num_buffers: int = 8):
+        self.cap = cap
+        self.frame_stride = max(1, frame_stride)
+        self.frames_read = 0  # a forrásból kiolvasott (grab + read) frame-ek száma
+        # A pufferek az első olvasáskor jönnek létre; a cap.read() utána ugyanabba a tömbbe dekódol
+        self._buffers = [None] * num_buffers
+        self._free = queue.Queue()
+        for index in range(num_buffers):
+            self._free.put(index)
+        self._ready = queue.Queue(maxsize=num_buffers + 1)
+        self._stop = threading.Event()
+        self._error = None
+        self._thread = threading.Thread(target=self._run, name="frame-decoder", daemon=True)
+
+    def start(self) -> "FrameDecoder":
+        self._thread.start()
+        return self
+
+    def _acquire_buffer(self):
+        while not self._stop.is_set():
+            try:
+                return self._free.get(timeout=_POLL_SECONDS)
+            except queue.Empty:
+                continue
+        return None
+
+    def _run(self):
+        frame_number = 0
+        try:
+            while not self._stop.is_set():
+                if frame_number % self.frame_stride != 0:
+                    if not self.cap.grab():
+                        break
+                    frame_number += 1
+                    continue
+
+                index = self._acquire_buffer()
+                if index is None:
+                    break
+
+                buffer = self._buffers[index]
+                success, image = self.cap.read(buffer) if buffer is not None else self.cap.read()
+                if not success:
+                    self._free.put(index)
+                    break
+
+                self._buffers[index] = image
+                self._ready.put((frame_number, index, image))
+                frame_number += 1
+        except Exception as e:
+            logger.error(f"❌ Dekóder szál hiba: {e}", exc_info=True)
+            self._error = e
+        finally:
+            self.frames_read = frame_number
+            self._ready.put(_END)
+
+    def __iter__(self):
+        while True:
+            item = self._ready.get()
+            if item is _END:
+                if self._error is not None:
+                    raise self._error
+                return
+            yield item
+
+    def release(self, buffer_index: int):
+        """A puffer visszaadása a dekódernek (újrafelhasználható)."""
+        self._free.put(buffer_index)
+
+    def close(self):
+        """Leállítás (korai kilépésnél vagy hiba esetén is biztonságos)."""
+        self._stop.set()
+        # A dekóder ne maradjon a teli sorra várva
+        while self._thread.is_alive():
+            try:
+                item = self._ready.get(timeout=_POLL_SECONDS)
+                if item is not _END:
+                    self._free.put(item[1])
+            except queue.Empty:
+                pass
+        self._thread.join()
+
+
+class FrameEncoder:
+    """
+    Háttérszálas enkóder: a kapott frame-eket sorrendben írja a cv2.VideoWriter-be,
+    majd a puffert visszaadja a dekódernek (release callback).
+    """
+
+    def __init__(self, writer, release=None, max_pending: int = 8):
+        self.writer = writer
+        self._release = release
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._error = None
+        self._thread = threading.Thread(target=self._run, name="frame-encoder", daemon=True)
+
+    def start(self) -> "FrameEncoder":
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is _END:
+                return
+            buffer_index, image = item
+            try:
+                if self._error is None:
+                    self.writer.write(image)
+            except Exception as e:
+                logger.error(f"❌ Enkóder szál hiba: {e}", exc_info=True)
+                self._error = e
+            finally:
+                if self._release is not None and buffer_index is not None:
+                    self._release(buffer_index)
+
+    def write(self, image, buffer_index: int = None):
+        """Frame sorba állítása kódolásra (teli sornál blokkol – backpressure)."""
+        if self._error is not None:
+            raise self._error
+        self._queue.put((buffer_index, image))
+
+    def close(self):
+        """A sor kiürítése és a szál leállítása; a writer lezárása a hívó feladata."""
+        self._queue.put(_END)
+        self._thread.join()
+        if self._error is not None:
+            raise self._error
@@ -0,0 +1,180 @@
+# diagnostics/utils/keypoint_cache.py
+"""
+Tartalom-címzett kulcspont cache.
+
+Kulcs = SHA-256(videó tartalom hash + modell fájl hash + feldolgozási paraméterek).
+Ugyanaz a videó (újrapróbált job, új pontozási verzióval újraszámolt elemzés) így
+MediaPipe futtatás nélkül, egy fájlolvasással visszakapja a PoseSequence-t.
+
+Két szint: helyi lemez (KEYPOINT_CACHE_DIR, mmap-pel olvasva, KEYPOINT_CACHE_MAX_MB-os LRU korláttal)
+és default_storage (keypoint_cache/<xx>/<kulcs>.dtpose), ami a workerek között is közös.
+A tömb nyers (kalibráció nélküli) koordinátákat tárol, a faktort olvasáskor állítjuk be.
+"""
+import functools
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+from diagnostics.utils.landmarker_pool import MODEL_PATH, VIDEO_POOL_KEY
+from diagnostics.utils.pose_sequence import PoseSequence, _MAGIC
+
+logger = logging.getLogger(__name__)
+
+_HASH_CHUNK_SIZE = 1024 * 1024
+STORAGE_PREFIX = "keypoint_cache"
+_local_lock = threading.Lock()
+
+
+def cache_enabled() -> bool:
+    return getattr(settings, "KEYPOINT_CACHE_ENABLED", True)
+
+
+def _local_cache_dir() -> str:
+    return getattr(settings, "KEYPOINT_CACHE_DIR", os.path.join(tempfile.gettempdir(), "keypoint_cache"))
+
+
+def _local_max_bytes() -> int:
+    return int(getattr(settings, "KEYPOINT_CACHE_MAX_MB", 128)) * 1024 * 1024
+
+
+def file_sha256(path: str) -> str:
+    """Fájl tartalom hash (darabonként olvasva, a teljes fájlt nem tartjuk memóriában)."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+@functools.lru_cache(maxsize=None)
+def model_sha256(model_path: str = MODEL_PATH) -> str:
+    """A modell fájl hash-e (processzenként egyszer számoljuk)."""
+    return file_sha256(model_path)
+
+
+def make_cache_key(video_hash: str, profile_params: dict, model_hash: str = None) -> str:
+    """
+    A cache kulcs a videó és a modell tartalmából, valamint minden olyan paraméterből áll,
+    ami a kimenetet befolyásolja (feldolgozási profil, detektálási küszöbök, tároló formátum).
+    """
+    _, min_detection, min_presence, min_tracking = VIDEO_POOL_KEY
+    material = {
+        "video": video_hash,
+        "model": model_hash or model_sha256(),
+        "profile": profile_params,
+        "thresholds": [min_detection, min_presence, min_tracking],
+        "format": _MAGIC.decode("ascii"),
+    }
+    return hashlib.sha256(json.dumps(material, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def _storage_path(key: str) -> str:
+    return f"{STORAGE_PREFIX}/{key[:2]}/{key}.dtpose"
+
+
+def _local_path(key: str) -> str:
+    return os.path.join(_local_cache_dir(), key[:2], f"{key}.dtpose")
+
+
+def _evict_local(max_bytes: int):
+    """Legrégebben használt bejegyzések törlése, amíg a helyi cache a korlát alá nem kerül."""
+    entries = []
+    total = 0
+    root = _local_cache_dir()
+    if not os.path.isdir(root):
+        return
+    for shard in os.scandir(root):
+        if not shard.is_dir():
+            continue
+        with os.scandir(shard.path) as it:
+            for entry in it:
+                if entry.is_file() and entry.name.endswith(".dtpose"):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+                    total += stat.st_size
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)  # a már mmap-elt tömbök érvényesek maradnak
+            total -= size
+        except OSError:
+            pass
+
+
+def _write_local(key: str, data: bytes):
+    """
+    Atomikus írás (ideiglenes fájl + os.replace), párhuzamos workerek mellett is biztonságos.
+    Írás után a helyi szint a KEYPOINT_CACHE_MAX_MB korlát alá ürül (LRU, az mtime szerint).
+    """
+    max_bytes = _local_max_bytes()
+    if max_bytes <= 0 or len(data) > max_bytes:
+        return
+    path = _local_path(key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    with _local_lock:
+        _evict_local(max_bytes)
+
+
+def get(key: str, calibration_factor: float = 1.0):
+    """
+    PoseSequence a cache-ből (a megadott kalibrációs faktorral), vagy None.
+    Hibás/olvashatatlan bejegyzés esetén None (a hívó újra feldolgozza a videót).
+    """
+    local_path = _local_path(key)
+    try:
+        if os.path.exists(local_path):
+            try:
+                os.utime(local_path)  # LRU: a használat idejét az mtime jelzi
+                sequence = PoseSequence.load(local_path)
+                logger.info(f"⚡ Kulcspont cache találat (lemez): {key[:12]}")
+                return sequence.with_calibration(calibration_factor)
+            except FileNotFoundError:
+                pass  # közben egy másik worker kiürítette – a storage szint következik
+
+        storage_path = _storage_path(key)
+        if default_storage.exists(storage_path):
+            with default_storage.open(storage_path, "rb") as f:
+                data = f.read()
+            sequence = PoseSequence.from_buffer(data)
+            try:
+                _write_local(key, data)
+            except OSError as e:
+                logger.warning(f"⚠️ Kulcspont cache helyi írás sikertelen: {e}")
+            logger.info(f"⚡ Kulcspont cache találat (storage): {key[:12]}")
+            return sequence.with_calibration(calibration_factor)
+    except Exception as e:
+        logger.warning(f"⚠️ Kulcspont cache olvasási hiba ({key[:12]}): {e}")
+    return None
+
+
+def put(key: str, pose_sequence: PoseSequence):
+    """A PoseSequence mentése mindkét szintre. Hiba esetén csak figyelmeztetünk."""
+    data = pose_sequence.to_bytes()
+    try:
+        _write_local(key, data)
+    except OSError as e:
+        logger.warning(f"⚠️ Kulcspont cache helyi írás sikertelen: {e}")
+    try:
+        storage_path = _storage_path(key)
+        if not default_storage.exists(storage_path):
+            default_storage.save(storage_path, ContentFile(data))
+        logger.info(f"💾 Kulcspont cache mentve: {key[:12]} ({len(data) / 1024:.1f} KB)")
+    except Exception as e:
+        logger.warning(f"⚠️ Kulcspont cache storage írás sikertelen: {e}")
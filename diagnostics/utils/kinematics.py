@@ -0,0 +1,144 @@
+# diagnostics/utils/kinematics.py
+"""
+Vektorizált biomechanikai kernelek.
+
+A geometry.py frame-enkénti függvényeinek (calculate_angle_3d, calculate_horizontal_tilt,
+calculate_midpoint_3d, calculate_distance_3d, get_landmark_coords) kötegelt megfelelői:
+egész (frames, joints, 3) vagy (frames, 3) tömbökön dolgoznak egyetlen NumPy hívással.
+Az eredmények a frame-enkénti függvényekkel azonosak (lebegőpontos tűrésen belül).
+"""
+import numpy as np
+
+from diagnostics.utils.geometry import MEDIAPIPE_POSE_LANDMARKS
+from diagnostics.utils.pose_sequence import PoseSequence
+
+# A get_landmark_coords ezen láthatóság alatt None-t ad vissza
+VISIBILITY_THRESHOLD = 0.5
+
+
+def ensure_pose_sequence(data) -> PoseSequence:
+    """PoseSequence-t ad vissza (a régi dict listás raw_keypoints bemenetet is elfogadja)."""
+    if isinstance(data, PoseSequence):
+        return data
+    return PoseSequence.from_raw_keypoints(data or [])
+
+
+def landmark_indices(names) -> np.ndarray:
+    return np.array([MEDIAPIPE_POSE_LANDMARKS[name.lower()] for name in names], dtype=np.intp)
+
+
+def frame_image_at(pose_sequence: PoseSequence, row):
+    """A `row`-adik elemzett frame-hez megőrzött kép (snapshot), ha van ilyen."""
+    if row is None or not pose_sequence.frame_images:
+        return None
+    return pose_sequence.frame_images.get(int(pose_sequence.frame_indices[row]))
+
+
+# -----------------------------------------------------------
+# 1. KOORDINÁTÁK ÉS LÁTHATÓSÁGI MASZKOK
+# -----------------------------------------------------------
+
+def gather(keypoints: np.ndarray, names, threshold: float = VISIBILITY_THRESHOLD, require_nonzero: bool = False):
+    """
+    A megadott landmarkok koordinátái és láthatósági maszkja egyszerre.
+
+    :param keypoints: (frames, 33, 4) tömb (x, y, z, visibility)
+    :param names: landmark nevek listája (J darab)
+    :param require_nonzero: a csupa nulla koordinátájú pontokat is érvénytelennek veszi
+                            (a régi `np.any(p)` ellenőrzés megfelelője)
+    :return: (coords (frames, J, 3), visible (frames, J) bool)
+    """
+    idx = landmark_indices(names)
+    selected = keypoints[:, idx, :]
+    coords = selected[..., :3]
+    # A get_landmark_coords `visibility < 0.5` esetén None-t ad; a hiányzó (NaN) pont sem látható
+    visible = selected[..., 3] >= threshold
+    if require_nonzero:
+        visible &= np.any(coords != 0, axis=-1)
+    return coords, visible
+
+
+def visibility_mask(keypoints: np.ndarray, names, threshold: float = VISIBILITY_THRESHOLD) -> np.ndarray:
+    """(frames,) bool: minden megadott landmark látható-e az adott frame-ben."""
+    _, visible = gather(keypoints, names, threshold)
+    return visible.all(axis=1)
+
+
+def apply_correction(coords: np.ndarray, factor: float) -> np.ndarray:
+    """Korrekciós faktor (pl. F_leg / F_general) alkalmazása egy koordináta tömbre."""
+    return coords * factor
+
+
+# -----------------------------------------------------------
+# 2. GEOMETRIAI KERNELEK
+# -----------------------------------------------------------
+
+def joint_angles(p1: np.ndarray, p2: np.ndarray, p3: np.ndarray) -> np.ndarray:
+    """
+    A p2 csúcsnál mért szög (fokban) minden frame-re – a calculate_angle_3d kötegelt változata.
+    Nulla hosszú vektornál NaN (ugyanúgy, mint a frame-enkénti függvénynél).
+    """
+    v1 = np.asarray(p1, dtype=np.float64) - p2
+    v2 = np.asarray(p3, dtype=np.float64) - p2
+    with np.errstate(invalid="ignore", divide="ignore"):
+        cosine = np.einsum("...i,...i->...", v1, v2) / (np.linalg.norm(v1, axis=-1) * np.linalg.norm(v2, axis=-1))
+        return np.degrees(np.arccos(np.clip(cosine, -1.0, 1.0)))
+
+
+def horizontal_tilts(p_left: np.ndarray, p_right: np.ndarray) -> np.ndarray:
+    """Dőlésszög fokban (calculate_horizontal_tilt kötegelt változata); 0 vízszintes távolságnál 0."""
+    diff = np.asarray(p_right, dtype=np.float64) - p_left
+    horizontal_dist = np.sqrt(diff[..., 0] ** 2 + diff[..., 2] ** 2)
+    tilt = np.degrees(np.arctan2(diff[..., 1], horizontal_dist))
+    return np.where(horizontal_dist == 0, 0.0, tilt)
+
+
+def midpoints(p1: np.ndarray, p2: np.ndarray) -> np.ndarray:
+    return (np.asarray(p1, dtype=np.float64) + p2) / 2.0
+
+
+def distances(p1: np.ndarray, p2: np.ndarray, axes=slice(None)) -> np.ndarray:
+    """Euklideszi távolság; `axes` pl. slice(0, 2) az X-Y síkbeli távolsághoz."""
+    diff = np.asarray(p1, dtype=np.float64)[..., axes] - np.asarray(p2, dtype=np.float64)[..., axes]
+    return np.linalg.norm(diff, axis=-1)
+
+
+def trunk_lean(shoulder: np.ndarray, hip: np.ndarray) -> np.ndarray:
+    """Törzsdőlés a függőlegeshez képest: 180° - (váll, csípő, csípő + 100 Y) szög."""
+    vertical_ref = np.asarray(hip, dtype=np.float64).copy()
+    vertical_ref[..., 1] += 100
+    return 180.0 - joint_angles(shoulder, hip, vertical_ref)
+
+
+# -----------------------------------------------------------
+# 3. ÖSSZEGZŐ SEGÉDEK (a frame-enkénti "ha nagyobb, cseréld" minták megfelelői)
+# -----------------------------------------------------------
+
+def running_extreme(values: np.ndarray, mask: np.ndarray = None, initial: float = 0.0, mode: str = "max"):
+    """
+    A `if current > best: best, frame = current, i` ciklus kötegelt megfelelője.
+
+    :param mode: "max", "min" vagy "absmax" (ez utóbbinál az előjeles értéket adja vissza)
+    :return: (érték, sor index vagy None, ha egyik frame sem múlta felül az initial értéket)
+    """
+    values = np.asarray(values, dtype=np.float64)
+    valid = ~np.isnan(values)
+    if mask is not None:
+        valid &= mask
+    if not valid.any():
+        return initial, None
+
+    if mode == "min":
+        scores, reference = np.where(valid, values, np.inf), initial
+        row = int(np.argmin(scores))
+        improved = scores[row] < reference
+    else:
+        scores = np.abs(values) if mode == "absmax" else values
+        scores = np.where(valid, scores, -np.inf)
+        reference = abs(initial) if mode == "absmax" else initial
+        row = int(np.argmax(scores))
+        improved = scores[row] > reference
+
+    if not improved:
+        return initial, None
+    return float(values[row]), row
@@ -0,0 +1,175 @@
+# diagnostics/utils/landmarker_pool.py
+import os
+import logging
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+from mediapipe.tasks import python
+from mediapipe.tasks.python import vision
+
+logger = logging.getLogger(__name__)
+
+MODEL_PATH = os.path.join(settings.BASE_DIR, "assets", "pose_landmarker_full.task")
+
+# Egy kulcshoz legfeljebb ennyi tétlen példányt tartunk meg (a Celery worker
+# jellemzően 1 taskot futtat processzenként, ennél több csak párhuzamos szálaknál kell).
+MAX_IDLE_PER_KEY = int(os.environ.get("LANDMARKER_POOL_MAX_IDLE", 2))
+
+
+class PooledLandmarker:
+    """
+    Egy PoseLandmarker példány burkolója.
+
+    A VIDEO módú landmarker csak monoton növekvő időbélyeget fogad el, és a követési
+    (tracking) állapota nem nullázható: egy másik job után újrahasználva az előző job
+    ROI-ja befolyásolná az első frame-eket. Ezért VIDEO módban minden job friss példányt
+    kap (lásd LandmarkerPool.acquire), a burkoló csak a jobon belüli monotonitást őrzi.
+    """
+
+    def __init__(self, key: tuple, landmarker):
+        self.key = key
+        self.landmarker = landmarker
+        self._last_timestamp_ms = -1
+
+    @property
+    def is_video(self) -> bool:
+        return self.key[0] == vision.RunningMode.VIDEO
+
+    def detect(self, mp_image):
+        return self.landmarker.detect(mp_image)
+
+    def detect_for_video(self, mp_image, timestamp_ms: int):
+        timestamp_ms = int(timestamp_ms)
+        if timestamp_ms <= self._last_timestamp_ms:
+            # Hibás/duplikált frame időbélyeg esetén is monoton maradunk
+            timestamp_ms = self._last_timestamp_ms + 1
+        self._last_timestamp_ms = timestamp_ms
+        return self.landmarker.detect_for_video(mp_image, timestamp_ms)
+
+    def close(self):
+        try:
+            self.landmarker.close()
+        except Exception as e:
+            logger.warning(f"⚠️ Landmarker lezárási hiba ({self.key}): {e}")
+
+
+class LandmarkerPool:
+    """
+    Processz szintű PoseLandmarker pool.
+
+    Kulcs: (running mode, min_pose_detection_confidence,
+    min_pose_presence_confidence, min_tracking_confidence).
+    A modell fájl processzenként egyszer töltődik a memóriába (model_asset_buffer), a
+    példányokat kizárólagosan adjuk ki (egy példányt egyszerre csak egy hívó használ).
+    Csak az állapotmentes IMAGE módú példányok kerülnek vissza a poolba; a VIDEO módú
+    példány jobonként új (a memóriában lévő modellből), így a kulcspontok nem függenek
+    attól, melyik job futott előtte a workeren.
+    """
+
+    def __init__(self, model_path: str = MODEL_PATH, max_idle_per_key: int = MAX_IDLE_PER_KEY):
+        self.model_path = model_path
+        self.max_idle_per_key = max_idle_per_key
+        self._idle = {}
+        self._model_buffer = None
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+
+    @staticmethod
+    def make_key(running_mode, min_detection: float = 0.5, min_presence: float = 0.5, min_tracking: float = 0.5) -> tuple:
+        return (running_mode, round(float(min_detection), 3), round(float(min_presence), 3), round(float(min_tracking), 3))
+
+    def _check_fork(self):
+        # Celery prefork: a szülőben létrehozott MediaPipe gráfok nem használhatók a gyerek processzben
+        if self._pid != os.getpid():
+            self._idle = {}
+            self._lock = threading.Lock()
+            self._pid = os.getpid()
+
+    def _model_asset_buffer(self) -> bytes:
+        """A .task modell tartalma; processzenként egyszer olvassuk be."""
+        if self._model_buffer is None:
+            if not os.path.exists(self.model_path):
+                raise FileNotFoundError(f"❌ Hiányzik a modell: {self.model_path}")
+            with open(self.model_path, "rb") as fh:
+                self._model_buffer = fh.read()
+        return self._model_buffer
+
+    def _create(self, key: tuple) -> PooledLandmarker:
+        running_mode, min_detection, min_presence, min_tracking = key
+        options = vision.PoseLandmarkerOptions(
+            base_options=python.BaseOptions(model_asset_buffer=self._model_asset_buffer()),
+            running_mode=running_mode,
+            min_pose_detection_confidence=min_detection,
+            min_pose_presence_confidence=min_presence,
+            min_tracking_confidence=min_tracking,
+            output_segmentation_masks=False,
+        )
+        landmarker = vision.PoseLandmarker.create_from_options(options)
+        logger.info(f"✅ Új PoseLandmarker: {key}")
+        return PooledLandmarker(key, landmarker)
+
+    def acquire(self, running_mode, min_detection: float = 0.5, min_presence: float = 0.5, min_tracking: float = 0.5) -> PooledLandmarker:
+        key = self.make_key(running_mode, min_detection, min_presence, min_tracking)
+        with self._lock:
+            self._check_fork()
+            if running_mode == vision.RunningMode.VIDEO:
+                # Friss követési állapot minden jobhoz (reprodukálható kulcspontok)
+                pooled = None
+            else:
+                idle = self._idle.get(key)
+                pooled = idle.pop() if idle else None
+
+        return pooled if pooled is not None else self._create(key)
+
+    def release(self, pooled: PooledLandmarker, discard: bool = False):
+        if discard or pooled.is_video:
+            pooled.close()
+            return
+
+        with self._lock:
+            self._check_fork()
+            idle = self._idle.setdefault(pooled.key, [])
+            if len(idle) < self.max_idle_per_key:
+                idle.append(pooled)
+                return
+        pooled.close()
+
+    @contextmanager
+    def landmarker(self, running_mode, min_detection: float = 0.5, min_presence: float = 0.5, min_tracking: float = 0.5):
+        """Kontextuskezelő: kivesz egy példányt, majd visszaadja (hiba esetén eldobja)."""
+        pooled = self.acquire(running_mode, min_detection, min_presence, min_tracking)
+        failed = False
+        try:
+            yield pooled
+        except Exception:
+            failed = True
+            raise
+        finally:
+            self.release(pooled, discard=failed)
+
+    def warm_up(self, keys: list[tuple]):
+        """
+        Előtöltés (pl. worker indításkor): a modell a memóriába kerül, és a kulcsokhoz egy-egy
+        példány létrejön. Az IMAGE módúak a poolban maradnak, a VIDEO módú próbapéldány lezárul.
+        """
+        for key in keys:
+            try:
+                self.release(self._create(self.make_key(*key)))
+            except Exception as e:
+                logger.warning(f"⚠️ Landmarker előtöltés sikertelen ({key}): {e}")
+
+    def close_all(self):
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for instances in idle.values():
+            for pooled in instances:
+                pooled.close()
+
+
+# Processz szintű példány
+landmarker_pool = LandmarkerPool()
+
+# A diagnosztikai videó feldolgozás által használt alapbeállítás (csökkentett küszöbök)
+VIDEO_POOL_KEY = (vision.RunningMode.VIDEO, 0.3, 0.3, 0.3)
+IMAGE_POOL_KEY = (vision.RunningMode.IMAGE, 0.3, 0.3, 0.5)
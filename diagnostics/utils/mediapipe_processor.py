@@ -4,25 +4,170 @@ import numpy as np
 import mediapipe as mp
 import os
 import logging
-import shutil
-import time
 from datetime import datetime
 from django.conf import settings
 from mediapipe.tasks import python
 from mediapipe.tasks.python import vision
-from mediapipe.framework.formats import landmark_pb2
+from diagnostics.utils.landmarker_pool import landmarker_pool, VIDEO_POOL_KEY, IMAGE_POOL_KEY, MODEL_PATH
+from diagnostics.utils.pose_sequence import PoseSequenceBuilder, landmarks_to_array
+from diagnostics.utils.skeleton_renderer import draw_skeleton, render_skeleton_video_file
+from diagnostics.utils import keypoint_cache
+from diagnostics.utils.video_download import StreamingDownload
+from diagnostics.utils.frame_pipeline import FrameDecoder, iter_frames, pipeline_enabled, pipeline_buffers
+from diagnostics.utils.processing_profile import get_processing_profile, prepare_frame, compute_roi, roi_to_frame_coords
 
 
 mp_drawing = mp.solutions.drawing_utils
 mp_pose = mp.solutions.pose
 logger = logging.getLogger(__name__)
 
-MODEL_PATH = os.path.join(settings.BASE_DIR, "assets", "pose_landmarker_full.task")
-
-def process_video_with_mediapipe(video_path: str, job_type: str = "GENERAL", calibration_factor: float = 1.0):
+def extract_pose_sequence(video_path: str, job_type: str = "GENERAL", calibration_factor: float = 1.0,
+                          pipelined: bool = None, use_cache: bool = None):
     """
     Feldolgozza a videót MediaPipe PoseLandmarker segítségével.
-    Annotált (eredeti + skeleton) MP4 videó + kulcspont adatok.
+    Visszaad: PoseSequence (a skeleton overlay videót a skeleton_renderer külön lépésben készíti).
+    A kulcspontok oszlopos NumPy tömbökben gyűlnek (nincs landmarkonkénti dict).
+    A job típus feldolgozási profilja (processing_profile) határozza meg az elemzési fps-t,
+    a maximális felbontást és a person-ROI kivágást.
+    pipelined=True esetén a dekódolás háttérszálon fut, előre lefoglalt pufferekkel
+    (alapértelmezés: settings.VIDEO_PIPELINE_ENABLED); az eredmény ugyanaz.
+
+    🆕 Tartalom-címzett cache: ugyanarra a videóra (+ modell + profil) a korábban kinyert
+    kulcspont tömböt adjuk vissza MediaPipe futtatás nélkül (settings.KEYPOINT_CACHE_ENABLED).
+
+    🌊 video_path lehet StreamingDownload is (get_local_video_path(..., streaming=True)):
+    ilyenkor a frame-ek a letöltés közben, a FIFO-ból érkeznek.
+    """
+    if use_cache is None:
+        use_cache = keypoint_cache.cache_enabled()
+
+    if isinstance(video_path, StreamingDownload):
+        return _extract_from_stream(video_path, job_type, calibration_factor, pipelined, use_cache)
+
+    cache_key = None
+    if use_cache:
+        try:
+            profile = get_processing_profile(job_type)
+            cache_key = keypoint_cache.make_cache_key(keypoint_cache.file_sha256(video_path), profile.as_dict())
+            cached = keypoint_cache.get(cache_key, calibration_factor)
+            if cached is not None:
+                _restore_snapshot_frame(cached, video_path)
+                logger.info(f"⚡ Kulcspontok a cache-ből: {len(cached)} frame, MediaPipe futtatás kihagyva.")
+                return cached
+        except Exception as e:
+            logger.warning(f"⚠️ Kulcspont cache nem használható: {e}")
+            cache_key = None
+
+    pose_sequence = _run_pose_extraction(video_path, job_type, calibration_factor, pipelined)
+
+    if cache_key is not None:
+        keypoint_cache.put(cache_key, pose_sequence)
+    return pose_sequence
+
+
+def _extract_from_stream(stream: StreamingDownload, job_type: str, calibration_factor: float,
+                         pipelined: bool, use_cache: bool):
+    """
+    Inferencia a letöltéssel átfedésben.
+    - A cache-t már a letöltés előtt ismert azonosítóval (GCS md5, különben objektum + generáció)
+      keressük: találatnál a MediaPipe nem fut, csak a teljes fájlt várjuk meg (snapshot, renderelés).
+    - A FIFO-ból olvasott frame-ek számát a kész fájléval vetjük össze; eltérésnél (csonka olvasás)
+      a teljes fájlból dolgozunk újra, a részleges eredményt eldobjuk.
+    Ha a FIFO nem nyitható meg, a teljes letöltés után fájlból dolgozunk.
+    """
+    stream_key = None
+    if use_cache and stream.content_id:
+        try:
+            stream_key = keypoint_cache.make_cache_key(stream.content_id, get_processing_profile(job_type).as_dict())
+            cached = keypoint_cache.get(stream_key, calibration_factor)
+        except Exception as e:
+            logger.warning(f"⚠️ Kulcspont cache nem használható: {e}")
+            stream_key, cached = None, None
+        if cached is not None:
+            stream.detach_consumer()
+            _restore_snapshot_frame(cached, stream.wait())
+            logger.info(f"⚡ Kulcspontok a cache-ből (streamelt bemenet): {len(cached)} frame, MediaPipe futtatás kihagyva.")
+            return cached
+
+    stats = {}
+    try:
+        pose_sequence = _run_pose_extraction(stream.source, job_type, calibration_factor, pipelined, stats=stats)
+    except RuntimeError as e:
+        logger.warning(f"⚠️ Streamelt feldolgozás nem indult el ({e}), feldolgozás a teljes letöltés után.")
+        pose_sequence = None
+    finally:
+        stream.detach_consumer()
+
+    # A letöltés hibája (csonka / sérült fájl) itt derül ki; ilyenkor a részleges eredményt eldobjuk
+    video_path = stream.wait()
+    if pose_sequence is not None and not _covers_file(stats, video_path):
+        logger.warning(
+            f"⚠️ A streamelt feldolgozás csonka ({stats.get('frames_read')} frame), újrafeldolgozás a teljes fájlból."
+        )
+        pose_sequence = None
+
+    if pose_sequence is None:
+        pose_sequence = extract_pose_sequence(video_path, job_type, calibration_factor, pipelined, use_cache)
+    else:
+        if not pose_sequence.frame_images:
+            _restore_snapshot_frame(pose_sequence, video_path)
+        if use_cache:
+            try:
+                profile = get_processing_profile(job_type)
+                cache_key = keypoint_cache.make_cache_key(keypoint_cache.file_sha256(video_path), profile.as_dict())
+                keypoint_cache.put(cache_key, pose_sequence)
+            except Exception as e:
+                logger.warning(f"⚠️ Kulcspont cache nem használható: {e}")
+
+    if stream_key is not None:
+        keypoint_cache.put(stream_key, pose_sequence)
+    return pose_sequence
+
+
+def _covers_file(stats: dict, video_path: str) -> bool:
+    """
+    A FIFO-ból olvasott frame-ek a teljes fájlt lefedték-e: az utolsó elemzett frame utáni index
+    egyezik-e a fájl frame számából és a stride-ból adódóval. Ismeretlen frame számnál nincs mihez mérni.
+    """
+    cap = cv2.VideoCapture(video_path)
+    try:
+        file_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT)) if cap.isOpened() else 0
+    finally:
+        cap.release()
+    if file_frames <= 0:
+        return True
+    stride = stats.get("frame_stride", 1)
+    return stats.get("frames_read") == (file_frames - 1) // stride * stride + 1
+
+
+def _restore_snapshot_frame(pose_sequence, video_path: str):
+    """
+    A cache csak a kulcspontokat tárolja: a snapshot frame-et (a középső utáni első detektált
+    frame, mint feldolgozáskor) egyetlen seek + read művelettel újra előállítjuk.
+    """
+    rows = np.flatnonzero(pose_sequence.frame_indices >= pose_sequence.total_frames // 2)
+    if rows.size == 0:
+        return
+    row = int(rows[0])
+    frame_number = int(pose_sequence.frame_indices[row])
+
+    cap = cv2.VideoCapture(video_path)
+    try:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, frame_number)
+        success, image = cap.read()
+    finally:
+        cap.release()
+
+    if success and image is not None:
+        draw_skeleton(image, pose_sequence.landmarks[row])
+        pose_sequence.frame_images[frame_number] = image
+
+
+def _run_pose_extraction(video_path: str, job_type: str, calibration_factor: float, pipelined: bool = None,
+                         stats: dict = None):
+    """
+    A tényleges MediaPipe feldolgozás (cache nélkül).
+    :param stats: ha megadott, ide kerül a stride és az utolsó elemzett frame utáni index (frames_read)
     """
     # ✅ Modell ellenőrzés
     if not os.path.exists(MODEL_PATH):
@@ -36,172 +181,128 @@ def process_video_with_mediapipe(video_path: str, job_type: str = "GENERAL", cal
     fps = cap.get(cv2.CAP_PROP_FPS) or 25.0
     width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
     height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    total_frames = max(0, int(cap.get(cv2.CAP_PROP_FRAME_COUNT)))  # pipe-ból olvasva ismeretlen (0)
 
     logger.info(f"📹 Videó info: {width}x{height}, {fps} FPS, {total_frames} frame")
 
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    # 🆕 Feldolgozási profil: minden `frame_stride`-adik frame-et elemezzük
+    profile = get_processing_profile(job_type)
+    frame_stride = profile.frame_stride(fps)
+    logger.info(f"⚙️ Feldolgozási profil ({job_type}): {profile.as_dict()}, stride={frame_stride}")
 
-    # ✅ JAVÍTÁS: Közvetlenül a /tmp mappába mentünk, egyedi fájlnévvel.
-    # Ezzel elkerüljük a rekurzív könyvtártörlési hibákat.
-    skeleton_video_path = os.path.join("/tmp", f"skeleton_video_{timestamp}.avi")
-    # Megjegyzés: Nincs szükség os.makedirs-re, mivel a /tmp már létezik.
-    fourcc = cv2.VideoWriter_fourcc(*"XVID") 
-    
-    out = cv2.VideoWriter(skeleton_video_path, fourcc, fps, (width, height))
-
-    BaseOptions = python.BaseOptions
-    PoseLandmarkerOptions = vision.PoseLandmarkerOptions
-    VisionRunningMode = vision.RunningMode
-
-    # ⬇️ CSÖKKENTETT THRESHOLD-OK
-    options = PoseLandmarkerOptions(
-        base_options=BaseOptions(model_asset_path=MODEL_PATH),
-        running_mode=VisionRunningMode.VIDEO,
-        min_pose_detection_confidence=0.3,  # Csökkentve 0.5-ről
-        min_pose_presence_confidence=0.3,   # Csökkentve 0.5-ről
-        min_tracking_confidence=0.3,        # Csökkentve 0.5-ről
-        output_segmentation_masks=False,
-    )
-    landmarker = vision.PoseLandmarker.create_from_options(options)
-    logger.info("✅ MediaPipe PoseLandmarker inicializálva.")
+    # ⬇️ CSÖKKENTETT THRESHOLD-OK (0.3); VIDEO módban jobonként friss példány a memóriában tartott modellből
+    landmarker = landmarker_pool.acquire(*VIDEO_POOL_KEY)
+    landmarker_failed = False
+    logger.info("✅ MediaPipe PoseLandmarker létrehozva (friss követési állapot).")
 
-    frame_number = 0
-    raw_keypoints = []
-    keyframes = []
+    builder = PoseSequenceBuilder(
+        capacity=max(1, total_frames // frame_stride), fps=fps, calibration_factor=calibration_factor, total_frames=total_frames
+    )
     detected_frames = 0  # 🆕 Detektált frame-ek számlálója
+    processed_frames = 0
+    roi = None  # Az előző frame landmarkjaiból számolt kivágás (None = teljes kép)
+    # Ismeretlen hossznál (stream) a snapshotot a hívó állítja elő utólag, a teljes fájlból
+    snapshot_frame = total_frames // 2 if total_frames > 0 else None
+
+    # 🧵 Pipeline mód: a dekóder szál előre dolgozik, amíg az inferencia fut
+    if pipelined is None:
+        pipelined = pipeline_enabled()
+    decoder = FrameDecoder(cap, frame_stride, pipeline_buffers()).start() if pipelined else None
+    # ⏩ A kihagyott (decimált) frame-eket mindkét mód csak grab()-bel lépteti
+    frames = decoder if decoder is not None else iter_frames(cap, frame_stride)
+    frame_number = -1
 
-    while cap.isOpened():
-        success, image = cap.read()
-        if not success:
-            break
-
-        # ✅ Frame validáció
-        if image is None or image.size == 0:
-            logger.error(f"❌ Frame {frame_number} üres, átugrás!")
-            frame_number += 1
-            continue
-
-        timestamp_ms = int(frame_number * 1000 / fps)
-        image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-        mp_image = mp.Image(image_format=mp.ImageFormat.SRGB, data=image_rgb)
-
-        results = landmarker.detect_for_video(mp_image, timestamp_ms)
-        annotated_image = image.copy()
-
-        # 🆕 DEBUG: Pose detektálás ellenőrzése
-        if results.pose_landmarks:
-            detected_frames += 1
-            if frame_number % 30 == 0:  # Csak minden 30. frame-nél logolunk
-                logger.info(f"✅ Frame {frame_number}/{total_frames}: {len(results.pose_landmarks[0])} landmark OK")
-            
-            drawing_spec_landmark = mp_drawing.DrawingSpec(color=(0, 255, 0), thickness=2, circle_radius=2)
-            drawing_spec_connection = mp_drawing.DrawingSpec(color=(0, 0, 255), thickness=2, circle_radius=2)
-
-            landmark_list = results.pose_landmarks[0]
-
-            mp_landmark_list = landmark_pb2.NormalizedLandmarkList()
-            
-
-            frame_keypoints = []
-            frame_world_landmarks = []
-
-            for lm in landmark_list:
-                l = mp_landmark_list.landmark.add()
-                # 💡 FIGYELEM! A LandmarkList-be továbbra is a normalizált értékek mennek (vagy kihagyjuk a feltöltést), 
-                # de a raw_keypoints-ba már a SKÁLÁZOTT!
-                # Itt hagyjuk a normalizált értékeket, mert a rajzoláshoz is az kell.
-
-                l.x = lm.x
-                l.y = lm.y
-                l.z = lm.z
-                l.visibility = getattr(lm, "visibility", 1.0)
-
-                # 🟢 A raw_keypoints-ba SKÁLÁZOTT értéket teszünk!
-                scaled_x = lm.x * calibration_factor
-                scaled_y = lm.y * calibration_factor
-                scaled_z = lm.z * calibration_factor # Z koordináta skálázása is, ha használva van
-
-                frame_keypoints.append(
-                    {"x": scaled_x, "y": scaled_y, "z": scaled_z, "v": getattr(lm, "visibility", 1.0)}
-                )
-
-            if results.pose_world_landmarks:
-                for wlm in results.pose_world_landmarks[0]:
-                    frame_world_landmarks.append(
-                        {"x": wlm.x, "y": wlm.y, "z": wlm.z, "v": getattr(wlm, "visibility", 1.0)}
-                    )
-
-            # ✅ RAJZOLÁS
-                mp_drawing.draw_landmarks(
-                    annotated_image,
-                    mp_landmark_list, # <<< EZ MÁR AZ ÚJ, BELSŐLEG KONSZISZTENS LISTA
-                    mp_pose.POSE_CONNECTIONS,
-                    landmark_drawing_spec=drawing_spec_landmark,
-                    connection_drawing_spec=drawing_spec_connection,
-                )
-
-            raw_keypoints.append(frame_keypoints)
-            keyframes.append({
-                "frame": frame_number,
-                "time_ms": timestamp_ms,
-                "keypoints": frame_keypoints,
-                "world_landmarks": frame_world_landmarks,
-                "frame_image": annotated_image if frame_number == total_frames // 2 else None,
-            })
-        else:
-            # ⚠️ Pose NEM detektálva
-            if frame_number % 30 == 0:
-                logger.warning(f"⚠️ Frame {frame_number}/{total_frames}: NINCS pose landmark!")
-
-        out.write(annotated_image)
-        frame_number += 1
-
-    cap.release()
-    out.release()
-    landmarker.close()
-
-    # 🆕 KÉSZÍTSEN EGY BIZTONSÁGOS MÁSOLATOT (SAFE_PATH)
-    # A skeleton_video_path a sikeresen megírt fájl útvonala.
-    # -----------------------------------------------------------
-    # 🟢 KRITIKUS VÁRAKOZÁS/ELLENŐRZÉS
-    # Adunk 100 ms-ot az OS-nek a fájl IO befejezésére
-    if not os.path.exists(skeleton_video_path):
-        time.sleep(0.1) 
-        
-    if not os.path.exists(skeleton_video_path):
-        # Ha 100 ms után is hiányzik, akkor a cleanup TÉNYLEG túl gyors
-        logger.error(f"❌ A skeleton videó azonnal eltűnt, másolás sikertelen: {skeleton_video_path}")
-        return raw_keypoints, skeleton_video_path, keyframes # Visszatérünk az eredeti útvonallal, de ez is hiányzik
-    
-    # -----------------------------------------------------------
-    
-    # Egy másodperc pontosságú timestamp is elég:
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S") 
-    safe_skeleton_video_path = os.path.join("/tmp", f"sls_skeleton_final_{os.getpid()}_{timestamp}.avi")
-    
     try:
-        shutil.copyfile(skeleton_video_path, safe_skeleton_video_path) # EZ AZ A SOR, AMI MÁR ELÉRNI A FÁJLT
-        logger.info(f"💾 Készült egy biztonsági másolat (feltöltésre): {safe_skeleton_video_path}")
-        returned_path = safe_skeleton_video_path
-        
-    except Exception as e:
-        # Ez a hiba már valószínűleg nem fordul elő
-        logger.error(f"❌ MÁSODLAGOS HIBA a skeleton videó másolásakor: {e}", exc_info=True)
-        returned_path = skeleton_video_path
+        for frame_number, buffer_index, image in frames:
+            try:
+                # ✅ Frame validáció
+                if image is None or image.size == 0:
+                    logger.error(f"❌ Frame {frame_number} üres, átugrás!")
+                    continue
+
+                frame_height, frame_width = image.shape[:2]
+                timestamp_ms = int(frame_number * 1000 / fps)
+                image_rgb = prepare_frame(image, profile, roi)
+                mp_image = mp.Image(image_format=mp.ImageFormat.SRGB, data=image_rgb)
+
+                results = landmarker.detect_for_video(mp_image, timestamp_ms)
+                processed_frames += 1
+
+                # 🆕 DEBUG: Pose detektálás ellenőrzése
+                if results.pose_landmarks:
+                    detected_frames += 1
+                    if frame_number % 30 == 0:  # Csak minden 30. frame-nél logolunk
+                        logger.info(f"✅ Frame {frame_number}/{total_frames}: {len(results.pose_landmarks[0])} landmark OK")
+
+                    # 🟢 A tömbbe a NYERS normalizált értékek kerülnek (a ROI-ból a teljes képre visszavetítve),
+                    # a kalibrációs faktort a PoseSequence.keypoints olvasáskor alkalmazza.
+                    landmarks = roi_to_frame_coords(
+                        landmarks_to_array(results.pose_landmarks[0]), roi, frame_width, frame_height
+                    )
+                    world_landmarks = (
+                        landmarks_to_array(results.pose_world_landmarks[0]) if results.pose_world_landmarks else None
+                    )
+                    builder.append_arrays(frame_number, timestamp_ms, landmarks, world_landmarks)
+
+                    # 📸 Decimálásnál a középső frame kimaradhat: az első utána következő elemzett frame
+                    # kerül snapshotnak, csak erre az egy képre rajzolunk (a teljes videót a renderer készíti).
+                    # Pipeline módban a puffer újrahasznosul, ezért másolatot teszünk el.
+                    if snapshot_frame is not None and frame_number >= snapshot_frame and not builder.frame_images:
+                        snapshot = image.copy() if buffer_index is not None else image
+                        draw_skeleton(snapshot, landmarks)
+                        builder.frame_images[frame_number] = snapshot
+
+                    roi = compute_roi(landmarks, frame_width, frame_height, profile.roi_margin) if profile.use_roi else None
+                else:
+                    # ⚠️ Pose NEM detektálva – a következő frame-en újra a teljes képet nézzük
+                    roi = None
+                    if frame_number % 30 == 0:
+                        logger.warning(f"⚠️ Frame {frame_number}/{total_frames}: NINCS pose landmark!")
+            finally:
+                if buffer_index is not None:
+                    decoder.release(buffer_index)
+
+    except Exception:
+        landmarker_failed = True
+        raise
+    finally:
+        if decoder is not None:
+            decoder.close()
+        cap.release()
+        landmarker_pool.release(landmarker, discard=landmarker_failed)
+
+    frame_number += 1  # az utolsó beolvasott frame utáni index
+    if stats is not None:
+        stats.update(frame_stride=frame_stride, frames_read=frame_number)
+    if builder.total_frames <= 0:
+        builder.total_frames = frame_number
+    pose_sequence = builder.build()
 
     # 🆕 ÖSSZEFOGLALÓ
-    detection_rate = (detected_frames / frame_number * 100) if frame_number > 0 else 0
-    logger.info(f"🎯 {frame_number} frame feldolgozva")
+    detection_rate = (detected_frames / processed_frames * 100) if processed_frames > 0 else 0
+    logger.info(f"🎯 {processed_frames}/{frame_number} frame feldolgozva (stride={frame_stride})")
     logger.info(f"✅ {detected_frames} frame-ben detektálva pose ({detection_rate:.1f}%)")
-    logger.info(f"📹 Annotált videó: {skeleton_video_path}")
+    logger.info(f"📦 Kulcspont tömb mérete: {pose_sequence.nbytes / 1024:.1f} KB")
 
     # ⚠️ Ha túl kevés detektálás volt, figyelmeztetés
     if detection_rate < 10:
         logger.error(f"❌ KRITIKUS: Csak {detection_rate:.1f}% frame-ben detektálva pose!")
         logger.error("💡 Ellenőrizd: videó minőség, világítás, kamera távolság, modell fájl")
 
-    return raw_keypoints, returned_path, keyframes
+    return pose_sequence
+
+
+def process_video_with_mediapipe(video_path: str, job_type: str = "GENERAL", calibration_factor: float = 1.0):
+    """
+    Régi interfész: (raw_keypoints, skeleton videó útvonal, keyframes) dict listákkal.
+    Új kódhoz az extract_pose_sequence() + skeleton_renderer javasolt.
+    """
+    pose_sequence = extract_pose_sequence(video_path, job_type, calibration_factor)
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    skeleton_video_path = render_skeleton_video_file(
+        pose_sequence, video_path, os.path.join("/tmp", f"skeleton_video_{os.getpid()}_{timestamp}.mp4")
+    )
+    return pose_sequence.to_raw_keypoints(), skeleton_video_path, pose_sequence.to_keyframes(include_images=True)
 
 def process_image_with_mediapipe(image_path: str):
     """
@@ -209,7 +310,6 @@ def process_image_with_mediapipe(image_path: str):
     Ha a MediaPipe nem talál embert, MoveNet fallback kerül alkalmazásra.
     """
     import mediapipe as mp
-    from mediapipe.tasks import python as mp_python
     from mediapipe.tasks.python import vision as mp_vision
     import tensorflow as tf
     import tensorflow_hub as hub
@@ -245,20 +345,11 @@ def process_image_with_mediapipe(image_path: str):
     cv2.imwrite(temp_preprocessed_path, image_bgr)
     logger.info(f"✅ Előkészített kép mentve: {temp_preprocessed_path}")
 
-    # --- MediaPipe beállítások ---
-    base_options = mp_python.BaseOptions(model_asset_path=MODEL_PATH)
-    options = mp_vision.PoseLandmarkerOptions(
-        base_options=base_options,
-        output_segmentation_masks=False,
-        running_mode=mp_vision.RunningMode.IMAGE,
-        min_pose_detection_confidence=0.3,
-        min_pose_presence_confidence=0.3,
-    )
-
+    # --- MediaPipe beállítások: a landmarker példányok a processz szintű poolból jönnek ---
     result = None
 
     try:
-        with mp_vision.PoseLandmarker.create_from_options(options) as landmarker:
+        with landmarker_pool.landmarker(*IMAGE_POOL_KEY) as landmarker:
             mp_image = mp.Image.create_from_file(temp_preprocessed_path)
             result = landmarker.detect(mp_image)
 
@@ -270,23 +361,13 @@ def process_image_with_mediapipe(image_path: str):
         # --- Második próbálkozás engedékenyebb beállításokkal ---
         if not result.pose_landmarks or not result.pose_world_landmarks:
             logger.warning("🔁 Újrapróbálás lazább küszöbökkel...")
-            options.min_pose_detection_confidence = 0.15
-            options.min_pose_presence_confidence = 0.15
-            with mp_vision.PoseLandmarker.create_from_options(options) as landmarker2:
+            with landmarker_pool.landmarker(mp_vision.RunningMode.IMAGE, 0.15, 0.15) as landmarker2:
                 result = landmarker2.detect(mp_image)
 
         # --- Selfie mód próbálkozás ---
         if not result.pose_landmarks:
             logger.warning("🔁 Újrapróbálás SELFIE módban...")
-            selfie_options = mp_vision.PoseLandmarkerOptions(
-                base_options=base_options,
-                running_mode=mp_vision.RunningMode.IMAGE,
-                output_segmentation_masks=False,
-                num_poses=1,
-                min_pose_detection_confidence=0.15,
-                min_pose_presence_confidence=0.15,
-            )
-            with mp_vision.PoseLandmarker.create_from_options(selfie_options) as selfie_landmarker:
+            with landmarker_pool.landmarker(mp_vision.RunningMode.IMAGE, 0.15, 0.15) as selfie_landmarker:
                 result = selfie_landmarker.detect(mp_image)
 
         # --- Ha MediaPipe nem talál, jön a MoveNet fallback ---
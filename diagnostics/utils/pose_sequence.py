@@ -0,0 +1,316 @@
+# diagnostics/utils/pose_sequence.py
+import io
+import logging
+import numpy as np
+
+from diagnostics.utils.geometry import MEDIAPIPE_POSE_LANDMARKS
+
+logger = logging.getLogger(__name__)
+
+NUM_LANDMARKS = 33
+# Oszlopok a landmark tömb utolsó tengelyén
+X, Y, Z, V = 0, 1, 2, 3
+
+# Bináris konténer: MAGIC + egymás után írt .npy tömbök, fix sorrendben
+_MAGIC = b"DTPOSE01"
+_ARRAY_ORDER = ("landmarks", "world_landmarks", "frame_indices", "timestamps_ms", "meta")
+
+
+class PoseSequence:
+    """
+    Oszlopos (NumPy) kulcspont tároló egy teljes videóhoz.
+
+    - landmarks:        float32 (frames, 33, 4) – normalizált x, y, z, visibility (skálázatlan)
+    - world_landmarks:  float32 (frames, 33, 4) – világkoordináták (NaN, ha az adott frame-ben nincs)
+    - frame_indices:    int32   (frames,)       – a videó frame sorszáma
+    - timestamps_ms:    int64   (frames,)       – időbélyeg ms-ban
+
+    Csak azokat a frame-eket tartalmazza, ahol a MediaPipe embert detektált
+    (ugyanúgy, mint a korábbi raw_keypoints / keyframes listák).
+    A kalibrációs faktort csak olvasáskor alkalmazzuk (keypoints), így a nyers
+    tömbök a faktortól függetlenül újrahasznosíthatók.
+    """
+
+    def __init__(self, landmarks, world_landmarks, frame_indices, timestamps_ms,
+                 fps: float = 25.0, calibration_factor: float = 1.0, total_frames: int = 0):
+        self.landmarks = np.asarray(landmarks, dtype=np.float32).reshape(-1, NUM_LANDMARKS, 4)
+        self.world_landmarks = np.asarray(world_landmarks, dtype=np.float32).reshape(-1, NUM_LANDMARKS, 4)
+        self.frame_indices = np.asarray(frame_indices, dtype=np.int32)
+        self.timestamps_ms = np.asarray(timestamps_ms, dtype=np.int64)
+        self.fps = float(fps or 25.0)
+        self.calibration_factor = float(calibration_factor or 1.0)
+        self.total_frames = int(total_frames or 0)
+        # Nem szerializált kiegészítők (pl. snapshot képek frame sorszám szerint)
+        self.frame_images = {}
+        self._keypoints = None
+
+    def __len__(self):
+        return int(self.landmarks.shape[0])
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.landmarks.nbytes + self.world_landmarks.nbytes
+                   + self.frame_indices.nbytes + self.timestamps_ms.nbytes)
+
+    # ------------------------------------------------------------------
+    # 📐 Olvasó nézetek
+    # ------------------------------------------------------------------
+    @property
+    def keypoints(self) -> np.ndarray:
+        """float64 (frames, 33, 4): x, y, z a kalibrációs faktorral skálázva, v változatlan."""
+        if self._keypoints is None:
+            keypoints = self.landmarks.astype(np.float64)
+            keypoints[..., :3] *= self.calibration_factor
+            self._keypoints = keypoints
+        return self._keypoints
+
+    @property
+    def has_world(self) -> np.ndarray:
+        """bool (frames,): van-e világkoordináta az adott frame-ben."""
+        return ~np.isnan(self.world_landmarks[:, 0, X])
+
+    def with_calibration(self, calibration_factor: float) -> "PoseSequence":
+        """Új nézet más kalibrációs faktorral (a nyers tömbök közösek maradnak)."""
+        seq = PoseSequence(self.landmarks, self.world_landmarks, self.frame_indices, self.timestamps_ms,
+                           fps=self.fps, calibration_factor=calibration_factor, total_frames=self.total_frames)
+        seq.frame_images = self.frame_images
+        return seq
+
+    @staticmethod
+    def landmark_index(landmark) -> int:
+        if isinstance(landmark, str):
+            return MEDIAPIPE_POSE_LANDMARKS[landmark.lower()]
+        return int(landmark)
+
+    def coords(self, landmark, world: bool = False) -> np.ndarray:
+        """(frames, 3) koordináta tömb egy landmarkhoz (név vagy index alapján)."""
+        idx = self.landmark_index(landmark)
+        source = self.world_landmarks if world else self.keypoints
+        return source[:, idx, :3]
+
+    def visibility(self, landmark, world: bool = False) -> np.ndarray:
+        idx = self.landmark_index(landmark)
+        source = self.world_landmarks if world else self.landmarks
+        return source[:, idx, V]
+
+    # ------------------------------------------------------------------
+    # 🔁 Átalakítás a DiagnosticJob.result JSON formátumára (lusta)
+    # ------------------------------------------------------------------
+    @staticmethod
+    def _frame_to_dicts(frame_rows: list) -> list:
+        return [{"x": x, "y": y, "z": z, "v": v} for x, y, z, v in frame_rows]
+
+    def to_raw_keypoints(self) -> list:
+        """A régi raw_keypoints lista: frame-enként 33 {x, y, z, v} dict (skálázott koordinátákkal)."""
+        return [self._frame_to_dicts(frame) for frame in self.keypoints.tolist()]
+
+    def iter_keyframes(self, include_images: bool = False):
+        """Frame-enként a régi keyframes dict formátum generátorként."""
+        keypoints = self.keypoints.tolist()
+        world = self.world_landmarks.astype(np.float64).tolist()
+        has_world = self.has_world.tolist()
+        frames = self.frame_indices.tolist()
+        times = self.timestamps_ms.tolist()
+
+        for i, frame_number in enumerate(frames):
+            keyframe = {
+                "frame": frame_number,
+                "time_ms": times[i],
+                "keypoints": self._frame_to_dicts(keypoints[i]),
+                "world_landmarks": self._frame_to_dicts(world[i]) if has_world[i] else [],
+            }
+            if include_images:
+                keyframe["frame_image"] = self.frame_images.get(frame_number)
+            yield keyframe
+
+    def to_keyframes(self, include_images: bool = False) -> list:
+        """JSON-kompatibilis keyframes lista (frame_image nélkül, ha include_images=False)."""
+        return list(self.iter_keyframes(include_images=include_images))
+
+    @classmethod
+    def from_raw_keypoints(cls, raw_keypoints: list, fps: float = 30.0) -> "PoseSequence":
+        """Régi (dict listás) raw_keypoints átalakítása. A bemenet már skálázott, ezért faktor = 1.0."""
+        frames = len(raw_keypoints)
+        landmarks = np.full((frames, NUM_LANDMARKS, 4), np.nan, dtype=np.float32)
+        for i, frame in enumerate(raw_keypoints):
+            for j, lm in enumerate(frame[:NUM_LANDMARKS]):
+                landmarks[i, j] = (lm.get("x", 0.0), lm.get("y", 0.0), lm.get("z", 0.0), lm.get("v", 0.0))
+        world = np.full_like(landmarks, np.nan)
+        frame_indices = np.arange(frames, dtype=np.int32)
+        timestamps = (frame_indices * 1000 / fps).astype(np.int64)
+        return cls(landmarks, world, frame_indices, timestamps, fps=fps, total_frames=frames)
+
+    @classmethod
+    def from_keyframes(cls, keyframes: list, fps: float = 30.0) -> "PoseSequence":
+        """
+        A job eredményében (result["keyframes"]) tárolt JSON lista visszaalakítása (a to_keyframes inverze).
+        A koordináták már skálázottak (faktor = 1.0); a frame sorszámok és időbélyegek megmaradnak.
+        """
+        seq = cls.from_raw_keypoints([kf.get("keypoints") or [] for kf in keyframes], fps=fps)
+        if keyframes:
+            seq.frame_indices = np.array([kf.get("frame", i) for i, kf in enumerate(keyframes)], dtype=np.int32)
+            seq.timestamps_ms = np.array(
+                [kf.get("time_ms", int(i * 1000 / fps)) for i, kf in enumerate(keyframes)], dtype=np.int64
+            )
+            seq.total_frames = int(seq.frame_indices[-1]) + 1
+        return seq
+
+    # ------------------------------------------------------------------
+    # 💾 Szerializáció (.npy konténer, zero-copy betöltéssel)
+    # ------------------------------------------------------------------
+    def _meta_array(self) -> np.ndarray:
+        return np.array([self.fps, self.calibration_factor, float(self.total_frames)], dtype=np.float64)
+
+    def to_buffers(self) -> dict:
+        """A tömbök nyers memóriája memoryview-ként (másolás nélkül)."""
+        return {
+            "landmarks": memoryview(np.ascontiguousarray(self.landmarks)),
+            "world_landmarks": memoryview(np.ascontiguousarray(self.world_landmarks)),
+            "frame_indices": memoryview(np.ascontiguousarray(self.frame_indices)),
+            "timestamps_ms": memoryview(np.ascontiguousarray(self.timestamps_ms)),
+        }
+
+    def write(self, fileobj):
+        """A konténer kiírása egy bináris fájlobjektumba (.npy formátumú tömbök egymás után)."""
+        arrays = {
+            "landmarks": self.landmarks,
+            "world_landmarks": self.world_landmarks,
+            "frame_indices": self.frame_indices,
+            "timestamps_ms": self.timestamps_ms,
+            "meta": self._meta_array(),
+        }
+        fileobj.write(_MAGIC)
+        for name in _ARRAY_ORDER:
+            np.lib.format.write_array(fileobj, np.ascontiguousarray(arrays[name]), allow_pickle=False)
+
+    def to_bytes(self) -> bytes:
+        buffer = io.BytesIO()
+        self.write(buffer)
+        return buffer.getvalue()
+
+    def save(self, path: str):
+        with open(path, "wb") as f:
+            self.write(f)
+
+    @classmethod
+    def from_buffer(cls, data) -> "PoseSequence":
+        """
+        Betöltés bytes / memoryview / mmap pufferből. A tömbök a pufferre mutatnak
+        (np.frombuffer), adatmásolás nélkül – ezért csak olvashatók.
+        """
+        view = memoryview(data)
+        if bytes(view[:len(_MAGIC)]) != _MAGIC:
+            raise ValueError("❌ Érvénytelen PoseSequence formátum.")
+
+        offset = len(_MAGIC)
+        arrays = {}
+        for name in _ARRAY_ORDER:
+            # A fejléc (max. néhány száz bájt) beolvasása után az adat közvetlenül a pufferből jön
+            header = io.BytesIO(bytes(view[offset:offset + 4096]))
+            version = np.lib.format.read_magic(header)
+            if version == (1, 0):
+                shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(header)
+            else:
+                shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(header)
+            if fortran_order:
+                raise ValueError("❌ Fortran sorrendű tömb nem támogatott.")
+            data_offset = offset + header.tell()
+            count = int(np.prod(shape)) if shape else 1
+            arrays[name] = np.frombuffer(view, dtype=dtype, count=count, offset=data_offset).reshape(shape)
+            offset = data_offset + count * dtype.itemsize
+
+        fps, calibration_factor, total_frames = arrays["meta"].tolist()
+        return cls(arrays["landmarks"], arrays["world_landmarks"], arrays["frame_indices"],
+                   arrays["timestamps_ms"], fps=fps, calibration_factor=calibration_factor,
+                   total_frames=int(total_frames))
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> "PoseSequence":
+        if mmap:
+            import mmap as _mmap
+            with open(path, "rb") as f:
+                mapped = _mmap.mmap(f.fileno(), 0, access=_mmap.ACCESS_READ)
+            return cls.from_buffer(mapped)
+        with open(path, "rb") as f:
+            return cls.from_buffer(f.read())
+
+
+def landmarks_to_array(landmark_list) -> np.ndarray:
+    """MediaPipe landmark lista -> (33, 4) float32 tömb (x, y, z, visibility); hiányzó pont NaN."""
+    target = np.full((NUM_LANDMARKS, 4), np.nan, dtype=np.float32)
+    PoseSequenceBuilder._fill(target, landmark_list)
+    return target
+
+
+class PoseSequenceBuilder:
+    """
+    Frame-enként bővíthető PoseSequence építő előre lefoglalt (duplázódó) tömbökkel,
+    hogy a videó feldolgozás során ne keletkezzen landmarkonként egy Python dict.
+    """
+
+    def __init__(self, capacity: int = 256, fps: float = 25.0, calibration_factor: float = 1.0, total_frames: int = 0):
+        capacity = max(int(capacity or 0), 16)
+        self.fps = fps
+        self.calibration_factor = calibration_factor
+        self.total_frames = total_frames
+        self._landmarks = np.empty((capacity, NUM_LANDMARKS, 4), dtype=np.float32)
+        self._world = np.empty((capacity, NUM_LANDMARKS, 4), dtype=np.float32)
+        self._frames = np.empty(capacity, dtype=np.int32)
+        self._times = np.empty(capacity, dtype=np.int64)
+        self._size = 0
+        self.frame_images = {}
+
+    def __len__(self):
+        return self._size
+
+    def _grow(self):
+        capacity = self._landmarks.shape[0] * 2
+        for attr in ("_landmarks", "_world", "_frames", "_times"):
+            old = getattr(self, attr)
+            new = np.empty((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:self._size] = old[:self._size]
+            setattr(self, attr, new)
+
+    @staticmethod
+    def _fill(target: np.ndarray, landmark_list):
+        for j, lm in enumerate(landmark_list):
+            if j >= NUM_LANDMARKS:
+                break
+            target[j, X] = lm.x
+            target[j, Y] = lm.y
+            target[j, Z] = lm.z
+            target[j, V] = getattr(lm, "visibility", 1.0)
+
+    def append(self, frame_number: int, timestamp_ms: int, pose_landmarks, pose_world_landmarks=None):
+        """Egy detektált frame hozzáadása (MediaPipe landmark listákból)."""
+        if self._size == self._landmarks.shape[0]:
+            self._grow()
+        i = self._size
+        self._landmarks[i] = np.nan
+        self._fill(self._landmarks[i], pose_landmarks)
+        self._world[i] = np.nan
+        if pose_world_landmarks:
+            self._fill(self._world[i], pose_world_landmarks)
+        self._frames[i] = frame_number
+        self._times[i] = timestamp_ms
+        self._size += 1
+
+    def append_arrays(self, frame_number: int, timestamp_ms: int, landmarks: np.ndarray, world_landmarks: np.ndarray = None):
+        """Egy frame hozzáadása már (33, 4) alakú tömbökből."""
+        if self._size == self._landmarks.shape[0]:
+            self._grow()
+        i = self._size
+        self._landmarks[i] = landmarks
+        self._world[i] = np.nan if world_landmarks is None else world_landmarks
+        self._frames[i] = frame_number
+        self._times[i] = timestamp_ms
+        self._size += 1
+
+    def build(self) -> PoseSequence:
+        n = self._size
+        seq = PoseSequence(
+            self._landmarks[:n].copy(), self._world[:n].copy(), self._frames[:n].copy(), self._times[:n].copy(),
+            fps=self.fps, calibration_factor=self.calibration_factor, total_frames=self.total_frames,
+        )
+        seq.frame_images = self.frame_images
+        return seq
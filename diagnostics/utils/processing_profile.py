@@ -0,0 +1,142 @@
+# diagnostics/utils/processing_profile.py
+"""
+Videó feldolgozási profilok job típusonként.
+
+Egy profil megmondja, hány fps-sel, mekkora felbontáson és milyen kivágással (ROI)
+fusson a PoseLandmarker. A metrika kód változatlan: a kulcspontok a teljes
+képkockához normalizálva kerülnek a PoseSequence-be.
+"""
+import logging
+
+import cv2
+import numpy as np
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class ProcessingProfile:
+    """
+    :param target_fps: elemzési fps (None = minden frame feldolgozása)
+    :param max_resolution: a hosszabbik képoldal maximuma pixelben (None = eredeti felbontás)
+    :param use_roi: az előző frame landmarkjai köré vágott kép (person-ROI) feldolgozása
+    :param roi_margin: a ROI befoglaló téglalap bővítése (a méret arányában, oldalanként)
+    """
+
+    def __init__(self, target_fps: float = None, max_resolution: int = None, use_roi: bool = False, roi_margin: float = 0.25):
+        self.target_fps = target_fps
+        self.max_resolution = max_resolution
+        self.use_roi = use_roi
+        self.roi_margin = roi_margin
+
+    def frame_stride(self, source_fps: float) -> int:
+        """Hányadik frame-et elemezzük (1 = mindet)."""
+        if not self.target_fps or not source_fps or source_fps <= self.target_fps:
+            return 1
+        return max(1, int(round(source_fps / self.target_fps)))
+
+    def as_dict(self) -> dict:
+        return {
+            "target_fps": self.target_fps,
+            "max_resolution": self.max_resolution,
+            "use_roi": self.use_roi,
+            "roi_margin": self.roi_margin,
+        }
+
+    def __repr__(self):
+        return f"ProcessingProfile({self.as_dict()})"
+
+
+# 🆕 Alapértelmezett profilok (DiagnosticJob.JobType értékek szerint).
+# Az egylábon állás és a felugrás időalapú metrikái (stance_time, fázisok) teljes fps-t igényelnek.
+DEFAULT_PROFILE = ProcessingProfile(target_fps=None, max_resolution=1280)
+
+PROCESSING_PROFILES = {
+    "POSTURE_ASSESSMENT": ProcessingProfile(target_fps=10, max_resolution=960, use_roi=True),
+    "SQUAT_ASSESSMENT": ProcessingProfile(target_fps=30, max_resolution=960, use_roi=True),
+    "SHOULDER_CIRCUMDUCTION": ProcessingProfile(target_fps=15, max_resolution=960, use_roi=True),
+    "VERTICAL_JUMP": ProcessingProfile(target_fps=None, max_resolution=960, use_roi=False),
+    "SINGLE_LEG_STANCE_LEFT": ProcessingProfile(target_fps=None, max_resolution=960, use_roi=True),
+    "SINGLE_LEG_STANCE_RIGHT": ProcessingProfile(target_fps=None, max_resolution=960, use_roi=True),
+}
+
+
+def get_processing_profile(job_type: str) -> ProcessingProfile:
+    """
+    A job típushoz tartozó profil. A settings.DIAGNOSTICS_PROCESSING_PROFILES
+    (job_type -> kulcsszavas paraméterek dict) felülírhatja az alapértékeket.
+    """
+    overrides = getattr(settings, "DIAGNOSTICS_PROCESSING_PROFILES", {}) or {}
+    profile = PROCESSING_PROFILES.get(job_type, DEFAULT_PROFILE)
+    if job_type in overrides:
+        params = profile.as_dict()
+        params.update(overrides[job_type])
+        profile = ProcessingProfile(**params)
+    return profile
+
+
+# -----------------------------------------------------------
+# Kép előkészítés (ROI + átméretezés) és koordináta visszavetítés
+# -----------------------------------------------------------
+
+def compute_roi(landmarks: np.ndarray, frame_width: int, frame_height: int, margin: float = 0.25, min_visibility: float = 0.3):
+    """
+    Befoglaló téglalap (x0, y0, x1, y1 pixelben) az előző frame látható landmarkjai köré.
+    None, ha nincs elég látható pont (ilyenkor a teljes képet dolgozzuk fel).
+    """
+    if landmarks is None:
+        return None
+    visible = landmarks[:, 3] >= min_visibility
+    if visible.sum() < 4:
+        return None
+
+    xs = landmarks[visible, 0] * frame_width
+    ys = landmarks[visible, 1] * frame_height
+    x0, x1 = float(xs.min()), float(xs.max())
+    y0, y1 = float(ys.min()), float(ys.max())
+
+    # A bővítés a nagyobbik oldal arányában, hogy gyors mozgásnál se vágjunk bele a testbe
+    pad = max(x1 - x0, y1 - y0) * margin
+    x0 = int(max(0, np.floor(x0 - pad)))
+    y0 = int(max(0, np.floor(y0 - pad)))
+    x1 = int(min(frame_width, np.ceil(x1 + pad)))
+    y1 = int(min(frame_height, np.ceil(y1 + pad)))
+
+    if x1 - x0 < 32 or y1 - y0 < 32:
+        return None
+    return x0, y0, x1, y1
+
+
+def prepare_frame(image: np.ndarray, profile: ProcessingProfile, roi=None):
+    """
+    A modellnek átadandó RGB kép előállítása (kivágás, majd lekicsinyítés, végül BGR→RGB).
+    A színkonverzió már a kisebb képen fut.
+    """
+    if roi is not None:
+        x0, y0, x1, y1 = roi
+        image = image[y0:y1, x0:x1]
+
+    if profile.max_resolution:
+        h, w = image.shape[:2]
+        scale = profile.max_resolution / float(max(h, w))
+        if scale < 1.0:
+            image = cv2.resize(image, (max(1, int(w * scale)), max(1, int(h * scale))), interpolation=cv2.INTER_AREA)
+
+    return np.ascontiguousarray(cv2.cvtColor(image, cv2.COLOR_BGR2RGB))
+
+
+def roi_to_frame_coords(landmarks: np.ndarray, roi, frame_width: int, frame_height: int) -> np.ndarray:
+    """
+    A kivágáshoz normalizált (33, 4) landmarkok visszavetítése a teljes képkockára.
+    A Z a kép szélességével arányos (MediaPipe konvenció), ezért azt is átskálázzuk.
+    A lekicsinyítés a normalizált koordinátákat nem érinti.
+    """
+    if roi is None:
+        return landmarks
+    x0, y0, x1, y1 = roi
+    roi_w, roi_h = x1 - x0, y1 - y0
+    mapped = landmarks.copy()
+    mapped[:, 0] = (landmarks[:, 0] * roi_w + x0) / frame_width
+    mapped[:, 1] = (landmarks[:, 1] * roi_h + y0) / frame_height
+    mapped[:, 2] = landmarks[:, 2] * roi_w / frame_width
+    return mapped
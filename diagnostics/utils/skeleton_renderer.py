@@ -0,0 +1,171 @@
+# diagnostics/utils/skeleton_renderer.py
+"""
+Skeleton overlay videó renderelése külön pipeline lépésként.
+
+Az inferencia (extract_pose_sequence) csak a kulcspont tömböt állítja elő; a rajzolás és a
+videó kódolás ebből + a forrás videóból utólag, külön Celery taskban fut (diagnostics_jobs.tasks),
+így a metrikák és a PDF nem várnak a kódolásra, terhelés alatt pedig a renderelés kikapcsolható
+(SKELETON_RENDERING_ENABLED).
+"""
+import logging
+import os
+import tempfile
+
+import cv2
+import numpy as np
+import mediapipe as mp
+from django.conf import settings
+from django.core.files import File
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from mediapipe.framework.formats import landmark_pb2
+
+from diagnostics.utils.frame_pipeline import FrameDecoder, FrameEncoder, iter_frames, pipeline_enabled, pipeline_buffers
+from diagnostics.utils.pose_sequence import PoseSequence
+
+logger = logging.getLogger(__name__)
+
+mp_drawing = mp.solutions.drawing_utils
+mp_pose = mp.solutions.pose
+
+DRAWING_SPEC_LANDMARK = mp_drawing.DrawingSpec(color=(0, 255, 0), thickness=2, circle_radius=2)
+DRAWING_SPEC_CONNECTION = mp_drawing.DrawingSpec(color=(0, 0, 255), thickness=2, circle_radius=2)
+
+# H.264 (avc1) MP4 böngészőben lejátszható; ha az OpenCV build nem tudja, mp4v-re esünk vissza
+FALLBACK_CODEC = "mp4v"
+
+
+def rendering_enabled() -> bool:
+    return getattr(settings, "SKELETON_RENDERING_ENABLED", True)
+
+
+def skeleton_storage_path(job_id, file_name: str = "skeleton_video.mp4") -> str:
+    return f"jobs/{job_id}/skeleton/{file_name}"
+
+
+def pose_sequence_storage_path(job_id) -> str:
+    return f"jobs/{job_id}/pose_sequence.dtpose"
+
+
+# -----------------------------------------------------------
+# Kulcspont tömb tárolása a renderelő lépés számára
+# -----------------------------------------------------------
+
+def store_pose_sequence(job_id, pose_sequence: PoseSequence) -> str:
+    """A PoseSequence mentése a storage-ba (a renderelő task innen olvassa vissza)."""
+    path = pose_sequence_storage_path(job_id)
+    if default_storage.exists(path):
+        default_storage.delete(path)
+    return default_storage.save(path, ContentFile(pose_sequence.to_bytes()))
+
+
+def load_pose_sequence(job_id) -> PoseSequence:
+    with default_storage.open(pose_sequence_storage_path(job_id), "rb") as fh:
+        return PoseSequence.from_buffer(fh.read())
+
+
+# -----------------------------------------------------------
+# Rajzolás és kódolás
+# -----------------------------------------------------------
+
+def draw_skeleton(image: np.ndarray, landmarks: np.ndarray):
+    """Egy (33, 4) normalizált landmark tömb felrajzolása a BGR képre (helyben)."""
+    landmark_list = landmark_pb2.NormalizedLandmarkList()
+    for x, y, z, v in landmarks:
+        lm = landmark_list.landmark.add()
+        lm.x = x
+        lm.y = y
+        lm.z = z
+        lm.visibility = 1.0 if np.isnan(v) else v
+
+    mp_drawing.draw_landmarks(
+        image,
+        landmark_list,
+        mp_pose.POSE_CONNECTIONS,
+        landmark_drawing_spec=DRAWING_SPEC_LANDMARK,
+        connection_drawing_spec=DRAWING_SPEC_CONNECTION,
+    )
+
+
+def _open_writer(output_path: str, codec: str, fps: float, size):
+    writer = cv2.VideoWriter(output_path, cv2.VideoWriter_fourcc(*codec), fps, size)
+    if writer.isOpened() or codec == FALLBACK_CODEC:
+        return writer, codec
+    logger.warning(f"⚠️ A(z) '{codec}' kodek nem érhető el, visszaesés: {FALLBACK_CODEC}")
+    writer.release()
+    return cv2.VideoWriter(output_path, cv2.VideoWriter_fourcc(*FALLBACK_CODEC), fps, size), FALLBACK_CODEC
+
+
+def render_skeleton_video_file(pose_sequence: PoseSequence, video_path: str, output_path: str, codec: str = None,
+                               pipelined: bool = None) -> str:
+    """
+    A forrás videó újrakódolása a skeleton overlay-jel.
+    Decimált elemzésnél (processing profile) a legutóbbi elemzett frame landmarkjai
+    maradnak a képen, legfeljebb fél másodpercig.
+    Pipeline módban a dekódolás, a rajzolás és a kódolás külön szálakon, átfedésben fut.
+    """
+    codec = codec or getattr(settings, "SKELETON_VIDEO_CODEC", "avc1")
+
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise RuntimeError(f"Nem sikerült megnyitni a videót: {video_path}")
+
+    fps = cap.get(cv2.CAP_PROP_FPS) or pose_sequence.fps or 25.0
+    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    writer, used_codec = _open_writer(output_path, codec, fps, (width, height))
+
+    frame_indices = pose_sequence.frame_indices
+    landmarks = pose_sequence.landmarks  # nyers normalizált koordináták (kalibráció nélkül)
+    hold_frames = max(1, int(fps / 2))
+
+    if pipelined is None:
+        pipelined = pipeline_enabled()
+    decoder, encoder = None, None
+    if pipelined:
+        buffers = pipeline_buffers()
+        decoder = FrameDecoder(cap, num_buffers=buffers).start()
+        encoder = FrameEncoder(writer, release=decoder.release, max_pending=buffers).start()
+
+    frame_number = -1
+    try:
+        for frame_number, buffer_index, image in (decoder if decoder is not None else iter_frames(cap)):
+            row = int(np.searchsorted(frame_indices, frame_number, side="right")) - 1
+            if row >= 0 and frame_number - frame_indices[row] < hold_frames:
+                draw_skeleton(image, landmarks[row])
+
+            if encoder is not None:
+                encoder.write(image, buffer_index)  # a puffert az enkóder adja vissza írás után
+            else:
+                writer.write(image)
+        frame_number += 1
+    finally:
+        if encoder is not None:
+            encoder.close()
+        if decoder is not None:
+            decoder.close()
+        cap.release()
+        writer.release()
+
+    logger.info(f"🎬 Skeleton videó renderelve ({used_codec}, {frame_number} frame): {output_path}")
+    return output_path
+
+
+def render_skeleton_to_storage(pose_sequence: PoseSequence, video_path: str, storage_path: str, codec: str = None) -> str:
+    """
+    Renderelés egy ideiglenes MP4-be, majd közvetlen (streamelt) feltöltés a storage-ba.
+    Nincs másodlagos helyi másolat; az ideiglenes fájlt a feltöltés után töröljük.
+    :return: a feltöltött videó URL-je
+    """
+    tmp = tempfile.NamedTemporaryFile(suffix=".mp4", delete=False)
+    tmp.close()
+    try:
+        render_skeleton_video_file(pose_sequence, video_path, tmp.name, codec)
+        if default_storage.exists(storage_path):
+            default_storage.delete(storage_path)
+        with open(tmp.name, "rb") as fh:
+            saved_path = default_storage.save(storage_path, File(fh, name=os.path.basename(storage_path)))
+        return default_storage.url(saved_path)
+    finally:
+        if os.path.exists(tmp.name):
+            os.remove(tmp.name)
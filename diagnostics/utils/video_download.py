@@ -0,0 +1,596 @@
+# diagnostics/utils/video_download.py
+"""
+Job bemeneti videók letöltése (GCS / HTTP).
+
+- Egy közös, connection poolos requests.Session újrapróbálkozással (Retry + backoff).
+- Az első kérés egy Range próba: megadja a méretet, a range támogatást és az objektum hash-eit.
+- Nagy fájloknál párhuzamos byte-range letöltés egy előre lefoglalt fájlba, kicsiknél streamelés
+  a fájlmérethez igazított (nagyobb) chunk mérettel.
+- Ellenőrzés a GCS x-goog-hash fejléc alapján (md5, ha van; összetett objektumnál crc32c) és méretre.
+- Minden letöltés egyedi, job-onkénti munkakönyvtárba kerül (nincs névütközés a /tmp-ben).
+- Korlátos méretű helyi LRU lemez cache (objektum + generáció/ETag szerint): az újrapróbált job,
+  a skeleton renderelés és az újraelemzés nem tölti le újra ugyanazt a videót.
+"""
+import base64
+import hashlib
+import logging
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+import google_crc32c
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+MIN_CHUNK_SIZE = 256 * 1024
+MAX_CHUNK_SIZE = 4 * 1024 * 1024
+PROBE_SIZE = 1024 * 1024
+_HASH_CHUNK_SIZE = 1024 * 1024
+_PART_ATTEMPTS = 3
+_FEED_POLL_SECONDS = 0.5
+_CONTENT_RANGE_PATTERN = re.compile(r"bytes \d+-\d+/(\d+)")
+
+_session = None
+_session_lock = threading.Lock()
+_cache_lock = threading.Lock()
+
+
+class DownloadError(RuntimeError):
+    """Sikertelen vagy sérült letöltés."""
+
+
+# -----------------------------------------------------------
+# Beállítások
+# -----------------------------------------------------------
+
+def _scratch_root() -> str:
+    return getattr(settings, "VIDEO_DOWNLOAD_SCRATCH_DIR", os.path.join(tempfile.gettempdir(), "video_downloads"))
+
+
+def _cache_dir() -> str:
+    return getattr(settings, "VIDEO_DOWNLOAD_CACHE_DIR", os.path.join(tempfile.gettempdir(), "video_cache"))
+
+
+def _cache_max_bytes() -> int:
+    return int(getattr(settings, "VIDEO_DOWNLOAD_CACHE_MAX_MB", 256)) * 1024 * 1024
+
+
+def _parallelism() -> int:
+    return max(1, int(getattr(settings, "VIDEO_DOWNLOAD_PARALLELISM", 4)))
+
+
+def _part_size() -> int:
+    return max(1, int(getattr(settings, "VIDEO_DOWNLOAD_PART_MB", 8))) * 1024 * 1024
+
+
+def _timeout():
+    return (10, int(getattr(settings, "VIDEO_DOWNLOAD_READ_TIMEOUT", 60)))
+
+
+def chunk_size_for(total_size: int) -> int:
+    """Streamelési chunk méret a fájlmérethez igazítva (kb. 64 olvasás fájlonként, korlátok között)."""
+    if not total_size:
+        return MIN_CHUNK_SIZE
+    return max(MIN_CHUNK_SIZE, min(MAX_CHUNK_SIZE, total_size // 64))
+
+
+# -----------------------------------------------------------
+# HTTP session
+# -----------------------------------------------------------
+
+def get_session() -> requests.Session:
+    """Processzenként egy megosztott session (keep-alive, connection pool, újrapróbálkozás)."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                retry = Retry(
+                    total=4,
+                    backoff_factor=0.5,
+                    status_forcelist=(429, 500, 502, 503, 504),
+                    allowed_methods=frozenset(["GET", "HEAD"]),
+                )
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max(8, _parallelism() * 2), max_retries=retry)
+                session = requests.Session()
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _session = session
+    return _session
+
+
+# -----------------------------------------------------------
+# Ellenőrzés
+# -----------------------------------------------------------
+
+def expected_hashes(headers) -> dict:
+    """A GCS x-goog-hash fejléc(ek) feldolgozása: {"md5": <base64>, "crc32c": <base64>}."""
+    hashes = {}
+    for part in (headers.get("x-goog-hash") or "").split(","):
+        name, _, value = part.strip().partition("=")
+        if name in ("md5", "crc32c") and value:
+            hashes[name] = value
+    return hashes
+
+
+def verify_file(path: str, hashes: dict, expected_size: int = None):
+    """Méret és (ha ismert) md5 / crc32c ellenőrzés. Eltérés esetén DownloadError."""
+    if expected_size is not None and os.path.getsize(path) != expected_size:
+        raise DownloadError(f"Hibás méret: {os.path.getsize(path)} != {expected_size} bájt ({path})")
+    if not hashes:
+        return
+
+    digest = hashlib.md5() if "md5" in hashes else google_crc32c.Checksum()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+
+    name = "md5" if "md5" in hashes else "crc32c"
+    actual = base64.b64encode(digest.digest()).decode("ascii")
+    if actual != hashes[name]:
+        raise DownloadError(f"Ellenőrzőösszeg eltérés ({name}): {actual} != {hashes[name]} ({path})")
+
+
+# -----------------------------------------------------------
+# Letöltés
+# -----------------------------------------------------------
+
+def _probe(url: str):
+    """
+    Range próba az első PROBE_SIZE bájtra.
+    :return: (response, total_size vagy None, range_supported)
+    """
+    response = get_session().get(url, headers={"Range": f"bytes=0-{PROBE_SIZE - 1}"}, stream=True, timeout=_timeout())
+    if response.status_code == 416:  # üres objektum
+        response.close()
+        response = get_session().get(url, stream=True, timeout=_timeout())
+    response.raise_for_status()
+
+    if response.status_code == 206:
+        match = _CONTENT_RANGE_PATTERN.match(response.headers.get("Content-Range", ""))
+        return response, int(match.group(1)) if match else None, match is not None
+
+    length = response.headers.get("Content-Length")
+    return response, int(length) if length else None, False
+
+
+def _write_stream(response, fileobj, chunk_size: int) -> int:
+    written = 0
+    for chunk in response.iter_content(chunk_size=chunk_size):
+        if chunk:
+            fileobj.write(chunk)
+            written += len(chunk)
+    return written
+
+
+def _fetch_range(url: str, path: str, start: int, end: int):
+    """Egy byte-tartomány letöltése a (már lefoglalt) fájl megfelelő helyére, részenkénti újrapróbálással."""
+    expected = end - start + 1
+    last_error = None
+    for attempt in range(1, _PART_ATTEMPTS + 1):
+        try:
+            with get_session().get(url, headers={"Range": f"bytes={start}-{end}"}, stream=True, timeout=_timeout()) as response:
+                response.raise_for_status()
+                if response.status_code != 206:
+                    raise DownloadError(f"A szerver nem adott részleges választ ({response.status_code})")
+                with open(path, "r+b") as f:
+                    f.seek(start)
+                    written = _write_stream(response, f, chunk_size_for(expected))
+            if written != expected:
+                raise DownloadError(f"Hiányos tartomány {start}-{end}: {written}/{expected} bájt")
+            return
+        except (requests.RequestException, DownloadError) as e:
+            last_error = e
+            logger.warning(f"⚠️ Tartomány letöltés hiba ({start}-{end}, {attempt}. próbálkozás): {e}")
+            time.sleep(0.5 * attempt)
+    raise DownloadError(f"A(z) {start}-{end} tartomány letöltése sikertelen: {last_error}")
+
+
+def _response_meta(response, total_size) -> dict:
+    headers = response.headers
+    return {
+        "size": total_size,
+        "hashes": expected_hashes(headers),
+        "etag": headers.get("ETag"),
+        "generation": headers.get("x-goog-generation"),
+        "parallel": False,
+    }
+
+
+def download_to_path(url: str, dest_path: str, probe=None, head: bytes = None) -> dict:
+    """
+    A teljes objektum letöltése a dest_path fájlba (párhuzamos range kérésekkel, ha érdemes).
+    :param probe: a _probe() már megnyitott eredménye (különben itt készül)
+    :param head: a próba válasz már kiolvasott törzse
+    :return: metaadatok (size, hashes, etag, generation, parallel)
+    """
+    response, total_size, range_supported = probe or _probe(url)
+    meta = _response_meta(response, total_size)
+
+    with response:
+        with open(dest_path, "wb") as f:
+            if head is not None:
+                f.write(head)
+                first = len(head)
+            else:
+                first = _write_stream(response, f, chunk_size_for(total_size))
+            if total_size is not None and range_supported and first < total_size:
+                f.truncate(total_size)
+
+    parts_needed = range_supported and total_size is not None and first < total_size
+    if parts_needed:
+        part_size = _part_size()
+        ranges = [(start, min(start + part_size, total_size) - 1) for start in range(first, total_size, part_size)]
+        meta["parallel"] = len(ranges) > 1 and _parallelism() > 1
+        if meta["parallel"]:
+            with ThreadPoolExecutor(max_workers=min(_parallelism(), len(ranges)), thread_name_prefix="video-download") as pool:
+                for future in [pool.submit(_fetch_range, url, dest_path, start, end) for start, end in ranges]:
+                    future.result()
+        else:
+            for start, end in ranges:
+                _fetch_range(url, dest_path, start, end)
+
+    verify_file(dest_path, meta["hashes"], total_size)
+    return meta
+
+
+# -----------------------------------------------------------
+# Munkakönyvtár és LRU lemez cache
+# -----------------------------------------------------------
+
+def make_scratch_dir(job_id=None) -> str:
+    """Egyedi munkakönyvtár (job_<id>_xxxx) a letöltött bemenetnek."""
+    root = _scratch_root()
+    os.makedirs(root, exist_ok=True)
+    prefix = f"job_{job_id}_" if job_id is not None else "job_"
+    return tempfile.mkdtemp(prefix=prefix, dir=root)
+
+
+def cleanup_local_video(path):
+    """
+    A letöltött videó és a munkakönyvtára törlése. Munkakönyvtáron kívüli (pl. MEDIA_ROOT) fájlt nem töröl.
+    StreamingDownload esetén előbb leállítja a háttérszálakat.
+    """
+    if not path:
+        return
+    if isinstance(path, StreamingDownload):
+        path.close()
+    scratch_root = os.path.abspath(_scratch_root())
+    parent = os.path.dirname(os.path.abspath(path))
+    if os.path.dirname(parent) != scratch_root:
+        return
+    shutil.rmtree(parent, ignore_errors=True)
+
+
+def _cache_key(url: str, meta: dict) -> str:
+    """Objektum útvonal (aláírási paraméterek nélkül) + verzió (generáció vagy ETag)."""
+    version = meta.get("generation") or meta.get("etag")
+    if not version:
+        return None
+    parsed = urlparse(url)
+    material = f"{parsed.netloc}{parsed.path}#{version}"
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+def _cache_path(key: str) -> str:
+    return os.path.join(_cache_dir(), f"{key}.bin")
+
+
+def _link_or_copy(src: str, dest: str):
+    """Hardlink (azonnali, helyet nem foglal); ha nem lehet (más fájlrendszer), másolat."""
+    try:
+        os.link(src, dest)
+    except OSError:
+        shutil.copyfile(src, dest)
+
+
+def _evict(max_bytes: int):
+    """Legrégebben használt bejegyzések törlése, amíg a cache a korlát alá nem kerül."""
+    entries = []
+    total = 0
+    with os.scandir(_cache_dir()) as it:
+        for entry in it:
+            if entry.is_file() and entry.name.endswith(".bin"):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)  # a már kiadott hardlinkek érvényesek maradnak
+            total -= size
+        except OSError:
+            pass
+
+
+def _cache_lookup(key: str, dest_path: str) -> bool:
+    path = _cache_path(key)
+    with _cache_lock:
+        if not os.path.exists(path):
+            return False
+        os.utime(path)  # LRU: a használat idejét az mtime jelzi
+        _link_or_copy(path, dest_path)
+    return True
+
+
+def _cache_store(key: str, src_path: str):
+    max_bytes = _cache_max_bytes()
+    if max_bytes <= 0 or os.path.getsize(src_path) > max_bytes:
+        return
+    os.makedirs(_cache_dir(), exist_ok=True)
+    path = _cache_path(key)
+    with _cache_lock:
+        if not os.path.exists(path):
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            _link_or_copy(src_path, tmp_path)
+            os.replace(tmp_path, path)
+        _evict(max_bytes)
+
+
+# -----------------------------------------------------------
+# Fő belépési pont
+# -----------------------------------------------------------
+
+def fetch_video(url: str, job_id=None, file_name: str = None, streaming: bool = False):
+    """
+    A videó egy egyedi munkakönyvtárba töltve (cache találatnál hardlink a cache bejegyzésre).
+    A hívó a cleanup_local_video()-val takaríthat; a cache bejegyzést ez nem érinti.
+
+    streaming=True esetén, ha a konténer sorosan olvasható (MPEG-TS, fragmentált vagy faststart MP4)
+    és a fájl elég nagy, egy már elindított StreamingDownload-ot ad vissza: a feldolgozás a
+    `source` FIFO-ból a letöltés közben olvashat (lásd mediapipe_processor.extract_pose_sequence).
+    :return: a helyi fájl útvonala vagy StreamingDownload
+    """
+    file_name = file_name or os.path.basename(urlparse(url).path) or "temp_video.mp4"
+    dest_path = os.path.join(make_scratch_dir(job_id), file_name)
+    started = time.monotonic()
+
+    try:
+        # A próba válasz fejlécei (generáció/ETag) adják a cache kulcsot; találatnál a törzset nem olvassuk
+        probe = _probe(url)
+        key = _cache_key(url, _response_meta(probe[0], probe[1]))
+        if key and _cache_lookup(key, dest_path):
+            probe[0].close()
+            logger.info(f"⚡ Videó a helyi cache-ből: {dest_path}")
+            return dest_path
+
+        response, total_size, range_supported = probe
+        if streaming and _streaming_enabled() and hasattr(os, "mkfifo") and range_supported \
+                and total_size and total_size >= _streaming_min_bytes():
+            head = response.content
+            container = detect_streamable_container(head)
+            if container is not None:
+                logger.info(f"🌊 Streamelt letöltés ({container}, {total_size / (1024 * 1024):.1f} MB): az inferencia letöltés közben indul")
+                return StreamingDownload(url, dest_path, probe, head, container, cache_key=key).start()
+            logger.info("ℹ️ A konténer nem olvasható sorosan (pl. moov a fájl végén), teljes letöltés.")
+            meta = download_to_path(url, dest_path, probe=probe, head=head)
+        else:
+            meta = download_to_path(url, dest_path, probe=probe)
+        elapsed = time.monotonic() - started
+        size_mb = (meta["size"] or os.path.getsize(dest_path)) / (1024 * 1024)
+        logger.info(
+            f"✅ Videó letöltve ({size_mb:.1f} MB, {elapsed:.1f} mp, {size_mb / elapsed if elapsed else 0:.1f} MB/s, "
+            f"{'párhuzamos' if meta['parallel'] else 'szekvenciális'}): {dest_path}"
+        )
+
+        if key:
+            try:
+                _cache_store(key, dest_path)
+            except OSError as e:
+                logger.warning(f"⚠️ Videó cache írás sikertelen: {e}")
+        return dest_path
+
+    except Exception:
+        cleanup_local_video(dest_path)
+        raise
+
+
+# -----------------------------------------------------------
+# 🆕 Streamelt bemenet: inferencia már letöltés közben
+# -----------------------------------------------------------
+
+def _streaming_enabled() -> bool:
+    return getattr(settings, "VIDEO_STREAMING_ENABLED", True)
+
+
+def _streaming_min_bytes() -> int:
+    return int(getattr(settings, "VIDEO_STREAMING_MIN_MB", 8)) * 1024 * 1024
+
+
+def detect_streamable_container(head: bytes):
+    """
+    A fájl eleje alapján eldönti, hogy a konténer sorosan (pipe-ból) is olvasható-e.
+    :return: "mpegts", "fragmented_mp4", "faststart_mp4" vagy None (pl. a végén lévő moov atom)
+    """
+    if len(head) >= 3 * 188 and head[0] == head[188] == head[376] == 0x47:
+        return "mpegts"
+
+    offset = 0
+    while offset + 8 <= len(head):
+        size = int.from_bytes(head[offset:offset + 4], "big")
+        box = head[offset + 4:offset + 8]
+        if size == 1 and offset + 16 <= len(head):
+            size = int.from_bytes(head[offset + 8:offset + 16], "big")
+        if box == b"moof":
+            return "fragmented_mp4"
+        if box == b"moov":
+            return "fragmented_mp4" if b"mvex" in head[offset:offset + size] else "faststart_mp4"
+        if box == b"mdat" or size < 8:
+            return None
+        offset += size
+    return None
+
+
+class StreamingDownload:
+    """
+    Sorrendi letöltés egy növekvő fájlba, amit egy adagoló szál közben egy FIFO-ba (named pipe) másol.
+    A cv2.VideoCapture a FIFO-t (`source`) olvassa, így az inferencia a letöltéssel átfedésben fut;
+    a letöltés a teljes fájlt (`path`) is előállítja (ellenőrzés, cache, renderelés, snapshot).
+    A letöltést nem fogja vissza a lassabb fogyasztó: a backpressure csak az adagoló szálat érinti.
+    """
+
+    _FEED_CHUNK_SIZE = 1024 * 1024
+
+    def __init__(self, url: str, dest_path: str, probe, head: bytes, container: str, cache_key: str = None):
+        self.url = url
+        self.path = dest_path
+        self.source = os.path.join(os.path.dirname(dest_path), "stream.fifo")
+        self.container = container
+        self._response, self._total_size, _ = probe
+        self._meta = _response_meta(self._response, self._total_size)
+        self._head = head
+        self._cache_key = cache_key
+        self._written = 0
+        self._finished = False
+        self._closed = False
+        self._error = None
+        self._cond = threading.Condition()
+        os.mkfifo(self.source)
+        open(self.path, "wb").close()  # az adagoló szál már az első bájt előtt megnyithatja
+        self._download_thread = threading.Thread(target=self._download, name="video-stream-download", daemon=True)
+        self._feed_thread = threading.Thread(target=self._feed, name="video-stream-feed", daemon=True)
+
+    def __fspath__(self):
+        return self.path
+
+    def __str__(self):
+        return self.path
+
+    @property
+    def content_id(self):
+        """
+        A tartalom már a letöltés előtt ismert azonosítója (a kulcspont cache-hez):
+        a GCS md5, ennek hiányában az objektum + generáció/ETag, különben None.
+        """
+        md5 = self._meta["hashes"].get("md5")
+        if md5:
+            return f"md5:{md5}"
+        return f"object:{self._cache_key}" if self._cache_key else None
+
+    def start(self) -> "StreamingDownload":
+        self._download_thread.start()
+        self._feed_thread.start()
+        return self
+
+    # --- letöltés (hálózat → fájl) ---
+
+    def _append(self, f, data: bytes):
+        f.write(data)
+        f.flush()  # az adagoló szál a fájlból olvas
+        with self._cond:
+            self._written += len(data)
+            self._cond.notify_all()
+
+    def _download(self):
+        started = time.monotonic()
+        try:
+            with open(self.path, "wb") as f:
+                self._append(f, self._head)
+                self._response.close()
+
+                attempt = 0
+                while self._total_size is not None and self._written < self._total_size and not self._closed:
+                    try:
+                        headers = {"Range": f"bytes={self._written}-"}
+                        with get_session().get(self.url, headers=headers, stream=True, timeout=_timeout()) as response:
+                            response.raise_for_status()
+                            if response.status_code != 206:
+                                raise DownloadError(f"A szerver nem adott részleges választ ({response.status_code})")
+                            for chunk in response.iter_content(chunk_size=chunk_size_for(self._total_size)):
+                                if self._closed:
+                                    break
+                                if chunk:
+                                    self._append(f, chunk)
+                    except (requests.RequestException, DownloadError) as e:
+                        attempt += 1
+                        if attempt >= _PART_ATTEMPTS:
+                            raise DownloadError(f"Streamelt letöltés sikertelen {self._written}. bájtnál: {e}")
+                        logger.warning(f"⚠️ Streamelt letöltés hiba ({attempt}. próbálkozás, folytatás {self._written}. bájttól): {e}")
+                        time.sleep(0.5 * attempt)
+
+            if self._closed:
+                return
+            verify_file(self.path, self._meta["hashes"], self._total_size)
+            elapsed = time.monotonic() - started
+            size_mb = self._written / (1024 * 1024)
+            logger.info(f"✅ Videó letöltve (streamelt, {self.container}, {size_mb:.1f} MB, {elapsed:.1f} mp): {self.path}")
+
+            if self._cache_key:
+                try:
+                    _cache_store(self._cache_key, self.path)
+                except OSError as e:
+                    logger.warning(f"⚠️ Videó cache írás sikertelen: {e}")
+        except Exception as e:
+            logger.error(f"❌ Streamelt letöltési hiba: {e}")
+            self._error = e if isinstance(e, DownloadError) else DownloadError(str(e))
+        finally:
+            with self._cond:
+                self._finished = True
+                self._cond.notify_all()
+
+    # --- adagolás (fájl → FIFO) ---
+
+    def _feed(self):
+        try:
+            fifo = open(self.source, "wb", buffering=0)  # blokkol, amíg a fogyasztó meg nem nyitja
+        except OSError:
+            return
+        try:
+            with open(self.path, "rb") as src:
+                offset = 0
+                while True:
+                    with self._cond:
+                        while self._written <= offset and not self._finished and not self._closed:
+                            self._cond.wait(_FEED_POLL_SECONDS)
+                        available, finished = self._written, self._finished
+                    if self._closed:
+                        return
+                    if available > offset:
+                        src.seek(offset)
+                        data = src.read(min(available - offset, self._FEED_CHUNK_SIZE))
+                        fifo.write(data)
+                        offset += len(data)
+                    elif finished:
+                        return  # EOF a fogyasztónak (hiba esetén a wait() jelzi)
+        except BrokenPipeError:
+            pass  # a fogyasztó bezárta a pipe-ot; a letöltés a fájlba folytatódik
+        finally:
+            try:
+                fifo.close()
+            except BrokenPipeError:
+                pass
+
+    def detach_consumer(self):
+        """A fogyasztó végzett (vagy meg sem nyitotta a FIFO-t): az adagoló szál ne blokkoljon tovább."""
+        try:
+            fd = os.open(self.source, os.O_RDONLY | os.O_NONBLOCK)
+            os.close(fd)
+        except OSError:
+            pass
+        self._feed_thread.join(timeout=5)
+
+    def wait(self, timeout: float = None) -> str:
+        """Megvárja a teljes (ellenőrzött) letöltést. :return: a helyi fájl útvonala"""
+        self._download_thread.join(timeout)
+        if self._download_thread.is_alive():
+            raise DownloadError(f"A letöltés nem fejeződött be {timeout} mp alatt: {self.url}")
+        if self._error is not None:
+            raise self._error
+        return self.path
+
+    def close(self):
+        """Letöltés és adagolás leállítása (takarításkor)."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self.detach_consumer()
+        self._download_thread.join()
@@ -0,0 +1,63 @@
+# diagnostics_jobs/management/commands/rescore_diagnostic_jobs.py
+from django.core.management.base import BaseCommand, CommandError
+
+from diagnostics_jobs.services.rescoring import RESCORING_SERVICES, pending_jobs, rescore_jobs
+from diagnostics_jobs.tasks import rescore_diagnostic_jobs
+
+
+class Command(BaseCommand):
+    help = (
+        "Befejezett diagnosztikai jobok újrapontozása a tárolt kulcspontokból (videó és MediaPipe nélkül). "
+        "Csak az aktuális SCORING_VERSION-nél régebbi jobokat érinti, így megszakítás után újraindítható."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--job-type", action="append", dest="job_types", choices=[str(t) for t in RESCORING_SERVICES],
+            help="Csak a megadott job típus(ok) (többször is megadható). Alapértelmezés: mind.",
+        )
+        parser.add_argument("--chunk-size", type=int, default=None, help="Egyszerre betöltött és mentett jobok száma.")
+        parser.add_argument("--workers", type=int, default=None, help="Pontozó processzek száma (alapértelmezés: CPU magok).")
+        parser.add_argument("--limit", type=int, default=None, help="Legfeljebb ennyi job feldolgozása.")
+        parser.add_argument("--start-after-id", type=int, default=0, help="Folytatás az adott job id után.")
+        parser.add_argument("--dry-run", action="store_true", help="Csak a függőben lévő jobok számának kiírása.")
+        parser.add_argument("--celery", action="store_true", help="Futtatás Celery taskként (háttérben).")
+
+    def handle(self, *args, **options):
+        job_types = options["job_types"] or [str(t) for t in RESCORING_SERVICES]
+
+        if options["dry_run"]:
+            for job_type in job_types:
+                count = pending_jobs(job_type, options["start_after_id"]).count()
+                version = RESCORING_SERVICES[job_type].SCORING_VERSION
+                self.stdout.write(f"{job_type}: {count} job vár újrapontozásra (verzió={version})")
+            return
+
+        if options["celery"]:
+            result = rescore_diagnostic_jobs.delay(
+                job_types=job_types,
+                chunk_size=options["chunk_size"],
+                limit=options["limit"],
+                start_after_id=options["start_after_id"],
+            )
+            self.stdout.write(f"🚀 Újrapontozás ütemezve (task id: {result.id})")
+            return
+
+        try:
+            stats = rescore_jobs(
+                job_types=job_types,
+                chunk_size=options["chunk_size"],
+                workers=options["workers"],
+                limit=options["limit"],
+                start_after_id=options["start_after_id"],
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Újrapontozás kész: {stats['processed']} job feldolgozva, {stats['updated']} frissítve, "
+            f"{stats['skipped']} kulcspont nélkül kihagyva, {stats['failed']} hibás "
+            f"({stats['elapsed_sec']} mp, {stats['jobs_per_sec']} job/s)"
+        ))
+        for job_type, last_id in stats["last_job_id"].items():
+            self.stdout.write(f"   {job_type}: utolsó feldolgozott id = {last_id}")
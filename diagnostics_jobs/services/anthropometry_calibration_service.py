@@ -7,7 +7,6 @@ from datetime import datetime
 from django.conf import settings
 from google.cloud import storage
 import mediapipe as mp
-from mediapipe.tasks import python as mp_tasks
 from mediapipe.tasks.python import vision
 import cv2
 
@@ -17,12 +16,11 @@ from diagnostics.utils.snapshot_manager import save_snapshot_to_gcs
 from diagnostics_jobs.utils import get_local_image_path
 from diagnostics_jobs.services.base_service import BaseDiagnosticService
 from diagnostics.utils.mediapipe_processor import process_image_with_mediapipe
+from diagnostics.utils.landmarker_pool import landmarker_pool
 
 
 logger = logging.getLogger(__name__)
 
-MODEL_PATH = '/app/assets/pose_landmarker_full.task'
-
 # ===================================================================
 # 🆕 KONSTANSOK: EMBERI TEST ARÁNYOK (validációhoz)
 # ===================================================================
@@ -131,15 +129,8 @@ def _download_photo_for_processing(gcs_key: str) -> str:
 # ===================================================================
 def _process_static_image_for_landmarks(image_path: str) -> dict:
     """MediaPipe PoseLandmarker-rel világkoordinátás landmarkokat ad vissza."""
-    base_opts = mp_tasks.BaseOptions(model_asset_path=MODEL_PATH)
-    opts = vision.PoseLandmarkerOptions(
-        base_options=base_opts,
-        output_segmentation_masks=False,
-        running_mode=vision.RunningMode.IMAGE
-    )
-
     try:
-        with vision.PoseLandmarker.create_from_options(opts) as landmarker:
+        with landmarker_pool.landmarker(vision.RunningMode.IMAGE) as landmarker:
             mp_image = mp.Image.create_from_file(image_path)
             result = landmarker.detect(mp_image)
 
@@ -295,14 +286,7 @@ def process_image_with_mediapipe(image_path: str) -> dict:
     if not os.path.exists(image_path):
         raise FileNotFoundError(f"Kép nem található: {image_path}")
 
-    base_opts = mp_tasks.BaseOptions(model_asset_path=MODEL_PATH)
-    options = vision.PoseLandmarkerOptions(
-        base_options=base_opts,
-        running_mode=vision.RunningMode.IMAGE,
-        output_segmentation_masks=False,
-    )
-
-    with vision.PoseLandmarker.create_from_options(options) as landmarker:
+    with landmarker_pool.landmarker(vision.RunningMode.IMAGE) as landmarker:
         mp_image = mp.Image.create_from_file(image_path)
         result = landmarker.detect(mp_image)
 
@@ -16,9 +16,20 @@ logger = logging.getLogger(__name__)
 class BaseDiagnosticService:
     """Közös alap a diagnosztikai elemzők számára."""
 
+    # 🆕 Pontozási verzió: a pontozó logika minden módosításakor növelni kell.
+    # A rescore_diagnostic_jobs parancs a régebbi verzióval pontozott jobokat számolja újra.
+    # None = a service nem támogatja az újrapontozást.
+    SCORING_VERSION = None
+    # A general_results tábla modellje (None, ha a service nem ír külön eredmény sort)
+    RESULT_MODEL = None
+
     def __init__(self, job: DiagnosticJob):
         """A szolgáltatás inicializálása a DiagnosticJob objektummal."""
         self.job = job
+        # 🆕 Az elemzés kulcspont tömbje, ebből készül utólag (külön taskban) a skeleton videó
+        self.pose_sequence = None
+        self.skeleton_video_result_key = "skeleton_video_url"
+        self.skeleton_video_file_name = "skeleton_video.mp4"
         self.logger = logging.getLogger(self.__class__.__name__)
         self.logger.info(f"Service inicializálva job_id={job.id}")
         
@@ -148,4 +159,33 @@ class BaseDiagnosticService:
     # ❗ A BaseDiagnosticService-ből kivettük a run_analysis osztályszintű metódust a konstruktor bevezetése miatt.
     def run_analysis(self):
         """Minden diagnosztikai service-nek implementálnia kell."""
-        raise NotImplementedError("A run_analysis() metódust implementálni kell a leszármazott osztályokban.")
\ No newline at end of file
+        raise NotImplementedError("A run_analysis() metódust implementálni kell a leszármazott osztályokban.")
+
+    # =========================================================================
+    # 🆕 Újrapontozás tárolt kulcspontokból (videó letöltés és MediaPipe nélkül)
+    # =========================================================================
+    def rescore(self, pose_sequence, previous_result: dict) -> dict:
+        """
+        Csak az elemzés és a pontozás újrafuttatása a job tárolt PoseSequence-én.
+        A korábbi eredményből veszi a kalibrációs faktorokat; a visszaadott dict a teljes új job eredmény.
+        Nem ír adatbázisba (a tömeges mentést a hívó végzi).
+        """
+        raise NotImplementedError(f"A(z) {self.__class__.__name__} nem támogatja az újrapontozást.")
+
+    @staticmethod
+    def result_row_values(result: dict) -> dict:
+        """A general_results sor pontozott (Decimal) mezői az eredmény dict-ből."""
+        return {}
+
+    @staticmethod
+    def merge_rescored(previous_result: dict, analysis: dict) -> dict:
+        """
+        Az új metrikák ráírása a korábbi eredményre. A tárolt kulcspontokból nincs képkocka,
+        ezért a None értékű URL-ek (snapshotok) nem írják felül a korábban feltöltötteket.
+        """
+        merged = dict(previous_result or {})
+        for key, value in analysis.items():
+            if value is None and key.endswith("_url") and merged.get(key):
+                continue
+            merged[key] = value
+        return merged
\ No newline at end of file
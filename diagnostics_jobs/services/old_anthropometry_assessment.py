@@ -174,7 +174,7 @@ class AnthropometryAssessmentService(BaseDiagnosticService):
         
         
         # LÉPÉS 2: Videó letöltése
-        video_path = get_local_video_path(job.video_url)
+        video_path = get_local_video_path(job.video_url, job_id=job.id)
 
         try:
             # MediaPipe feldolgozás
@@ -1,19 +1,24 @@
 import logging
 import numpy as np
-from typing import List, Dict, Any
+from typing import Dict, Any
 from decimal import Decimal
 import numpy.linalg # 🆕 Import hozzáadva a np.linalg használatához
 
-from diagnostics.utils.geometry import calculate_horizontal_tilt, get_landmark_coords
-from diagnostics.utils.mediapipe_processor import process_video_with_mediapipe
+from diagnostics.utils import kinematics
+from diagnostics.utils.mediapipe_processor import extract_pose_sequence
 from diagnostics.utils.snapshot_manager import save_snapshot_to_gcs
 from diagnostics_jobs.utils import get_local_video_path
+from diagnostics.utils.video_download import cleanup_local_video
 from diagnostics_jobs.services.base_service import BaseDiagnosticService
 from diagnostics_jobs.services.utils.anthropometry_loader import get_user_anthropometry_data 
 from general_results.models import PostureAssessmentResult
 
 logger = logging.getLogger(__name__)
 
+# Az elemzéshez használt landmarkok sorrendje a kinematics.gather tömbben
+POSTURE_LANDMARKS = ['left_shoulder', 'right_shoulder', 'left_hip', 'right_hip', 'left_ankle', 'right_ankle', 'nose']
+L_SHOULDER, R_SHOULDER, L_HIP, R_HIP, L_ANKLE, R_ANKLE, NOSE = range(7)
+
 
 class PostureAssessmentService(BaseDiagnosticService):
     """
@@ -21,12 +26,15 @@ class PostureAssessmentService(BaseDiagnosticService):
     antropometriai kalibrációval skálázott koordináták alapján.
     """
 
+    SCORING_VERSION = 1
+    RESULT_MODEL = PostureAssessmentResult
+
     
     def run_analysis(self):
         job = self.job
     
         self.log(f"▶️ Posture Assessment indítása job_id={job.id}") 
-        video_path = get_local_video_path(job.video_url)
+        video_path = get_local_video_path(job.video_url, job_id=job.id, streaming=True)
 
         try:
             # 0️⃣ Kalibráció és Antropometria betöltése
@@ -44,17 +52,17 @@ class PostureAssessmentService(BaseDiagnosticService):
             }
 
             # 1️⃣ Videó feldolgozása MediaPipe-pal 
-            raw_keypoints, skeleton_video_path, keyframes = process_video_with_mediapipe(
+            pose_sequence = extract_pose_sequence(
                 video_path, 
                 job.job_type,
                 # 🟢 KRITIKUS JAVÍTÁS: ELTÁVOLÍTVA a 'leg_calibration_factor', mert hibát okozott.
                 calibration_factor=calibration_factor, 
             )
-            self.log(f"MediaPipe feldolgozás kész, {len(raw_keypoints)} frame elemzve.")
+            self.log(f"MediaPipe feldolgozás kész, {len(pose_sequence)} frame elemzve.")
 
             # 2️⃣ Elemzés lefuttatása
             analysis_result = self._analyze_posture_keypoints(
-                raw_keypoints, 
+                pose_sequence, 
                 job, 
                 calibration_factor,
                 segment_measurements_cm # 👈 Átadjuk a szegmensméreteket
@@ -62,23 +70,10 @@ class PostureAssessmentService(BaseDiagnosticService):
 
             # Extra metaadatok hozzáadása
             analysis_result["video_analysis_done"] = True
-            analysis_result["skeleton_video_local_path"] = skeleton_video_path
+            self.pose_sequence = pose_sequence  # A skeleton videót a renderelő task készíti el belőle
 
-            # ✅ JSON SERIALIZÁCIÓS JAVÍTÁS (np.ndarray eltávolítása/konvertálása)
-            cleaned_keyframes = []
-            for frame in keyframes:
-                cleaned_frame = frame.copy()
-                
-                if 'frame_image' in cleaned_frame:
-                    del cleaned_frame['frame_image'] 
-                    
-                for k, v in cleaned_frame.items():
-                    if isinstance(v, np.ndarray):
-                        cleaned_frame[k] = v.tolist()
-                        
-                cleaned_keyframes.append(cleaned_frame)
-
-            analysis_result["keyframes"] = cleaned_keyframes
+            # A keyframes JSON lista a PoseSequence-ből készül (képadat nélkül)
+            analysis_result["keyframes"] = pose_sequence.to_keyframes()
             
             # 🟢 HIBÁNAK JAVÍTÁSA: 'anthro' helyett 'anthro_profile_data'-t használunk.
             analysis_result["calibration_used"] = bool(anthro_profile_data.get("calibration_factor")) 
@@ -92,17 +87,13 @@ class PostureAssessmentService(BaseDiagnosticService):
             }
 
             # 🆕 3️⃣ AZ EREDMÉNY MENTÉSE A GENERAL_RESULTS TÁBLÁBA 
-            metrics = analysis_result.get('metrics', {})
-
             PostureAssessmentResult.objects.create(
                 user=job.user,
                 job=job,
                 created_at=job.created_at,
                 
                 # A metrikák Decimal típusra konvertálása
-                posture_score=Decimal(str(metrics.get('posture_score', 0.0))),
-                avg_shoulder_tilt=Decimal(str(metrics.get('average_shoulder_tilt', 0.0))),
-                avg_hip_tilt=Decimal(str(metrics.get('average_hip_tilt', 0.0))),
+                **self.result_row_values(analysis_result),
                 # 🟢 ÚJ METRIKA
                 # avg_ap_proxy=Decimal(str(metrics.get('average_ap_proxy', 0.0))),
 
@@ -117,82 +108,79 @@ class PostureAssessmentService(BaseDiagnosticService):
             # ⚠️ A job hibaüzenettel tér vissza, ha a MediaPipe feldolgozás sikertelen
             return {"error": f"Elemzés hiba: {e}", "video_analysis_done": False}
 
-    
+        finally:
+            # 🗑 Letöltött videó törlése
+            cleanup_local_video(video_path)
+
+    @staticmethod
+    def result_row_values(result: dict) -> dict:
+        metrics = result.get('metrics', {})
+        return {
+            "posture_score": Decimal(str(metrics.get('posture_score', 0.0))),
+            "avg_shoulder_tilt": Decimal(str(metrics.get('average_shoulder_tilt', 0.0))),
+            "avg_hip_tilt": Decimal(str(metrics.get('average_hip_tilt', 0.0))),
+        }
+
+    def rescore(self, pose_sequence, previous_result: dict) -> dict:
+        anthropometry = previous_result.get("anthropometry") or {}
+        calibration_factor = float(anthropometry.get("calibration_factor", previous_result.get("calibration_factor", 1.0)) or 1.0)
+        segment_measurements_cm = anthropometry.get("segment_measurements") or {}
+        analysis_result = self._analyze_posture_keypoints(pose_sequence, self.job, calibration_factor, segment_measurements_cm)
+        return self.merge_rescored(previous_result, analysis_result)
+
     # ------------------------------------------------------------------------------
     # 🧠 _analyze_posture_keypoints METÓDUS: AP Proxy és Lateral Shift implementáció
     # ------------------------------------------------------------------------------
     def _analyze_posture_keypoints(
         self, 
-        raw_keypoints: List[Dict[str, Any]], 
+        pose_sequence, 
         job, 
         calibration_factor: float,
         segment_measurements: Dict[str, float] # 👈 Antropometria
     ) -> Dict[str, Any]:
         """
-        Kinyeri a váll-, csípő- dőlési, valamint a Sagittális és Laterális egyensúly adatokat.
+        Kinyeri a váll-, csípő- dőlési, valamint a Sagittális és Laterális egyensúly adatokat
+        (vektorizáltan, az összes frame-re egyszerre).
         """
-        shoulder_tilts, hip_tilts = [], []
-        ap_proxies, lateral_shifts = [], []
-        max_shoulder_tilt, max_hip_tilt = 0.0, 0.0
-        max_ap_proxy, max_lateral_shift = 0.0, 0.0
-        max_shoulder_frame, max_hip_frame = None, None
-
-        for frame_data in raw_keypoints:
-            # Kulcspontok kinyerése
-            left_shoulder = get_landmark_coords(frame_data, 'left_shoulder')
-            right_shoulder = get_landmark_coords(frame_data, 'right_shoulder')
-            left_hip = get_landmark_coords(frame_data, 'left_hip')
-            right_hip = get_landmark_coords(frame_data, 'right_hip')
-            left_ankle = get_landmark_coords(frame_data, 'left_ankle')
-            right_ankle = get_landmark_coords(frame_data, 'right_ankle')
-            nose = get_landmark_coords(frame_data, 'nose')
-
-            # 1️⃣ Laterális dőlés (Lateral Tilt)
-            if all(p is not None for p in [left_shoulder, right_shoulder]):
-                shoulder_tilt = calculate_horizontal_tilt(left_shoulder, right_shoulder)
-                shoulder_tilts.append(shoulder_tilt)
-                if abs(shoulder_tilt) > abs(max_shoulder_tilt):
-                    max_shoulder_tilt, max_shoulder_frame = shoulder_tilt, frame_data
-
-            if all(p is not None for p in [left_hip, right_hip]):
-                hip_tilt = calculate_horizontal_tilt(left_hip, right_hip)
-                hip_tilts.append(hip_tilt)
-                if abs(hip_tilt) > abs(max_hip_tilt):
-                    max_hip_tilt, max_hip_frame = hip_tilt, frame_data
-
-            # 2️⃣ Sagittális és Laterális egyensúly (AP Proxy & Lateral Shift)
-            if all(p is not None for p in [left_hip, right_hip, left_ankle, right_ankle, nose]):
-                
-                # Hip távolság (referenciahossz)
-                hip_distance = np.linalg.norm(np.array(left_hip)[:2] - np.array(right_hip)[:2]) # X,Y sík
-                mid_ankle = (np.array(left_ankle) + np.array(right_ankle)) / 2
-
-                if hip_distance > 0:
-                    
-                    # 🟢 AP Proxy (Sagittális stabilitás - Fej előrehelyezkedés)
-                    # Z tengely eltérés (mélység) a MediaPipe koordináta rendszerben
-                    ap_offset = nose[2] - mid_ankle[2] 
-                    ap_proxy = ap_offset / hip_distance
-                    ap_proxies.append(ap_proxy)
-                    
-                    if abs(ap_proxy) > abs(max_ap_proxy):
-                        max_ap_proxy = ap_proxy
-                        
-                    # 🟢 Laterális egyensúly (Lateral Shift - Súlypont eltérés)
-                    # X tengely eltérés (oldalirány)
-                    center_line_hip = (np.array(left_hip) + np.array(right_hip)) / 2
-                    lateral_offset = center_line_hip[0] - mid_ankle[0] 
-                    lateral_shift = abs(lateral_offset) / hip_distance
-                    lateral_shifts.append(lateral_shift)
-                    
-                    if lateral_shift > max_lateral_shift:
-                        max_lateral_shift = lateral_shift
+        pose_sequence = kinematics.ensure_pose_sequence(pose_sequence)
+
+        # Kulcspontok kinyerése: (frames, 7, 3) koordináták + (frames, 7) láthatóság
+        coords, visible = kinematics.gather(pose_sequence.keypoints, POSTURE_LANDMARKS)
+
+        # 1️⃣ Laterális dőlés (Lateral Tilt)
+        shoulder_ok = visible[:, L_SHOULDER] & visible[:, R_SHOULDER]
+        shoulder_tilts = kinematics.horizontal_tilts(coords[:, L_SHOULDER], coords[:, R_SHOULDER])
+        max_shoulder_tilt, max_shoulder_row = kinematics.running_extreme(shoulder_tilts, mask=shoulder_ok, mode="absmax")
+        shoulder_tilts = shoulder_tilts[shoulder_ok]
+
+        hip_ok = visible[:, L_HIP] & visible[:, R_HIP]
+        hip_tilts = kinematics.horizontal_tilts(coords[:, L_HIP], coords[:, R_HIP])
+        max_hip_tilt, max_hip_row = kinematics.running_extreme(hip_tilts, mask=hip_ok, mode="absmax")
+        hip_tilts = hip_tilts[hip_ok]
+
+        # 2️⃣ Sagittális és Laterális egyensúly (AP Proxy & Lateral Shift)
+        # Hip távolság (referenciahossz, X,Y sík); csak pozitív távolságú frame-ek számítanak
+        hip_distance = kinematics.distances(coords[:, L_HIP], coords[:, R_HIP], axes=slice(0, 2))
+        balance_ok = visible[:, [L_HIP, R_HIP, L_ANKLE, R_ANKLE, NOSE]].all(axis=1) & (hip_distance > 0)
+        hip_distance = hip_distance[balance_ok]
+        mid_ankle = kinematics.midpoints(coords[balance_ok, L_ANKLE], coords[balance_ok, R_ANKLE])
+
+        # 🟢 AP Proxy (Sagittális stabilitás - Fej előrehelyezkedés)
+        # Z tengely eltérés (mélység) a MediaPipe koordináta rendszerben
+        ap_proxies = (coords[balance_ok, NOSE, 2] - mid_ankle[:, 2]) / hip_distance
+        max_ap_proxy, _ = kinematics.running_extreme(ap_proxies, mode="absmax")
+
+        # 🟢 Laterális egyensúly (Lateral Shift - Súlypont eltérés)
+        # X tengely eltérés (oldalirány)
+        center_line_hip = kinematics.midpoints(coords[balance_ok, L_HIP], coords[balance_ok, R_HIP])
+        lateral_shifts = np.abs(center_line_hip[:, 0] - mid_ankle[:, 0]) / hip_distance
+        max_lateral_shift, _ = kinematics.running_extreme(lateral_shifts, mode="max")
 
         # Metrikák átlaga
-        avg_shoulder_tilt = np.mean(np.abs(shoulder_tilts)) if shoulder_tilts else 0.0
-        avg_hip_tilt = np.mean(np.abs(hip_tilts)) if hip_tilts else 0.0
-        avg_ap_proxy = np.mean(ap_proxies) if ap_proxies else 0.0
-        avg_lateral_shift = np.mean(lateral_shifts) if lateral_shifts else 0.0
+        avg_shoulder_tilt = np.mean(np.abs(shoulder_tilts)) if shoulder_tilts.size else 0.0
+        avg_hip_tilt = np.mean(np.abs(hip_tilts)) if hip_tilts.size else 0.0
+        avg_ap_proxy = np.mean(ap_proxies) if ap_proxies.size else 0.0
+        avg_lateral_shift = np.mean(lateral_shifts) if lateral_shifts.size else 0.0
         
         posture_score = max(0.0, 100.0 - ((avg_shoulder_tilt + avg_hip_tilt) / 2.0) * 5)
         
@@ -237,10 +225,12 @@ class PostureAssessmentService(BaseDiagnosticService):
 
         # Snapshotok
         shoulder_snapshot_url, hip_snapshot_url = None, None
-        if max_shoulder_frame and "frame_image" in max_shoulder_frame:
-            shoulder_snapshot_url = save_snapshot_to_gcs(max_shoulder_frame["frame_image"], job, "shoulder_tilt")
-        if max_hip_frame and "frame_image" in max_hip_frame:
-            hip_snapshot_url = save_snapshot_to_gcs(max_hip_frame["frame_image"], job, "hip_tilt")
+        shoulder_image = kinematics.frame_image_at(pose_sequence, max_shoulder_row)
+        hip_image = kinematics.frame_image_at(pose_sequence, max_hip_row)
+        if shoulder_image is not None:
+            shoulder_snapshot_url = save_snapshot_to_gcs(shoulder_image, job, "shoulder_tilt")
+        if hip_image is not None:
+            hip_snapshot_url = save_snapshot_to_gcs(hip_image, job, "hip_tilt")
 
         return {
             "metrics": {
@@ -0,0 +1,246 @@
+# diagnostics_jobs/services/rescoring.py
+"""
+Historikus DiagnosticJob-ok tömeges újrapontozása a tárolt kulcspontokból.
+
+A pontozó logika módosításakor (a service SCORING_VERSION értékének növelése után) a befejezett
+jobokat típusonként, id szerint rendezett darabokban (chunk) járjuk be:
+- a PoseSequence a storage-ból töltődik (jobs/<id>/pose_sequence.dtpose), régebbi joboknál
+  a result["keyframes"] listából – videó letöltés és MediaPipe futtatás nincs;
+- csak az elemzés + pontozás fut, processz poolban;
+- a general_results sorok és a DiagnosticJob.result chunkonként bulk_update-tel frissülnek,
+  a result a "scoring_version" bélyeget kapja.
+
+Újraindítható: a már az aktuális verzióval pontozott jobokat a lekérdezés kihagyja,
+így egy megszakadt futás egyszerűen újraindítható (vagy --start-after-id-vel folytatható).
+"""
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from diagnostics.utils.pose_sequence import PoseSequence
+from diagnostics.utils.skeleton_renderer import pose_sequence_storage_path
+from diagnostics_jobs.models import DiagnosticJob
+from diagnostics_jobs.utils import convert_numpy_to_python
+from diagnostics_jobs.services.squat_assessment import SquatAssessmentService
+from diagnostics_jobs.services.posture_assessment import PostureAssessmentService
+from diagnostics_jobs.services.shoulder_circumduction_assessment import ShoulderCircumductionService
+from diagnostics_jobs.services.vertical_jump_assessment import VerticalJumpAssessmentService
+from diagnostics_jobs.services.single_leg_stance_service import SingleLegStanceAssessmentService
+
+logger = logging.getLogger(__name__)
+
+# Az újrapontozható job típusok (a service-nek SCORING_VERSION-nel és rescore()-ral kell rendelkeznie)
+RESCORING_SERVICES = {
+    DiagnosticJob.JobType.SQUAT_ASSESSMENT: SquatAssessmentService,
+    DiagnosticJob.JobType.POSTURE_ASSESSMENT: PostureAssessmentService,
+    DiagnosticJob.JobType.SHOULDER_CIRCUMDUCTION: ShoulderCircumductionService,
+    DiagnosticJob.JobType.VERTICAL_JUMP: VerticalJumpAssessmentService,
+    DiagnosticJob.JobType.SINGLE_LEG_STANCE_LEFT: SingleLegStanceAssessmentService,
+    DiagnosticJob.JobType.SINGLE_LEG_STANCE_RIGHT: SingleLegStanceAssessmentService,
+}
+
+_LOADER_THREADS = 8
+
+
+def default_chunk_size() -> int:
+    return max(1, int(getattr(settings, "DIAGNOSTICS_RESCORING_CHUNK_SIZE", 200)))
+
+
+def default_workers() -> int:
+    return max(1, int(getattr(settings, "DIAGNOSTICS_RESCORING_WORKERS", 0) or os.cpu_count() or 1))
+
+
+def pending_jobs(job_type: str, start_after_id: int = 0):
+    """
+    Azok a befejezett jobok, amelyek még nem az aktuális pontozási verzióval készültek (id szerint rendezve).
+    A scoring_version kulcs nélküli (a verziózás előtti) jobokat külön feltétel veszi fel: a hiányzó
+    kulcsra a JSON összehasonlítás NULL, amit egy puszta exclude() kiszűrne.
+    """
+    version = RESCORING_SERVICES[job_type].SCORING_VERSION
+    return (
+        DiagnosticJob.objects
+        .filter(job_type=job_type, status=DiagnosticJob.JobStatus.COMPLETED, id__gt=start_after_id)
+        .exclude(result__isnull=True)
+        .filter(Q(result__scoring_version__isnull=True) | ~Q(result__scoring_version=version))
+        .order_by("id")
+    )
+
+
+# -----------------------------------------------------------
+# Kulcspontok betöltése (I/O, a fő processz szálain)
+# -----------------------------------------------------------
+
+def load_pose_bytes(job: DiagnosticJob):
+    """
+    A job PoseSequence-e szerializálva (a processz poolnak így adjuk át), vagy None.
+    Elsődleges forrás a tárolt tömb; ha nincs, a result["keyframes"] JSON lista.
+    """
+    try:
+        with default_storage.open(pose_sequence_storage_path(job.id), "rb") as fh:
+            return fh.read()
+    except Exception:
+        pass
+
+    keyframes = (job.result or {}).get("keyframes")
+    if keyframes:
+        return PoseSequence.from_keyframes(keyframes).to_bytes()
+    return None
+
+
+# -----------------------------------------------------------
+# Pontozás (processz pool worker)
+# -----------------------------------------------------------
+
+def _rescore_job(job: DiagnosticJob, data: bytes):
+    """
+    Egy job újrapontozása (a pool workerében fut, adatbázist nem ér el).
+    :return: (job_id, új eredmény dict vagy None, hibaüzenet vagy None)
+    """
+    try:
+        service = RESCORING_SERVICES[job.job_type](job=job)
+        result = service.rescore(PoseSequence.from_buffer(data), job.result or {})
+        return job.id, convert_numpy_to_python(result), None
+    except Exception as e:
+        return job.id, None, str(e)
+
+
+def _make_executor(workers: int):
+    """
+    Processz pool (fork), vagy None, ha egy processzben futunk.
+    A Celery prefork workerei daemon processzek, azoknak nem lehet gyermekprocesszük.
+    """
+    if workers <= 1:
+        return None
+    if multiprocessing.current_process().daemon:
+        logger.info("ℹ️ [RESCORE] Daemon processzben futunk (Celery worker), a pontozás egy processzben fut.")
+        return None
+
+    # A gyermekprocesszek a DB kapcsolat újranyitása előtt jönnek létre (fork esetén minden worker azonnal indul)
+    connections.close_all()
+    executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("fork"))
+    executor.submit(int).result()
+    return executor
+
+
+# -----------------------------------------------------------
+# Mentés
+# -----------------------------------------------------------
+
+def _apply_results(service_class, jobs_by_id: dict, results: list) -> tuple[int, int]:
+    """Az új eredmények tömeges mentése egy tranzakcióban. :return: (frissített, hibás) darabszám"""
+    rescored_at = timezone.now().isoformat()
+    updated_jobs = []
+    failed = 0
+
+    for job_id, result, error in results:
+        if error is not None:
+            failed += 1
+            logger.warning(f"⚠️ [RESCORE] Újrapontozás sikertelen job_id={job_id}: {error}")
+            continue
+        result["scoring_version"] = service_class.SCORING_VERSION
+        result["rescored_at"] = rescored_at
+        job = jobs_by_id[job_id]
+        job.result = result
+        updated_jobs.append(job)
+
+    if not updated_jobs:
+        return 0, failed
+
+    with transaction.atomic():
+        DiagnosticJob.objects.bulk_update(updated_jobs, ["result"])
+
+        model = service_class.RESULT_MODEL
+        if model is not None:
+            rows = list(model.objects.filter(job_id__in=[job.id for job in updated_jobs]))
+            fields = None
+            for row in rows:
+                result = jobs_by_id[row.job_id].result
+                values = service_class.result_row_values(result)
+                for field, value in values.items():
+                    setattr(row, field, value)
+                row.raw_json_metrics = result
+                fields = list(values) + ["raw_json_metrics"]
+            if rows:
+                model.objects.bulk_update(rows, fields)
+
+    return len(updated_jobs), failed
+
+
+# -----------------------------------------------------------
+# Fő belépési pont (management parancs és Celery task)
+# -----------------------------------------------------------
+
+def rescore_jobs(job_types=None, chunk_size: int = None, workers: int = None, limit: int = None,
+                 start_after_id: int = 0) -> dict:
+    """
+    A megadott (alapértelmezés: minden újrapontozható) típusú jobok újrapontozása.
+    :return: JSON-kompatibilis statisztika (feldolgozott/frissített/kihagyott/hibás, job/s, utolsó id)
+    """
+    job_types = list(job_types or RESCORING_SERVICES)
+    unknown = [job_type for job_type in job_types if job_type not in RESCORING_SERVICES]
+    if unknown:
+        raise ValueError(f"Nem újrapontozható job típus(ok): {', '.join(unknown)}")
+
+    chunk_size = chunk_size or default_chunk_size()
+    workers = workers or default_workers()
+    stats = {"processed": 0, "updated": 0, "skipped": 0, "failed": 0, "last_job_id": {}}
+    started = time.monotonic()
+
+    executor = _make_executor(workers)
+    loader = ThreadPoolExecutor(max_workers=_LOADER_THREADS, thread_name_prefix="rescore-loader")
+    try:
+        for job_type in job_types:
+            service_class = RESCORING_SERVICES[job_type]
+            last_id = start_after_id
+            logger.info(f"🔁 [RESCORE] {job_type} újrapontozása (verzió={service_class.SCORING_VERSION}, chunk={chunk_size}, worker={workers})")
+
+            while limit is None or stats["processed"] < limit:
+                size = chunk_size if limit is None else min(chunk_size, limit - stats["processed"])
+                jobs = list(pending_jobs(job_type, last_id)[:size])
+                if not jobs:
+                    break
+                last_id = jobs[-1].id
+
+                payloads = list(loader.map(load_pose_bytes, jobs))
+                scorable = [(job, data) for job, data in zip(jobs, payloads) if data is not None]
+                stats["skipped"] += len(jobs) - len(scorable)
+
+                if scorable:
+                    chunk_jobs, chunk_data = zip(*scorable)
+                    if executor is not None:
+                        results = list(executor.map(_rescore_job, chunk_jobs, chunk_data,
+                                                    chunksize=max(1, len(scorable) // (workers * 4))))
+                    else:
+                        results = [_rescore_job(job, data) for job, data in scorable]
+                    updated, failed = _apply_results(service_class, {job.id: job for job in chunk_jobs}, results)
+                    stats["updated"] += updated
+                    stats["failed"] += failed
+
+                stats["processed"] += len(jobs)
+                stats["last_job_id"][job_type] = last_id
+                elapsed = time.monotonic() - started
+                logger.info(
+                    f"⚡ [RESCORE] {job_type}: {stats['processed']} job feldolgozva, "
+                    f"{stats['processed'] / elapsed if elapsed else 0.0:.1f} job/s (utolsó id={last_id})"
+                )
+    finally:
+        loader.shutdown()
+        if executor is not None:
+            executor.shutdown()
+
+    elapsed = time.monotonic() - started
+    stats["elapsed_sec"] = round(elapsed, 2)
+    stats["jobs_per_sec"] = round(stats["processed"] / elapsed, 2) if elapsed else 0.0
+    logger.info(
+        f"🏁 [RESCORE] Kész: {stats['processed']} job ({stats['updated']} frissítve, {stats['skipped']} kulcspont nélkül, "
+        f"{stats['failed']} hibás), {stats['jobs_per_sec']} job/s"
+    )
+    return stats
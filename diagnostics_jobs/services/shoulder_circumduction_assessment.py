@@ -1,13 +1,15 @@
 import logging
 import numpy as np
-from typing import List, Dict, Any
+from typing import Dict, Any
 from decimal import Decimal
 
 # Importáljuk a szükséges geometriai függvényeket
-from diagnostics.utils.geometry import calculate_angle_3d, get_landmark_coords, calculate_horizontal_tilt
-from diagnostics.utils.mediapipe_processor import process_video_with_mediapipe
+from diagnostics.utils.geometry import calculate_angle_3d
+from diagnostics.utils import kinematics
+from diagnostics.utils.mediapipe_processor import extract_pose_sequence
 from diagnostics.utils.snapshot_manager import save_snapshot_to_gcs
 from diagnostics_jobs.utils import get_local_video_path
+from diagnostics.utils.video_download import cleanup_local_video
 from diagnostics_jobs.services.base_service import BaseDiagnosticService
 from diagnostics_jobs.services.utils.anthropometry_loader import get_user_anthropometry_data
 from general_results.models import ShoulderCircumductionResult # ❗ Ezt a Modelt még létre kell hozni!
@@ -25,16 +27,27 @@ def _calculate_trunk_tilt(shoulder: np.ndarray, hip: np.ndarray) -> float:
     return 180.0 - angle
 
 
+# Az elemzéshez használt landmarkok sorrendje a kinematics.gather tömbben
+SHOULDER_LANDMARKS = [
+    'left_shoulder', 'left_elbow', 'left_wrist', 'left_hip',
+    'right_shoulder', 'right_elbow', 'right_wrist', 'right_hip',
+]
+L_SHOULDER, L_ELBOW, L_WRIST, L_HIP, R_SHOULDER, R_ELBOW, R_WRIST, R_HIP = range(8)
+
+
 class ShoulderCircumductionService(BaseDiagnosticService):
     """
     Vállkörzés elemzés (ROM, lapocka kontroll, szimmetria, kompenzáció).
     """
 
+    SCORING_VERSION = 1
+    RESULT_MODEL = ShoulderCircumductionResult
+
     
     def run_analysis(self):
         job = self.job
         self.log(f"▶️ Vállkörzés Assessment indítása job_id={job.id}")
-        video_path = get_local_video_path(job.video_url)
+        video_path = get_local_video_path(job.video_url, job_id=job.id, streaming=True)
 
         try:
             # 0️⃣ Kalibráció
@@ -46,49 +59,32 @@ class ShoulderCircumductionService(BaseDiagnosticService):
             self.log(f"Kalibrációs faktor (általános/felsőtest): {general_factor:.4f}")
 
             # 1️⃣ Videó feldolgozása MediaPipe-pal
-            raw_keypoints, skeleton_video_path, keyframes = process_video_with_mediapipe(
+            pose_sequence = extract_pose_sequence(
                 video_path, 
                 job.job_type,
                 calibration_factor=general_factor,
             )
-            self.log(f"MediaPipe feldolgozás kész, {len(raw_keypoints)} frame elemzve.")
+            self.log(f"MediaPipe feldolgozás kész, {len(pose_sequence)} frame elemzve.")
 
             # 2️⃣ Elemzés
-            analysis = self._analyze_shoulder_circumduction(raw_keypoints, job, general_factor, leg_factor)
+            analysis = self._analyze_shoulder_circumduction(pose_sequence, job, general_factor, leg_factor)
             analysis["video_analysis_done"] = True
-            analysis["skeleton_video_local_path"] = skeleton_video_path
+            self.pose_sequence = pose_sequence  # A skeleton videót a renderelő task készíti el belőle
             
-            # ⚠️ JSON-hiba Javítás: Tisztítjuk a keyframes-t
-            cleaned_keyframes = []
-            for frame in keyframes:
-                cleaned_frame = frame.copy()
-                if 'frame_image' in cleaned_frame:
-                    del cleaned_frame['frame_image'] 
-                for k, v in cleaned_frame.items():
-                    if isinstance(v, np.ndarray):
-                        cleaned_frame[k] = v.tolist()
-                cleaned_keyframes.append(cleaned_frame)
-
-            analysis["keyframes"] = cleaned_keyframes
+            # A keyframes JSON lista a PoseSequence-ből készül (képadat nélkül)
+            analysis["keyframes"] = pose_sequence.to_keyframes()
             analysis["calibration_used"] = bool(anthro)
             analysis["general_calibration_factor"] = round(general_factor, 5)
             analysis["leg_calibration_factor"] = round(leg_factor, 5)
             
             # 🆕 3️⃣ AZ EREDMÉNY MENTÉSE ----------------
-            # Kinyerjük a fő metrikákat
-            overall_score = analysis.get('overall_score', 0.0)
-            max_rom_left = analysis.get('max_elevation_angle_left', 0.0)
-            max_rom_right = analysis.get('max_elevation_angle_right', 0.0)
-            
             ShoulderCircumductionResult.objects.create(
                 user=job.user,
                 job=job,
                 created_at=job.created_at,
                 
-                # Konvertálás Decimal-ra
-                overall_score=Decimal(str(overall_score)),
-                max_rom_left=Decimal(str(max_rom_left)),
-                max_rom_right=Decimal(str(max_rom_right)),
+                # A fő metrikák Decimal-ra konvertálva
+                **self.result_row_values(analysis),
 
                 # Az összes elemzési adat mentése JSON-ként
                 raw_json_metrics=analysis,
@@ -102,89 +98,52 @@ class ShoulderCircumductionService(BaseDiagnosticService):
             self.log(f"❌ Vállkörzés Assessment hiba job_id={job.id}: {e}")
             return {"error": f"Elemzés hiba: {e}", "video_analysis_done": False}
 
-    
-    def _analyze_shoulder_circumduction(self, raw_keypoints: List[Dict[str, Any]], job, general_factor: float, leg_factor: float) -> Dict[str, Any]:
-        """A vállkörzés elemzésének futtatása (ROM, kontroll, kompenzáció)."""
-        
-        # 1. Metrikák inicializálása
-        max_elevation_l, max_elevation_r = 0.0, 0.0
-        max_asymmetry = 0.0
-        max_tilt_l, max_tilt_r = 0.0, 0.0 # Törzs aszimmetria/kompenzáció
-        max_elevation_frame_l, max_elevation_frame_r = None, None
-        
-        elevation_angles_l, elevation_angles_r = [], []
-        tilt_angles = []
-
-        # 2. Frame-enkénti elemzés
-        for frame_data in raw_keypoints:
-            # Kulcspontok beolvasása (FONTOS: r_elbow, r_wrist hozzáadva!)
-            l_shoulder = get_landmark_coords(frame_data, 'left_shoulder')
-            l_elbow = get_landmark_coords(frame_data, 'left_elbow')
-            l_wrist = get_landmark_coords(frame_data, 'left_wrist')
-            l_hip = get_landmark_coords(frame_data, 'left_hip')
-            
-            r_shoulder = get_landmark_coords(frame_data, 'right_shoulder')
-            r_elbow = get_landmark_coords(frame_data, 'right_elbow') # 🆕 Ezt a sort felejtettük ki!
-            r_wrist = get_landmark_coords(frame_data, 'right_wrist') # 🆕 Ez is szükséges
-            r_hip = get_landmark_coords(frame_data, 'right_hip')
-            
-            # Skálázás (az egyszerűség kedvéért kihagyom, de a kódodban benne van a ciklus)
-            # ❗ Fontos: A kalibrálás miatt a get_landmark_coords-nak is NumPy tömböt kellene visszaadnia, ha kalibrálunk! 
-            # Az eredeti kódban a ciklusban konvertáltál np.array-re, itt feltételezzük, hogy a kapott adatok már NumPy-k.
-
-            # Váll eleváció számítás (Ha a nézet frontális, akkor a kar-törzs szög kell)
-            if all(p is not None for p in [l_shoulder, l_hip, l_wrist]):
-                # A váll eleváció szögét (humerus a törzshöz képest) itt hip-shoulder-wrist szögként becsüljük, 
-                # vagy a törzs függőlegeséhez képest. Használjuk a Hip-Shoulder-Elbow szögét, ha van könyök adat.
-                
-                # Feltételezve, hogy a 'calculate_angle_3d' a törzset veszi referenciának:
-                # Váll eleváció: hip - shoulder - elbow/wrist
-                # Mivel 2D frontális (legtöbbször), feltételezzük, hogy a 'vertical_ref' a hip felett van:
-                vertical_ref = np.array([l_shoulder[0], l_shoulder[1] + 100, l_shoulder[2]]) 
-                
-                # ❗ Megjegyzés: Vállkörzésnél az eleváció szögét a törzs hosszanti tengelyéhez képest mérik!
-                # Itt most a vállkörzés frontális nézetből történik. Használjunk egy leegyszerűsített tengelyt.
-                
-                # Törzs referencia: hip - shoulder (hosszanti tengely)
-                # Kar referencia: shoulder - elbow/wrist
-                # A legegyszerűbb, ha a Y tengelyhez viszonyítjuk az elevációt (180 - szög)
-                
-                if l_elbow is not None:
-                     l_elev_angle = calculate_angle_3d(l_hip, l_shoulder, l_elbow) # Hip-Shoulder-Elbow szög
-                     l_elev_angle_deg = 180.0 - l_elev_angle # Kb. a törzshöz képesti eleváció
-                else: # Ha nincs könyök (vagy csukló)
-                     l_elev_angle_deg = 0.0 # Képtelenség számolni
-                     
-                elevation_angles_l.append(l_elev_angle_deg)
-                if l_elev_angle_deg > max_elevation_l:
-                    max_elevation_l, max_elevation_frame_l = l_elev_angle_deg, frame_data
-            
-            # Jobb oldal
-                if all(p is not None for p in [r_hip, r_shoulder, r_elbow]):
-                    # Ugyanaz a számítási logika, mint a bal oldalon
-                    r_elev_angle = calculate_angle_3d(r_hip, r_shoulder, r_elbow)
-                    r_elev_angle_deg = 180.0 - r_elev_angle
-                 
-                    elevation_angles_r.append(r_elev_angle_deg)
-                    if r_elev_angle_deg > max_elevation_r:
-                        max_elevation_r, max_elevation_frame_r = r_elev_angle_deg, frame_data
-                else:
-                 # Ha hiányzik a kulcspont, nulla szöget veszünk fel, de ez nem befolyásolja a max_elevation_r-t,
-                 # mert az eleve 0.0-ról indul.
-                    elevation_angles_r.append(0.0)
-                    if r_elev_angle_deg > max_elevation_r:
-                        max_elevation_r, max_elevation_frame_r = r_elev_angle_deg, frame_data
-
-
-            # Törzs Kompenzáció (Pl. Törzsdőlés aszimmetria frontális nézetből)
-            if all(p is not None for p in [l_shoulder, r_shoulder, l_hip, r_hip]):
-                current_tilt = calculate_horizontal_tilt(l_shoulder, r_shoulder) # Válldőlés
-                tilt_angles.append(current_tilt)
-                if abs(current_tilt) > abs(max_asymmetry):
-                    max_asymmetry = current_tilt
+        finally:
+            # 🗑 Letöltött videó törlése
+            cleanup_local_video(video_path)
+
+    @staticmethod
+    def result_row_values(result: dict) -> dict:
+        return {
+            "overall_score": Decimal(str(result.get('overall_score', 0.0))),
+            "max_rom_left": Decimal(str(result.get('max_elevation_angle_left', 0.0))),
+            "max_rom_right": Decimal(str(result.get('max_elevation_angle_right', 0.0))),
+        }
+
+    def rescore(self, pose_sequence, previous_result: dict) -> dict:
+        general_factor = float(previous_result.get("general_calibration_factor", 1.0) or 1.0)
+        leg_factor = float(previous_result.get("leg_calibration_factor", 1.0) or 1.0)
+        analysis = self._analyze_shoulder_circumduction(pose_sequence, self.job, general_factor, leg_factor)
+        return self.merge_rescored(previous_result, analysis)
+
+    def _analyze_shoulder_circumduction(self, pose_sequence, job, general_factor: float, leg_factor: float) -> Dict[str, Any]:
+        """A vállkörzés elemzésének futtatása (ROM, kontroll, kompenzáció) – az összes frame-re egyszerre."""
+        pose_sequence = kinematics.ensure_pose_sequence(pose_sequence)
+
+        # 1. Kulcspontok beolvasása: (frames, 8, 3) koordináták + (frames, 8) láthatóság
+        coords, visible = kinematics.gather(pose_sequence.keypoints, SHOULDER_LANDMARKS)
+
+        # 2. Váll eleváció: 180° - (hip, shoulder, elbow) szög, a törzshöz képesti eleváció közelítése
+        # ❗ Megjegyzés: Vállkörzésnél az eleváció szögét a törzs hosszanti tengelyéhez képest mérik!
+        # A bal oldal csak akkor számít, ha váll, csípő és csukló látható; könyök nélkül 0°.
+        left_ok = visible[:, [L_SHOULDER, L_HIP, L_WRIST]].all(axis=1)
+        l_elev = 180.0 - kinematics.joint_angles(coords[:, L_HIP], coords[:, L_SHOULDER], coords[:, L_ELBOW])
+        l_elev = np.where(visible[:, L_ELBOW], l_elev, 0.0)
+        max_elevation_l, max_elevation_row_l = kinematics.running_extreme(l_elev, mask=left_ok, initial=0.0)
+
+        # Jobb oldal (a korábbi logika szerint csak a bal oldali feltétel teljesülésekor értékeljük;
+        # hiányzó pont esetén 0° került a listába, ami a maximumot nem befolyásolja)
+        right_ok = left_ok & visible[:, [R_HIP, R_SHOULDER, R_ELBOW]].all(axis=1)
+        r_elev = 180.0 - kinematics.joint_angles(coords[:, R_HIP], coords[:, R_SHOULDER], coords[:, R_ELBOW])
+        max_elevation_r, max_elevation_row_r = kinematics.running_extreme(r_elev, mask=right_ok, initial=0.0)
+
+        # Törzs Kompenzáció (Pl. Törzsdőlés aszimmetria frontális nézetből)
+        tilt_ok = visible[:, [L_SHOULDER, R_SHOULDER, L_HIP, R_HIP]].all(axis=1)
+        tilt_angles = kinematics.horizontal_tilts(coords[tilt_ok, L_SHOULDER], coords[tilt_ok, R_SHOULDER]) # Válldőlés
+        max_asymmetry, _ = kinematics.running_extreme(tilt_angles, initial=0.0, mode="absmax")
 
         # 3. Pontozás (a melléklet alapján)
-        avg_asymmetry = np.mean(np.abs(tilt_angles)) if tilt_angles else 0.0
+        avg_asymmetry = np.mean(np.abs(tilt_angles)) if tilt_angles.size else 0.0
         
         # ROM score (Mobilitás - 35p)
         max_rom_avg = (max_elevation_l + max_elevation_r) / 2.0
@@ -223,8 +182,10 @@ class ShoulderCircumductionService(BaseDiagnosticService):
 
         # 5. Snapshotok
         # Snapshot mentése a bal/jobb maximális mobilitási pontoknál
-        snapshot_url_l = save_snapshot_to_gcs(max_elevation_frame_l["frame_image"], job, "max_elevation_l") if max_elevation_frame_l and "frame_image" in max_elevation_frame_l else None
-        snapshot_url_r = save_snapshot_to_gcs(max_elevation_frame_r["frame_image"], job, "max_elevation_r") if max_elevation_frame_r and "frame_image" in max_elevation_frame_r else None
+        image_l = kinematics.frame_image_at(pose_sequence, max_elevation_row_l)
+        image_r = kinematics.frame_image_at(pose_sequence, max_elevation_row_r)
+        snapshot_url_l = save_snapshot_to_gcs(image_l, job, "max_elevation_l") if image_l is not None else None
+        snapshot_url_r = save_snapshot_to_gcs(image_r, job, "max_elevation_r") if image_r is not None else None
 
 
         return {
@@ -5,21 +5,16 @@ import json
 import os
 from diagnostics_jobs.models import DiagnosticJob
 from diagnostics_jobs.services.base_service import BaseDiagnosticService
-from diagnostics.utils.mediapipe_processor import process_video_with_mediapipe
+from diagnostics.utils.mediapipe_processor import extract_pose_sequence
 # Fontos: A BaseDiagnosticService-ben feltételezzük, hogy a szükséges segédosztályok (pl. geometry, snapshot_manager) már importálva vannak
 # A példa tisztasága kedvéért a BaseService-re támaszkodunk.
 
-from diagnostics.utils.geometry import (
-    get_landmark_coords, 
-    calculate_horizontal_tilt, 
-    calculate_angle_3d,
-    calculate_distance_3d,
-    calculate_midpoint_3d
-)
+from diagnostics.utils import kinematics
 import numpy as np
 from diagnostics_jobs.services.utils.anthropometry_loader import get_user_anthropometry_data
 from diagnostics_jobs.utils import get_local_video_path
-from diagnostics.utils.snapshot_manager import upload_file_to_gcs, save_snapshot_to_gcs
+from diagnostics.utils.video_download import cleanup_local_video
+from diagnostics.utils.snapshot_manager import save_snapshot_to_gcs
 
 logger = logging.getLogger(__name__)
 
@@ -29,6 +24,9 @@ class SingleLegStanceAssessmentService(BaseDiagnosticService):
     Vizsgálja a medence, térd és boka stabilitását (SINGLE_LEG_STANCE_LEFT/RIGHT).
     """
 
+    # Nincs külön general_results tábla: csak a DiagnosticJob.result frissül újrapontozáskor
+    SCORING_VERSION = 1
+
     def run_analysis(self):
         job = self.job
         logger.info(f"Feldolgozás elindítva a job: {job.id} számára")
@@ -53,12 +51,12 @@ class SingleLegStanceAssessmentService(BaseDiagnosticService):
         
         # 🆕 ÚJ: EREDMÉNY KULCS ÉS FÁJLNÉV UTÓTAG MEGHATÁROZÁSA
         video_result_key = f"skeleton_video_{side_to_analyze}_url" # Pl: skeleton_video_left_url
-        unique_filename = f"skeleton_video_{side_to_analyze}.avi" # Pl: skeleton_video_left.avi
+        unique_filename = f"skeleton_video_{side_to_analyze}.mp4" # Pl: skeleton_video_left.mp4
         
         # 2. Videó letöltése és MediaPipe feldolgozás
         # ❌ EREDETI: local_video_path = self.download_video()
         # ✅ JAVÍTVA: Használjuk a standard utility függvényt
-        local_video_path = get_local_video_path(job.video_url) 
+        local_video_path = get_local_video_path(job.video_url, job_id=job.id, streaming=True) 
         
         if not local_video_path:
             # ❗ Ez most a get_local_video_path függvény hibáját jelzi
@@ -67,52 +65,35 @@ class SingleLegStanceAssessmentService(BaseDiagnosticService):
 
         # Végigfut a videón és visszaadja a teljes landmark adatokat minden frame-re
         # 🟢 Fő skálázáshoz az általános faktort használjuk
-        all_landmarks, skeleton_path, keyframes = process_video_with_mediapipe(
-            local_video_path, 
-            job.job_type,
-            calibration_factor=general_factor,
-        ) 
-        
-        if not all_landmarks:
+        try:
+            pose_sequence = extract_pose_sequence(
+                local_video_path, 
+                job.job_type,
+                calibration_factor=general_factor,
+            ) 
+        finally:
+            # 🗑 Letöltött videó törlése (a további lépések már csak a kulcspontokat használják)
+            cleanup_local_video(local_video_path)
+        if len(pose_sequence) == 0:
             self.fail_job("Nincs detektálható landmark a videóban.")
             return {}
 
         # 3. Biomechanikai számítások
         # 🟢 Átadjuk mindkét faktort
         analysis_result, video_summary = self._calculate_sls_metrics(
-            all_landmarks, 
+            pose_sequence, 
             is_left_stance, 
             general_factor, 
             leg_factor
         )
         
         # 4. Kép/videó előállítás
-        # ❌ HIBÁS: skeleton_video_url = self.create_skeleton_video(local_video_path, all_landmarks)
-        # 🟢 JAVÍTOTT: Feltöltjük a MediaPipe által generált videót (skeleton_path)
+        # 🟢 A skeleton videót a run_diagnostic_job után a renderelő task készíti el és tölti fel
+        # (jobs/<id>/skeleton/skeleton_video_<side>.mp4), az URL a video_result_key alá kerül.
+        self.pose_sequence = pose_sequence
+        self.skeleton_video_result_key = video_result_key
+        self.skeleton_video_file_name = unique_filename
         skeleton_video_url = None
-        # Feltételezzük, hogy a BaseDiagnosticService-ből megöröklődik egy upload_file_to_gcs nevű metódus:
-        # Ha a BaseService-ből öröklődik az upload_file:
-        try:
-            if skeleton_path and os.path.exists(skeleton_path):
-                logger.info(f"📤 Skeleton videó feltöltése GCS-re: {skeleton_path}")
-                
-                # 🟢 JAVÍTÁS 1: A GCS célútvonal oldalspecifikussá tétele
-                # Így lesz: media/dev/jobs/173/skeleton_video_left.avi
-                # ÉS: media/dev/jobs/174/skeleton_video_right.avi
-                gcs_destination = f"media/dev/jobs/{job.id}/{unique_filename}" 
-                
-                skeleton_video_url = upload_file_to_gcs( 
-                    local_file_path=skeleton_path, 
-                    gcs_destination=gcs_destination
-                )
-                logger.info(f"✅ Skeleton videó feltöltve: {skeleton_video_url}")
-            else:
-                logger.error(f"❌ A skeleton videó nem létezik: {skeleton_path}")
-                skeleton_video_url = None
-                
-        except Exception as e:
-            logger.error(f"❌ Skeleton videó feltöltési hiba: {e}", exc_info=True)
-            skeleton_video_url = None
 
         # Snapshot feltöltése a leginstabilabb frame-ről
         # ❌ HIBÁS: worst_frame_snapshot_url = self.upload_snapshot(...)
@@ -126,15 +107,15 @@ class SingleLegStanceAssessmentService(BaseDiagnosticService):
         worst_frame_index = video_summary.get('worst_frame_index', 0)
         
         if worst_frame_index > 0:
-            # 💡 LOGIKAI KORREKCIÓ: A MediaPipe által generált keyframes-ből kikeressük a képadatot
-            worst_frame_data = next((k for k in keyframes if k.get('frame_index', -1) == worst_frame_index), None)
+            # 💡 LOGIKAI KORREKCIÓ: A PoseSequence-hez eltárolt képekből kikeressük a képadatot
+            worst_frame_image = pose_sequence.frame_images.get(worst_frame_index)
             
-            # Ha van kép adat ('frame_image' kulcs alatt) a kiválasztott frame-hez:
-            if worst_frame_data and worst_frame_data.get('frame_image') is not None:
+            # Ha van kép adat a kiválasztott frame-hez:
+            if worst_frame_image is not None:
                 try:
                     # 🟢 HELYES HÍVÁS: A kinyert frame-et (NumPy array) adjuk át a save_snapshot_to_gcs-nek
                     worst_frame_snapshot_url = save_snapshot_to_gcs(
-                        frame_image=worst_frame_data['frame_image'],
+                        frame_image=worst_frame_image,
                         job=job,
                         label=f"sls_worst_{side_to_analyze}"
                     )
@@ -146,27 +127,9 @@ class SingleLegStanceAssessmentService(BaseDiagnosticService):
         # 🟢 JAVÍTÁS: Biztonságos kulcshozzáférés a .get() metódusokkal, 
         # hogy ha egy kulcs hiányzik, ne szakadjon meg a program.
         
-        # 1. Biztonságos hozzáférés a 'scoring_breakdown'-hoz (alapértelmezett: üres szótár {})
-        scoring_breakdown = analysis_result.get("scoring_breakdown", {})
-        
         final_result = {
-            # Biztonságos hozzáférés a fő kulcsokhoz
-            "overall_score": analysis_result.get("overall_score", 0),
-            "stability_score": analysis_result.get("stability_score", 0),
-            "pelvic_control_score": analysis_result.get("pelvic_control_score", 0),
-            "knee_ankle_score": analysis_result.get("knee_ankle_score", 0),
-            
-            # Biztonságos hozzáférés a 'scoring_breakdown' belsejében lévő kulcsokhoz
-            "time_score": scoring_breakdown.get('Kitartás idő', 0),
-            "symmetry_score": scoring_breakdown.get('Szimetriaviszony', 0),
-            
-            # További kulcsok biztonságosan
-            "max_pelvic_drop_angle": analysis_result.get("max_pelvic_drop_angle", 0), 
-            "max_knee_valgus_angle": analysis_result.get("max_knee_valgus_angle", 0), 
+            **self._score_fields(analysis_result),
             "side": side_to_analyze,
-            
-            # 🆕 ÚJ: A generált visszajelzések
-            "feedback_list": analysis_result.get("feedback_list", []),
             video_result_key: skeleton_video_url,
             "worst_frame_snapshot_url": worst_frame_snapshot_url,
             # 🆕 ÚJ: Kalibrációs adatok mentése
@@ -188,88 +151,88 @@ class SingleLegStanceAssessmentService(BaseDiagnosticService):
 
         return final_result
 
-    def _calculate_sls_metrics(self, all_landmarks: list[dict], is_left_stance: bool, general_factor: float, leg_factor: float) -> tuple[dict, dict]:
-        """A stabilitás, medencekontroll és térd/boka stabilitási metrikák kiszámítása."""
+    @staticmethod
+    def _score_fields(analysis_result: dict) -> dict:
+        """A job eredmény pontozott mezői (a run_analysis és az újrapontozás közös része)."""
+        # Biztonságos hozzáférés a 'scoring_breakdown'-hoz (alapértelmezett: üres szótár {})
+        scoring_breakdown = analysis_result.get("scoring_breakdown", {})
+        return {
+            # Biztonságos hozzáférés a fő kulcsokhoz
+            "overall_score": analysis_result.get("overall_score", 0),
+            "stability_score": analysis_result.get("stability_score", 0),
+            "pelvic_control_score": analysis_result.get("pelvic_control_score", 0),
+            "knee_ankle_score": analysis_result.get("knee_ankle_score", 0),
+
+            # Biztonságos hozzáférés a 'scoring_breakdown' belsejében lévő kulcsokhoz
+            "time_score": scoring_breakdown.get('Kitartás idő', 0),
+            "symmetry_score": scoring_breakdown.get('Szimetriaviszony', 0),
+
+            # További kulcsok biztonságosan
+            "max_pelvic_drop_angle": analysis_result.get("max_pelvic_drop_angle", 0),
+            "max_knee_valgus_angle": analysis_result.get("max_knee_valgus_angle", 0),
+
+            # 🆕 ÚJ: A generált visszajelzések
+            "feedback_list": analysis_result.get("feedback_list", []),
+        }
+
+    def rescore(self, pose_sequence, previous_result: dict) -> dict:
+        general_factor = float(previous_result.get("general_calibration_factor", 1.0) or 1.0)
+        leg_factor = float(previous_result.get("leg_calibration_factor", 1.0) or 1.0)
+        is_left_stance = "LEFT" in self.job.job_type
+        analysis_result, _ = self._calculate_sls_metrics(pose_sequence, is_left_stance, general_factor, leg_factor)
+        return self.merge_rescored(previous_result, self._score_fields(analysis_result))
+
+    def _calculate_sls_metrics(self, pose_sequence, is_left_stance: bool, general_factor: float, leg_factor: float) -> tuple[dict, dict]:
+        """A stabilitás, medencekontroll és térd/boka stabilitási metrikák kiszámítása (az összes frame-re egyszerre)."""
+        pose_sequence = kinematics.ensure_pose_sequence(pose_sequence)
         
         # 🆕 KALIBRÁCIÓ KORREKCIÓS TÉNYEZŐ SZÁMÍTÁSA (EGYSZER)
         correction_factor = leg_factor / general_factor if general_factor and general_factor != 0 else leg_factor
 
-        # Metrika gyűjtők
-        pelvic_drop_angles = []
-        knee_valgus_angles = []
-        stance_ankle_sway_corrected = [] # 🆕 Korrigált pontokat fog tárolni
-        
         # Landmark nevek a támaszkodó oldalhoz
         side_prefix = "left" if is_left_stance else "right"
         opp_prefix = "right" if is_left_stance else "left"
         
-        # A támaszkodó oldal ízületei
-        stance_hip = f'{side_prefix}_hip'
-        stance_knee = f'{side_prefix}_knee'
-        stance_ankle = f'{side_prefix}_ankle'
-        stance_foot_index = f'{side_prefix}_foot_index'
-        
-        # Az ellentétes (szabad) oldal ízületei
-        opp_hip = f'{opp_prefix}_hip'
+        # A támaszkodó oldal ízületei + az ellentétes (szabad) oldal csípője
+        landmark_names = [
+            f'{side_prefix}_hip',
+            f'{side_prefix}_knee',
+            f'{side_prefix}_ankle',
+            f'{side_prefix}_foot_index',
+            f'{opp_prefix}_hip',
+        ]
+
+        # 1. Alsótest pontok kinyerése és KORREKCIÓJA (F_leg skálázás) – (frames, 5, 3)
+        coords, visible = kinematics.gather(pose_sequence.keypoints, landmark_names)
+        coords = kinematics.apply_correction(coords, correction_factor)
+        p_stance_hip, p_stance_knee, p_stance_ankle, p_opp_hip = coords[:, 0], coords[:, 1], coords[:, 2], coords[:, 4]
+
+        # --- 1.1 Medence Dőlés (Pelvic Drop) - KORRIGÁLT pontokkal ---
+        pelvis_ok = visible[:, 0] & visible[:, 4]
+        if is_left_stance:
+            drop_angles = kinematics.horizontal_tilts(p_stance_hip[pelvis_ok], p_opp_hip[pelvis_ok])
+        else:
+            drop_angles = kinematics.horizontal_tilts(p_opp_hip[pelvis_ok], p_stance_hip[pelvis_ok])
+        pelvic_drop_angles = np.abs(drop_angles)
+
+        # --- 1.2 Térd Valgus (Knee Valgus/Varus) - KORRIGÁLT pontokkal ---
+        knee_ok = visible[:, 0:3].all(axis=1)
+        knee_angles = kinematics.joint_angles(p_stance_hip[knee_ok], p_stance_knee[knee_ok], p_stance_ankle[knee_ok])
+        # fmax: a NaN szög (nulla hosszú vektor) 0-ra esik, mint a korábbi max(0.0, ...) hívásnál
+        knee_valgus_angles = np.fmax(180.0 - knee_angles, 0.0)
+
+        # --- 1.3 Stabilitás / Boka Billegés (Ankle Sway) - KORRIGÁLT pontokkal ---
+        sway_points = p_stance_ankle[visible[:, 2]]
 
-        # 1. Metrikák számítása frame-enként
-        for i, frame_data in enumerate(all_landmarks):
-            # world_landmarks = frame_data.get('world_landmarks', [])
-            
-            # --- Alsótest pontok kinyerése és KORREKCIÓJA (F_leg skálázás) ---
-            
-            # A támaszkodó oldal ízületei
-            p_stance_hip = get_landmark_coords(frame_data, stance_hip)
-            p_stance_knee = get_landmark_coords(frame_data, stance_knee)
-            p_stance_ankle = get_landmark_coords(frame_data, stance_ankle)
-            p_stance_foot = get_landmark_coords(frame_data, stance_foot_index)
-            
-            # Az ellentétes (szabad) oldal ízületei
-            p_opp_hip = get_landmark_coords(frame_data, opp_hip) # 🟢 JAVÍTVA       
-            
-            lower_body_coords = [
-                p_stance_hip, p_stance_knee, p_stance_ankle, p_stance_foot, p_opp_hip
-            ]
-
-            corrected_coords = []
-            for p in lower_body_coords:
-                if p is not None:
-                    # 🔹 Alkalmazzuk a korrekciós faktort (F_leg / F_general)
-                    corrected_coords.append(np.array(p) * correction_factor)
-                else:
-                    corrected_coords.append(None)
-            
-            [p_stance_hip, p_stance_knee, p_stance_ankle, p_stance_foot, p_opp_hip] = corrected_coords
-            
-            # --- 1.1 Medence Dőlés (Pelvic Drop) - KORRIGÁLT pontokkal ---
-            if p_stance_hip is not None and p_opp_hip is not None:
-                # ... (calculate_horizontal_tilt hívás VÁLTOZATLAN, de a pontok korrigáltak)
-                drop_angle = calculate_horizontal_tilt(p_left=p_stance_hip, p_right=p_opp_hip) \
-                             if is_left_stance else \
-                             calculate_horizontal_tilt(p_left=p_opp_hip, p_right=p_stance_hip)
-                pelvic_drop_angles.append(abs(drop_angle))
-
-            # --- 1.2 Térd Valgus (Knee Valgus/Varus) - KORRIGÁLT pontokkal ---
-            if p_stance_hip is not None and p_stance_knee is not None and p_stance_ankle is not None:
-                # ... (calculate_angle_3d hívás VÁLTOZATLAN, de a pontok korrigáltak)
-                knee_angle = calculate_angle_3d(p_stance_hip, p_stance_knee, p_stance_ankle)
-                valgus_dev = 180.0 - knee_angle
-                knee_valgus_angles.append(max(0.0, valgus_dev))
-
-            # --- 1.3 Stabilitás / Boka Billegés (Ankle Sway) - KORRIGÁLT pontokkal ---
-            if p_stance_ankle is not None:
-                stance_ankle_sway_corrected.append(p_stance_ankle) # 🆕 Korrigált pontok gyűjtése
-            
         # 2. Összegzés / Maximumok és Szórások számítása
         
         # Medencekontroll metrikák
-        max_pelvic_drop = np.max(pelvic_drop_angles) if pelvic_drop_angles else 0.0
+        max_pelvic_drop = np.max(pelvic_drop_angles) if pelvic_drop_angles.size else 0.0
         
         # Térd-boka metrikák
-        max_knee_valgus_dev = np.max(knee_valgus_angles) if knee_valgus_angles else 0.0
+        max_knee_valgus_dev = np.max(knee_valgus_angles) if knee_valgus_angles.size else 0.0
         
         # Stabilitás metrikák (A billegés/sway metrikája a szórás)
-        sway_points = np.array(stance_ankle_sway_corrected)
         sway_amplitude = 0.0
         if sway_points.size > 0:
             # Csak az X (oldalra) és Z (előre/hátra) mozgás érdekes
@@ -281,7 +244,7 @@ class SingleLegStanceAssessmentService(BaseDiagnosticService):
             "max_pelvic_drop_deg": float(max_pelvic_drop),
             "max_knee_valgus_deg": float(max_knee_valgus_dev),
             "ankle_sway_amplitude": float(sway_amplitude),
-            "stance_time_sec": len(all_landmarks) / 30, # Feltételezett 30 FPS
+            "stance_time_sec": len(pose_sequence) / 30, # Feltételezett 30 FPS
             # Ide kell bejönnie a leginstabilabb frame számításának is (pl. ahol a legnagyobb az eltérés a boka pozíciójában)
         }
         
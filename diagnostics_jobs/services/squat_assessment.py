@@ -1,12 +1,13 @@
 import logging
 import numpy as np
-from typing import List, Dict, Any
+from typing import Dict, Any
 from decimal import Decimal
 
-from diagnostics.utils.geometry import calculate_angle_3d, get_landmark_coords
-from diagnostics.utils.mediapipe_processor import process_video_with_mediapipe
+from diagnostics.utils import kinematics
+from diagnostics.utils.mediapipe_processor import extract_pose_sequence
 from diagnostics.utils.snapshot_manager import save_snapshot_to_gcs
 from diagnostics_jobs.utils import get_local_video_path
+from diagnostics.utils.video_download import cleanup_local_video
 from diagnostics_jobs.services.base_service import BaseDiagnosticService
 from diagnostics_jobs.services.utils.anthropometry_loader import get_user_anthropometry_data
 from general_results.models import SquatAssessmentResult
@@ -14,11 +15,9 @@ from general_results.models import SquatAssessmentResult
 logger = logging.getLogger(__name__)
 
 
-def _calculate_trunk_lean(shoulder: np.ndarray, hip: np.ndarray) -> float:
-    """Törzsdőlés szögének becslése (csípő és váll alapján)."""
-    vertical_ref = np.array([hip[0], hip[1] + 100, hip[2]])
-    angle = calculate_angle_3d(shoulder, hip, vertical_ref)
-    return 180.0 - angle
+# Az elemzéshez használt landmarkok (alsótest: F_leg korrekcióval)
+LOWER_BODY = ['left_hip', 'left_knee', 'left_ankle', 'right_hip', 'right_knee', 'right_ankle']
+SHOULDERS = ['left_shoulder', 'right_shoulder']
 
 
 class SquatAssessmentService(BaseDiagnosticService):
@@ -27,11 +26,14 @@ class SquatAssessmentService(BaseDiagnosticService):
     térdszög, törzsdőlés, mozgáskontroll.
     """
 
+    SCORING_VERSION = 1
+    RESULT_MODEL = SquatAssessmentResult
+
     
     def run_analysis(self):
         job = self.job
         self.log(f"▶️ Squat Assessment indítása job_id={job.id}")
-        video_path = get_local_video_path(job.video_url)
+        video_path = get_local_video_path(job.video_url, job_id=job.id, streaming=True)
 
         try:
             # 0️⃣ Kalibráció betöltése
@@ -42,37 +44,24 @@ class SquatAssessmentService(BaseDiagnosticService):
             self.log(f"Kalibrációs faktor (láb-specifikus/elemzés): {leg_factor:.4f}")
 
             # 1️⃣ Videó feldolgozása MediaPipe-pal
-            raw_keypoints, skeleton_video_path, keyframes = process_video_with_mediapipe(
+            pose_sequence = extract_pose_sequence(
                 video_path, 
                 job.job_type,
                 # 🟢 KRITIKUS JAVÍTÁS: Átadjuk a kalibrációs faktort
                 calibration_factor=general_factor, 
             )
-            self.log(f"MediaPipe feldolgozás kész, {len(raw_keypoints)} frame elemzve.")
+            self.log(f"MediaPipe feldolgozás kész, {len(pose_sequence)} frame elemzve.")
 
             # 2️⃣ Elemzés
-            analysis = self._analyze_squat(raw_keypoints, job, general_factor, leg_factor)
+            analysis = self._analyze_squat(pose_sequence, job, general_factor, leg_factor)
             analysis["video_analysis_done"] = True
-            analysis["skeleton_video_local_path"] = skeleton_video_path
+            self.pose_sequence = pose_sequence  # A skeleton videót a renderelő task készíti el belőle
 
             # -------------------------------------------------------------------
             # ✅ KRITIKUS JAVÍTÁS: A keyframes listából eltávolítjuk a nagy (NumPy) képadatokat
             # -------------------------------------------------------------------
-            cleaned_keyframes = []
-            for frame in keyframes:
-                # Másolat készítése és a nyers, nem JSON-kompatibilis képadat eltávolítása
-                cleaned_frame = frame.copy()
-                if 'frame_image' in cleaned_frame:
-                    del cleaned_frame['frame_image'] 
-
-                # Biztonsági konverzió: Minden megmaradt NumPy tömböt konvertálunk listává
-                for k, v in cleaned_frame.items():
-                    if isinstance(v, np.ndarray):
-                        cleaned_frame[k] = v.tolist()
-
-                cleaned_keyframes.append(cleaned_frame)
-
-            analysis["keyframes"] = cleaned_keyframes # ⬅️ A TISZTÍTOTT LISTA!
+            # A keyframes JSON lista a PoseSequence-ből készül (képadat nélkül)
+            analysis["keyframes"] = pose_sequence.to_keyframes()
             analysis["calibration_used"] = bool(anthro)
             analysis["general_calibration_factor"] = round(general_factor, 5)
             analysis["leg_calibration_factor"] = round(leg_factor, 5)
@@ -87,9 +76,7 @@ class SquatAssessmentService(BaseDiagnosticService):
                 created_at=job.created_at,
                 
                 # Konvertálás Decimal-ra
-                overall_squat_score=Decimal(str(analysis.get('overall_squat_score', 0.0))),
-                min_knee_angle=Decimal(str(analysis.get('min_knee_angle', 0.0))),
-                max_trunk_lean=Decimal(str(analysis.get('max_trunk_lean', 0.0))),
+                **self.result_row_values(analysis),
 
                 raw_json_metrics=analysis,
             )
@@ -102,69 +89,54 @@ class SquatAssessmentService(BaseDiagnosticService):
             self.log(f"❌ Squat Assessment hiba job_id={job.id}: {e}")
             return {"error": f"Elemzés hiba: {e}", "video_analysis_done": False}
 
-    def _analyze_squat(self, raw_keypoints: List[Dict[str, Any]], job, general_factor: float, leg_factor: float) -> Dict[str, Any]:
-        """A tényleges guggolás-elemzés futtatása kalibrált testarányokkal."""
-        import numpy as np
-        
-        min_knee_angle, max_trunk_lean = 180.0, 0.0
-        min_angle_frame, max_trunk_frame = None, None
+        finally:
+            # 🗑 Letöltött videó törlése
+            cleanup_local_video(video_path)
+
+    @staticmethod
+    def result_row_values(result: dict) -> dict:
+        return {
+            "overall_squat_score": Decimal(str(result.get('overall_squat_score', 0.0))),
+            "min_knee_angle": Decimal(str(result.get('min_knee_angle', 0.0))),
+            "max_trunk_lean": Decimal(str(result.get('max_trunk_lean', 0.0))),
+        }
+
+    def rescore(self, pose_sequence, previous_result: dict) -> dict:
+        general_factor = float(previous_result.get("general_calibration_factor", 1.0) or 1.0)
+        leg_factor = float(previous_result.get("leg_calibration_factor", 1.0) or 1.0)
+        analysis = self._analyze_squat(pose_sequence, self.job, general_factor, leg_factor)
+        return self.merge_rescored(previous_result, analysis)
+
+    def _analyze_squat(self, pose_sequence, job, general_factor: float, leg_factor: float) -> Dict[str, Any]:
+        """A tényleges guggolás-elemzés futtatása kalibrált testarányokkal (vektorizált, az összes frame egyszerre)."""
+        pose_sequence = kinematics.ensure_pose_sequence(pose_sequence)
+        keypoints = pose_sequence.keypoints  # (frames, 33, 4), F_general-lal skálázva
 
         # 🆕 KALIBRÁCIÓ KORREKCIÓS TÉNYEZŐ SZÁMÍTÁSA (CSAK EGYSZER!)
-        # A raw_keypoints már F_general-lal van skálázva.
+        # A keypoints már F_general-lal van skálázva.
         # Korrekciós arány: F_leg / F_general.
         correction_factor = leg_factor / general_factor if general_factor and general_factor != 0 else leg_factor
 
-        for frame_data in raw_keypoints:
-            # Kulcspontok beolvasása (ezek F_general-lal skálázottak)
-            left_hip = get_landmark_coords(frame_data, 'left_hip')
-            left_knee = get_landmark_coords(frame_data, 'left_knee')
-            left_ankle = get_landmark_coords(frame_data, 'left_ankle')
-            right_hip = get_landmark_coords(frame_data, 'right_hip')
-            right_knee = get_landmark_coords(frame_data, 'right_knee')
-            right_ankle = get_landmark_coords(frame_data, 'right_ankle')
-            left_shoulder = get_landmark_coords(frame_data, 'left_shoulder')
-            right_shoulder = get_landmark_coords(frame_data, 'right_shoulder')
-
-            # Alsótest pontok listája
-            lower_body_coords = [left_hip, left_knee, left_ankle, right_hip, right_knee, right_ankle]
-
-            # 🔹 ALSÓTEST SKÁLÁZÁSA (KORREKCIÓJA) valós méretre (F_leg)
-            scaled_lower_body = []
-            for p in lower_body_coords:
-                if p is not None:
-                    # Alkalmazzuk a korrekciós faktort (F_leg / F_general)
-                    scaled_lower_body.append(np.array(p) * correction_factor)
-                else:
-                    scaled_lower_body.append(None)
-            
-            # Visszaadjuk a skálázott (korrigált) alsótest értékeket a változóknak
-            [left_hip, left_knee, left_ankle, right_hip, right_knee, right_ankle] = scaled_lower_body
-
-            # Térdszög számítás (innentől a hip/knee/ankle pontok már F_leg-gel vannak skálázva)
-            if all(np.any(p) for p in [left_hip, left_knee, left_ankle]):
-                left_knee_angle = calculate_angle_3d(left_hip, left_knee, left_ankle)
-            else:
-                left_knee_angle = 180.0
-
-            if all(np.any(p) for p in [right_hip, right_knee, right_ankle]):
-                right_knee_angle = calculate_angle_3d(right_hip, right_knee, right_ankle)
-            else:
-                right_knee_angle = 180.0
-
-            current_knee_angle = (left_knee_angle + right_knee_angle) / 2.0
-            if current_knee_angle < min_knee_angle:
-                min_knee_angle, min_angle_frame = current_knee_angle, frame_data
-
-            # Törzsdőlés (a vállak F_general-lal, a csípők F_leg-gel vannak skálázva, de a szög számítás stabil)
-            if all(np.any(p) for p in [left_shoulder, right_shoulder, left_hip, right_hip]):
-                mid_shoulder = (left_shoulder + right_shoulder) / 2.0
-                mid_hip = (left_hip + right_hip) / 2.0
-                current_trunk_lean = _calculate_trunk_lean(mid_shoulder, mid_hip)
-            else:
-                current_trunk_lean = 0.0
-
-            if current_trunk_lean > max_trunk_lean:
-                max_trunk_lean, max_trunk_frame = current_trunk_lean, frame_data
+        # 🔹 ALSÓTEST SKÁLÁZÁSA (KORREKCIÓJA) valós méretre (F_leg)
+        # require_nonzero: a régi `np.any(p)` ellenőrzés a csupa nulla pontot is kizárta
+        lower, lower_ok = kinematics.gather(keypoints, LOWER_BODY, require_nonzero=True)
+        lower = kinematics.apply_correction(lower, correction_factor)
+        shoulders, shoulders_ok = kinematics.gather(keypoints, SHOULDERS, require_nonzero=True)
+
+        # Térdszög számítás (nem látható lánc esetén 180°)
+        left_ok = lower_ok[:, 0:3].all(axis=1)
+        right_ok = lower_ok[:, 3:6].all(axis=1)
+        left_knee_angle = np.where(left_ok, kinematics.joint_angles(lower[:, 0], lower[:, 1], lower[:, 2]), 180.0)
+        right_knee_angle = np.where(right_ok, kinematics.joint_angles(lower[:, 3], lower[:, 4], lower[:, 5]), 180.0)
+        knee_angles = (left_knee_angle + right_knee_angle) / 2.0
+        min_knee_angle, min_angle_row = kinematics.running_extreme(knee_angles, initial=180.0, mode="min")
+
+        # Törzsdőlés (a vállak F_general-lal, a csípők F_leg-gel vannak skálázva, de a szög számítás stabil)
+        trunk_ok = shoulders_ok.all(axis=1) & lower_ok[:, 0] & lower_ok[:, 3]
+        mid_shoulder = kinematics.midpoints(shoulders[:, 0], shoulders[:, 1])
+        mid_hip = kinematics.midpoints(lower[:, 0], lower[:, 3])
+        trunk_leans = np.where(trunk_ok, kinematics.trunk_lean(mid_shoulder, mid_hip), 0.0)
+        max_trunk_lean, max_trunk_row = kinematics.running_extreme(trunk_leans, initial=0.0, mode="max")
 
         # Pontozás (marad változatlan)
         ROM_optimal = 100.0
@@ -187,8 +159,10 @@ class SquatAssessmentService(BaseDiagnosticService):
         if overall_score < 70:
             feedback.append("A mozgáskontroll javítása javasolt a biztonságos guggolás érdekében.")
 
-        knee_snapshot_url = save_snapshot_to_gcs(min_angle_frame["frame_image"], job, "knee_angle") if min_angle_frame and "frame_image" in min_angle_frame else None
-        trunk_snapshot_url = save_snapshot_to_gcs(max_trunk_frame["frame_image"], job, "trunk_lean") if max_trunk_frame and "frame_image" in max_trunk_frame else None
+        knee_image = kinematics.frame_image_at(pose_sequence, min_angle_row)
+        trunk_image = kinematics.frame_image_at(pose_sequence, max_trunk_row)
+        knee_snapshot_url = save_snapshot_to_gcs(knee_image, job, "knee_angle") if knee_image is not None else None
+        trunk_snapshot_url = save_snapshot_to_gcs(trunk_image, job, "trunk_lean") if trunk_image is not None else None
 
         return {
             "overall_squat_score": float(round(overall_score, 1)),     
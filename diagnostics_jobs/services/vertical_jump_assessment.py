@@ -1,14 +1,15 @@
 import logging
 import numpy as np
-from typing import List, Dict, Any
+from typing import Dict, Any
 from decimal import Decimal
 import random # Szimulációhoz
 
 # ❗ Importok frissítve a Vertical Jump elemzéshez
-from diagnostics.utils.geometry import calculate_angle_3d, get_landmark_coords
-from diagnostics.utils.mediapipe_processor import process_video_with_mediapipe
+from diagnostics.utils import kinematics
+from diagnostics.utils.mediapipe_processor import extract_pose_sequence
 from diagnostics.utils.snapshot_manager import save_snapshot_to_gcs
 from diagnostics_jobs.utils import get_local_video_path
+from diagnostics.utils.video_download import cleanup_local_video
 from diagnostics_jobs.services.base_service import BaseDiagnosticService
 # ❗ Kalibrációs modell betöltése a korábbi kérésnek megfelelően
 from diagnostics_jobs.services.utils.anthropometry_loader import get_user_anthropometry_data 
@@ -18,16 +19,20 @@ from general_results.models import VerticalJumpAssessmentResult
 logger = logging.getLogger(__name__)
 
 
-def _calculate_valgus_angle_proxy(hip: np.ndarray, knee: np.ndarray, ankle: np.ndarray) -> float:
+# Az elemzéshez használt landmarkok (alsótest: F_leg korrekcióval)
+LOWER_BODY = ['left_hip', 'left_knee', 'left_ankle', 'right_hip', 'right_knee', 'right_ankle']
+
+
+def _calculate_valgus_angle_proxy(hip: np.ndarray, knee: np.ndarray, ankle: np.ndarray) -> np.ndarray:
     """
-    Knee Valgus szög proxy számítása.
+    Knee Valgus szög proxy számítása minden frame-re ((frames, 3) bemenetek).
     (A valós valgus mérés frontális síkot igényelne, itt a szimulációhoz helykitöltő.)
     """
     # A valós valgus mérés frontális síkban, 2D/3D projektálással történik.
     # Itt egy szimuláció zajlik a valgus szög tipikus tartományában.
     
     # ⚠️ FIGYELEM: A valós logikában ez helyettesítené a bonyolult CV modellt.
-    return random.uniform(5.0, 15.0)
+    return np.random.uniform(5.0, 15.0, size=len(knee))
 
 
 class VerticalJumpAssessmentService(BaseDiagnosticService):
@@ -36,11 +41,14 @@ class VerticalJumpAssessmentService(BaseDiagnosticService):
     Méri a robbanékonyságot, a landolási kontrollt és a valgus kockázatot.
     """
 
+    SCORING_VERSION = 1
+    RESULT_MODEL = VerticalJumpAssessmentResult
+
     
     def run_analysis(self):
         job = self.job
         self.log(f"▶️ Vertical Jump Assessment indítása job_id={job.id}")
-        video_path = get_local_video_path(job.video_url)
+        video_path = get_local_video_path(job.video_url, job_id=job.id, streaming=True)
 
         try:
             # 0️⃣ Kalibráció betöltése
@@ -59,33 +67,23 @@ class VerticalJumpAssessmentService(BaseDiagnosticService):
             self.log(f"✅ Kalibrációs faktorok betöltve: Általános={general_factor:.4f}, Láb={leg_factor:.4f}")
 
             # 1️⃣ Videó feldolgozása MediaPipe-pal
-            raw_keypoints, skeleton_video_path, keyframes = process_video_with_mediapipe(
+            pose_sequence = extract_pose_sequence(
                 video_path, 
                 job.job_type,
                 calibration_factor=general_factor,
             )
-            self.log(f"MediaPipe feldolgozás kész, {len(raw_keypoints)} frame elemzve.")
+            self.log(f"MediaPipe feldolgozás kész, {len(pose_sequence)} frame elemzve.")
 
             # 2️⃣ Elemzés
-            analysis = self._analyze_vertical_jump(raw_keypoints, job, general_factor, leg_factor)
+            analysis = self._analyze_vertical_jump(pose_sequence, job, general_factor, leg_factor)
             analysis["video_analysis_done"] = True
-            analysis["skeleton_video_local_path"] = skeleton_video_path
+            self.pose_sequence = pose_sequence  # A skeleton videót a renderelő task készíti el belőle
 
             # -------------------------------------------------------------------
             # ✅ JSON-kompatibilis Keyframes lista előkészítése (a NumPy tömbök eltávolítása)
             # -------------------------------------------------------------------
-            cleaned_keyframes = []
-            for frame in keyframes:
-                cleaned_frame = frame.copy()
-                if 'frame_image' in cleaned_frame:
-                    del cleaned_frame['frame_image'] 
-                for k, v in cleaned_frame.items():
-                    if isinstance(v, np.ndarray):
-                        cleaned_frame[k] = v.tolist()
-
-                cleaned_keyframes.append(cleaned_frame)
-
-            analysis["keyframes"] = cleaned_keyframes 
+            # A keyframes JSON lista a PoseSequence-ből készül (képadat nélkül)
+            analysis["keyframes"] = pose_sequence.to_keyframes()
             analysis["calibration_used"] = bool(anthro)
             analysis["general_calibration_factor"] = round(general_factor, 5)
             analysis["leg_calibration_factor"] = round(leg_factor, 5)
@@ -98,9 +96,7 @@ class VerticalJumpAssessmentService(BaseDiagnosticService):
                 created_at=job.created_at,
                 
                 # Konvertálás Decimal-ra (a jump metrikák mentése)
-                overall_jump_score=Decimal(str(analysis.get('overall_jump_score', 0.0))),
-                jump_height_cm=Decimal(str(analysis.get('jump_height_cm', 0.0))),
-                max_valgus_angle=Decimal(str(analysis.get('max_valgus_angle', 0.0))), # Landolási kockázat
+                **self.result_row_values(analysis),
                 
                 raw_json_metrics=analysis,
             )
@@ -113,63 +109,48 @@ class VerticalJumpAssessmentService(BaseDiagnosticService):
             self.log(f"❌ Vertical Jump Assessment hiba job_id={job.id}: {e}")
             return {"error": f"Elemzés hiba: {e}", "video_analysis_done": False}
 
-    
-    def _analyze_vertical_jump(self, raw_keypoints: List[Dict[str, Any]], job, general_factor: float, leg_factor: float) -> Dict[str, Any]:
+        finally:
+            # 🗑 Letöltött videó törlése
+            cleanup_local_video(video_path)
+
+    @staticmethod
+    def result_row_values(result: dict) -> dict:
+        return {
+            "overall_jump_score": Decimal(str(result.get('overall_jump_score', 0.0))),
+            "jump_height_cm": Decimal(str(result.get('jump_height_cm', 0.0))),
+            "max_valgus_angle": Decimal(str(result.get('max_valgus_angle', 0.0))),  # Landolási kockázat
+        }
+
+    def rescore(self, pose_sequence, previous_result: dict) -> dict:
+        general_factor = float(previous_result.get("general_calibration_factor", 1.0) or 1.0)
+        leg_factor = float(previous_result.get("leg_calibration_factor", 1.0) or 1.0)
+        analysis = self._analyze_vertical_jump(pose_sequence, self.job, general_factor, leg_factor)
+        return self.merge_rescored(previous_result, analysis)
+
+    def _analyze_vertical_jump(self, pose_sequence, job, general_factor: float, leg_factor: float) -> Dict[str, Any]:
         """
         A Magassági Ugrás elemzés futtatása kalibrált testarányokkal.
         A számításokat szimuláljuk, de a struktúrát a dokumentum alapján adjuk vissza.
         """
         # Célok: Legnagyobb ugrásmagasság (z) és legnagyobb valgus szög (frontális sík) megtalálása
-        
-        # Iterálunk, de most a szimulált max/min értékeket keressük
-        min_cm_knee_angle = 180.0
-        max_valgus_angle = 0.0
-        cm_frame = None
-        valgus_frame = None
+        pose_sequence = kinematics.ensure_pose_sequence(pose_sequence)
+        keypoints = pose_sequence.keypoints  # (frames, 33, 4), F_general-lal skálázva
+        frames = len(pose_sequence)
 
         correction_factor = leg_factor / general_factor if general_factor and general_factor != 0 else leg_factor
-        
+
+        # 🔹 ALSÓTEST SKÁLÁZÁSA (KORREKCIÓJA) valós méretre (F_leg), az összes frame-re egyszerre
+        lower, _ = kinematics.gather(keypoints, LOWER_BODY)
+        lower = kinematics.apply_correction(lower, correction_factor)
+
         # ⚠️ Valós logikában ez a rész felelne a mozgás fázisainak felismeréséért (CM, Takeoff, Flight, Landing)
-        for frame_data in raw_keypoints:
-            # Szimuláció: A valós életben a MediaPipe kulcspontokból számolnánk!
-
-            # Kulcspontok beolvasása (F_general-lal skálázva)
-            left_hip = get_landmark_coords(frame_data, 'left_hip')
-            left_knee = get_landmark_coords(frame_data, 'left_knee')
-            left_ankle = get_landmark_coords(frame_data, 'left_ankle')
-            right_hip = get_landmark_coords(frame_data, 'right_hip') # 🆕 Ezek hiányoztak
-            right_knee = get_landmark_coords(frame_data, 'right_knee') # 🆕
-            right_ankle = get_landmark_coords(frame_data, 'right_ankle') # 🆕
-            
-            # 🔹 ALSÓTEST SKÁLÁZÁSA (KORREKCIÓJA) valós méretre (F_leg)
-            lower_body_coords = [left_hip, left_knee, left_ankle, right_hip, right_knee, right_ankle]
-
-            scaled_lower_body = []
-            for p in lower_body_coords:
-                if p is not None:
-                    # Alkalmazzuk a korrekciós faktort (F_leg / F_general)
-                    scaled_lower_body.append(np.array(p) * correction_factor)
-                else:
-                    scaled_lower_body.append(None)
-            
-            # Visszaadjuk a skálázott (korrigált) alsótest értékeket a változóknak
-            [left_hip, left_knee, left_ankle, right_hip, right_knee, right_ankle] = scaled_lower_body
-
-            # Keresés a legmélyebb Countermovement pontra (legkisebb térdszög)
-            current_knee_angle = random.uniform(70, 140) 
-            if current_knee_angle < min_cm_knee_angle:
-                min_cm_knee_angle = current_knee_angle
-                cm_frame = frame_data
-                
-            # Keresés a maximális valgus pontra (általában a landolási fázisban)
-            current_valgus_angle = _calculate_valgus_angle_proxy(
-                get_landmark_coords(frame_data, 'left_hip'), 
-                get_landmark_coords(frame_data, 'left_knee'), 
-                get_landmark_coords(frame_data, 'left_ankle')
-            )
-            if current_valgus_angle > max_valgus_angle:
-                max_valgus_angle = current_valgus_angle
-                valgus_frame = frame_data
+        # Keresés a legmélyebb Countermovement pontra (legkisebb térdszög) – szimuláció
+        knee_angles = np.random.uniform(70, 140, size=frames)
+        min_cm_knee_angle, cm_row = kinematics.running_extreme(knee_angles, initial=180.0, mode="min")
+
+        # Keresés a maximális valgus pontra (általában a landolási fázisban)
+        valgus_angles = _calculate_valgus_angle_proxy(lower[:, 0], lower[:, 1], lower[:, 2])
+        max_valgus_angle, valgus_row = kinematics.running_extreme(valgus_angles, initial=0.0, mode="max")
 
         
         # ---------------------------------------------------------
@@ -203,8 +184,10 @@ class VerticalJumpAssessmentService(BaseDiagnosticService):
             feedback.append("A landolás merev és hangosnak tűnik. Javítani kell az excentrikus kontrollt (plyometria).")
 
         # 4. Snapshot generálás (A guggolás mintájára)
-        landing_snapshot_url = save_snapshot_to_gcs(valgus_frame["frame_image"], job, "landing_valgus") if valgus_frame and "frame_image" in valgus_frame else None
-        takeoff_snapshot_url = save_snapshot_to_gcs(cm_frame["frame_image"], job, "takeoff_cm") if cm_frame and "frame_image" in cm_frame else None
+        valgus_image = kinematics.frame_image_at(pose_sequence, valgus_row)
+        cm_image = kinematics.frame_image_at(pose_sequence, cm_row)
+        landing_snapshot_url = save_snapshot_to_gcs(valgus_image, job, "landing_valgus") if valgus_image is not None else None
+        takeoff_snapshot_url = save_snapshot_to_gcs(cm_image, job, "takeoff_cm") if cm_image is not None else None
 
         
         # 5. Eredmény struktúra visszaadása
@@ -4,12 +4,19 @@ import shutil
 import logging
 import numpy as np
 from celery import shared_task
+from celery.signals import worker_process_init
 from django.conf import settings
 from django.utils import timezone
 from django.core.files.storage import default_storage
 
 from .models import DiagnosticJob, UserAnthropometryProfile
 from diagnostics.pdf_utils import generate_pdf_report 
+from diagnostics.utils.landmarker_pool import landmarker_pool, VIDEO_POOL_KEY
+from diagnostics.utils.skeleton_renderer import (
+    rendering_enabled, store_pose_sequence, load_pose_sequence, skeleton_storage_path, render_skeleton_to_storage,
+)
+from diagnostics.utils.video_download import cleanup_local_video
+from diagnostics_jobs.utils import get_local_video_path, convert_numpy_to_python
 
 # 🆕 ÚJ IMPORT: Billing utils
 from billing.utils import refund_analysis, get_analysis_balance
@@ -22,6 +29,7 @@ from .services.posture_assessment import PostureAssessmentService
 from .services.shoulder_circumduction_assessment import ShoulderCircumductionService
 from .services.vertical_jump_assessment import VerticalJumpAssessmentService
 from .services.single_leg_stance_service import SingleLegStanceAssessmentService
+from .services.rescoring import rescore_jobs
 
 logger = logging.getLogger(__name__)
 
@@ -36,20 +44,100 @@ SERVICE_MAP = {
 }
 
 
-def _convert_numpy_to_python(data):
+@worker_process_init.connect
+def _warm_up_landmarker_pool(**kwargs):
     """
-    Rekurzívan átalakítja a NumPy típusokat (ndarray, np.float, stb.)
-    natív Python típusokká (list, float, int), hogy JSON-ba menthető legyen.
+    Worker processz indulásakor előtöltjük a PoseLandmarker modellt: a VIDEO módú példány
+    jobonként friss (reprodukálható követés), de a modell fájlt már nem kell újra beolvasni.
     """
-    if isinstance(data, dict):
-        return {k: _convert_numpy_to_python(v) for k, v in data.items()}
-    elif isinstance(data, list):
-        return [_convert_numpy_to_python(item) for item in data]
-    elif isinstance(data, np.ndarray):
-        return data.tolist()
-    elif isinstance(data, (np.float32, np.float64, np.number)):
-        return float(data)
-    return data
+    if os.environ.get("LANDMARKER_POOL_WARM_UP", "true").lower() != "true":
+        return
+    landmarker_pool.warm_up([VIDEO_POOL_KEY])
+    logger.info("🔥 [TASK] PoseLandmarker pool előtöltve.")
+
+
+def _store_pose_sequence(job, service_instance) -> bool:
+    """
+    A job kulcspont tömbjének mentése a storage-ba (jobs/<id>/pose_sequence.dtpose).
+    Ebből dolgozik a skeleton renderelő task és a historikus újrapontozás (rescore_diagnostic_jobs).
+    """
+    pose_sequence = getattr(service_instance, "pose_sequence", None)
+    if pose_sequence is None or len(pose_sequence) == 0:
+        return False
+    try:
+        store_pose_sequence(job.id, pose_sequence)
+        return True
+    except Exception as e:
+        logger.warning(f"⚠️ [TASK] Kulcspont tömb mentése sikertelen job_id={job.id}: {e}")
+        return False
+
+
+def _schedule_skeleton_render(job, service_instance):
+    """
+    A skeleton videó renderelését külön taskba ütemezi: a render_skeleton_video task
+    a tárolt kulcspont tömbből és a forrás videóból készíti el az MP4-et.
+    """
+    if not rendering_enabled():
+        logger.info(f"⏭️ [TASK] Skeleton renderelés kikapcsolva, kihagyva job_id={job.id}")
+        return
+
+    try:
+        render_skeleton_video.apply_async(
+            args=[job.id, service_instance.skeleton_video_result_key, service_instance.skeleton_video_file_name],
+            queue=getattr(settings, "SKELETON_RENDER_QUEUE", "default"),
+        )
+        logger.info(f"🎬 [TASK] Skeleton renderelés ütemezve job_id={job.id}")
+    except Exception as e:
+        logger.warning(f"⚠️ [TASK] Skeleton renderelés ütemezése sikertelen job_id={job.id}: {e}")
+
+
+@shared_task(queue='default')
+def render_skeleton_video(job_id, result_key="skeleton_video_url", file_name="skeleton_video.mp4"):
+    """
+    Skeleton overlay videó renderelése a tárolt kulcspont tömbből (H.264/MP4), közvetlen feltöltéssel.
+    Az URL a job eredményébe kerül (result_key alá); a job ekkor már COMPLETED állapotú.
+    """
+    if not rendering_enabled():
+        logger.info(f"⏭️ [RENDER] Skeleton renderelés kikapcsolva ezen a workeren, job_id={job_id}")
+        return
+
+    video_path = None
+    try:
+        job = DiagnosticJob.objects.get(id=job_id)
+        pose_sequence = load_pose_sequence(job_id)
+        video_path = get_local_video_path(job.video_url, job_id=job.id)
+
+        skeleton_url = render_skeleton_to_storage(
+            pose_sequence, video_path, skeleton_storage_path(job_id, file_name)
+        )
+
+        # Friss eredmény olvasása, hogy a közben történt módosításokat ne írjuk felül
+        job.refresh_from_db(fields=["result"])
+        result = job.result or {}
+        result[result_key] = skeleton_url
+        job.result = result
+        job.save(update_fields=["result"])
+        logger.info(f"🎥 [RENDER] Skeleton videó feltöltve job_id={job_id}: {skeleton_url}")
+
+    except DiagnosticJob.DoesNotExist:
+        logger.error(f"❌ [RENDER] DiagnosticJob #{job_id} nem található.")
+    except Exception as e:
+        logger.error(f"❌ [RENDER] Skeleton renderelési hiba job_id={job_id}: {e}", exc_info=True)
+    finally:
+        cleanup_local_video(video_path)
+
+
+@shared_task(queue='default')
+def rescore_diagnostic_jobs(job_types=None, chunk_size=None, limit=None, start_after_id=0):
+    """
+    Historikus jobok újrapontozása a tárolt kulcspontokból (lásd services/rescoring.py).
+    A Celery worker daemon processz, ezért itt a pontozás egy processzben fut;
+    nagy tömegű futtatáshoz a rescore_diagnostic_jobs management parancs használja a processz poolt.
+    """
+    stats = rescore_jobs(job_types=job_types, chunk_size=chunk_size, workers=1, limit=limit,
+                         start_after_id=start_after_id)
+    logger.info(f"🏁 [TASK] Újrapontozás kész: {stats}")
+    return stats
 
 
 @shared_task(queue='default')
@@ -186,9 +274,16 @@ def run_diagnostic_job(job_id):
             logger.info("📄 PDF riport kihagyva: Antropometriai Job.")
 
         # 5️⃣ Mentés
-        final_result_data = _convert_numpy_to_python(result_data)      
+        # 🆕 Pontozási verzió bélyeg: az újrapontozás ez alapján hagyja ki az aktuális jobokat
+        if service_class.SCORING_VERSION is not None and "error" not in result_data:
+            result_data["scoring_version"] = service_class.SCORING_VERSION
+        final_result_data = convert_numpy_to_python(result_data)      
         job.mark_as_completed(final_result_data, pdf_path=pdf_path)
         logger.info(f"🏁 [TASK] Elemzés sikeresen befejezve job_id={job.id}")
+
+        # 🎬 Skeleton videó: külön, később futó lépés (a metrikák és a PDF már elérhetők)
+        if _store_pose_sequence(job, service_instance):
+            _schedule_skeleton_render(job, service_instance)
         
         # 🆕 6️⃣ SIKERES JOB: NEM KELL SEMMIT CSINÁLNI
         # Az elemzés már le van vonva a views.py-ban (dedicate_analysis)
@@ -1,3 +1,87 @@
+from decimal import Decimal
+from unittest import mock
+
+from django.core.files.storage import InMemoryStorage
 from django.test import TestCase
 
-# Create your tests here.
+from diagnostics.tests import random_raw_keypoints
+from general_results.models import PostureAssessmentResult
+from users.models import User
+
+from .models import DiagnosticJob
+from .services.posture_assessment import PostureAssessmentService
+from .services.rescoring import pending_jobs, rescore_jobs
+
+POSTURE = DiagnosticJob.JobType.POSTURE_ASSESSMENT
+
+
+def keyframes(seed):
+    """result["keyframes"] formátumú lista (a verziózás előtti jobok egyetlen kulcspont forrása)."""
+    return [
+        {"frame": frame, "time_ms": frame * 33, "keypoints": keypoints}
+        for frame, keypoints in enumerate(random_raw_keypoints(frames=30, seed=seed))
+    ]
+
+
+class RescoringTests(TestCase):
+    """Az újrapontozandó jobok kiválasztása, a keyframes tartalék, a bulk mentés és az újraindíthatóság."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='athlete', password='pw')
+        version = PostureAssessmentService.SCORING_VERSION
+
+        # Verziózás előtti job: nincs scoring_version kulcs
+        cls.unversioned = cls.create_job({"metrics": {"posture_score": 1.0}, "keyframes": keyframes(1)})
+        cls.stale = cls.create_job({"scoring_version": version - 1, "keyframes": keyframes(2)})
+        cls.current = cls.create_job({"scoring_version": version, "keyframes": keyframes(3)})
+        # Kulcspontok nélkül: kihagyott, de függőben marad
+        cls.without_keypoints = cls.create_job({"metrics": {}})
+        cls.create_job(None)
+        cls.create_job({}, status=DiagnosticJob.JobStatus.FAILED)
+        cls.create_job({}, job_type=DiagnosticJob.JobType.SQUAT_ASSESSMENT)
+
+        PostureAssessmentResult.objects.create(
+            user=cls.user, job=cls.unversioned, posture_score=Decimal('1.00'), raw_json_metrics=cls.unversioned.result,
+        )
+
+    @classmethod
+    def create_job(cls, result, status=DiagnosticJob.JobStatus.COMPLETED, job_type=POSTURE):
+        return DiagnosticJob.objects.create(user=cls.user, sport_type='Birkózás', job_type=job_type, status=status, result=result)
+
+    def setUp(self):
+        # Nincs tárolt .dtpose: a result["keyframes"] tartalék töltődik
+        patcher = mock.patch('diagnostics_jobs.services.rescoring.default_storage', InMemoryStorage())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_pending_jobs_include_unversioned_results(self):
+        self.assertEqual(
+            list(pending_jobs(POSTURE).values_list('id', flat=True)),
+            [self.unversioned.id, self.stale.id, self.without_keypoints.id],
+        )
+        self.assertEqual(
+            list(pending_jobs(POSTURE, start_after_id=self.unversioned.id).values_list('id', flat=True)),
+            [self.stale.id, self.without_keypoints.id],
+        )
+
+    def test_rescore_updates_results_and_is_resumable(self):
+        stats = rescore_jobs([POSTURE], chunk_size=2, workers=1)
+        self.assertEqual((stats["processed"], stats["updated"], stats["skipped"], stats["failed"]), (3, 2, 1, 0))
+        self.assertEqual(stats["last_job_id"][POSTURE], self.without_keypoints.id)
+
+        for job in (self.unversioned, self.stale):
+            job.refresh_from_db()
+            self.assertEqual(job.result["scoring_version"], PostureAssessmentService.SCORING_VERSION)
+            self.assertIn("rescored_at", job.result)
+            self.assertIn("posture_score", job.result["metrics"])
+
+        row = PostureAssessmentResult.objects.get(job=self.unversioned)
+        self.unversioned.refresh_from_db()
+        self.assertEqual(row.raw_json_metrics, self.unversioned.result)
+        self.assertEqual(
+            row.posture_score, Decimal(str(self.unversioned.result["metrics"]["posture_score"])).quantize(Decimal('0.01')),
+        )
+
+        # Újrafuttatáskor csak a kulcspont nélküli job marad függőben
+        self.assertEqual(rescore_jobs([POSTURE], chunk_size=2, workers=1)["processed"], 1)
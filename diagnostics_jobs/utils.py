@@ -2,6 +2,7 @@
 
 import os
 import cv2
+import numpy as np
 import json
 import logging
 import requests 
@@ -9,6 +10,7 @@ import re
 from urllib.parse import urlparse
 from django.conf import settings
 from django.core.files.storage import default_storage
+from diagnostics.utils.video_download import fetch_video
 # A MediaPipe importok maradnak az analyze_video_with_mediapipe-hoz
 from mediapipe.tasks import python
 from mediapipe.tasks.python import vision
@@ -20,14 +22,15 @@ logger = logging.getLogger(__name__)
 GCS_URL_PATTERN = r"https://storage\.googleapis\.com/[^/]+/(.+)"
 
 # --- BIZTONSÁGOS FÁJL ELÉRÉS KONVERTÁLÁSA ---
-def get_local_video_path(job_url: str) -> str:
+def get_local_video_path(job_url: str, job_id=None, streaming: bool = False):
     """
     Kinyeri a videó letöltéséhez szükséges lokális elérési utat.
+    GCS esetén a videó egy egyedi, job-onkénti munkakönyvtárba töltődik (diagnostics.utils.video_download);
+    a hívó a cleanup_local_video()-val takaríthat.
+    🌊 streaming=True: sorosan olvasható konténernél StreamingDownload-ot ad vissza, amit az
+    extract_pose_sequence már letöltés közben feldolgoz (más felhasználásra előbb .wait() kell).
     """
 
-    gcs_object_path = None
-    full_download_url = job_url  # Alapértelmezésben a Job URL-t használjuk
-
     # 1️⃣ Lokális fejlesztés: MEDIA_URL → MEDIA_ROOT
     if job_url.startswith(settings.MEDIA_URL) and "storage.googleapis.com" not in settings.MEDIA_URL:
         relative_path = job_url[len(settings.MEDIA_URL):]
@@ -37,32 +40,14 @@ def get_local_video_path(job_url: str) -> str:
 
     # 2️⃣ GCS URL feldolgozása
     if "storage.googleapis.com" in job_url:
-        match = re.search(GCS_URL_PATTERN, job_url)
-        if match:
-            gcs_object_path = match.group(1)
-        else:
+        if not re.search(GCS_URL_PATTERN, job_url):
             logger.error(f"❌ Nem sikerült kinyerni a GCS objektum útvonalát: {job_url}")
             raise RuntimeError(f"Hibás GCS URL formátum: {job_url}")
 
-        # ✅ Biztonságos fájlnév (nem tartalmazza az aláírási paramétereket)
-        parsed_url = urlparse(full_download_url)
-        clean_name = os.path.basename(parsed_url.path)
-        if not clean_name:
-            clean_name = "temp_video.mp4"
-
-        local_temp_path = os.path.join("/tmp", clean_name)
-
         try:
-            logger.info(f"⬇️ Videó letöltése GCS-ről: {full_download_url}")
-            response = requests.get(full_download_url, stream=True)
-            response.raise_for_status()
-
-            with open(local_temp_path, "wb") as local_file:
-                for chunk in response.iter_content(chunk_size=8192):
-                    local_file.write(chunk)
-
-            logger.info(f"✅ Videó letöltve: {local_temp_path}")
-            return local_temp_path
+            logger.info(f"⬇️ Videó letöltése GCS-ről: {job_url}")
+            # ✅ Poolos session, párhuzamos range letöltés, ellenőrzőösszeg, helyi LRU cache
+            return fetch_video(job_url, job_id=job_id, streaming=streaming)
 
         except Exception as e:
             logger.critical(f"❌ Hiba a GCS videó letöltésekor: {e}")
@@ -247,4 +232,20 @@ def analyze_video_with_mediapipe(video_path: str, output_dir: str) -> dict:
         "overall_rating": "Jó",
         "shoulder_angle": 15.2, # Mock érték
         "hip_symmetry": 98.5, # Mock érték
-    }
\ No newline at end of file
+    }
+
+
+def convert_numpy_to_python(data):
+    """
+    Rekurzívan átalakítja a NumPy típusokat (ndarray, np.float, stb.)
+    natív Python típusokká (list, float, int), hogy JSON-ba menthető legyen.
+    """
+    if isinstance(data, dict):
+        return {k: convert_numpy_to_python(v) for k, v in data.items()}
+    elif isinstance(data, list):
+        return [convert_numpy_to_python(item) for item in data]
+    elif isinstance(data, np.ndarray):
+        return data.tolist()
+    elif isinstance(data, (np.float32, np.float64, np.number)):
+        return float(data)
+    return data
@@ -3,6 +3,12 @@ ASGI config for digiTTrain project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Csak a streamelt Ditta chat fut natív (async) Django ASGI-n; minden más kérés a WSGI
+alkalmazáshoz kerül egy szálkészleten (a2wsgi: a kérés törzsét is darabonként olvassa, a
+uvicorn beépített adapterével szemben). Így a szinkron FileResponse / StreamingHttpResponse
+válaszok (exportok, letöltések, statikus fájlok) darabonként mennek ki, és nem pufferelődnek
+teljes egészében a memóriába, ahogy az ASGI handler tenné.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
@@ -13,4 +19,21 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "digiTTrain.settings")
 
-application = get_asgi_application()
+django_asgi_application = get_asgi_application()
+
+# A get_asgi_application már elvégezte a django.setup()-ot
+from django.urls import reverse  # noqa: E402
+
+from a2wsgi import WSGIMiddleware  # noqa: E402
+
+from digiTTrain.wsgi import application as django_wsgi_application  # noqa: E402
+
+ASGI_PATHS = (reverse("ml_engine:ditta_chat_stream_api"),)
+
+wsgi_application = WSGIMiddleware(django_wsgi_application)
+
+
+async def application(scope, receive, send):
+    if scope["type"] == "http" and not scope["path"].startswith(ASGI_PATHS):
+        return await wsgi_application(scope, receive, send)
+    return await django_asgi_application(scope, receive, send)
@@ -117,6 +117,18 @@ SHAREABLE_DATA_MODELS = {
     ],
 }
 
+# A sportolónként lefordított engedélykészlet (data_sharing.access) cache ideje másodpercben
+DATA_SHARING_ACCESS_CACHE_TTL = int(os.environ.get('DATA_SHARING_ACCESS_CACHE_TTL', '600'))
+
+# A klubonkénti, napi jelenléti összesítők (training_log.utils.get_attendance_summaries) cache ideje másodpercben
+ATTENDANCE_SUMMARY_CACHE_TTL = int(os.environ.get('ATTENDANCE_SUMMARY_CACHE_TTL', '86400'))
+
+# Jelenléti ív export (training_log.attendance_export): efölötti napszámú időszak háttérfeladatként készül,
+# a memóriában tartott fájl mérete (bájt) – fölötte lemezre kerül –, és a letöltési link érvényessége másodpercben
+ATTENDANCE_EXPORT_ASYNC_DAYS = int(os.environ.get('ATTENDANCE_EXPORT_ASYNC_DAYS', '120'))
+ATTENDANCE_EXPORT_SPOOL_MAX_SIZE = int(os.environ.get('ATTENDANCE_EXPORT_SPOOL_MAX_SIZE', str(8 * 1024 * 1024)))
+ATTENDANCE_EXPORT_LINK_TTL = int(os.environ.get('ATTENDANCE_EXPORT_LINK_TTL', '86400'))
+
 ROOT_URLCONF = "digiTTrain.urls"
 
 TEMPLATES = [
@@ -301,6 +313,65 @@ CELERY_ENABLE_UTC = True
 CELERY_TASK_TRACK_STARTED = True
 CELERY_TASK_TIME_LIMIT = 30 * 60  # 30 perc
 
+# ========== SKELETON VIDEÓ RENDERELÉS ==========
+# Külön Celery taskban fut; terhelés alatt workerenként kikapcsolható.
+SKELETON_RENDERING_ENABLED = os.environ.get('SKELETON_RENDERING_ENABLED', 'true').lower() == 'true'
+SKELETON_VIDEO_CODEC = os.environ.get('SKELETON_VIDEO_CODEC', 'avc1')  # H.264 / MP4
+SKELETON_RENDER_QUEUE = os.environ.get('SKELETON_RENDER_QUEUE', 'default')
+
+# Videó pipeline: háttérszálas dekódolás/kódolás, fix számú előre lefoglalt frame pufferrel
+VIDEO_PIPELINE_ENABLED = os.environ.get('VIDEO_PIPELINE_ENABLED', 'true').lower() == 'true'
+VIDEO_PIPELINE_BUFFERS = int(os.environ.get('VIDEO_PIPELINE_BUFFERS', '8'))
+
+# Tartalom-címzett kulcspont cache (videó hash + modell hash + profil) – helyi lemez + default_storage
+KEYPOINT_CACHE_ENABLED = os.environ.get('KEYPOINT_CACHE_ENABLED', 'true').lower() == 'true'
+KEYPOINT_CACHE_DIR = os.environ.get('KEYPOINT_CACHE_DIR', '/tmp/keypoint_cache')
+# A helyi szint mérete (LRU); a /tmp Cloud Run alatt a konténer memóriájából fogy
+KEYPOINT_CACHE_MAX_MB = int(os.environ.get('KEYPOINT_CACHE_MAX_MB', '128'))
+
+# Historikus jobok újrapontozása (rescore_diagnostic_jobs); 0 worker = CPU magok száma
+DIAGNOSTICS_RESCORING_CHUNK_SIZE = int(os.environ.get('DIAGNOSTICS_RESCORING_CHUNK_SIZE', '200'))
+DIAGNOSTICS_RESCORING_WORKERS = int(os.environ.get('DIAGNOSTICS_RESCORING_WORKERS', '0'))
+
+# Bemeneti videók letöltése: job-onkénti munkakönyvtár, párhuzamos range letöltés, helyi LRU cache
+VIDEO_DOWNLOAD_SCRATCH_DIR = os.environ.get('VIDEO_DOWNLOAD_SCRATCH_DIR', '/tmp/video_downloads')
+VIDEO_DOWNLOAD_CACHE_DIR = os.environ.get('VIDEO_DOWNLOAD_CACHE_DIR', '/tmp/video_cache')
+# A /tmp Cloud Run alatt memóriában van: nagyobb cache-hez lemez-alapú VIDEO_DOWNLOAD_CACHE_DIR kell
+VIDEO_DOWNLOAD_CACHE_MAX_MB = int(os.environ.get('VIDEO_DOWNLOAD_CACHE_MAX_MB', '256'))
+VIDEO_DOWNLOAD_PARALLELISM = int(os.environ.get('VIDEO_DOWNLOAD_PARALLELISM', '4'))
+VIDEO_DOWNLOAD_PART_MB = int(os.environ.get('VIDEO_DOWNLOAD_PART_MB', '8'))
+# Streamelt bemenet: az inferencia már letöltés közben indul (MPEG-TS / fragmentált / faststart MP4)
+VIDEO_STREAMING_ENABLED = os.environ.get('VIDEO_STREAMING_ENABLED', 'true').lower() == 'true'
+VIDEO_STREAMING_MIN_MB = int(os.environ.get('VIDEO_STREAMING_MIN_MB', '8'))
+
+# ML modell registry: a tárolt modell verziójának (GCS generáció) ellenőrzési gyakorisága másodpercben
+ML_MODEL_CHECK_INTERVAL = int(os.environ.get('ML_MODEL_CHECK_INTERVAL', '300'))
+# Éjszakai tömeges predikció: a predict hívás szálainak száma (0 = a modell saját beállítása, -1 = minden mag)
+ML_PREDICTION_N_JOBS = int(os.environ.get('ML_PREDICTION_N_JOBS', '-1'))
+# Éjszakai feature generálás: ennyi sportoló adatai töltődnek be egy lekérdezés-körben
+ML_FEATURE_BATCH_SIZE = int(os.environ.get('ML_FEATURE_BATCH_SIZE', '1000'))
+# Tanítási pipeline: oszlopos snapshot cache + verziózott artifactok, párhuzamos tanítás (-1 = minden mag)
+ML_TRAINING_CACHE_DIR = os.environ.get('ML_TRAINING_CACHE_DIR', '/tmp/ml_training')
+ML_TRAINING_CACHE_MAX_AGE_DAYS = int(os.environ.get('ML_TRAINING_CACHE_MAX_AGE_DAYS', '7'))
+ML_TRAINING_N_JOBS = int(os.environ.get('ML_TRAINING_N_JOBS', '-1'))
+ML_TRAINING_KEEP_ARTIFACTS = int(os.environ.get('ML_TRAINING_KEEP_ARTIFACTS', '5'))
+# Warm start: a korábbi erdőhöz csak az új sorokon tanított fák adódnak (a fák maximális számáig);
+# ML_TRAINING_FULL_REBUILD_DAYS naponként teljes újratanítás
+ML_TRAINING_WARM_START = os.environ.get('ML_TRAINING_WARM_START', 'true').lower() == 'true'
+ML_TRAINING_FULL_REBUILD_DAYS = int(os.environ.get('ML_TRAINING_FULL_REBUILD_DAYS', '7'))
+ML_TRAINING_WARM_START_TREES = int(os.environ.get('ML_TRAINING_WARM_START_TREES', '20'))
+ML_TRAINING_MAX_TREES = int(os.environ.get('ML_TRAINING_MAX_TREES', '300'))
+# Ditta tanácsok: aszinkron generálás a mentett predikciók után (Celery rate limit, esemény duplikáció szűrés)
+ML_ADVICE_ENABLED = os.environ.get('ML_ADVICE_ENABLED', 'true').lower() == 'true'
+ML_ADVICE_RATE_LIMIT = os.environ.get('ML_ADVICE_RATE_LIMIT', '30/m')
+ML_ADVICE_DEDUP_SECONDS = int(os.environ.get('ML_ADVICE_DEDUP_SECONDS', str(12 * 3600)))
+# Ditta elemző: (kérdező, cél, szerepkör) kontextus cache élettartama; a változások explicit érvénytelenítik
+ML_DITTA_CONTEXT_TTL = int(os.environ.get('ML_DITTA_CONTEXT_TTL', '900'))
+# Streamelt Ditta chat (ASGI): párhuzamos válaszok felhasználónként, első token / teljes időkorlát (mp)
+ML_DITTA_STREAM_MAX_PER_USER = int(os.environ.get('ML_DITTA_STREAM_MAX_PER_USER', '2'))
+ML_DITTA_STREAM_FIRST_TOKEN_TIMEOUT = int(os.environ.get('ML_DITTA_STREAM_FIRST_TOKEN_TIMEOUT', '15'))
+ML_DITTA_STREAM_TIMEOUT = int(os.environ.get('ML_DITTA_STREAM_TIMEOUT', '60'))
+
 # ========== CELERY BEAT BEÁLLÍTÁSOK ==========
 
 # Ez mondja meg a Celery-nek, hogy az adatbázisból olvassa az ütemtervet
@@ -320,6 +391,10 @@ CELERY_BEAT_SCHEDULE = {
         "task": "ml_engine.tasks.predict_form_for_active_subscribers",
         "schedule": crontab(hour=3, minute=0), # Hajnali 3:00
     },
+    "óránkénti-jelenléti-export-takarítás": {
+        "task": "training_log.tasks.cleanup_attendance_exports",
+        "schedule": crontab(minute=15), # Óránként, a lejárt letöltési linkek fájljai
+    },
 }
 
 GEMINI_API_KEY = os.environ.get('GEMINI_API_KEY')
@@ -0,0 +1,46 @@
+# ml_engine/advice_events.py
+"""
+Predikció → Ditta tanács esemény.
+
+A predikció csak számol: a mentett predikció után egy eseményt küldünk, a tanácsot
+a generate_coach_advice Celery task (rate limittel) készíti el és menti el.
+Duplikáció szűrés: userenként és forrás snapshot dátumonként egy esemény (cache.add),
+a task pedig kihagyja a már friss tanáccsal rendelkező predikciókat.
+"""
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+
+def _dedup_key(user_id, source_date) -> str:
+    day = source_date.date().isoformat() if hasattr(source_date, "date") else str(source_date)
+    return f"ml_engine:advice_event:{user_id}:{day}"
+
+
+def publish_prediction(user_id, source_date) -> bool:
+    """
+    Esemény egy elmentett predikcióról. A task a tranzakció commitja után indul.
+    :return: True, ha új esemény került a sorba (False: már volt ugyanerre a snapshotra)
+    """
+    if not getattr(settings, "ML_ADVICE_ENABLED", True):
+        return False
+
+    timeout = int(getattr(settings, "ML_ADVICE_DEDUP_SECONDS", 12 * 3600))
+    if not cache.add(_dedup_key(user_id, source_date), 1, timeout=timeout):
+        return False
+
+    from ml_engine.tasks import generate_coach_advice
+    transaction.on_commit(lambda: generate_coach_advice.delay(user_id))
+    return True
+
+
+def publish_predictions(predictions) -> int:
+    """Tömeges változat: (user_id, source_date) párok. :return: a sorba került események száma"""
+    published = sum(1 for user_id, source_date in predictions if publish_prediction(user_id, source_date))
+    if published:
+        logger.info(f"📨 [ML_ENGINE] {published} tanács esemény a sorban")
+    return published
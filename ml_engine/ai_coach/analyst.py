@@ -2,12 +2,8 @@ import logging
 from django.utils import timezone
 from .base_persona import BasePersona
 from .app_interpreters.users_context import UsersContext
-from .app_interpreters.assessment_interpreter import AssessmentInterpreter
-from .app_interpreters.billing_interpreter import BillingInterpreter
-from .app_interpreters.training_log_interpreter import TrainingLogInterpreter
-from .app_interpreters.biometric_interpreter import BiometricInterpreter
-from .app_interpreters.diagnostics_interpreter import DiagnosticsInterpreter
-from .app_interpreters.ml_engine_interpreter import MLEngineInterpreter
+from .app_interpreters.context_builder import AnalystContextBuilder
+from .context_cache import get_or_build
 from ml_engine.models import DittaMissedQuery
 from .ui_knowledge import UI_NAVIGATION_MAP, NAVIGATION_PATHS, FAQ_SHORTCUTS, ERROR_EXPLANATIONS
 from .knowledge_base import get_relevant_knowledge, format_knowledge_for_prompt, SYSTEM_TERMS
@@ -105,10 +101,17 @@ class AnalystPersona(BasePersona):
             if not u_context.children.filter(user=target_user).exists():
                 return "👨‍👩‍👧 Szülőként csak a saját gyermekeid adatait láthatod. Írd le a gyermek nevét pontosan!"
 
+        # === ADATOK ELŐKÉSZÍTÉSE (INTERPRETEREK) ===
+        # 🧠 (kérdező, cél, szerepkör) szerint cache-elve: a követő kérdések kihagyják az adatgyűjtést,
+        # a mögöttes sorok változásakor a context_cache érvényteleníti
+        context_data = dict(get_or_build(
+            AnalystContextBuilder(self, u_context, target_user, active_role),
+            viewer_id=user.pk, target_id=target_user.pk, role=active_role,
+        ))
+
         # === RELEVÁNS TUDÁS ÖSSZEGYŰJTÉSE ===
-        target_sport = self._get_primary_sport(target_user)
         relevant_knowledge = get_relevant_knowledge(
-            sport_name=target_sport,
+            sport_name=context_data.pop("target_sport"),
             context_app='ml_engine',
             user_roles=[active_role]
         )
@@ -117,53 +120,8 @@ class AnalystPersona(BasePersona):
         if active_role in ["Edző", "Egyesületi vezető"]:
             relevant_knowledge.update(SYSTEM_TERMS)
 
-        # === ADATOK ELŐKÉSZÍTÉSE (INTERPRETEREK) ===
-        audit = u_context.get_data_availability([target_user])
-        asm = AssessmentInterpreter(user)
-        bill = BillingInterpreter(target_user)
-        tlog = TrainingLogInterpreter(target_user)
-        bio = BiometricInterpreter(target_user)
-        diag = DiagnosticsInterpreter(target_user)
-        ml = MLEngineInterpreter(target_user)
-        ml_raw_results = ml.get_ml_predictions()
-
-        # ÚJ: Értékek normalizálása, hogy ne legyen 51/10-es hallucináció
-        # Ha a predikció 0-100 közötti, leosztjuk 10-zel a 10-es skálához
-        try:
-            # Feltételezve, hogy a ml_results-ban van egy 'predicted_value'
-            if isinstance(ml_raw_results, dict) and 'predicted_value' in ml_raw_results:
-                raw_val = float(ml_raw_results['predicted_value'])
-                # Kerekített 10-es skála (pl. 61.56 -> 6.2)
-                ml_raw_results['display_score'] = round(min(raw_val / 10, 10.0), 1)
-        except:
-            pass
-
-        context_data = {
-            "details": u_context.get_target_details(target_user, active_role=active_role),
-            "relevant_terms": format_knowledge_for_prompt(relevant_knowledge),
-            "audit": audit,
-            "ml_results": ml_raw_results,
-            "assessments": asm.get_assessment_summary(target_user=target_user),
-            "billing": bill.get_billing_status(),
-            "training": tlog.get_training_summary(),
-            "biometrics": bio.get_biometric_summary(),
-            "diagnostics": diag.get_diagnostics_summary(),
-            "ml_results": ml.get_ml_predictions(),
-            "active_role": active_role,
-            "family_info": self._get_family_context(u_context, target_user, active_role)
-        }
-
-        # === SZÜLŐI GYEREKEK ÖSSZEGZÉSE ===
-        if active_role == "Szülő":
-            children_summary = u_context.get_children_summary()
-            context_data["children_summary"] = children_summary
-            
-            logger.info(f"[ANALYST] Szülői összefoglaló előkészítve: {active_role}")
-        
-        # === EDZŐ/VEZETŐ CSAPAT ÖSSZEGZÉSE ===
-        if active_role in ["Edző", "Egyesületi vezető"] and target_user == user:
-            if hasattr(u_context, 'get_club_athletes_summary'):
-                context_data["team_summary"] = u_context.get_club_athletes_summary()
+        context_data["relevant_terms"] = format_knowledge_for_prompt(relevant_knowledge)
+        context_data["active_role"] = active_role
 
         # === PROMPT ÉPÍTÉSE ===
         generated_prompt = self._build_orchestrator_prompt(
@@ -201,10 +159,14 @@ class AnalystPersona(BasePersona):
         """Lekéri a felhasználó elsődleges sportágát."""
         try:
             from users.models import UserRole
-            primary_role = UserRole.objects.filter(
-                user=target_user, 
-                status='approved'
-            ).select_related('sport').first()
+            roles = getattr(target_user, 'approved_roles', None)
+            if roles is not None:
+                primary_role = roles[0] if roles else None
+            else:
+                primary_role = UserRole.objects.filter(
+                    user=target_user, 
+                    status='approved'
+                ).select_related('sport').first()
             
             if primary_role and primary_role.sport:
                 return primary_role.sport.name
@@ -347,17 +309,13 @@ class AnalystPersona(BasePersona):
     def _get_family_context(self, u_context, target_user, active_role):
         """Családi kontextus (szülők) lekérése edzőknek/vezetőknek."""
         if active_role in ["Edző", "Sportvezető", "Egyesületi vezető"] and target_user != u_context.user:
-            from users.models import UserRole
-            
-            # Szülők keresése a UserRole táblában
-            parent_roles = UserRole.objects.filter(
-                user=target_user,
-                role__name='Sportoló',
-                status='approved',
-                parent__isnull=False
-            ).select_related('parent')
+            # Szülők keresése a UserRole táblában (előtöltött szerepkörökből, ha vannak)
+            parent_roles = [
+                r for r in u_context.approved_roles_of(target_user)
+                if r.role.name == 'Sportoló' and r.parent_id is not None
+            ]
             
-            if parent_roles.exists():
+            if parent_roles:
                 parent_names = ", ".join([pr.parent.get_full_name() for pr in parent_roles])
                 return f"👨‍👩‍👧 Szülők: {parent_names}"
         
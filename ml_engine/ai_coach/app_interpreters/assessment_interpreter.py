@@ -18,9 +18,9 @@ class AssessmentInterpreter:
         else:
             return "Nincs megadva sportoló a felmérés kereséséhez."
 
-        results = query.order_by('-assessment_date')[:5]
+        results = list(query.order_by('-assessment_date')[:5])
         
-        if not results.exists():
+        if not results:
             return "Erről a sportolóról még nincsenek rögzített fizikai felmérések (húzódzkodás, ugrás, stb.)."
 
         data_lines = []
@@ -1,25 +1,35 @@
-from billing.models import UserSubscription, UserCreditBalance, UserAnalysisBalance
+from billing.models import UserSubscription
+from django.core.exceptions import ObjectDoesNotExist
 from django.utils import timezone
 
 class BillingInterpreter:
     def __init__(self, target_user):
         self.target_user = target_user
 
+    def _one_to_one(self, name):
+        """OneToOne kapcsolat (select_related esetén lekérdezés nélkül), hiányzó sornál None."""
+        try:
+            return getattr(self.target_user, name)
+        except ObjectDoesNotExist:
+            return None
+
     def get_billing_status(self):
         # 1. Kredit egyenleg lekérése
-        credit_obj = UserCreditBalance.objects.filter(user=self.target_user).first()
+        credit_obj = self._one_to_one('credit_balance')
         credits = credit_obj.credits if credit_obj else 0
 
         # 2. Elemzési keret lekérése
-        analysis_obj = UserAnalysisBalance.objects.filter(user=self.target_user).first()
+        analysis_obj = self._one_to_one('analysis_balance')
         analysis_count = analysis_obj.count if analysis_obj else 0
 
-        # 3. Aktív előfizetések (ML vagy Ad-Free)
-        active_subs = UserSubscription.objects.filter(
-            user=self.target_user,
-            active=True,
-            expiry_date__gte=timezone.now()
-        )
+        # 3. Aktív előfizetések (ML vagy Ad-Free) – 🧠 előtöltve az AnalystContextBuilder-ből
+        active_subs = getattr(self.target_user, 'active_subscriptions', None)
+        if active_subs is None:
+            active_subs = UserSubscription.objects.filter(
+                user=self.target_user,
+                active=True,
+                expiry_date__gte=timezone.now()
+            )
 
         sub_list = []
         has_ml = False
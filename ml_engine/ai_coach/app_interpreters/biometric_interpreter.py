@@ -1,7 +1,5 @@
 # biometric_interpreter.py
 
-from tensorboard import summary
-from tensorboard import summary
 from biometric_data.models import WeightData, HRVandSleepData, WorkoutFeedback
 from django.db.models import Avg
 from datetime import timedelta
@@ -17,34 +15,34 @@ class BiometricInterpreter:
         last_7_days = timezone.now() - timedelta(days=7)
         
         # JAVÍTÁS: recorded_at használata a korábbi measured_at helyett
-        hrv_data = HRVandSleepData.objects.filter(
+        # ⚡ Listaként egyszer kiértékelve (exists / count / first újabb lekérdezések helyett)
+        hrv_data = list(HRVandSleepData.objects.filter(
             user=self.target_user, 
             recorded_at__gte=last_7_days
-        ).order_by('-recorded_at')
+        ).order_by('-recorded_at').only('hrv'))
 
         # Súly adatok - itt is ellenőrizd a mezőnevet, ha hiba jönne, 
         # de a log most csak a HRV-nél állt meg.
-        weight_data = WeightData.objects.filter(
+        latest_weight = WeightData.objects.filter(
             user=self.target_user,
             workout_date__gte=last_7_days.date()
-        ).order_by('-workout_date')
+        ).order_by('-workout_date').values_list('morning_weight', flat=True).first()
 
-        if not hrv_data.exists() and not weight_data.exists():
+        if not hrv_data and latest_weight is None:
             return "Nincsenek biometriai adatok az elmúlt 7 napból."
 
         summary = ["--- Biometriai Trendek (7 nap) ---"]
 
-        if hrv_data.exists():
-            avg_hrv = sum(d.hrv for d in hrv_data if d.hrv) / hrv_data.count()
+        if hrv_data:
+            avg_hrv = sum(d.hrv for d in hrv_data if d.hrv) / len(hrv_data)
             # Adjunk hozzá kontextust Dittának!
             hrv_msg = f"Átlagos HRV: {round(avg_hrv, 1)} ms"
             if avg_hrv < 40: hrv_msg += " (Alacsony - pihenés javasolt)"
             elif avg_hrv > 70: hrv_msg += " (Jó regeneráció)"
             summary.append(hrv_msg)
 
-        if weight_data.exists():
-            latest_w = weight_data.first().morning_weight
-            summary.append(f"Legutóbbi testsúly: {latest_w} kg")
+        if latest_weight is not None:
+            summary.append(f"Legutóbbi testsúly: {latest_weight} kg")
 
         return "\n".join(summary)
 
@@ -0,0 +1,99 @@
+# ml_engine/ai_coach/app_interpreters/context_builder.py
+
+from django.db.models import Prefetch
+from django.utils import timezone
+
+from billing.models import UserSubscription
+from users.models import User, UserRole
+
+from .assessment_interpreter import AssessmentInterpreter
+from .billing_interpreter import BillingInterpreter
+from .biometric_interpreter import BiometricInterpreter
+from .diagnostics_interpreter import DiagnosticsInterpreter
+from .ml_engine_interpreter import MLEngineInterpreter
+from .training_log_interpreter import TrainingLogInterpreter
+
+COACH_ROLES = ["Edző", "Egyesületi vezető"]
+
+
+class AnalystContextBuilder:
+    """
+    Az elemző összes interpreter-összefoglalója egy menetben.
+    A cél user egyszer töltődik be (profil, egyenlegek, antropometria, jóváhagyott szerepkörök,
+    aktív előfizetések előtöltve), és minden interpreter ezt a példányt kapja.
+    """
+
+    def __init__(self, persona, u_context, target_user, active_role):
+        self.persona = persona
+        self.u_context = u_context
+        self.target_user = target_user
+        self.active_role = active_role
+
+    @property
+    def is_team_view(self):
+        return self.active_role in COACH_ROLES and self.target_user == self.u_context.user
+
+    def dependencies(self):
+        """Azok a userek, akiknek az adatváltozása érvényteleníti a kontextust."""
+        user_ids = [self.target_user.pk]
+        if self.active_role == "Szülő":
+            user_ids += list(self.u_context.children.values_list('user_id', flat=True))
+        if self.is_team_view:
+            user_ids += list(self.u_context.club_athletes().values_list('pk', flat=True))
+        return user_ids
+
+    def _load_target(self):
+        return (
+            User.objects
+            .select_related('profile', 'credit_balance', 'analysis_balance', 'useranthropometryprofile')
+            .prefetch_related(
+                Prefetch(
+                    'user_roles',
+                    queryset=UserRole.objects.filter(status='approved').select_related('role', 'club', 'sport', 'parent'),
+                    to_attr='approved_roles',
+                ),
+                Prefetch(
+                    'subscriptions',
+                    queryset=UserSubscription.objects.filter(active=True, expiry_date__gte=timezone.now()),
+                    to_attr='active_subscriptions',
+                ),
+            )
+            .get(pk=self.target_user.pk)
+        )
+
+    def build(self):
+        target = self._load_target()
+        ml_raw_results = MLEngineInterpreter(target).get_ml_predictions()
+
+        # ÚJ: Értékek normalizálása, hogy ne legyen 51/10-es hallucináció
+        # Ha a predikció 0-100 közötti, leosztjuk 10-zel a 10-es skálához
+        try:
+            if isinstance(ml_raw_results, dict) and 'predicted_value' in ml_raw_results:
+                raw_val = float(ml_raw_results['predicted_value'])
+                # Kerekített 10-es skála (pl. 61.56 -> 6.2)
+                ml_raw_results['display_score'] = round(min(raw_val / 10, 10.0), 1)
+        except (TypeError, ValueError):
+            pass
+
+        context_data = {
+            "target_sport": self.persona._get_primary_sport(target),
+            "details": self.u_context.get_target_details(target, active_role=self.active_role),
+            "audit": self.u_context.get_data_availability([target]),
+            "ml_results": ml_raw_results,
+            "assessments": AssessmentInterpreter(self.u_context.user).get_assessment_summary(target_user=target),
+            "billing": BillingInterpreter(target).get_billing_status(),
+            "training": TrainingLogInterpreter(target).get_training_summary(),
+            "biometrics": BiometricInterpreter(target).get_biometric_summary(),
+            "diagnostics": DiagnosticsInterpreter(target).get_diagnostics_summary(),
+            "family_info": self.persona._get_family_context(self.u_context, target, self.active_role),
+        }
+
+        # === SZÜLŐI GYEREKEK ÖSSZEGZÉSE ===
+        if self.active_role == "Szülő":
+            context_data["children_summary"] = self.u_context.get_children_summary()
+
+        # === EDZŐ/VEZETŐ CSAPAT ÖSSZEGZÉSE ===
+        if self.is_team_view:
+            context_data["team_summary"] = self.u_context.get_club_athletes_summary()
+
+        return context_data
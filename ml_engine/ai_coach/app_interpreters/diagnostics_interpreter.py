@@ -2,21 +2,27 @@
 
 # 1. JAVÍTÁS: Az importnál használd azt a nevet, amit a hibaüzenet javasolt
 from diagnostics_jobs.models import DiagnosticJob, UserAnthropometryProfile 
+from django.core.exceptions import ObjectDoesNotExist
 
 class DiagnosticsInterpreter:
     def __init__(self, target_user):
         self.target_user = target_user
 
     def get_diagnostics_summary(self):
-        jobs = DiagnosticJob.objects.filter(
+        # Egyetlen kiértékelés (a korábbi exists() + iterálás helyett)
+        jobs = list(DiagnosticJob.objects.filter(
             user=self.target_user,
             status='COMPLETED'
-        ).order_by('-created_at')[:3]
+        ).order_by('-created_at')[:3])
 
         # 2. JAVÍTÁS: Itt is írd át a modell nevét
-        profile = UserAnthropometryProfile.objects.filter(user=self.target_user).first()
+        # 🧠 Az AnalystContextBuilder select_related-del előtölti (OneToOne, pk = user)
+        try:
+            profile = self.target_user.useranthropometryprofile
+        except ObjectDoesNotExist:
+            profile = None
 
-        if not jobs.exists() and not profile:
+        if not jobs and not profile:
             return "Nincsenek elérhető diagnosztikai adatok vagy mozgáselemzések."
 
         summary = ["--- Diagnosztika és Mozgáselemzés ---"]
@@ -27,7 +33,7 @@ class DiagnosticsInterpreter:
             if hasattr(profile, 'manual_thigh_cm') and profile.manual_thigh_cm:
                 summary.append(f"Regisztrált combhossz: {profile.manual_thigh_cm} cm")
 
-        if jobs.exists():
+        if jobs:
             summary.append("Legutóbbi elemzések eredményei:")
             for job in jobs:
                 summary.append(f"- {job.get_job_type_display()}: {job.updated_at.strftime('%Y-%m-%d')} (Sikeres)")
@@ -3,7 +3,7 @@
 from training_log.models import TrainingSession, Attendance
 from django.utils import timezone
 from datetime import timedelta
-from django.db.models import Count, Sum
+from django.db.models import Count, Q, Sum
 
 class TrainingLogInterpreter:
     def __init__(self, target_user):
@@ -16,18 +16,23 @@ class TrainingLogInterpreter:
         last_month = timezone.now() - timedelta(days=30)
         
         # JAVÍTÁS: athlete_user HELYETT registered_athlete
-        attendances = Attendance.objects.filter(
+        # ⚡ Egyetlen aggregáló lekérdezés (darabszám, jelenlét, percek)
+        stats = Attendance.objects.filter(
             registered_athlete=self.target_user, 
             session__session_date__gte=last_month
-        ).select_related('session')
+        ).aggregate(
+            total_sessions=Count('id'),
+            present_count=Count('id', filter=Q(is_present=True)),
+            # Itt is javítva a mezőnév (session__duration_minutes)
+            total_minutes=Sum('session__duration_minutes', filter=Q(is_present=True)),
+        )
 
-        if not attendances.exists():
+        if not stats['total_sessions']:
             return "Nincs rögzített edzéslátogatás az elmúlt 30 napban."
 
-        total_sessions = attendances.count()
-        present_count = attendances.filter(is_present=True).count()
-        # Itt is javítva a mezőnév (session__duration_minutes)
-        total_minutes = sum(a.session.duration_minutes for a in attendances if a.is_present)
+        total_sessions = stats['total_sessions']
+        present_count = stats['present_count']
+        total_minutes = stats['total_minutes'] or 0
 
         summary = [
             f"--- Edzésstatisztika (utolsó 30 nap) ---",
@@ -5,7 +5,7 @@ from data_sharing.models import DataSharingPermission
 from billing.models import UserSubscription
 from django.utils import timezone
 from datetime import date
-from django.db.models import Q
+from django.db.models import Prefetch, Q
 
 class UsersContext:
     def __init__(self, user):
@@ -26,6 +26,30 @@ class UsersContext:
             status='approved'
         ).select_related('user__profile')  # A 'user' mező a gyerek!
 
+    def approved_roles_of(self, target_user):
+        """A user jóváhagyott szerepkörei – 🧠 előtöltve (approved_roles), ha az AnalystContextBuilder adta."""
+        roles = getattr(target_user, 'approved_roles', None)
+        if roles is None:
+            roles = UserRole.objects.filter(
+                user=target_user, status='approved'
+            ).select_related('role', 'club', 'sport', 'parent')
+        return roles
+
+    def with_today_data(self, queryset, user_path=''):
+        """
+        ⚡ A napi összefoglalókhoz szükséges sorok előtöltése (mai súly, mai futás, predikciók)
+        userenkénti lekérdezések helyett; user_path: a User objektum útvonala (pl. 'user__').
+        """
+        from biometric_data.models import WeightData, RunningPerformance
+        from ml_engine.models import UserPredictionResult
+
+        today = timezone.now().date()
+        return queryset.prefetch_related(
+            Prefetch(f'{user_path}weightdata_set', queryset=WeightData.objects.filter(workout_date=today), to_attr='today_weights'),
+            Prefetch(f'{user_path}runningperformance_set', queryset=RunningPerformance.objects.filter(run_date=today), to_attr='today_runs'),
+            Prefetch(f'{user_path}userpredictionresult_set', queryset=UserPredictionResult.objects.order_by('-predicted_at'), to_attr='predictions'),
+        )
+
     def identify_target(self, query, active_role=None):
         """
         Beazonosítja a beszélgetés alanyát a kérdés és az aktív szerepkör alapján.
@@ -63,45 +87,38 @@ class UsersContext:
         # 3. ALAPÉRTELMEZETT: Saját maga
         return {'user': self.user, 'name': "Saját profil", 'is_placeholder': False}
 
+    def club_athletes(self):
+        """A kérdező klubjainak sportolói (a csapat összefoglaló és a cache függőségek alapja)."""
+        user_clubs = self.roles.values_list('club', flat=True)
+        return User.objects.filter(
+            user_roles__club__in=user_clubs,
+            user_roles__role__name='Sportoló'
+        ).distinct()
+
     def get_club_athletes_summary(self):
         """
         Vezetőknek és edzőnek: lista a klub sportolóiról.
         """
-        from biometric_data.models import WeightData, RunningPerformance
-        from ml_engine.models import UserPredictionResult
-        from django.utils import timezone
-        
-        user_clubs = self.roles.values_list('club', flat=True)
-        athletes = User.objects.filter(
-            user_roles__club__in=user_clubs,
-            user_roles__role__name='Sportoló'
-        ).select_related('profile').distinct()
+        athletes = list(self.with_today_data(self.club_athletes().select_related('profile')))
         
-        if not athletes.exists():
+        if not athletes:
             return "Nincsenek regisztrált sportolók a klubodban."
             
         summary_list = []
-        today = timezone.now().date()
 
         for a in athletes:
-            morning_weight_entry = WeightData.objects.filter(
-                user=a, 
-                workout_date=today
-            ).first()
+            morning_weight_entry = a.today_weights[0] if a.today_weights else None
             
             weight_status = f"✅ ({morning_weight_entry.morning_weight}kg)" if morning_weight_entry else "❌"
             
-            run_entry = RunningPerformance.objects.filter(
-                user=a, 
-                run_date=today
-            ).first()
+            run_entry = a.today_runs[0] if a.today_runs else None
             
             if run_entry:
                 run_status = f"🏃 ({run_entry.run_distance_km}km, {run_entry.run_avg_hr} bpm)"
             else:
                 run_status = "⚪"
             
-            ml_res = UserPredictionResult.objects.filter(user=a).order_by('-predicted_at').first()
+            ml_res = a.predictions[0] if a.predictions else None
             fi_value = f"{round(ml_res.form_score, 1)}" if ml_res else "N/A"
             
             summary_list.append(
@@ -133,9 +150,13 @@ class UsersContext:
                 if not shared:
                     report["nincs_megosztas"].append(full_name)
 
-            has_ml = UserSubscription.objects.filter(
-                user=u, sub_type='ML_ACCESS', active=True, expiry_date__gte=timezone.now()
-            ).exists()
+            active_subs = getattr(u, 'active_subscriptions', None)
+            if active_subs is not None:
+                has_ml = any(sub.sub_type == 'ML_ACCESS' for sub in active_subs)
+            else:
+                has_ml = UserSubscription.objects.filter(
+                    user=u, sub_type='ML_ACCESS', active=True, expiry_date__gte=timezone.now()
+                ).exists()
             if not has_ml:
                 report["nincs_ml_access"].append(full_name)
                 
@@ -153,21 +174,19 @@ class UsersContext:
         # Vezetői/Edzői extra: szülők lekérése
         if active_role in ["Edző", "Sportvezető", "Egyesületi vezető"] and target_user != self.user:
             # UserRole táblából keressük a szülőt
-            parent_roles = UserRole.objects.filter(
-                user=target_user, 
-                role__name='Sportoló',
-                status='approved',
-                parent__isnull=False
-            ).select_related('parent')
+            parent_roles = [
+                r for r in self.approved_roles_of(target_user)
+                if r.role.name == 'Sportoló' and r.parent_id is not None
+            ]
             
-            if parent_roles.exists():
+            if parent_roles:
                 details["szulok"] = [pr.parent.get_full_name() for pr in parent_roles]
 
         return details
 
     def get_roles_string(self, target_user=None):
         u = target_user or self.user
-        roles = UserRole.objects.filter(user=u, status='approved').select_related('role', 'club')
+        roles = self.approved_roles_of(u)
         return ", ".join([f"{r.club.short_name} - {r.role.name}" for r in roles])
     
     def get_children_summary(self):
@@ -175,17 +194,14 @@ class UsersContext:
         Szülőknek: gyermekeik napi összefoglalója.
         JAVÍTVA: UserRole alapú lekérdezés!
         """
-        from biometric_data.models import WeightData, RunningPerformance
-        from ml_engine.models import UserPredictionResult
-        from django.utils import timezone
+        children = list(self.with_today_data(self.children, user_path='user__'))
         
-        if not self.children.exists():
+        if not children:
             return "Nincs regisztrált gyermeked a rendszerben."
         
         summary_list = []
-        today = timezone.now().date()
         
-        for child_role in self.children:
+        for child_role in children:
             child = child_role.user
             
             # --- JAVÍTOTT NÉVLEKÉRÉS (Last Name a Profile-ból) ---
@@ -209,10 +225,7 @@ class UsersContext:
             print(f"[CHILDREN SUMMARY DEBUG] Name resolved for ID {child.id}: {child_name}")
             
             # 1. Reggeli mérés
-            morning_weight = WeightData.objects.filter(
-                user=child,
-                workout_date=today
-            ).first()
+            morning_weight = child.today_weights[0] if child.today_weights else None
             
             if morning_weight:
                 weight_status = f"✅ ({morning_weight.morning_weight}kg)"
@@ -220,10 +233,7 @@ class UsersContext:
                 weight_status = "❌ Még nem mért ma"
             
             # 2. Edzésadat
-            run_entry = RunningPerformance.objects.filter(
-                user=child,
-                run_date=today
-            ).first()
+            run_entry = child.today_runs[0] if child.today_runs else None
             
             if run_entry:
                 run_status = f"🏃 {run_entry.run_distance_km}km, {run_entry.run_avg_hr} bpm"
@@ -231,9 +241,7 @@ class UsersContext:
                 run_status = "⚪ Még nem volt edzés ma"
             
             # 3. Formaindex
-            ml_res = UserPredictionResult.objects.filter(
-                user=child
-            ).order_by('-predicted_at').first()
+            ml_res = child.predictions[0] if child.predictions else None
             
             if ml_res:
                 fi_value = round(ml_res.form_score, 1)
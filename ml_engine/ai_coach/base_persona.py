@@ -1,12 +1,19 @@
 # base_persona.py
-from google import genai
-from django.conf import settings
+from .llm_client import get_client
+
+# A streamelt válaszban a modell kimenetének helye (a persona előtte/utána fűzött szövege marad)
+STREAM_PLACEHOLDER = "\x00ditta-stream\x00"
+MODEL_ID = "gemini-2.0-flash"
 
 class BasePersona:
-    def __init__(self):
+    def __init__(self, defer_generation=False):
         # ÚJ SDK konfiguráció (google.genai - NEM deprecated!)
-        self.client = genai.Client(api_key=settings.GEMINI_API_KEY)
-        self.model_id = "gemini-2.0-flash"
+        # ⚡ Processzenként egy közös kliens – a persona példányosítása nem nyit új kapcsolatot
+        self.client = get_client()
+        self.model_id = MODEL_ID
+        # 🆕 Streameléshez: a _generate csak eltárolja a promptot, a hívást az async végpont végzi
+        self.defer_generation = defer_generation
+        self.deferred_prompt = None
         
     def is_navigation_question(self, query):
         """Felismeri navigációs kérdéseket"""
@@ -85,15 +92,22 @@ class BasePersona:
         
         return "❓ Pontosíts: profil / mérés / kredit / sportolók / gyerekek"
 
+    def _full_prompt(self, prompt):
+        return (
+            "Te Ditta vagy, a DigiT-Train coach asszisztense. "
+            "Magyarul válaszolj, tegeződj, légy motiváló. "
+            "Rövid válaszok! Max 2-3 mondat. Használj emojit! "
+            f"\n\n{prompt}"
+        )
+
     def _generate(self, prompt):
         """Generálás google.genai SDK-val (ÚJ, nem deprecated!)"""
+        if self.defer_generation:
+            self.deferred_prompt = self._full_prompt(prompt)
+            return STREAM_PLACEHOLDER
+
         try:
-            full_prompt = (
-                "Te Ditta vagy, a DigiT-Train coach asszisztense. "
-                "Magyarul válaszolj, tegeződj, légy motiváló. "
-                "Rövid válaszok! Max 2-3 mondat. Használj emojit! "
-                f"\n\n{prompt}"
-            )
+            full_prompt = self._full_prompt(prompt)
             
             # ÚJ SDK szintaxis
             response = self.client.models.generate_content(
@@ -0,0 +1,69 @@
+# ml_engine/ai_coach/context_cache.py
+"""
+Ditta elemző (AnalystPersona) adatkontextusának cache-e.
+
+- Kulcs: (kérdező, cél user, szerepkör, nap) – egy beszélgetés követő kérdései
+  az interpreterek adatgyűjtését teljesen kihagyják.
+- Érvénytelenítés: felhasználónkénti verzió token. A bejegyzés eltárolja az összes érintett
+  user (cél, gyerekek, klub sportolói) építéskori tokenjét; ha bármelyik megváltozott,
+  a bejegyzés érvénytelen. Az ellenőrzés egyetlen get_many kérés.
+- A tokeneket a biometrikus, edzésnapló, diagnosztika, billing és predikció sorok mentése /
+  törlése lépteti (ml_engine.signals); bulk írásnál közvetlenül az invalidate_users.
+"""
+import hashlib
+import logging
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "ditta_ctx"
+VERSION_PREFIX = "ditta_ctx_ver"
+
+
+def _version_key(user_id) -> str:
+    return f"{VERSION_PREFIX}:{user_id}"
+
+
+def _context_key(viewer_id, target_id, role) -> str:
+    # A szerepkör neve ékezetes / szóközös lehet (memcached kulcs-kompatibilitás)
+    role_hash = hashlib.md5((role or "").encode("utf-8")).hexdigest()[:10]
+    return f"{KEY_PREFIX}:{viewer_id}:{target_id}:{role_hash}:{timezone.now().date().isoformat()}"
+
+
+def invalidate_users(user_ids):
+    """Az érintett userek összes cache-elt kontextusának érvénytelenítése (új verzió token)."""
+    token = time.time_ns()
+    keys = {_version_key(user_id): token for user_id in set(user_ids) if user_id is not None}
+    if keys:
+        cache.set_many(keys, timeout=None)
+
+
+def invalidate_user(user_id):
+    invalidate_users([user_id])
+
+
+def _versions(user_ids) -> dict:
+    found = cache.get_many([_version_key(user_id) for user_id in user_ids])
+    return {user_id: found.get(_version_key(user_id)) for user_id in user_ids}
+
+
+def get_or_build(builder, viewer_id, target_id, role) -> dict:
+    """
+    A cache-elt kontextus, vagy a builder-rel frissen épített (és eltárolt) kontextus.
+    :param builder: dependencies() -> user id-k, build() -> JSON/pickle-kompatibilis dict
+    """
+    key = _context_key(viewer_id, target_id, role)
+    entry = cache.get(key)
+    if entry is not None and _versions(entry["versions"]) == entry["versions"]:
+        logger.debug(f"🧠 [DITTA_CONTEXT] Cache találat: {key}")
+        return entry["data"]
+
+    # A tokeneket az adatgyűjtés ELŐTT olvassuk: egy közben érkező írás a következő kérést érvényteleníti
+    versions = _versions(sorted(set(builder.dependencies()) | {target_id}))
+    data = builder.build()
+    cache.set(key, {"versions": versions, "data": data}, timeout=getattr(settings, "ML_DITTA_CONTEXT_TTL", 900))
+    return data
@@ -2,7 +2,7 @@
 from .navigator import NavigatorPersona
 from .analyst import AnalystPersona
 
-def get_persona(context_app, has_ml_access=False):
+def get_persona(context_app, has_ml_access=False, defer_generation=False):
     """
     Kiválasztja a megfelelő személyiséget a jogosultság alapján.
     
@@ -13,13 +13,14 @@ def get_persona(context_app, has_ml_access=False):
     Args:
         context_app: Alkalmazás kontextusa (nem használt már)
         has_ml_access: Van-e aktív ML_ACCESS előfizetés
+        defer_generation: Streameléshez – a modell hívását a hívó végzi (deferred_prompt)
     
     Returns:
         BasePersona: Navigator vagy Analyst persona
     """
     if has_ml_access:
         # ML előfizetőknek: Guru mód (mélyreható elemzés)
-        return AnalystPersona()
+        return AnalystPersona(defer_generation=defer_generation)
     else:
         # Ingyenes felhasználóknak: Asszisztens mód (navigáció + upsell)
-        return NavigatorPersona()
\ No newline at end of file
+        return NavigatorPersona(defer_generation=defer_generation)
\ No newline at end of file
@@ -0,0 +1,157 @@
+# ml_engine/ai_coach/llm_client.py
+"""
+Megosztott, hosszú életű Gemini kliensek és streamelés.
+
+- A szinkron kliens processzenként egyszer jön létre (a personák példányosítása így olcsó);
+  fork után (gunicorn / Celery prefork) a gyermek processz újat hoz létre.
+- Az aszinkron kliens (genai.Client.aio) eseményhurkonként egy: ASGI alatt ez workerenként
+  egyetlen, tartós kapcsolatkészletű kliens; a runserver kérésenkénti hurkai sem keverednek.
+- stream_text: a tokenek érkezés szerinti továbbadása első-token és teljes időkorláttal.
+- acquire/release_stream_slot: felhasználónkénti párhuzamossági korlát (cache számláló, processzek között is).
+"""
+import asyncio
+import logging
+import os
+import threading
+import time
+import weakref
+
+from django.conf import settings
+from django.core.cache import cache
+from google import genai
+
+logger = logging.getLogger(__name__)
+
+_client = None
+_client_lock = threading.Lock()
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def _reset_after_fork():
+    global _client, _client_lock
+    _client = None
+    _client_lock = threading.Lock()
+    _async_clients.clear()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def get_client():
+    """A processz közös szinkron genai kliense."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = genai.Client(api_key=settings.GEMINI_API_KEY)
+    return _client
+
+
+def get_async_client():
+    """Az aktuális eseményhurok tartós aszinkron kliense (genai.Client.aio)."""
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        # A teljes klienst tartjuk meg: a .aio a szülő kliens kapcsolatkészletét használja
+        client = genai.Client(api_key=settings.GEMINI_API_KEY)
+        _async_clients[loop] = client
+    return client.aio
+
+
+def _slot_key(user_id) -> str:
+    return f"ditta_stream_slots:{user_id}"
+
+
+async def acquire_stream_slot(user_id) -> bool:
+    """
+    Felhasználónkénti párhuzamossági korlát (ML_DITTA_STREAM_MAX_PER_USER). A számláló lejárata a teljes
+    időkorlát kétszerese, így egy megszakadt processz sem zárja ki véglegesen a felhasználót.
+    :return: False, ha a felhasználónak már a megengedett számú válasza streamelődik
+    """
+    limit = int(getattr(settings, "ML_DITTA_STREAM_MAX_PER_USER", 2))
+    timeout = int(getattr(settings, "ML_DITTA_STREAM_TIMEOUT", 60)) * 2
+    key = _slot_key(user_id)
+    await cache.aadd(key, 0, timeout=timeout)
+    try:
+        active = await cache.aincr(key)
+    except ValueError:
+        # A kulcs közben lejárt
+        await cache.aset(key, 1, timeout=timeout)
+        active = 1
+    if active > limit:
+        await release_stream_slot(user_id)
+        return False
+    return True
+
+
+async def release_stream_slot(user_id):
+    try:
+        await cache.adecr(_slot_key(user_id))
+    except ValueError:
+        pass
+
+
+class MarkerFilter:
+    """Egy jelölő (pl. [MISSED]) kiszűrése a streamből akkor is, ha darabok határán érkezik."""
+
+    def __init__(self, marker: str):
+        self.marker = marker
+        self.found = False
+        self._buffer = ""
+
+    def feed(self, text: str) -> str:
+        self._buffer += text
+        if self.marker in self._buffer:
+            self.found = True
+            self._buffer = self._buffer.replace(self.marker, "")
+        # A jelölő eleje lehet a puffer végén – azt visszatartjuk a következő darabig
+        keep = 0
+        for size in range(min(len(self.marker) - 1, len(self._buffer)), 0, -1):
+            if self.marker.startswith(self._buffer[-size:]):
+                keep = size
+                break
+        out, self._buffer = self._buffer[:len(self._buffer) - keep], self._buffer[len(self._buffer) - keep:]
+        return out
+
+    def flush(self) -> str:
+        out, self._buffer = self._buffer, ""
+        return out
+
+
+async def stream_text(prompt: str, model_id: str):
+    """
+    A modell válaszának szövegdarabjai érkezés szerint.
+    :raises asyncio.TimeoutError: ha az első token vagy a teljes válasz túllépi a korlátot
+    """
+    first_token_timeout = float(getattr(settings, "ML_DITTA_STREAM_FIRST_TOKEN_TIMEOUT", 15))
+    total_timeout = float(getattr(settings, "ML_DITTA_STREAM_TIMEOUT", 60))
+    deadline = time.monotonic() + total_timeout
+    started = time.monotonic()
+
+    stream = await asyncio.wait_for(
+        get_async_client().models.generate_content_stream(model=model_id, contents=prompt),
+        timeout=first_token_timeout,
+    )
+    iterator = stream.__aiter__()
+    first = True
+    try:
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise asyncio.TimeoutError()
+            timeout = min(remaining, first_token_timeout) if first else remaining
+            try:
+                chunk = await asyncio.wait_for(iterator.__anext__(), timeout=timeout)
+            except StopAsyncIteration:
+                break
+            text = getattr(chunk, "text", None)
+            if text:
+                if first:
+                    logger.info(f"⚡ [DITTA_STREAM] Első token: {time.monotonic() - started:.2f} mp")
+                    first = False
+                yield text
+    finally:
+        aclose = getattr(iterator, "aclose", None)
+        if aclose is not None:
+            await aclose()
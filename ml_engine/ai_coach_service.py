@@ -15,11 +15,25 @@ class DittaCoachService:
             user_query: A felhasználó kérdése
             history: Beszélgetés előzmények (opcionális)
         """
+        response_text, _ = self._respond(user, context_app, user_query, history, active_role)
+        return response_text
+
+    def prepare_streamed_response(self, user, context_app, user_query=None, history=None, active_role=None):
+        """
+        🆕 Streameléshez: minden adatgyűjtés és prompt építés lefut, de a modell hívása nem.
+        
+        Returns:
+            (szöveg, prompt): a szövegben a STREAM_PLACEHOLDER jelöli a modell kimenetének helyét;
+            ha a válasz modell nélkül is kész (navigáció, szerepkör választás), a prompt None.
+        """
+        return self._respond(user, context_app, user_query, history, active_role, defer_generation=True)
+
+    def _respond(self, user, context_app, user_query=None, history=None, active_role=None, defer_generation=False):
         # 1. Jogosultság ellenőrzése
         has_ml_access = self._check_ml_access(user)
         
         # 2. Persona példányosítása
-        persona = get_persona(context_app, has_ml_access)
+        persona = get_persona(context_app, has_ml_access, defer_generation=defer_generation)
         
         # 3. Válasz generálása
         response_text = ""
@@ -59,7 +73,33 @@ class DittaCoachService:
             )
             response_text = response_text.replace("[MISSED]", "").strip()
         
-        return response_text
+        return response_text, persona.deferred_prompt
+
+    def generate_advice(self, user, prediction):
+        """
+        🆕 Rövid coach tanács egy elmentett predikcióhoz (a generate_coach_advice task hívja).
+        Hiba esetén kivételt dob, hogy a task újrapróbálhassa – hibaszöveg nem kerül a tanácsba.
+        """
+        from .ai_coach.base_persona import BasePersona
+        from .models import UserFeatureSnapshot
+
+        snapshot = UserFeatureSnapshot.objects.filter(user=user).order_by("-snapshot_date").first()
+        features = snapshot.features if snapshot else {}
+        if isinstance(features, list):
+            features = features[0] if features else {}
+
+        prompt = (
+            "Te Ditta vagy, a DigiT-Train coach asszisztense. "
+            "Magyarul válaszolj, tegeződj, légy motiváló. Max 2-3 mondat. Használj emojit!\n\n"
+            f"A sportoló holnapi várható formaindexe: {prediction.form_score:.1f}.\n"
+            f"Átlagos HRV: {features.get('avg_hrv', 'n.a.')} ms, átlagos alvásminőség: {features.get('avg_sleep', 'n.a.')}, "
+            f"dehidratációs index: {features.get('dehydration_index', 'n.a.')}.\n"
+            "Adj egy konkrét, rövid edzés/regenerációs tanácsot a holnapi napra."
+        )
+
+        persona = BasePersona()
+        response = persona.client.models.generate_content(model=persona.model_id, contents=prompt)
+        return (response.text or "").strip()
 
     def _check_ml_access(self, user):
         if not user or not user.is_authenticated:
@@ -0,0 +1,164 @@
+# ml_engine/bulk_prediction.py
+"""
+Tömeges formaindex predikció (éjszakai batch).
+
+A felhasználónkénti predict_form helyett:
+- a jogosult userek legfrissebb UserFeatureSnapshot-ja EGY window function lekérdezéssel jön,
+- a FEATURE_COLUMNS sorrendű feature mátrix egyben épül fel,
+- egyetlen model.predict hívás fut (opcionálisan n_jobs szállal); hibánál soronként, a hibás userek kimaradnak,
+- a UserPredictionResult sorok bulk_create(update_conflicts=True) upserttel íródnak.
+"""
+import copy
+import logging
+from datetime import date, datetime
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from django.db import connection
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+from django.utils.timezone import make_aware
+
+from ml_engine.advice_events import publish_predictions
+from ml_engine.ai_coach.context_cache import invalidate_users
+from ml_engine.models import UserFeatureSnapshot, UserPredictionResult
+from ml_engine.training_service import TrainingService, form_model_registry
+
+logger = logging.getLogger(__name__)
+
+CATEGORY_CODES = TrainingService.CATEGORY_CODES
+
+
+def latest_snapshots(user_ids):
+    """
+    A megadott userek legfrissebb snapshotja egy lekérdezésben (ROW_NUMBER() OVER (PARTITION BY user)).
+    :param user_ids: id lista vagy values('id') queryset (utóbbi subqueryként fut)
+    """
+    return (
+        UserFeatureSnapshot.objects
+        .filter(user_id__in=user_ids)
+        .annotate(row_number=Window(
+            expression=RowNumber(),
+            partition_by=[F("user_id")],
+            order_by=[F("snapshot_date").desc(), F("generated_at").desc()],
+        ))
+        .filter(row_number=1)
+        .values_list("user_id", "snapshot_date", "features")
+    )
+
+
+def _snapshot_row(features) -> dict:
+    """A predict_form-mal azonos értelmezés: lista esetén az első elem számít."""
+    if isinstance(features, list):
+        features = features[0] if features and isinstance(features[0], dict) else {}
+    return features if isinstance(features, dict) else {}
+
+
+def _to_float(value) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def build_feature_matrix(feature_dicts) -> pd.DataFrame:
+    """
+    FEATURE_COLUMNS sorrendű mátrix: a hiányzó oszlop 0, a kategória kóddá alakul (ismeretlen = 0),
+    a None / nem numerikus érték NaN – ugyanúgy, mint a felhasználónkénti predikciónál.
+    """
+    columns = TrainingService.FEATURE_COLUMNS
+    category_index = columns.index('category')
+    matrix = np.empty((len(feature_dicts), len(columns)), dtype=np.float64)
+
+    for row, features in enumerate(feature_dicts):
+        values = [features.get(col, 0) for col in columns]
+        values[category_index] = CATEGORY_CODES.get(values[category_index], 0)
+        matrix[row] = [_to_float(value) for value in values]
+
+    return pd.DataFrame(matrix, columns=[str(col) for col in columns])
+
+
+def _source_datetime(value):
+    if isinstance(value, date) and not isinstance(value, datetime):
+        return make_aware(datetime.combine(value, datetime.min.time()))
+    if isinstance(value, datetime) and value.tzinfo is None:
+        return make_aware(value)
+    return value
+
+
+def _predict(model, X: pd.DataFrame, n_jobs: int = None, user_ids=None):
+    """
+    Egy predict hívás; n_jobs-hoz sekély másolat, a registry közös példánya nem módosul.
+    Ha a közös hívás hibát dob (pl. egy hibás snapshot), soronként újrapróbáljuk: a hibás sorok
+    NaN-t kapnak (a hívó kihagyja őket), a többi user predikciója elkészül.
+    """
+    if n_jobs and hasattr(model, "n_jobs"):
+        model = copy.copy(model)
+        model.n_jobs = n_jobs
+    try:
+        return np.asarray(model.predict(X), dtype=np.float64)
+    except Exception as e:
+        logger.warning(f"⚠️ [ML_ENGINE] A tömeges predict hibát dobott ({e}), soronkénti újrapróbálás.")
+
+    predictions = np.full(len(X), np.nan)
+    failed = []
+    for row in range(len(X)):
+        try:
+            predictions[row] = np.asarray(model.predict(X.iloc[row:row + 1]), dtype=np.float64)[0]
+        except Exception as e:
+            failed.append(user_ids[row] if user_ids is not None else row)
+            logger.error(f"❌ [ML_ENGINE] Predikció hiba (user: {failed[-1]}): {e}")
+    if failed:
+        logger.warning(f"⚠️ [ML_ENGINE] {len(failed)} user predikciója kimaradt: {failed[:20]}")
+    return predictions
+
+
+def predict_bulk(user_ids, model=None, n_jobs: int = None, batch_size: int = 1000) -> int:
+    """
+    Predikció és mentés az összes megadott userre.
+    :return: a frissített UserPredictionResult sorok száma
+    """
+    model = model if model is not None else form_model_registry.get(wait=True)
+    if model is None:
+        logger.warning("⚠️ [ML_ENGINE] Nincs betöltött modell, a tömeges predikció kimarad.")
+        return 0
+    if n_jobs is None:
+        n_jobs = getattr(settings, "ML_PREDICTION_N_JOBS", None) or None
+
+    snapshots = list(latest_snapshots(user_ids))
+    if not snapshots:
+        return 0
+
+    X = build_feature_matrix([_snapshot_row(features) for _, _, features in snapshots])
+    predictions = _predict(model, X, n_jobs=n_jobs, user_ids=[user_id for user_id, _, _ in snapshots])
+
+    now = timezone.now()
+    results = [
+        UserPredictionResult(
+            user_id=user_id,
+            predicted_at=now,
+            form_score=float(score),
+            source_date=_source_datetime(snapshot_date),
+        )
+        for (user_id, snapshot_date, _), score in zip(snapshots, predictions)
+        if np.isfinite(score)
+    ]
+
+    # MySQL-en (ON DUPLICATE KEY UPDATE) nem adható meg unique_fields; a user egyedi kulcs dönt
+    unique_fields = ["user"] if connection.features.supports_update_conflicts_with_target else None
+    UserPredictionResult.objects.bulk_create(
+        results,
+        batch_size=batch_size,
+        update_conflicts=True,
+        update_fields=["predicted_at", "form_score", "source_date"],
+        unique_fields=unique_fields,
+    )
+    # A bulk upsert nem küld signalt: a Ditta kontextus cache közvetlenül érvénytelenedik
+    invalidate_users(result.user_id for result in results)
+    # 📨 A tanácsokat a rate limitelt generate_coach_advice task készíti el
+    publish_predictions((result.user_id, result.source_date) for result in results)
+
+    logger.info(f"⚡ [ML_ENGINE] Tömeges predikció: {len(results)} user, egy predict hívás ({len(X)} sor)")
+    return len(results)
@@ -7,17 +7,78 @@ class SyntheticDataGenerator:
     Kategória-specifikus sportolói adatokat generál a modell tanításához.
     """
     
-    def __init__(self):
+    def __init__(self, seed=None):
         self.categories = ['COMBAT', 'TEAM', 'ENDURANCE', 'POWER_TECH']
+        # 🆕 Seedelhető NumPy generátor a vektorizált generáláshoz (reprodukálható kísérletek)
+        self.rng = np.random.default_rng(seed)
 
     def generate_batch(self, count_per_category=2500):
+        """
+        ⚡ Vektorizált generálás: minden oszlop egy NumPy tömb, a kategóriánkénti képletek maszkokkal.
+        Az eloszlások megegyeznek a soronkénti _generate_single_row-éval; milliós méretben is másodpercek.
+        """
+        n = count_per_category * len(self.categories)
+        rng = self.rng
+        category = np.repeat(np.array(self.categories, dtype=object), count_per_category)
+
+        # 1. Demográfia
+        age = rng.integers(16, 56, size=n)
+        gender = rng.integers(0, 2, size=n)  # 0: Nő, 1: Férfi
+        male = gender == 1
+
+        # 2. Alapértékek kategória szerint (Grip Strength kg-ban)
+        strength_sport = (category == 'COMBAT') | (category == 'POWER_TECH')
+        low = np.where(strength_sport, np.where(male, 40, 25), np.where(male, 30, 20))
+        high = np.where(strength_sport, np.where(male, 65, 45), np.where(male, 50, 35))
+        base_grip = rng.uniform(low, high)
+
+        # 3. Élettani állapot (HRV és Alvás) – idősebbeknél picit alacsonyabb HRV
+        age_factor = (60 - age) / 40
+        hrv = rng.uniform(40, 90, size=n) * age_factor + rng.uniform(-5, 5, size=n)
+        sleep_quality = rng.uniform(4, 10, size=n)
+
+        # 4. Súlyvesztés és Hidratáció
+        weight_before = rng.uniform(60, 110, size=n)
+        intensity = rng.uniform(3, 10, size=n)
+        actual_loss = (intensity * 0.2) + rng.uniform(0.1, 0.8, size=n)
+        fluid_intake = actual_loss * rng.uniform(0, 0.8, size=n) * 1000
+        weight_after = weight_before - (actual_loss - (fluid_intake / 1000))
+        weight_loss_delta = (weight_before - weight_after) + (fluid_intake / 1000)
+        dehydration_index = weight_loss_delta / weight_before
+
+        # 5. FORMAINDEKS (Célváltozó)
+        hrv_score = np.clip(hrv, 0, 100)
+        grip_score = base_grip * np.where(sleep_quality < 6, 0.9, 1.0)
+        hydro_penalty = 100 - (dehydration_index * 1000)
+
+        # Súlyozás kategória szerint (COMBAT / ENDURANCE / egyéb)
+        w_hrv = np.select([category == 'COMBAT', category == 'ENDURANCE'], [0.25, 0.45], 0.35)
+        w_grip = np.select([category == 'COMBAT', category == 'ENDURANCE'], [0.45, 0.15], 0.35)
+        w_hydro = np.select([category == 'COMBAT', category == 'ENDURANCE'], [0.30, 0.40], 0.30)
+        form_score = (hrv_score * w_hrv) + (grip_score * w_grip) + (hydro_penalty * w_hydro)
+
+        return pd.DataFrame({
+            'age': age,
+            'gender': gender,
+            'category': category,
+            'avg_hrv': np.round(hrv, 2),
+            'avg_sleep': np.round(sleep_quality, 1),
+            'grip_right': np.round(base_grip, 1),
+            'grip_left': np.round(base_grip * rng.uniform(0.9, 1.1, size=n), 1),
+            'weight_loss_delta': np.round(weight_loss_delta, 3),
+            'dehydration_index': np.round(dehydration_index, 4),
+            'form_score': np.round(np.clip(form_score, 0, 100), 2),
+        })
+
+    def generate_batch_rowwise(self, count_per_category=2500):
+        """A korábbi soronkénti generálás (Python random) – összehasonlításhoz megtartva."""
         all_data = []
-        
+
         for cat in self.categories:
             for _ in range(count_per_category):
                 data = self._generate_single_row(cat)
                 all_data.append(data)
-        
+
         return pd.DataFrame(all_data)
 
     def _generate_single_row(self, category):
@@ -4,9 +4,77 @@ from django.utils import timezone
 from django.db import models
 # Importáljuk a biometriai modelleket
 from biometric_data.models import WeightData, WorkoutFeedback, HRVandSleepData
+from biometric_data.rollup import update_form_scores
 
 logger = logging.getLogger(__name__)
 
+FEATURE_WINDOW_DAYS = 30
+
+
+def compose_features(weight, hrv_avg, sleep_avg, grip, profile, category):
+    """
+    A feature dict összeállítása a már lekérdezett nyers értékekből.
+    A FeatureBuilder (egy user) és a BatchFeatureBuilder (minden sportoló) is ezt használja,
+    így a két út kimenete azonos.
+
+    :param weight: (pre_workout_weight, post_workout_weight, fluid_intake) a legutóbbi mérésből, vagy None
+    :param hrv_avg / sleep_avg: az időablak átlagai (None, ha nincs adat)
+    :param grip: (bal, jobb) marokerő a legutóbbi visszajelzésből, vagy None
+    :param profile: a user Profile-ja vagy None
+    :param category: a legutóbbi szerepkör sportágának kategóriája vagy None
+    """
+    # --- HIDRATÁCIÓS MÉRLEG (WeightData-ból) ---
+    weight_loss_delta = 0
+    dehydration_index = 0
+
+    if weight:
+        w_pre, w_post, fluid = weight
+        # fluid_intake l-ben van (pl. 0.5), a delta számításhoz float-ra váltunk
+        fluid = fluid or 0
+
+        if w_pre and w_post:
+            # Képlet: (Előtte - Utána) + Bevitt folyadék
+            weight_loss_delta = float(w_pre - w_post) + float(fluid)
+            dehydration_index = weight_loss_delta / float(w_pre) if w_pre > 0 else 0
+
+    # --- REGENERÁCIÓS MUTATÓK (HRVandSleepData-ból) ---
+    # Ha nincsenek adatok, biztonsági alapértelmezett értékeket adunk (50 ms HRV, 7.0 alvás)
+    hrv_avg = float(hrv_avg or 50.0)
+    sleep_avg = float(sleep_avg or 7.0)
+
+    # --- MAROKERŐ (WorkoutFeedback-ből) ---
+    # Ha nincs visszajelzés, 40 kg-os átlagos marokerőt feltételezünk
+    grip_l = float(grip[0] or 40.0) if grip else 40.0
+    grip_r = float(grip[1] or 40.0) if grip else 40.0
+
+    # --- FEATURE VEKTOR ÖSSZEÁLLÍTÁSA ---
+    user_age = 30
+    if profile is not None and profile.date_of_birth:
+        user_age = profile.age_years() or 30
+
+    # Alapértelmezett Férfi
+    user_gender = 1
+    if profile is not None:
+        user_gender = 1 if profile.gender == 'M' else 0
+
+    features = {
+        'age': user_age,
+        'gender': user_gender,
+        'category': category if category is not None else 'COMBAT',
+        'avg_hrv': round(hrv_avg, 2),
+        'avg_sleep': round(sleep_avg, 1),
+        'grip_right': round(grip_r, 1),
+        'grip_left': round(grip_l, 1),
+        'weight_loss_delta': round(weight_loss_delta, 3),
+        'dehydration_index': round(dehydration_index, 4),
+    }
+
+    # Kiszámoljuk a pontszámokat, hogy a Dashboard kártyái lássák
+    features['form_score'] = round((hrv_avg * 0.6) + (sleep_avg * 2), 2)
+    features['injury_risk_index'] = round(1.0 + (dehydration_index * 5), 2)
+    return features
+
+
 class FeatureBuilder:
     """
     Összegyűjti és számszerűsíti a felhasználó biometriai adatait 
@@ -22,73 +90,141 @@ class FeatureBuilder:
         Visszatérési érték: [dict] vagy None
         """
         # 1. Alapadatok lekérése az elmúlt 30 napból
-        since_date = timezone.now().date() - timedelta(days=30)
+        since_date = timezone.now().date() - timedelta(days=FEATURE_WINDOW_DAYS)
         
         # Lekérések a különböző táblákból
         weights = WeightData.objects.filter(user=self.user, workout_date__gte=since_date).order_by('-workout_date')
         feedback = WorkoutFeedback.objects.filter(user=self.user, workout_date__gte=since_date).order_by('-workout_date')
         recovery = HRVandSleepData.objects.filter(user=self.user, recorded_at__gte=since_date).order_by('-recorded_at')
 
-        # --- 2. HIDRATÁCIÓS MÉRLEG (WeightData-ból) ---
         latest_weight_entry = weights.first()
-        weight_loss_delta = 0
-        dehydration_index = 0
-
-        if latest_weight_entry:
-            w_pre = latest_weight_entry.pre_workout_weight
-            w_post = latest_weight_entry.post_workout_weight
-            # fluid_intake nálad l-ben van (pl. 0.5), a delta számításhoz float-ra váltunk
-            fluid = latest_weight_entry.fluid_intake or 0
-
-            if w_pre and w_post:
-                # Képlet: (Előtte - Utána) + Bevitt folyadék
-                weight_loss_delta = float(w_pre - w_post) + float(fluid)
-                dehydration_index = weight_loss_delta / float(w_pre) if w_pre > 0 else 0
-
-        # --- 3. REGENERÁCIÓS MUTATÓK (HRVandSleepData-ból) ---
-        # Ha nincsenek adatok, biztonsági alapértelmezett értékeket adunk (50 ms HRV, 7.0 alvás)
-        hrv_avg = float(recovery.aggregate(models.Avg('hrv'))['hrv__avg'] or 50.0)
-        sleep_avg = float(recovery.aggregate(models.Avg('sleep_quality'))['sleep_quality__avg'] or 7.0)
-
-        # --- 4. MAROKERŐ ÉS INTENZITÁS (WorkoutFeedback-ből) ---
+        recovery_avg = recovery.aggregate(hrv_avg=models.Avg('hrv'), sleep_avg=models.Avg('sleep_quality'))
         latest_f = feedback.first()
-        # Ha nincs visszajelzés, 40 kg-os átlagos marokerőt feltételezünk
-        grip_l = float(latest_f.left_grip_strength or 40.0) if latest_f else 40.0
-        grip_r = float(latest_f.right_grip_strength or 40.0) if latest_f else 40.0
-
-        # --- 5. FEATURE VEKTOR ÖSSZEÁLLÍTÁSA (A te struktúrádhoz igazítva) ---
-        
-        # Életkor lekérése a Profile-ból
-        user_age = 30
-        if hasattr(self.user, 'profile') and self.user.profile.date_of_birth:
-            user_age = self.user.profile.age_years() or 30
-
-        # Nem lekérése a Profile-ból
-        user_gender = 1 # Alapértelmezett Férfi
-        if hasattr(self.user, 'profile'):
-            user_gender = 1 if self.user.profile.gender == 'M' else 0
-
-        # Sport kategória lekérése a UserRole -> Sport útvonalon
-        user_category = 'COMBAT' # Alapértelmezett
         latest_role = self.user.user_roles.select_related('sport').first()
-        if latest_role and latest_role.sport:
-            user_category = latest_role.sport.category
-
-        features = {
-            'age': user_age,
-            'gender': user_gender,
-            'category': user_category,
-            'avg_hrv': round(hrv_avg, 2),
-            'avg_sleep': round(sleep_avg, 1),
-            'grip_right': round(grip_r, 1),
-            'grip_left': round(grip_l, 1),
-            'weight_loss_delta': round(weight_loss_delta, 3),
-            'dehydration_index': round(dehydration_index, 4),
-        }
 
-        # Kiszámoljuk a pontszámokat, hogy a Dashboard kártyái lássák
-        features['form_score'] = round((hrv_avg * 0.6) + (sleep_avg * 2), 2)
-        features['injury_risk_index'] = round(1.0 + (dehydration_index * 5), 2)
+        features = compose_features(
+            weight=(
+                latest_weight_entry.pre_workout_weight,
+                latest_weight_entry.post_workout_weight,
+                latest_weight_entry.fluid_intake,
+            ) if latest_weight_entry else None,
+            hrv_avg=recovery_avg['hrv_avg'],
+            sleep_avg=recovery_avg['sleep_avg'],
+            grip=(latest_f.left_grip_strength, latest_f.right_grip_strength) if latest_f else None,
+            profile=getattr(self.user, 'profile', None),
+            category=latest_role.sport.category if latest_role and latest_role.sport else None,
+        )
 
         # FONTOS: Vedd le a szögletes zárójelet! Csak a szótárat adjuk vissza.
-        return features
\ No newline at end of file
+        return features
+
+class BatchFeatureBuilder:
+    """
+    🆕 Halmazalapú feature számítás sok sportolóra egyszerre.
+
+    Userenkénti lekérdezések helyett chunkonként egy-egy lekérdezés:
+    - legutóbbi WeightData és WorkoutFeedback: ROW_NUMBER() OVER (PARTITION BY user),
+    - HRV / alvás átlag: GROUP BY user,
+    - legutóbbi szerepkör sportág kategóriája: ROW_NUMBER() OVER (PARTITION BY user),
+    - profil: select_related.
+    A kimenet userenként azonos a FeatureBuilder(user).build() eredményével (compose_features).
+    """
+
+    def __init__(self, users, chunk_size: int = 1000):
+        """
+        :param users: User queryset (pl. a jóváhagyott sportolók)
+        """
+        self.users = users
+        self.chunk_size = chunk_size
+        self.since_date = timezone.now().date() - timedelta(days=FEATURE_WINDOW_DAYS)
+
+    @staticmethod
+    def _latest_per_user(queryset, order_by, fields):
+        from django.db.models import F, Window
+        from django.db.models.functions import RowNumber
+
+        rows = (
+            queryset
+            .annotate(row_number=Window(expression=RowNumber(), partition_by=[F('user_id')], order_by=order_by))
+            .filter(row_number=1)
+            .values_list('user_id', *fields)
+        )
+        return {row[0]: row[1:] for row in rows}
+
+    def _build_chunk(self, users) -> dict:
+        from users.models import UserRole
+
+        user_ids = [user.id for user in users]
+
+        weights = self._latest_per_user(
+            WeightData.objects.filter(user_id__in=user_ids, workout_date__gte=self.since_date),
+            [models.F('workout_date').desc(), models.F('created_at').desc(), models.F('id').desc()],
+            ('pre_workout_weight', 'post_workout_weight', 'fluid_intake'),
+        )
+        grips = self._latest_per_user(
+            WorkoutFeedback.objects.filter(user_id__in=user_ids, workout_date__gte=self.since_date),
+            [models.F('workout_date').desc(), models.F('id').desc()],
+            ('left_grip_strength', 'right_grip_strength'),
+        )
+        categories = self._latest_per_user(
+            UserRole.objects.filter(user_id__in=user_ids),
+            [models.F('created_at').desc(), models.F('id').desc()],
+            ('sport__category',),
+        )
+        recovery = {
+            row['user_id']: row
+            for row in (
+                HRVandSleepData.objects
+                .filter(user_id__in=user_ids, recorded_at__gte=self.since_date)
+                .order_by()
+                .values('user_id')
+                .annotate(hrv_avg=models.Avg('hrv'), sleep_avg=models.Avg('sleep_quality'))
+            )
+        }
+
+        features_by_user = {}
+        for user in users:
+            averages = recovery.get(user.id, {})
+            category = categories.get(user.id)
+            features_by_user[user.id] = compose_features(
+                weight=weights.get(user.id),
+                hrv_avg=averages.get('hrv_avg'),
+                sleep_avg=averages.get('sleep_avg'),
+                grip=grips.get(user.id),
+                profile=getattr(user, 'profile', None),
+                category=category[0] if category else None,
+            )
+        return features_by_user
+
+    def build_all(self) -> dict:
+        """:return: {user_id: features dict} minden userre"""
+        users = list(self.users.select_related('profile').order_by('id'))
+        features_by_user = {}
+        for start in range(0, len(users), self.chunk_size):
+            features_by_user.update(self._build_chunk(users[start:start + self.chunk_size]))
+        return features_by_user
+
+    def save_snapshots(self, snapshot_date=None) -> int:
+        """Számítás és mentés egy bulk upserttel (user, snapshot_date egyedi kulcs). :return: mentett snapshotok"""
+        from django.db import connection
+        from ml_engine.models import UserFeatureSnapshot
+
+        snapshot_date = snapshot_date or timezone.now().date()
+        features_by_user = self.build_all()
+        snapshots = [
+            UserFeatureSnapshot(user_id=user_id, snapshot_date=snapshot_date, features=features)
+            for user_id, features in features_by_user.items()
+        ]
+        # MySQL-en (ON DUPLICATE KEY UPDATE) a unique_fields nem adható meg, az egyedi index dönt
+        unique_fields = ['user', 'snapshot_date'] if connection.features.supports_update_conflicts_with_target else None
+        UserFeatureSnapshot.objects.bulk_create(
+            snapshots,
+            batch_size=self.chunk_size,
+            update_conflicts=True,
+            update_fields=['features'],
+            unique_fields=unique_fields,
+        )
+        # A bulk upsert nem küld post_save signalt: a napi összesítő formaindexe itt frissül
+        update_form_scores(snapshot_date, features_by_user)
+        logger.info(f"⚡ [ML_ENGINE] {len(snapshots)} feature snapshot mentve ({snapshot_date})")
+        return len(snapshots)
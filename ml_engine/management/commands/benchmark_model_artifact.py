@@ -0,0 +1,115 @@
+# ml_engine/management/commands/benchmark_model_artifact.py
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+import joblib
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from ml_engine.data_generator import SyntheticDataGenerator
+from ml_engine.model_artifact import write_bundle
+from ml_engine.training_pipeline import frame_to_matrix
+from ml_engine.training_service import TrainingService
+
+# Hideg processz: betöltés + egy predikció, majd RSS / PSS mérés, miközben a többi processz is él
+CHILD_SCRIPT = r"""
+import json, sys, time
+started = time.perf_counter()
+import numpy as np
+fmt, path = sys.argv[1], sys.argv[2]
+if fmt == "joblib":
+    import joblib
+    model = joblib.load(path)
+else:
+    from ml_engine.model_artifact import load_bundle
+    model = load_bundle(path)
+load_seconds = time.perf_counter() - started
+X = np.zeros((1, 9))
+if fmt == "joblib":
+    import pandas as pd
+    X = pd.DataFrame(X, columns=model.feature_names_in_)
+model.predict(X)
+
+def memory():
+    values = {}
+    for name in ("/proc/self/status", "/proc/self/smaps_rollup"):
+        try:
+            with open(name) as fh:
+                for line in fh:
+                    key, _, rest = line.partition(":")
+                    if key in ("VmRSS", "Pss"):
+                        values[key] = int(rest.split()[0])
+        except OSError:
+            pass
+    return values
+
+print(json.dumps({"load_seconds": load_seconds, "first_predict_done": True, **memory()}), flush=True)
+sys.stdin.readline()
+print(json.dumps(memory()), flush=True)
+"""
+
+
+class Command(BaseCommand):
+    help = (
+        "A formaindex modell artifact formátumok összehasonlítása: hideg betöltési idő, "
+        "processzenkénti RSS és PSS (megosztott lapok) N párhuzamos processzben."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--processes", type=int, default=4, help="Párhuzamosan betöltő processzek száma.")
+        parser.add_argument("--trees", type=int, default=100, help="Fák száma a teszt modellben.")
+        parser.add_argument("--rows-per-category", type=int, default=2500, help="Szintetikus tanító sorok kategóriánként.")
+
+    def _run(self, fmt, path, processes):
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [str(settings.BASE_DIR), os.environ.get("PYTHONPATH")])))
+        children = [
+            subprocess.Popen([sys.executable, "-c", CHILD_SCRIPT, fmt, path], stdin=subprocess.PIPE,
+                             stdout=subprocess.PIPE, text=True, env=env)
+            for _ in range(processes)
+        ]
+        ready = [json.loads(child.stdout.readline()) for child in children]
+        for child in children:
+            child.stdin.write("\n")
+            child.stdin.flush()
+        shared = [json.loads(child.stdout.readline()) for child in children]
+        for child in children:
+            child.wait()
+
+        return {
+            "load_ms": 1000 * float(np.median([r["load_seconds"] for r in ready])),
+            "rss_mb": np.median([r.get("VmRSS", 0) for r in shared]) / 1024,
+            "pss_mb": np.median([r.get("Pss", 0) for r in shared]) / 1024,
+            "size_mb": (os.path.getsize(path) / 1024 / 1024),
+        }
+
+    def handle(self, *args, **options):
+        from sklearn.ensemble import RandomForestRegressor
+
+        X, y = frame_to_matrix(SyntheticDataGenerator(seed=42).generate_batch(options["rows_per_category"]))
+        columns = [str(col) for col in TrainingService.FEATURE_COLUMNS]
+        model = RandomForestRegressor(n_estimators=options["trees"], random_state=42, n_jobs=-1)
+        model.fit(pd.DataFrame(X, columns=columns), y)
+        model.set_params(n_jobs=None)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            pkl_path = os.path.join(tmp, "form_predictor.pkl")
+            joblib.dump(model, pkl_path)
+            bundle_path = os.path.join(tmp, "form_predictor.dtmodel")
+            compact = write_bundle(model, bundle_path, columns, TrainingService.CATEGORY_CODES)
+
+            sample = pd.DataFrame(X[:2000], columns=columns)
+            max_diff = float(np.max(np.abs(model.predict(sample) - compact.predict(sample))))
+            self.stdout.write(f"Predikció eltérés (sklearn vs kompakt, 2000 sor): max {max_diff:.2e}")
+
+            # Az első kicsomagolás hostonként egyszer történik; a mérés a már kicsomagolt állapotot nézi
+            for fmt, path in (("joblib", pkl_path), ("compact", bundle_path)):
+                result = self._run(fmt, path, options["processes"])
+                self.stdout.write(
+                    f"{fmt:8s} fájl={result['size_mb']:.2f} MB  hideg betöltés={result['load_ms']:.1f} ms  "
+                    f"RSS={result['rss_mb']:.1f} MB  PSS={result['pss_mb']:.1f} MB  ({options['processes']} processz)"
+                )
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.5 on 2026-10-17 09:12
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def remove_duplicate_predictions(apps, schema_editor):
+    """Userenként csak a legfrissebb predikció marad meg (az egyedi kulcs előfeltétele)."""
+    UserPredictionResult = apps.get_model('ml_engine', 'UserPredictionResult')
+    seen = set()
+    duplicates = []
+    for pk, user_id in UserPredictionResult.objects.order_by('user_id', '-predicted_at', '-id').values_list('id', 'user_id'):
+        if user_id in seen:
+            duplicates.append(pk)
+        else:
+            seen.add(user_id)
+    if duplicates:
+        UserPredictionResult.objects.filter(id__in=duplicates).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ml_engine', '0004_alter_dittamissedquery_options_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_predictions, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='userpredictionresult',
+            constraint=models.UniqueConstraint(fields=('user',), name='ml_engine_unique_prediction_per_user'),
+        ),
+    ]
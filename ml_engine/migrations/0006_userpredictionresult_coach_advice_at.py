@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-17 10:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ml_engine', '0005_userpredictionresult_unique_user'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userpredictionresult',
+            name='coach_advice_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,192 @@
+# ml_engine/model_artifact.py
+"""
+Kompakt, memory-mappelt formaindex modell artifact.
+
+A sklearn fák pickle-ből betöltéskor a csomópontokat saját memóriába másolják, így minden
+web/worker processz külön példányt tart. Itt az erdő lapos NumPy tömbökbe exportálódik:
+
+    <könyvtár>/manifest.json   – formátum verzió, feature oszlop sorrend, kategória kódok, tanítási metaadat
+    <könyvtár>/<tömb>.npy      – tömörítetlen tömbök, np.load(mmap_mode="r") -> a host processzei
+                                 ugyanazokat a page cache lapokat osztják meg
+
+Szállításra (GCS) a könyvtár egyetlen gzip-tömörített tar csomag (.dtmodel); hostonként egyszer
+csomagolódik ki. A predikció vektorizált fa-bejárás, a sklearn RandomForestRegressor.predict-tel
+azonos döntésekkel (float32 bemenet, X <= threshold, NaN a missing_go_to_left szerint).
+"""
+import json
+import os
+import shutil
+import tarfile
+import tempfile
+import time
+
+import numpy as np
+
+FORMAT_VERSION = 1
+MANIFEST_NAME = "manifest.json"
+ARRAY_NAMES = ("feature", "threshold", "left", "right", "value", "missing_left", "roots")
+
+
+class CompactForest:
+    """Lapos tömbös regressziós erdő (csak predikció)."""
+
+    def __init__(self, arrays: dict, manifest: dict):
+        self.manifest = manifest
+        self.feature_columns = manifest["feature_columns"]
+        self.category_codes = manifest.get("category_codes", {})
+        self.max_depth = manifest["max_depth"]
+        self.n_estimators = manifest["n_trees"]
+        self.feature = arrays["feature"]
+        self.threshold = arrays["threshold"]
+        self.left = arrays["left"]
+        self.right = arrays["right"]
+        self.value = arrays["value"]
+        self.missing_left = arrays["missing_left"]
+        self.roots = arrays["roots"]
+
+    # -----------------------------------------------------------
+    # Export sklearn erdőből
+    # -----------------------------------------------------------
+
+    @classmethod
+    def from_sklearn(cls, model, feature_columns, category_codes=None, metadata=None):
+        features, thresholds, lefts, rights, values, missing, roots = [], [], [], [], [], [], []
+        offset = 0
+        max_depth = 0
+        for estimator in model.estimators_:
+            tree = estimator.tree_
+            n = tree.node_count
+            is_leaf = tree.children_left < 0
+            roots.append(offset)
+            features.append(np.where(is_leaf, 0, tree.feature).astype(np.int32))
+            thresholds.append(tree.threshold.astype(np.float64))
+            lefts.append(np.where(is_leaf, -1, tree.children_left + offset).astype(np.int32))
+            rights.append(np.where(is_leaf, -1, tree.children_right + offset).astype(np.int32))
+            values.append(tree.value[:, 0, 0].astype(np.float64))
+            go_left = getattr(tree, "missing_go_to_left", None)
+            missing.append(np.asarray(go_left, dtype=np.uint8) if go_left is not None else np.zeros(n, dtype=np.uint8))
+            max_depth = max(max_depth, int(tree.max_depth))
+            offset += n
+
+        arrays = {
+            "feature": np.concatenate(features),
+            "threshold": np.concatenate(thresholds),
+            "left": np.concatenate(lefts),
+            "right": np.concatenate(rights),
+            "value": np.concatenate(values),
+            "missing_left": np.concatenate(missing),
+            "roots": np.asarray(roots, dtype=np.int32),
+        }
+        manifest = {
+            "format_version": FORMAT_VERSION,
+            "model_type": "random_forest_regressor",
+            "feature_columns": [str(col) for col in feature_columns],
+            "category_codes": dict(category_codes or {}),
+            "n_trees": len(roots),
+            "n_nodes": int(offset),
+            "max_depth": max_depth,
+            "metadata": metadata or {},
+        }
+        return cls(arrays, manifest)
+
+    # -----------------------------------------------------------
+    # Predikció
+    # -----------------------------------------------------------
+
+    def _as_matrix(self, X) -> np.ndarray:
+        if hasattr(X, "columns"):
+            X = X[self.feature_columns].to_numpy()
+        # A sklearn fák float32 bemenettel dolgoznak – a küszöb összehasonlítás így azonos
+        return np.asarray(X, dtype=np.float32).astype(np.float64)
+
+    def predict(self, X) -> np.ndarray:
+        X = self._as_matrix(X)
+        n_rows = X.shape[0]
+        node = np.broadcast_to(self.roots, (n_rows, len(self.roots))).copy()
+        rows = np.arange(n_rows)[:, None]
+
+        for _ in range(self.max_depth):
+            left = self.left[node]
+            leaf = left < 0
+            if leaf.all():
+                break
+            x = X[rows, self.feature[node]]
+            go_left = np.where(np.isnan(x), self.missing_left[node] == 1, x <= self.threshold[node])
+            node = np.where(leaf, node, np.where(go_left, left, self.right[node]))
+
+        return self.value[node].mean(axis=1)
+
+    # -----------------------------------------------------------
+    # Mentés / betöltés
+    # -----------------------------------------------------------
+
+    def save(self, directory: str) -> str:
+        os.makedirs(directory, exist_ok=True)
+        for name in ARRAY_NAMES:
+            np.save(os.path.join(directory, f"{name}.npy"), np.ascontiguousarray(getattr(self, name)))
+        with open(os.path.join(directory, MANIFEST_NAME), "w") as fh:
+            json.dump(self.manifest, fh, indent=2)
+        return directory
+
+    @classmethod
+    def load(cls, directory: str, mmap: bool = True):
+        with open(os.path.join(directory, MANIFEST_NAME)) as fh:
+            manifest = json.load(fh)
+        if manifest.get("format_version") != FORMAT_VERSION:
+            raise ValueError(f"Nem támogatott artifact formátum: {manifest.get('format_version')}")
+        mmap_mode = "r" if mmap else None
+        arrays = {name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode=mmap_mode) for name in ARRAY_NAMES}
+        return cls(arrays, manifest)
+
+
+# -----------------------------------------------------------
+# Szállítási csomag (.dtmodel = gzip tar)
+# -----------------------------------------------------------
+
+def pack(directory: str, bundle_path: str) -> str:
+    tmp_path = f"{bundle_path}.{os.getpid()}.part"
+    with tarfile.open(tmp_path, "w:gz", compresslevel=6) as tar:
+        for name in sorted(os.listdir(directory)):
+            tar.add(os.path.join(directory, name), arcname=name)
+    os.replace(tmp_path, bundle_path)
+    return bundle_path
+
+
+def unpack(bundle_path: str, directory: str) -> str:
+    """Kicsomagolás (hostonként egyszer): ideiglenes könyvtárba, majd atomikus átnevezés."""
+    if os.path.exists(os.path.join(directory, MANIFEST_NAME)):
+        return directory
+
+    parent = os.path.dirname(directory) or "."
+    tmp_dir = tempfile.mkdtemp(prefix=".unpack-", dir=parent)
+    try:
+        with tarfile.open(bundle_path, "r:gz") as tar:
+            for member in tar.getmembers():
+                if not member.isfile() or os.path.basename(member.name) != member.name:
+                    raise ValueError(f"Érvénytelen artifact elem: {member.name}")
+            tar.extractall(tmp_dir)
+        try:
+            os.rename(tmp_dir, directory)
+        except OSError:
+            # Egy másik processz közben kicsomagolta
+            if not os.path.exists(os.path.join(directory, MANIFEST_NAME)):
+                raise
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    return directory
+
+
+def load_bundle(bundle_path: str):
+    """A .dtmodel csomag melletti könyvtárba kicsomagolt, memory-mappelt modell."""
+    root, _ = os.path.splitext(bundle_path)
+    return CompactForest.load(unpack(bundle_path, root))
+
+
+def write_bundle(model, bundle_path: str, feature_columns, category_codes=None, metadata=None) -> CompactForest:
+    """sklearn erdő → kompakt könyvtár + tömörített csomag; a visszaadott példány már mmap-elt."""
+    root, _ = os.path.splitext(bundle_path)
+    shutil.rmtree(root, ignore_errors=True)
+    forest = CompactForest.from_sklearn(model, feature_columns, category_codes, dict(metadata or {}, packed_at=time.time()))
+    forest.save(root)
+    pack(root, bundle_path)
+    return CompactForest.load(root)
@@ -0,0 +1,270 @@
+# ml_engine/model_registry.py
+"""
+Processzenként egyszer betöltött ML modellek nyilvántartása (hot reload).
+
+- A modell egyszer deszerializálódik processzenként; a kérések a memóriában lévő példányt kapják.
+- A tárolt artifact verzióját (GCS objektum generáció, helyi fájlnál mtime) legfeljebb
+  ML_MODEL_CHECK_INTERVAL másodpercenként ellenőrizzük egy metaadat lekéréssel.
+- Új verzió (pl. a 02:30-as újratanítás után) háttérszálon töltődik be, és egyetlen
+  referencia cserével kerül élesbe – a futó kérések addig a régi modellt használják.
+- A dashboard (wait=False) soha nem vár deszerializálásra: hideg processzben None-t kap,
+  és a betöltés a háttérben indul; a batch predikció (wait=True) megvárja.
+- Megadható egy régi formátumú (legacy) artifact is: amíg az elsődleges még nem létezik
+  (pl. formátumváltás után az első újratanításig), az töltődik be "legacy-" verzióval.
+"""
+import glob
+import logging
+import os
+import shutil
+import threading
+import time
+
+import joblib
+from django.conf import settings
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+
+def get_storage_client():
+    """Hitelesített GCS kliens létrehozása a meglévő settings alapján."""
+    from google.cloud import storage
+
+    if getattr(settings, "GS_CREDENTIALS", None):
+        return storage.Client(credentials=settings.GS_CREDENTIALS, project=settings.GS_PROJECT_ID)
+    # Ha nincs közvetlen credentials (pl. Production Cloud Run-on), az alapértelmezettet használjuk
+    return storage.Client()
+
+
+class _LoadedModel:
+    """Egy betöltött modell verzióval – nem módosul, csere esetén új példány készül."""
+
+    __slots__ = ("model", "version", "loaded_at", "load_seconds")
+
+    def __init__(self, model, version: str, load_seconds: float):
+        self.model = model
+        self.version = version
+        self.loaded_at = timezone.now()
+        self.load_seconds = load_seconds
+
+
+class ModelRegistry:
+    """Egy modell processz-szintű példánya, verzió szerinti hot reloaddal és metrikákkal."""
+
+    def __init__(self, name: str, gcs_path: str, local_path: str, loader=None, legacy=None):
+        """
+        :param loader: path -> modell függvény (alapértelmezés: joblib.load)
+        :param legacy: (gcs_path, local_path, loader) – tartalék artifact, ha az elsődleges hiányzik
+        """
+        self.name = name
+        self.gcs_path = gcs_path
+        self.local_path = local_path
+        self.loader = loader or joblib.load
+        # (verzió előtag, gcs útvonal, helyi útvonal, loader) – az első létező forrás töltődik be
+        self._sources = [("", gcs_path, local_path, self.loader)]
+        if legacy is not None:
+            legacy_gcs_path, legacy_local_path, legacy_loader = legacy
+            self._sources.append(("legacy-", legacy_gcs_path, legacy_local_path, legacy_loader or joblib.load))
+        self._entry = None
+        self._next_check = 0.0
+        self._client = None
+        self._refresh_lock = threading.Lock()
+        self._state_lock = threading.Lock()
+        self._refreshing = False
+        self._stats = {
+            "hits": 0, "misses": 0, "checks": 0, "loads": 0, "load_failures": 0,
+            "last_load_seconds": None, "total_load_seconds": 0.0, "last_check_seconds": None,
+        }
+        # Fork után (gunicorn / Celery prefork) a zárak és a háttérszál állapota nem öröklődhet
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        self._refresh_lock = threading.Lock()
+        self._state_lock = threading.Lock()
+        self._refreshing = False
+        self._client = None
+
+    # -----------------------------------------------------------
+    # Lekérés
+    # -----------------------------------------------------------
+
+    def get(self, wait: bool = False):
+        """
+        Az aktuális modell vagy None.
+        :param wait: True esetén esedékes ellenőrzéskor / hideg processzben szinkron betöltés
+                     (batch taskok); False esetén a frissítés háttérszálon fut (webes kérések).
+        """
+        if time.monotonic() >= self._next_check:
+            if wait:
+                self._refresh(only_if_due=True)
+            else:
+                self._refresh_in_background()
+
+        entry = self._entry
+        self._count("hits" if entry is not None else "misses")
+        return entry.model if entry is not None else None
+
+    @property
+    def version(self):
+        entry = self._entry
+        return entry.version if entry is not None else None
+
+    def publish(self, model, version: str = None):
+        """Frissen tanított modell élesítése ebben a processzben (újratöltés nélkül)."""
+        version = version or self._local_version() or f"memory-{time.time_ns()}"
+        self._entry = _LoadedModel(model, version, 0.0)
+        self._next_check = time.monotonic() + self._check_interval()
+        logger.info(f"🔄 [MODEL_REGISTRY] {self.name} élesítve: {version}")
+
+    def refresh(self):
+        """Azonnali verzió ellenőrzés és szükség esetén újratöltés (szinkron)."""
+        self._refresh(only_if_due=False)
+        return self.version
+
+    def stats(self) -> dict:
+        """Betöltési idő és találati metrikák (JSON-kompatibilis)."""
+        entry = self._entry
+        with self._state_lock:
+            stats = dict(self._stats)
+        requests_total = stats["hits"] + stats["misses"]
+        stats.update({
+            "name": self.name,
+            "version": entry.version if entry is not None else None,
+            "loaded_at": entry.loaded_at.isoformat() if entry is not None else None,
+            "hit_rate": round(stats["hits"] / requests_total, 4) if requests_total else None,
+            "total_load_seconds": round(stats["total_load_seconds"], 4),
+            "pid": os.getpid(),
+        })
+        return stats
+
+    # -----------------------------------------------------------
+    # Frissítés
+    # -----------------------------------------------------------
+
+    def _check_interval(self) -> float:
+        return float(getattr(settings, "ML_MODEL_CHECK_INTERVAL", 300))
+
+    def _count(self, key: str, value=1):
+        with self._state_lock:
+            self._stats[key] += value
+
+    def _refresh_in_background(self):
+        with self._state_lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+        threading.Thread(target=self._background_refresh, name=f"model-registry-{self.name}", daemon=True).start()
+
+    def _background_refresh(self):
+        try:
+            self._refresh(only_if_due=True)
+        finally:
+            with self._state_lock:
+                self._refreshing = False
+
+    def _refresh(self, only_if_due: bool):
+        with self._refresh_lock:
+            if only_if_due and time.monotonic() < self._next_check:
+                return
+
+            try:
+                started = time.monotonic()
+                version, blob = self._resolve_version()
+                self._count("checks")
+                with self._state_lock:
+                    self._stats["last_check_seconds"] = round(time.monotonic() - started, 4)
+
+                current = self._entry
+                if version is None:
+                    if current is None:
+                        logger.warning(f"⚠️ [MODEL_REGISTRY] {self.name}: nincs tárolt modell (még nem készült el).")
+                elif current is None or current.version != version:
+                    self._load(version, blob)
+            except Exception as e:
+                self._count("load_failures")
+                logger.error(f"❌ [MODEL_REGISTRY] {self.name} frissítése sikertelen: {e}", exc_info=True)
+            finally:
+                # Hiba vagy hiányzó modell esetén is csak a következő intervallumban próbáljuk újra
+                self._next_check = time.monotonic() + self._check_interval()
+
+    def _local_version(self, local_path: str = None):
+        local_path = local_path or self.local_path
+        if os.path.exists(local_path):
+            return f"local-{os.stat(local_path).st_mtime_ns}"
+        return None
+
+    def _source(self, version: str):
+        """A verzióhoz tartozó (előtag, gcs útvonal, helyi útvonal, loader) forrás."""
+        for source in reversed(self._sources):
+            if version.startswith(source[0]):
+                return source
+        return self._sources[0]
+
+    def _resolve_version(self):
+        """
+        (verzió, blob): forrásonként a GCS objektum generációja, vagy a helyi fájl mtime-ja (blob=None).
+        A legacy forrás csak akkor számít, ha az elsődleges artifact sehol sincs meg.
+        """
+        bucket_name = getattr(settings, "GS_BUCKET_NAME", None)
+        for prefix, gcs_path, local_path, _ in self._sources:
+            if bucket_name:
+                try:
+                    if self._client is None:
+                        self._client = get_storage_client()
+                    # Egyetlen metaadat kérés, a tartalom nem töltődik le
+                    blob = self._client.bucket(bucket_name).get_blob(gcs_path)
+                    if blob is not None:
+                        return f"{prefix}gcs-{blob.generation}", blob
+                except Exception as e:
+                    logger.warning(f"⚠️ [MODEL_REGISTRY] GCS verzió lekérés sikertelen ({self.name}, {gcs_path}): {e}")
+            local_version = self._local_version(local_path)
+            if local_version is not None:
+                if prefix:
+                    logger.warning(f"⚠️ [MODEL_REGISTRY] {self.name}: az elsődleges artifact hiányzik, legacy modell: {local_path}")
+                return f"{prefix}{local_version}", None
+        return None, None
+
+    def _versioned_path(self, version: str) -> str:
+        root, ext = os.path.splitext(self._source(version)[2])
+        return f"{root}.{version}{ext}"
+
+    def _load(self, version: str, blob):
+        _, _, path, loader = self._source(version)
+        if blob is not None:
+            path = self._versioned_path(version)
+            if not os.path.exists(path):
+                tmp_path = f"{path}.{os.getpid()}.part"
+                blob.download_to_filename(tmp_path)
+                os.replace(tmp_path, path)
+
+        started = time.monotonic()
+        model = loader(path)
+        load_seconds = time.monotonic() - started
+
+        # Atomikus csere: a futó kérések a régi példányt használják tovább
+        self._entry = _LoadedModel(model, version, load_seconds)
+        with self._state_lock:
+            self._stats["loads"] += 1
+            self._stats["last_load_seconds"] = round(load_seconds, 4)
+            self._stats["total_load_seconds"] += load_seconds
+        logger.info(f"✅ [MODEL_REGISTRY] {self.name} betöltve: {version} ({load_seconds:.3f} mp)")
+
+        if blob is not None:
+            self._remove_stale_files(path)
+
+    def _remove_stale_files(self, current_path: str):
+        """A korábbi verziók letöltött fájljai (és a mellettük kicsomagolt könyvtárak) törlése, forrásonként."""
+        current_root = os.path.splitext(current_path)[0]
+        for prefix, _, local_path, _ in self._sources:
+            root, ext = os.path.splitext(local_path)
+            for path in glob.glob(f"{root}.{prefix}gcs-*"):
+                if path in (current_path, current_root) or path.endswith(".part"):
+                    continue
+                try:
+                    if os.path.isdir(path):
+                        shutil.rmtree(path)
+                    else:
+                        os.remove(path)
+                except OSError:
+                    pass
@@ -25,9 +25,15 @@ class UserPredictionResult(models.Model):
     form_score = models.FloatField()
     source_date = models.DateTimeField(null=True, blank=True)
     coach_advice = models.TextField(null=True, blank=True)
+    # A tanács elkészülésének ideje; ha régebbi a predicted_at-nél, a tanács elavult
+    coach_advice_at = models.DateTimeField(null=True, blank=True)
 
     class Meta:
         ordering = ["-predicted_at"]
+        # Userenként egy (a legfrissebb) predikció – a tömeges upsert (bulk_create update_conflicts) kulcsa
+        constraints = [
+            models.UniqueConstraint(fields=["user"], name="ml_engine_unique_prediction_per_user"),
+        ]
 
     def __str__(self):
         return f"{self.user.username} - {self.form_score:.2f}"
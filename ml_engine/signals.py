@@ -0,0 +1,53 @@
+# ml_engine/signals.py
+"""
+Ditta elemző kontextus cache érvénytelenítése (ml_engine.ai_coach.context_cache):
+a mögöttes sorok mentésekor / törlésekor az érintett userek verzió tokenje lép.
+"""
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+
+from ml_engine.ai_coach.context_cache import invalidate_users
+
+# "app_label.Model" -> az érintett user(ek) mezői
+CONTEXT_SOURCES = {
+    # Biometria
+    "biometric_data.WeightData": ("user_id",),
+    "biometric_data.HRVandSleepData": ("user_id",),
+    "biometric_data.WorkoutFeedback": ("user_id",),
+    "biometric_data.RunningPerformance": ("user_id",),
+    # Edzésnapló és felmérések
+    "training_log.Attendance": ("registered_athlete_id",),
+    "assessment.PhysicalAssessment": ("athlete_user_id",),
+    # Diagnosztika
+    "diagnostics_jobs.DiagnosticJob": ("user_id",),
+    "diagnostics_jobs.UserAnthropometryProfile": ("user_id",),
+    # Billing
+    "billing.UserSubscription": ("user_id",),
+    "billing.UserCreditBalance": ("user_id",),
+    "billing.UserAnalysisBalance": ("user_id",),
+    # Predikció, szerepkörök (szülő / edző összefoglalók), megosztás
+    "ml_engine.UserPredictionResult": ("user_id",),
+    "users.UserRole": ("user_id", "parent_id", "coach_id"),
+    "data_sharing.DataSharingPermission": ("athlete_id",),
+}
+
+
+def _invalidate_instance(sender, instance, **kwargs):
+    fields = CONTEXT_SOURCES[sender._meta.label]
+    user_ids = [getattr(instance, field, None) for field in fields]
+    transaction.on_commit(lambda: invalidate_users(user_ids))
+
+
+def _invalidate_session_attendees(sender, instance, **kwargs):
+    """Edzés módosítása (pl. időtartam) a jelenlévők edzésstatisztikáját is érinti."""
+    user_ids = list(
+        instance.attendees.filter(registered_athlete__isnull=False).values_list("registered_athlete_id", flat=True)
+    )
+    transaction.on_commit(lambda: invalidate_users(user_ids))
+
+
+for _label in CONTEXT_SOURCES:
+    post_save.connect(_invalidate_instance, sender=_label, dispatch_uid=f"ditta_ctx_save_{_label}")
+    post_delete.connect(_invalidate_instance, sender=_label, dispatch_uid=f"ditta_ctx_delete_{_label}")
+
+post_save.connect(_invalidate_session_attendees, sender="training_log.TrainingSession", dispatch_uid="ditta_ctx_session")
@@ -1,15 +1,19 @@
 # ml_engine/tasks.py
 import logging
+from celery import shared_task
 from datetime import date
 from django.utils import timezone
 from django.db import transaction
 from django.utils.timezone import make_aware
 from datetime import datetime
 
+from django.conf import settings
 from users.models import User
-from ml_engine.features import FeatureBuilder
+from ml_engine.features import BatchFeatureBuilder
 from ml_engine.models import UserFeatureSnapshot, UserPredictionResult
-from ml_engine.training_service import TrainingService
+from ml_engine.training_service import TrainingService, form_model_registry
+from ml_engine.bulk_prediction import predict_bulk
+from ml_engine.ai_coach.context_cache import invalidate_user
 from billing.models import UserSubscription
 from users.models import UserRole
 
@@ -18,7 +22,6 @@ logger = logging.getLogger(__name__)
 def generate_user_features():
     """Napi feature snapshot generálás - CSAK JÓVÁHAGYOTT SPORTOLÓKNAK."""
     logger.info("🚀 [ML_ENGINE] Feature generálás indul a sportolóknak...")
-    generated_count = 0
     today = timezone.now().date()
 
     # Szűrés: CSAK azok a userek, akiknek van 'Sportoló' szerepkörük és 'approved' státuszúak
@@ -27,27 +30,11 @@ def generate_user_features():
         user_roles__status='approved'
     ).distinct()
 
-    for user in sportolo_users:
-        try:
-            fb = FeatureBuilder(user)
-            features_dict = fb.build()
-
-            if not features_dict:
-                continue
-
-            # JAVÍTÁS: Itt biztosítjuk, hogy a változó neve konzisztens legyen
-            # A build() vagy dict-et vagy listát ad vissza, ezt kezeljük le:
-            final_features = features_dict[0] if isinstance(features_dict, list) else features_dict
-
-            UserFeatureSnapshot.objects.update_or_create(
-                user=user,
-                snapshot_date=today,
-                defaults={'features': final_features}
-            )
-            generated_count += 1
-            logger.info(f"✅ Feature snapshot készült: {user.username}")
-        except Exception as e:
-            logger.error(f"❌ Hiba a {user.username} feldolgozásakor: {e}", exc_info=True)
+    # ⚡ Halmazalapú számítás: chunkonként néhány csoportosított lekérdezés és egy bulk upsert
+    generated_count = BatchFeatureBuilder(
+        sportolo_users,
+        chunk_size=getattr(settings, "ML_FEATURE_BATCH_SIZE", 1000),
+    ).save_snapshots(snapshot_date=today)
 
     logger.info(f"🏁 Összesen {generated_count} sportoló feature snapshot elkészült.")
     return generated_count
@@ -75,37 +62,44 @@ def predict_form_for_active_subscribers():
         expiry_date__gte=timezone.now(),
         user__user_roles__role__name='Sportoló',
         user__user_roles__status='approved'
-    ).select_related("user").distinct()
-
-    trainer = TrainingService()
-    processed_count = 0
-
-    for sub in active_subs:
-        user = sub.user
-        try:
-            pred_date, prediction = trainer.predict_form(user)
-
-            if prediction is not None:
-                # Dátum átalakítása timezone-aware formátumba, ha szükséges
-                source_val = pred_date
-                if isinstance(source_val, date) and not isinstance(source_val, datetime):
-                    # Ha csak date, csinálunk belőle éjféli datetime-ot a mai napra
-                    source_val = make_aware(datetime.combine(source_val, datetime.min.time()))
-                elif isinstance(source_val, datetime) and source_val.tzinfo is None:
-                    source_val = make_aware(source_val)
-                
-                UserPredictionResult.objects.update_or_create(
-                    user=user,
-                    defaults={
-                        "predicted_at": timezone.now(),
-                        "form_score": prediction,
-                        "source_date": source_val,
-                    },
-                )
-                processed_count += 1
-                logger.info(f"✅ Predikció készült: {user.username} -> {prediction:.2f}")
-        except Exception as e:
-            logger.error(f"❌ Hiba a predikció során ({user.username}): {e}", exc_info=True)
+    ).distinct()
+
+    # 🔄 Batch futás előtt egyszer ellenőrizzük a tárolt modell verzióját (a 02:30-as tanítás után új lehet)
+    form_model_registry.refresh()
+
+    # ⚡ Egy snapshot lekérdezés, egy predict hívás, egy upsert – nem userenkénti DB körök
+    processed_count = predict_bulk(active_subs.values("user_id"))
 
     logger.info(f"🏁 Összesen {processed_count} predikció frissítve.")
-    return processed_count
\ No newline at end of file
+    return processed_count
+
+
+@shared_task(bind=True, queue='default', rate_limit=getattr(settings, "ML_ADVICE_RATE_LIMIT", "30/m"),
+             max_retries=3, default_retry_delay=120)
+def generate_coach_advice(self, user_id):
+    """
+    🆕 Ditta tanács egy elmentett predikcióhoz (az advice_events esemény fogyasztója).
+    A Gemini hívás itt fut, nem a predikció közben; a már friss tanácsot nem generálja újra.
+    """
+    from ml_engine.ai_coach_service import DittaCoachService
+
+    prediction = UserPredictionResult.objects.select_related("user").filter(user_id=user_id).first()
+    if prediction is None:
+        return "no_prediction"
+    if prediction.coach_advice and prediction.coach_advice_at and prediction.coach_advice_at >= prediction.predicted_at:
+        return "up_to_date"
+
+    try:
+        advice = DittaCoachService().generate_advice(prediction.user, prediction)
+    except Exception as e:
+        logger.warning(f"⚠️ [ML_ENGINE] Tanács generálás sikertelen (user_id={user_id}): {e}")
+        raise self.retry(exc=e)
+
+    if not advice:
+        return "empty"
+
+    UserPredictionResult.objects.filter(pk=prediction.pk).update(coach_advice=advice, coach_advice_at=timezone.now())
+    # 🧠 A .update() nem küld signalt: a Ditta kontextus cache-t közvetlenül érvénytelenítjük
+    invalidate_user(user_id)
+    logger.info(f"💬 [ML_ENGINE] Tanács mentve: user_id={user_id}")
+    return "saved"
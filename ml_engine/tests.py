@@ -1,3 +1,77 @@
+from datetime import date, timedelta
+from decimal import Decimal
+
 from django.test import TestCase
+from django.utils import timezone
+
+from biometric_data.models import HRVandSleepData, WeightData, WorkoutFeedback
+from users.models import Club, Role, Sport, User, UserRole
+
+from .features import BatchFeatureBuilder, FeatureBuilder
+
+
+class BatchFeatureBuilderMatchesFeatureBuilderTests(TestCase):
+    """A halmazalapú feature számítás userenként a FeatureBuilder(user).build() eredményét adja."""
+
+    @classmethod
+    def setUpTestData(cls):
+        today = timezone.now().date()
+        combat = Sport.objects.create(name='Birkózás', category='COMBAT')
+        team = Sport.objects.create(name='Labdarúgás', category='TEAM')
+        club = Club.objects.create(name='Teszt SE', short_name='TSE', address='Budapest')
+        athlete_role = Role.objects.create(name='Sportoló')
+
+        # 1. Minden adatforrás, több méréssel: a legutóbbi (és az ablakon belüli) számít
+        full = cls.create_user('full', date(2001, 5, 20), 'F')
+        for days_ago, pre, post, fluid in ((10, '70.0', '68.5', '0.5'), (2, '71.2', '69.9', None), (40, '80', '70', '1')):
+            weight = WeightData.objects.create(
+                user=full, morning_weight=70, pre_workout_weight=Decimal(pre),
+                post_workout_weight=Decimal(post), fluid_intake=Decimal(fluid) if fluid else None,
+            )
+            WeightData.objects.filter(pk=weight.pk).update(workout_date=today - timedelta(days=days_ago))
+        for days_ago, hrv, sleep in ((1, '62.5', 8), (5, '55.0', 6), (45, '10.0', 1)):
+            HRVandSleepData.objects.create(
+                user=full, hrv=Decimal(hrv), sleep_quality=sleep, recorded_at=today - timedelta(days=days_ago)
+            )
+        for days_ago, left, right in ((3, '41.5', '44.0'), (1, '39.0', None)):
+            WorkoutFeedback.objects.create(
+                user=full, left_grip_strength=Decimal(left),
+                right_grip_strength=Decimal(right) if right else None, workout_date=today - timedelta(days=days_ago),
+            )
+        # Két szerepkör: a legutóbb létrehozott sportág kategóriája számít
+        older = UserRole.objects.create(user=full, role=athlete_role, club=club, sport=combat, status='approved')
+        UserRole.objects.filter(pk=older.pk).update(created_at=timezone.now() - timedelta(days=30))
+        UserRole.objects.create(user=full, role=athlete_role, club=club, sport=team, status='approved')
+
+        # 2. Csak profil és egy hiányos súlymérés (nincs edzés utáni súly)
+        partial = cls.create_user('partial', date(2012, 1, 1), 'M')
+        WeightData.objects.create(user=partial, morning_weight=45, pre_workout_weight=Decimal('45.0'))
+        UserRole.objects.create(user=partial, role=athlete_role, club=club, sport=combat, status='approved')
+
+        # 3. Semmilyen adat: az alapértelmezések
+        cls.create_user('empty', None, '')
+
+        # 4. Csak ablakon kívüli adat
+        stale = cls.create_user('stale', date(1990, 12, 31), 'M')
+        HRVandSleepData.objects.create(user=stale, hrv=Decimal('70'), sleep_quality=9, recorded_at=today - timedelta(days=31))
+
+    @classmethod
+    def create_user(cls, username, date_of_birth, gender):
+        user = User.objects.create_user(username=username, password='pw')
+        user.profile.date_of_birth = date_of_birth
+        user.profile.gender = gender
+        user.profile.save()
+        return user
+
+    def test_build_all_matches_per_user_builder(self):
+        users = User.objects.all()
+        expected = {user.id: FeatureBuilder(user).build() for user in users}
+        for chunk_size in (1000, 2):
+            with self.subTest(chunk_size=chunk_size):
+                self.assertEqual(BatchFeatureBuilder(users, chunk_size=chunk_size).build_all(), expected)
 
-# Create your tests here.
+    def test_query_count_does_not_scale_with_users(self):
+        users = User.objects.all()
+        # userek (profil), súly, marokerő, kategória, HRV / alvás átlag
+        with self.assertNumQueries(5):
+            BatchFeatureBuilder(users).build_all()
@@ -0,0 +1,268 @@
+# ml_engine/training_pipeline.py
+"""
+Inkrementális, párhuzamos tanítási pipeline a formaindex modellhez.
+
+- A valódi UserFeatureSnapshot sorok chunkokban streamelődnek egy oszlopos (npz) cache-be;
+  éjszakánként csak az utolsó cache-elt naptól újabb sorok jönnek az adatbázisból.
+- A szintetikus alapadat (SyntheticDataGenerator, fix seed) a futások között cache-elt.
+- A tanítás minden magot használ (n_jobs), a holdout metrikák (MAE, R²) a metaadatba kerülnek.
+- Verziózott artifactok: <cache_dir>/artifacts/<verzió>.pkl + <verzió>.json (az utolsó N megmarad).
+- Warm start (alapértelmezés): a korábbi erdőhöz csak az új sorokon tanított fák adódnak hozzá, így az
+  éjszakai tanítás ideje nem nő a táblával; ML_TRAINING_FULL_REBUILD_DAYS naponként (vagy a fák
+  maximális számánál) teljes újratanítás fut.
+"""
+import glob
+import json
+import logging
+import os
+import time
+from datetime import date, datetime, timedelta
+
+import joblib
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from django.utils import timezone
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.metrics import mean_absolute_error, r2_score
+
+from ml_engine.bulk_prediction import CATEGORY_CODES, build_feature_matrix
+from ml_engine.data_generator import SyntheticDataGenerator
+from ml_engine.models import UserFeatureSnapshot
+from ml_engine.training_service import TrainingService
+
+logger = logging.getLogger(__name__)
+
+# A szintetikus generátor logikájának változásakor növelni kell (a cache kulcs része)
+SYNTHETIC_BASELINE_VERSION = 1
+SYNTHETIC_SEED = 42
+
+
+def frame_to_matrix(df: pd.DataFrame):
+    """Szintetikus DataFrame → (X, y) a FEATURE_COLUMNS sorrendjében, vektorizáltan."""
+    X = df[TrainingService.FEATURE_COLUMNS].copy()
+    X['category'] = X['category'].map(CATEGORY_CODES).fillna(0)
+    return X.to_numpy(dtype=np.float64), df['form_score'].to_numpy(dtype=np.float64)
+
+
+class TrainingPipeline:
+    """A napi tanítás lépései: adat cache frissítés, tanítás, kiértékelés, artifact mentés."""
+
+    def __init__(self, cache_dir: str = None, n_jobs: int = None, n_estimators: int = 100,
+                 chunk_size: int = 5000, holdout_fraction: float = 0.1, random_state: int = 42):
+        self.cache_dir = cache_dir or getattr(settings, "ML_TRAINING_CACHE_DIR", "/tmp/ml_training")
+        self.artifact_dir = os.path.join(self.cache_dir, "artifacts")
+        self.n_jobs = n_jobs if n_jobs is not None else getattr(settings, "ML_TRAINING_N_JOBS", -1)
+        self.n_estimators = n_estimators
+        self.chunk_size = chunk_size
+        self.holdout_fraction = holdout_fraction
+        self.random_state = random_state
+        os.makedirs(self.artifact_dir, exist_ok=True)
+
+    # -----------------------------------------------------------
+    # Valódi adatok: oszlopos cache, inkrementális frissítés
+    # -----------------------------------------------------------
+
+    @property
+    def real_cache_path(self) -> str:
+        return os.path.join(self.cache_dir, "real_snapshots.npz")
+
+    def _load_real_cache(self):
+        max_age = int(getattr(settings, "ML_TRAINING_CACHE_MAX_AGE_DAYS", 7))
+        try:
+            with np.load(self.real_cache_path) as data:
+                cache = {key: data[key] for key in data.files}
+        except (OSError, ValueError):
+            return None
+        # Időnként teljes újraépítés (törölt userek, utólag módosított régi snapshotok)
+        if date.today().toordinal() - int(cache["built_on"]) > max_age:
+            return None
+        return cache
+
+    def _fetch_real_rows(self, since: date = None):
+        """A snapshotok streamelése chunkokban; csak a form_score-ral rendelkező sorok kellenek."""
+        queryset = UserFeatureSnapshot.objects.order_by("id")
+        if since is not None:
+            queryset = queryset.filter(snapshot_date__gte=since)
+
+        ids, days, rows, targets = [], [], [], []
+        for pk, snapshot_date, features in queryset.values_list("id", "snapshot_date", "features").iterator(chunk_size=self.chunk_size):
+            if isinstance(features, dict) and features.get("form_score") is not None:
+                ids.append(pk)
+                days.append(snapshot_date.toordinal())
+                rows.append(features)
+                targets.append(float(features["form_score"]))
+
+        X = build_feature_matrix(rows).to_numpy() if rows else np.empty((0, len(TrainingService.FEATURE_COLUMNS)))
+        return np.asarray(ids, dtype=np.int64), np.asarray(days, dtype=np.int32), X, np.asarray(targets, dtype=np.float64)
+
+    def update_real_cache(self) -> dict:
+        """
+        A cache frissítése: az utolsó cache-elt naptól (azt is beleértve, mert az aznapi snapshot
+        upserttel még változhat) újra lekérjük a sorokat, a korábbiak a lemezről jönnek.
+        """
+        cache = self._load_real_cache()
+        if cache is not None and len(cache["days"]):
+            watermark = date.fromordinal(int(cache["days"].max()))
+            keep = cache["days"] < watermark.toordinal()
+            ids, days, X, y = self._fetch_real_rows(since=watermark)
+            cache = {
+                "ids": np.concatenate([cache["ids"][keep], ids]),
+                "days": np.concatenate([cache["days"][keep], days]),
+                "X": np.concatenate([cache["X"][keep], X]),
+                "y": np.concatenate([cache["y"][keep], y]),
+                "built_on": cache["built_on"],
+            }
+            logger.info(f"🗂 [TRAINING] Snapshot cache frissítve: {len(ids)} sor {watermark} óta, összesen {len(cache['ids'])}")
+        else:
+            ids, days, X, y = self._fetch_real_rows()
+            cache = {"ids": ids, "days": days, "X": X, "y": y, "built_on": np.int64(date.today().toordinal())}
+            logger.info(f"🗂 [TRAINING] Snapshot cache újraépítve: {len(ids)} sor")
+
+        tmp_path = f"{self.real_cache_path}.{os.getpid()}.tmp.npz"
+        np.savez(tmp_path, **cache)
+        os.replace(tmp_path, self.real_cache_path)
+        return cache
+
+    # -----------------------------------------------------------
+    # Szintetikus alapadat (cache-elt)
+    # -----------------------------------------------------------
+
+    def synthetic_baseline(self, count_per_category: int = 2500):
+        path = os.path.join(
+            self.cache_dir, f"synthetic_v{SYNTHETIC_BASELINE_VERSION}_{count_per_category}_{SYNTHETIC_SEED}.npz"
+        )
+        try:
+            with np.load(path) as data:
+                return data["X"], data["y"]
+        except (OSError, ValueError):
+            pass
+
+        X, y = frame_to_matrix(SyntheticDataGenerator(seed=SYNTHETIC_SEED).generate_batch(count_per_category))
+        tmp_path = f"{path}.{os.getpid()}.tmp.npz"
+        np.savez(tmp_path, X=X, y=y)
+        os.replace(tmp_path, path)
+        return X, y
+
+    # -----------------------------------------------------------
+    # Tanítás
+    # -----------------------------------------------------------
+
+    def _frame(self, X):
+        return pd.DataFrame(X, columns=[str(col) for col in TrainingService.FEATURE_COLUMNS])
+
+    def _holdout_split(self, n: int):
+        rng = np.random.default_rng(self.random_state)
+        mask = rng.random(n) < self.holdout_fraction
+        return ~mask, mask
+
+    def latest_metadata(self):
+        paths = sorted(glob.glob(os.path.join(self.artifact_dir, "*.json")))
+        if not paths:
+            return None
+        with open(paths[-1]) as fh:
+            return json.load(fh)
+
+    def _warm_start_model(self, previous, X_new, y_new):
+        """A korábbi erdő bővítése az új sorokon tanított fákkal (None, ha nem lehetséges)."""
+        add_trees = int(getattr(settings, "ML_TRAINING_WARM_START_TREES", 20))
+        max_trees = int(getattr(settings, "ML_TRAINING_MAX_TREES", 300))
+        model = joblib.load(previous["artifact_path"]) if os.path.exists(previous.get("artifact_path", "")) else None
+        if not isinstance(model, RandomForestRegressor) or model.n_estimators + add_trees > max_trees:
+            return None
+
+        model.set_params(warm_start=True, n_estimators=model.n_estimators + add_trees, n_jobs=self.n_jobs)
+        model.fit(self._frame(X_new), y_new)
+        return model
+
+    @staticmethod
+    def _full_rebuild_due(previous) -> bool:
+        """Eltelt-e ML_TRAINING_FULL_REBUILD_DAYS nap az utolsó teljes tanítás óta."""
+        full_trained_at = previous.get("full_trained_at") or previous.get("trained_at")
+        if not full_trained_at:
+            return True
+        days = int(getattr(settings, "ML_TRAINING_FULL_REBUILD_DAYS", 7))
+        return timezone.now() - datetime.fromisoformat(full_trained_at) >= timedelta(days=days)
+
+    def train(self, warm_start: bool = False):
+        """
+        :return: (model, metadata dict) vagy (None, None), ha nincs elég adat
+        """
+        started = time.monotonic()
+        cache = self.update_real_cache()
+        X_synth, y_synth = self.synthetic_baseline()
+
+        X_all = np.concatenate([X_synth, cache["X"]])
+        y_all = np.concatenate([y_synth, cache["y"]])
+        if len(y_all) < 10:
+            logger.error("❌ [TRAINING] Nincs elég adat a tanításhoz.")
+            return None, None
+
+        train_mask, holdout_mask = self._holdout_split(len(y_all))
+        mode = "full"
+        model = None
+        previous = self.latest_metadata() if warm_start else None
+        if previous is not None and self._full_rebuild_due(previous):
+            logger.info("🧠 [TRAINING] Esedékes a periodikus teljes újratanítás.")
+            previous = None
+
+        if previous is not None:
+            # Csak a legutóbbi tanítás óta érkezett valódi sorok (a holdout-ot kihagyva)
+            new_rows = cache["ids"] > int(previous.get("max_snapshot_id", 0))
+            new_mask = np.concatenate([np.zeros(len(y_synth), dtype=bool), new_rows]) & train_mask
+            if new_mask.sum() >= 10:
+                model = self._warm_start_model(previous, X_all[new_mask], y_all[new_mask])
+                mode = "warm_start" if model is not None else mode
+
+        if model is None:
+            model = RandomForestRegressor(n_estimators=self.n_estimators, random_state=self.random_state, n_jobs=self.n_jobs)
+            model.fit(self._frame(X_all[train_mask]), y_all[train_mask])
+
+        training_seconds = time.monotonic() - started
+        holdout_pred = model.predict(self._frame(X_all[holdout_mask])) if holdout_mask.any() else np.array([])
+        # Kiszolgáláskor soronkénti predikció fut: a szálkezelés ott nem éri meg (a batch maga állítja)
+        model.set_params(n_jobs=None, warm_start=False)
+
+        trained_at = timezone.now()
+        version = trained_at.strftime("%Y%m%d%H%M%S")
+        metadata = {
+            "version": version,
+            "mode": mode,
+            "trained_at": trained_at.isoformat(),
+            # A warm start a legutóbbi teljes tanítás idejét viszi tovább (periodikus újratanításhoz)
+            "full_trained_at": (
+                previous.get("full_trained_at") or previous.get("trained_at")
+                if mode == "warm_start" else trained_at.isoformat()
+            ),
+            "training_seconds": round(training_seconds, 2),
+            "n_estimators": model.n_estimators,
+            "rows_synthetic": int(len(y_synth)),
+            "rows_real": int(len(cache["y"])),
+            "rows_train": int(train_mask.sum()),
+            "rows_holdout": int(holdout_mask.sum()),
+            "holdout_mae": round(float(mean_absolute_error(y_all[holdout_mask], holdout_pred)), 4) if len(holdout_pred) else None,
+            "holdout_r2": round(float(r2_score(y_all[holdout_mask], holdout_pred)), 4) if len(holdout_pred) > 1 else None,
+            "max_snapshot_id": int(cache["ids"].max()) if len(cache["ids"]) else 0,
+            "feature_columns": list(TrainingService.FEATURE_COLUMNS),
+        }
+        metadata["artifact_path"] = self._save_artifact(model, metadata)
+        logger.info(
+            f"🧠 [TRAINING] {mode} tanítás kész: {metadata['rows_train']} sor, {model.n_estimators} fa, "
+            f"{metadata['training_seconds']} mp, holdout MAE={metadata['holdout_mae']} R²={metadata['holdout_r2']}"
+        )
+        return model, metadata
+
+    def _save_artifact(self, model, metadata: dict) -> str:
+        artifact_path = os.path.join(self.artifact_dir, f"{metadata['version']}.pkl")
+        joblib.dump(model, artifact_path)
+        with open(os.path.join(self.artifact_dir, f"{metadata['version']}.json"), "w") as fh:
+            json.dump(dict(metadata, artifact_path=artifact_path), fh, indent=2)
+
+        keep = int(getattr(settings, "ML_TRAINING_KEEP_ARTIFACTS", 5))
+        for old in sorted(glob.glob(os.path.join(self.artifact_dir, "*.json")))[:-keep]:
+            for path in (old, old[:-len(".json")] + ".pkl"):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+        return artifact_path
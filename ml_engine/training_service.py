@@ -1,25 +1,27 @@
 # ml_engine/training_service.py
 import os
-import joblib
 import pandas as pd
 import numpy as np
 import logging
 from django.conf import settings
-from google.cloud import storage
-from google.oauth2 import service_account
 
-from sklearn.ensemble import RandomForestRegressor
 from ml_engine.models import UserFeatureSnapshot
-from ml_engine.data_generator import SyntheticDataGenerator
-from .ai_coach_service import DittaCoachService
+from .model_artifact import load_bundle, write_bundle
+from .model_registry import ModelRegistry, get_storage_client
 
 logger = logging.getLogger(__name__)
 
 class TrainingService:
     # Helyi ideiglenes útvonal (Cloud Run-on és Codespace-ben is írható)
-    LOCAL_MODEL_PATH = "/tmp/form_predictor.pkl"
+    # 🆕 Kompakt artifact (.dtmodel: tömörített csomag, mellette a kicsomagolt, mmap-elt tömbök)
+    LOCAL_MODEL_PATH = "/tmp/form_predictor.dtmodel"
     # GCS-en belüli útvonal
-    GCS_MODEL_PATH = "models/form_predictor.pkl"
+    GCS_MODEL_PATH = "models/form_predictor.dtmodel"
+    # Régi (joblib) modell: tartalék, amíg az első .dtmodel újratanítás el nem készül
+    LEGACY_LOCAL_MODEL_PATH = "/tmp/form_predictor.pkl"
+    LEGACY_GCS_MODEL_PATH = "models/form_predictor.pkl"
+
+    CATEGORY_CODES = {'COMBAT': 0, 'STRENGTH': 1, 'ENDURANCE': 2, 'REHAB': 3}
 
     # 🔹 DEFINIÁLJUK A FIX SORRENDET
     FEATURE_COLUMNS = [
@@ -27,118 +29,73 @@ class TrainingService:
         'grip_right', 'grip_left', 'weight_loss_delta', 'dehydration_index'
     ]
 
-    def __init__(self):
+    def __init__(self, wait_for_model: bool = True):
         self.bucket_name = getattr(settings, 'GS_BUCKET_NAME', None)
-        self.model = self.load_model()
+        # 🆕 A modell a processz-szintű registryből jön (nincs joblib.load példányosításkor).
+        # wait_for_model=False: webes kérés, hideg processzben sem vár a betöltésre.
+        self.wait_for_model = wait_for_model
+
+    @property
+    def model(self):
+        return form_model_registry.get(wait=self.wait_for_model)
 
     def _get_storage_client(self):
         """Hitelesített GCS kliens létrehozása a meglévő settings alapján."""
-        if hasattr(settings, 'GS_CREDENTIALS') and settings.GS_CREDENTIALS:
-            return storage.Client(credentials=settings.GS_CREDENTIALS, project=settings.GS_PROJECT_ID)
-        
-        # Ha nincs közvetlen credentials (pl. Production Cloud Run-on), próbálja az alapértelmezettet
-        return storage.Client()
+        return get_storage_client()
 
     def load_model(self):
-        """Betölti a modellt: GCS -> Local /tmp -> Memory"""
-        # 1. Ha nincs a /tmp-ben, próbáljuk letölteni a GCS-ről
-        if not os.path.exists(self.LOCAL_MODEL_PATH):
-            logger.info("🤖 Modell nem található a /tmp-ben, letöltés a GCS-ről...")
-            self._download_from_gcs()
-
-        # 2. Ha most már létezik a fájl, betöltjük
-        if os.path.exists(self.LOCAL_MODEL_PATH):
-            try:
-                return joblib.load(self.LOCAL_MODEL_PATH)
-            except Exception as e:
-                logger.error(f"❌ Modell betöltése sikertelen: {e}")
-        
-        logger.warning("⚠️ Nem sikerült betölteni a modellt (még nem készült el).")
-        return None
-
-    def _download_from_gcs(self):
-        """Modell letöltése a bödönből."""
-        try:
-            client = self._get_storage_client()
-            bucket = client.bucket(self.bucket_name)
-            blob = bucket.blob(self.GCS_MODEL_PATH)
-            
-            if blob.exists():
-                blob.download_to_filename(self.LOCAL_MODEL_PATH)
-                logger.info(f"✅ Modell sikeresen letöltve: gs://{self.bucket_name}/{self.GCS_MODEL_PATH}")
-            else:
-                logger.warning("⚠️ Modell nem létezik a GCS-en.")
-        except Exception as e:
-            logger.error(f"❌ Hiba a GCS letöltés során: {e}")
+        """A registryben lévő (szükség esetén most betöltött) modell."""
+        return form_model_registry.get(wait=True)
 
-    def _upload_to_gcs(self):
-        """Modell feltöltése a bödönbe."""
+    def _upload_to_gcs(self, local_path=None, gcs_path=None):
+        """Modell (vagy verziózott artifact) feltöltése a bödönbe. :return: a registry verzió vagy None"""
+        local_path = local_path or self.LOCAL_MODEL_PATH
+        gcs_path = gcs_path or self.GCS_MODEL_PATH
         try:
             client = self._get_storage_client()
             bucket = client.bucket(self.bucket_name)
-            blob = bucket.blob(self.GCS_MODEL_PATH)
-            blob.upload_from_filename(self.LOCAL_MODEL_PATH)
-            logger.info(f"🚀 Modell feltöltve a GCS-re: gs://{self.bucket_name}/{self.GCS_MODEL_PATH}")
+            blob = bucket.blob(gcs_path)
+            blob.upload_from_filename(local_path)
+            logger.info(f"🚀 Modell feltöltve a GCS-re: gs://{self.bucket_name}/{gcs_path}")
+            return f"gcs-{blob.generation}" if blob.generation else None
         except Exception as e:
             logger.error(f"❌ Hiba a GCS feltöltés során: {e}")
+            return None
+
+    def train_model(self, warm_start: bool = None):
+        """
+        A hibrid tanítási folyamat (TrainingPipeline): inkrementális snapshot cache,
+        cache-elt szintetikus alapadat, párhuzamos tanítás, holdout metrikák, verziózott artifact.
+        :param warm_start: True esetén csak az új sorokra tanított fák adódnak a korábbi erdőhöz
+        """
+        from ml_engine.training_pipeline import TrainingPipeline
 
-    def train_model(self):
-        """A hibrid tanítási folyamat."""
         logger.info("🧠 Modell tanítása indul...")
-        
-        X, y = self._prepare_training_data()
-        
-        if X.empty or len(y) < 10:
-            logger.error("❌ Nincs elég adat a tanításhoz.")
+        if warm_start is None:
+            warm_start = getattr(settings, "ML_TRAINING_WARM_START", True)
+
+        model, metadata = TrainingPipeline().train(warm_start=warm_start)
+        if model is None:
             return False
 
-        # Tanítás
-        model = RandomForestRegressor(n_estimators=100, random_state=42)
-        model.fit(X, y)
-
-        # Mentés helyben
-        joblib.dump(model, self.LOCAL_MODEL_PATH)
-        
-        # Feltöltés GCS-re
-        self._upload_to_gcs()
-        
-        self.model = model
-        return True
+        # Mentés helyben: kompakt, mmap-elhető artifact manifesttel (oszlop sorrend, kategória kódok, metaadat)
+        compact_model = write_bundle(model, self.LOCAL_MODEL_PATH, self.FEATURE_COLUMNS, self.CATEGORY_CODES, metadata)
 
-    def _prepare_training_data(self):
-        """Valódi és szintetikus adatok összefésülése (a korábbi kódod alapján)."""
-        # Itt marad a korábbi logikád a SyntheticDataGenerator-ral
-        gen = SyntheticDataGenerator()
-        df_synth = gen.generate_batch(count_per_category=2500)
-        
-        real_snapshots = UserFeatureSnapshot.objects.all()
-        real_data = []
-        for s in real_snapshots:
-            feat = s.features
-            if isinstance(feat, dict) and 'form_score' in feat:
-                real_data.append(feat)
-        
-        df_real = pd.DataFrame(real_data)
-        df_combined = pd.concat([df_synth, df_real], ignore_index=True)
-
-        if 'category' in df_combined.columns:
-            df_combined['category'] = df_combined['category'].map({
-                'COMBAT': 0, 'STRENGTH': 1, 'ENDURANCE': 2, 'REHAB': 3
-            }).fillna(0)
-
-        y = df_combined['form_score']
-        
-        # 🔹 CSAK A FIX OSZLOPOKAT TARTJUK MEG ÉS SORBA RENDEZZÜK
-        X = df_combined[self.FEATURE_COLUMNS].copy()
-        X.columns = X.columns.astype(str)
-        
-        return X, y
+        # Verziózott másolat + metaadat, majd az élő modell feltöltése
+        version_path = f"models/versions/form_predictor-{metadata['version']}"
+        self._upload_to_gcs(metadata["artifact_path"], f"{version_path}.pkl")
+        self._upload_to_gcs(metadata["artifact_path"][:-len(".pkl")] + ".json", f"{version_path}.json")
+        version = self._upload_to_gcs()
+
+        # 🔄 Ebben a processzben azonnal élesítjük; a többi processz a következő verzió ellenőrzéskor tölti be
+        form_model_registry.publish(compact_model, version=version)
+        return True
 
     def predict_form(self, user):
         """Predikció végrehajtása egy adott felhasználóra."""
-        if not self.model:
-            self.model = self.load_model()
-            if not self.model: return None, None
+        model = self.model
+        if model is None:
+            return None, None
 
         try:
             latest_snapshot = UserFeatureSnapshot.objects.filter(user=user).order_by("-snapshot_date").first()
@@ -150,9 +107,7 @@ class TrainingService:
             df_pred = pd.DataFrame(data_for_df)
             
             if 'category' in df_pred.columns:
-                df_pred['category'] = df_pred['category'].map({
-                    'COMBAT': 0, 'STRENGTH': 1, 'ENDURANCE': 2, 'REHAB': 3
-                }).fillna(0)
+                df_pred['category'] = df_pred['category'].map(self.CATEGORY_CODES).fillna(0)
 
             # 🔹 KÉNYSZERÍTJÜK UGYANAZT A SORRENDET, MINT A TANÍTÁSNÁL
             # Ha valami hiányzik a snapshotból, kitöltjük nullával
@@ -163,16 +118,21 @@ class TrainingService:
             X_pred = df_pred[self.FEATURE_COLUMNS].copy()
             X_pred.columns = X_pred.columns.astype(str)
 
-            prediction = self.model.predict(X_pred)[0]
-            
-            # AI Tanács (Ditta)
-            try:
-                coach = DittaCoachService()
-                coach.generate_advice(user)
-            except: pass
+            prediction = model.predict(X_pred)[0]
 
+            # A Ditta tanács nem itt készül: a mentett predikciók eseményt küldenek (advice_events)
             return latest_snapshot.snapshot_date, float(prediction)
 
         except Exception as e:
             logger.error(f"❌ Predikciós hiba: {e}")
-            return None, None
\ No newline at end of file
+            return None, None
+
+
+# 🆕 Processzenként egyetlen betöltött formaindex modell (hot reload a GCS generáció alapján)
+form_model_registry = ModelRegistry(
+    "form_predictor",
+    gcs_path=TrainingService.GCS_MODEL_PATH,
+    local_path=TrainingService.LOCAL_MODEL_PATH,
+    loader=load_bundle,
+    legacy=(TrainingService.LEGACY_GCS_MODEL_PATH, TrainingService.LEGACY_LOCAL_MODEL_PATH, None),
+)
@@ -10,4 +10,6 @@ urlpatterns = [
     path('dashboard/', views.dashboard_view, name='dashboard'),
     path('api/dashboard-data/', views.dashboard_data_api, name='dashboard_data_api'),
     path('api/ditta-chat/', views.ditta_chat_api, name='ditta_chat_api'),
+    path('api/ditta-chat/stream/', views.ditta_chat_stream_api, name='ditta_chat_stream_api'),
+    path('api/model-registry/', views.model_registry_stats_api, name='model_registry_stats_api'),
 ]
\ No newline at end of file
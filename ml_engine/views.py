@@ -1,10 +1,12 @@
 # ml_engine/views.py
 
+import asyncio
 import logging
 import json
 import re
+from asgiref.sync import sync_to_async
 from datetime import date, timedelta
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
 from django.shortcuts import render
 from django.contrib.auth.decorators import login_required
 from django.utils import timezone
@@ -13,14 +15,19 @@ from django.views.decorators.http import require_http_methods,  require_GET
 
 # Modulok és Modellek
 from ml_engine.ai_coach_service import DittaCoachService
-from ml_engine.training_service import TrainingService
-from ml_engine.models import UserFeatureSnapshot, UserPredictionResult
-from biometric_data.models import WeightData, HRVandSleepData, WorkoutFeedback
+from ml_engine.ai_coach.base_persona import MODEL_ID, STREAM_PLACEHOLDER
+from ml_engine.ai_coach.llm_client import MarkerFilter, acquire_stream_slot, release_stream_slot, stream_text
+from ml_engine.training_service import TrainingService, form_model_registry
+from ml_engine.models import DittaMissedQuery, UserFeatureSnapshot, UserPredictionResult
+from biometric_data.models import AthleteDailyRollup
+from biometric_data.rollup import rollup_window
 from billing.models import UserSubscription
 from billing.decorators import subscription_required
 
 logger = logging.getLogger(__name__)
 
+MAX_DASHBOARD_DAYS = 90
+
 # ------------------------------------------------------------
 #  Formaindex predikció (külön oldal)
 # ------------------------------------------------------------
@@ -93,59 +100,23 @@ def form_prediction_view(request):
 def dashboard_view(request):
     user = request.user
     today = date.today()
-    two_weeks_ago = today - timedelta(days=14)
 
     active_sub = UserSubscription.objects.filter(
         user=user, sub_type="ML_ACCESS", active=True
     ).first()
 
-    # --- Biometrikus adatok ---
-    weight_data = WeightData.objects.filter(
-        user=user, workout_date__gte=two_weeks_ago
-    ).order_by("workout_date")
-
-    hrv_data = HRVandSleepData.objects.filter(
-        user=user, recorded_at__gte=two_weeks_ago
-    ).order_by("recorded_at")
-
-    feedback_data = WorkoutFeedback.objects.filter(
-        user=user, workout_date__gte=two_weeks_ago
-    ).order_by("workout_date")
-
-    # --- Aktuális snapshot ---
-    latest_snapshot = (
-        UserFeatureSnapshot.objects.filter(user=user)
-        .order_by("-generated_at")
-        .first()
-    )
-
-    ci = 0.0
-    injury_risk_index = 0.0
-
-    if latest_snapshot:
-        # Ellenőrizzük a features típusát
-        if isinstance(latest_snapshot.features, dict):
-            ci = float(latest_snapshot.features.get("form_score", 0))
-            injury_risk_index = float(
-                latest_snapshot.features.get("injury_risk_index", 0)
-            )
-        elif isinstance(latest_snapshot.features, list):
-            # Ha lista, próbáljuk az első elemből kinyerni
-            if latest_snapshot.features and len(latest_snapshot.features) > 0:
-                if isinstance(latest_snapshot.features[0], dict):
-                    ci = float(latest_snapshot.features[0].get("form_score", 0))
-                    injury_risk_index = float(
-                        latest_snapshot.features[0].get("injury_risk_index", 0)
-                    )
+    # 📊 Napi összesítő: egyetlen indexelt tartomány-olvasás a teljes 14 napos ablakra
+    rollups = rollup_window(user, 14)
+    ci, injury_risk_index = _latest_form(user, rollups)
 
     # --- Predikció ---
     predicted_form_index = None
-    ml_service = TrainingService()
-    if ml_service.model:
-        try:
-            _, predicted_form_index = ml_service.predict_form(user)
-        except Exception as e:
-            logger.error(f"ML hiba: {e}")
+    # ⚡ A registry modelljét használjuk; hideg processzben nem várunk a betöltésre
+    ml_service = TrainingService(wait_for_model=False)
+    try:
+        _, predicted_form_index = ml_service.predict_form(user)
+    except Exception as e:
+        logger.error(f"ML hiba: {e}")
 
     # --- Értékelés ---
     if ci < 20:
@@ -158,32 +129,7 @@ def dashboard_view(request):
         evaluation_text, evaluation_color = "Kiemelkedő forma", "#2980b9"
 
     # --- Trend ---
-    snapshots = (
-        UserFeatureSnapshot.objects.filter(user=user)
-        .order_by("snapshot_date")[:14]
-    )
-
-    trend_dates = []
-    trend_values = []
-
-    for s in snapshots:
-        trend_dates.append(s.snapshot_date.strftime("%Y-%m-%d"))
-        
-        # Típusellenőrzés
-        val = 0
-        if isinstance(s.features, dict):
-            val = s.features.get("form_score", 0)
-        elif isinstance(s.features, list):
-            if s.features and len(s.features) > 0:
-                if isinstance(s.features[0], dict):
-                    val = s.features[0].get("form_score", 0)
-                else:
-                    try:
-                        val = float(s.features[0])
-                    except (ValueError, TypeError):
-                        val = 0
-        
-        trend_values.append(float(val))
+    trend_dates, trend_values = _form_series(rollups)
 
     if predicted_form_index is not None:
         trend_dates.append((today + timedelta(days=1)).strftime("%Y-%m-%d"))
@@ -207,10 +153,10 @@ def dashboard_view(request):
     )
 
     chart_data = {
-        "dates": [str(w.workout_date) for w in weight_data],
-        "weights": [float(w.morning_weight) for w in weight_data],
-        "hrv": [float(h.hrv or 0) for h in hrv_data],
-        "intensity": [f.workout_intensity or 0 for f in feedback_data],
+        "dates": [str(r.day) for r in rollups if r.morning_weight is not None],
+        "weights": [float(r.morning_weight) for r in rollups if r.morning_weight is not None],
+        "hrv": [float(r.hrv or 0) for r in rollups if r.hrv is not None or r.sleep_quality is not None or r.alertness is not None],
+        "intensity": [r.workout_intensity or 0 for r in rollups if r.workout_intensity is not None or r.right_grip_strength is not None or r.left_grip_strength is not None],
         "trend_dates": trend_dates,
         "trend_values": trend_values,
         "injury_risk": [injury_risk_index] * len(trend_dates),
@@ -235,85 +181,59 @@ def dashboard_view(request):
 
     return render(request, "ml_engine/dashboard.html", context)
 
+def _form_series(rollups):
+    """(dátumok, formaindexek) a formaindexszel rendelkező napokra."""
+    days = [r for r in rollups if r.form_score is not None]
+    return [r.day.strftime("%Y-%m-%d") for r in days], [float(r.form_score) for r in days]
+
+
+def _latest_form(user, rollups):
+    """(formaindex, sérülési kockázat) a legutolsó formaindexes napból; az ablakon kívül egy indexelt lekérés."""
+    latest = next((r for r in reversed(rollups) if r.form_score is not None), None)
+    if latest is None:
+        latest = (
+            AthleteDailyRollup.objects.filter(user=user, form_score__isnull=False)
+            .order_by("-day")
+            .first()
+        )
+    if latest is None:
+        return 0.0, 0.0
+    return float(latest.form_score), float(latest.injury_risk_index or 0)
+
+
 @login_required
 @subscription_required
 @require_GET
 def dashboard_data_api(request):
-    """AJAX adatforrás – 7 / 14 / 30 nap"""
+    """AJAX adatforrás – 7 / 14 / 30 / 90 nap (napi összesítőből)"""
 
     user = request.user
-    days = int(request.GET.get("days", 14))
+    try:
+        days = min(max(int(request.GET.get("days", 14)), 1), MAX_DASHBOARD_DAYS)
+    except ValueError:
+        days = 14
     today = date.today()
-    since = today - timedelta(days=days)
-
-    # Snapshotok
-    snapshots = (
-        UserFeatureSnapshot.objects
-        .filter(user=user, snapshot_date__gte=since)
-        .order_by("snapshot_date")
-    )
 
-    trend_dates = []
-    trend_values = []
-
-    for s in snapshots:
-        # Ellenőrizzük, hogy mi a features típusa
-        if isinstance(s.features, dict):
-            # Ha dictionary
-            value = s.features.get("form_score", 0) or s.features.get("avg_hrv", 0) or 0
-        elif isinstance(s.features, list):
-            # Ha lista, akkor próbáljuk meg az első elemet használni
-            if s.features and len(s.features) > 0:
-                if isinstance(s.features[0], dict):
-                    value = s.features[0].get("form_score", 0) or s.features[0].get("avg_hrv", 0) or 0
-                else:
-                    # Ha az első elem is nem dict, akkor számként próbáljuk
-                    try:
-                        value = float(s.features[0])
-                    except (ValueError, TypeError):
-                        value = 0
-            else:
-                value = 0
-        else:
-            # Ha egyéb típus (pl. szám vagy string)
-            try:
-                value = float(s.features)
-            except (ValueError, TypeError):
-                value = 0
-        
-        trend_dates.append(s.snapshot_date.strftime("%Y-%m-%d"))
-        trend_values.append(float(value))
+    rollups = rollup_window(user, days)
+    trend_dates, trend_values = _form_series(rollups)
 
     # Predikció
     predicted_value = None
-    ml_service = TrainingService()
-    
-    # Debug
-    print(f"DEBUG - ML Service model exists: {ml_service.model is not None}")
-    
-    if ml_service.model:
-        try:
-            _, predicted_value = ml_service.predict_form(user)
-            print(f"DEBUG - Predicted value: {predicted_value}")
-        except Exception as e:
-            logger.error(f"Prediction error: {e}")
-            print(f"DEBUG - Prediction error: {e}")
+    # ⚡ A registry modelljét használjuk; hideg processzben nem várunk a betöltésre
+    ml_service = TrainingService(wait_for_model=False)
+
+    try:
+        _, predicted_value = ml_service.predict_form(user)
+        logger.debug(f"Predicted value: {predicted_value}")
+    except Exception as e:
+        logger.error(f"Prediction error: {e}")
 
     if predicted_value:
         trend_dates.append((today + timedelta(days=1)).strftime("%Y-%m-%d"))
         trend_values.append(float(predicted_value))
-        print(f"DEBUG - Added prediction to trend")
-    else:
-        print(f"DEBUG - No prediction value to add")
 
-    # 1. Injury Risk kinyerése a legfrissebb snapshotból
-    latest_snapshot = UserFeatureSnapshot.objects.filter(user=user).order_by("-generated_at").first()
-    injury_risk_val = 0
-    if latest_snapshot:
-        if isinstance(latest_snapshot.features, dict):
-            injury_risk_val = latest_snapshot.features.get("injury_risk_index", 0)
-        elif isinstance(latest_snapshot.features, list) and len(latest_snapshot.features) > 0:
-            injury_risk_val = latest_snapshot.features[0].get("injury_risk_index", 0)
+    # 1. Injury Risk a legfrissebb formaindexes napi összesítőből
+    _, injury_risk_val = _latest_form(user, rollups)
 
     # 2. Statisztikák (marad a korábbi)
     avg_form = sum(trend_values) / len(trend_values) if trend_values else 0
@@ -350,6 +270,53 @@ def dashboard_data_api(request):
 
 ditta_service = DittaCoachService()
 
+def _remember_chat_role(request, session_key, user_query, response_text, active_role):
+    """A kiválasztott / kikövetkeztetett szerepkör mentése a sessionbe (szinkron és streamelt chat)."""
+    # === ÚJ RÉSZ: Ellenőrizzük, hogy sikerült-e szerepkört választani ===
+    # 1. Regex alapú keresés (ha benne van a válaszban)
+    role_pattern = r'Rendben, \*\*([^*]+)\*\* minőségedben segítek'
+    role_match = re.search(role_pattern, response_text)
+    
+    if role_match:
+        new_role = role_match.group(1)
+        request.session[session_key] = new_role
+        request.session.modified = True
+        logger.info(f"[SESSION SAVED] Role from response: {new_role}")
+    
+    # 2. Ha nincs a válaszban, de sikerült megállapítani a kérdésből
+    # (pl. "gyerekkel" -> Szülő), akkor is mentsük el!
+    elif not active_role:  # Ha még nincs mentve
+        # Próbáljuk meg kitalálni még egyszer
+        from users.models import UserRole
+        user_roles = UserRole.objects.filter(user=request.user, status='approved')
+        
+        # Egyszerű kulcsszó alapú detektálás
+        query_lower = user_query.lower()
+        detected_role = None
+        
+        if any(kw in query_lower for kw in ['gyerek', 'gyermek', 'fiam', 'lányom']):
+            parent_role = user_roles.filter(role__name='Szülő').first()
+            if parent_role:
+                detected_role = 'Szülő'
+        elif any(kw in query_lower for kw in ['sportoló', 'tanítványaim', 'csapatom']):
+            coach_role = user_roles.filter(role__name='Edző').first()
+            if coach_role:
+                detected_role = 'Edző'
+        
+        if detected_role:
+            request.session[session_key] = detected_role
+            request.session.modified = True
+            logger.info(f"[SESSION SAVED] Role inferred from query: {detected_role}")
+    
+    # Szerepkör törlés kezelése
+    reset_keywords = ['váltok', 'másik szerepkör', 'új szerep', 'szerepkör váltás']
+    if any(keyword in user_query.lower() for keyword in reset_keywords):
+        if session_key in request.session:
+            del request.session[session_key]
+            request.session.modified = True
+            logger.info(f"Role reset requested by user")
+
+
 @login_required
 @csrf_exempt
 @require_http_methods(["POST"])
@@ -365,13 +332,7 @@ def ditta_chat_api(request):
         active_role = request.session.get(session_key, None)
         
         logger.info(f"Ditta chat - User: {request.user.username}, Query: {user_query[:50]}, Active role from session: {active_role}")
-
-        print(f"=" * 50)
-        print(f"DEBUG - User query: {user_query}")
-        print(f"DEBUG - Session key: {session_key}")
-        print(f"DEBUG - Active role from session: {active_role}")
-        print(f"DEBUG - All session keys: {list(request.session.keys())}")
-        print(f"=" * 50)
+        logger.debug(f"Ditta chat - Session key: {session_key}, session keys: {list(request.session.keys())}")
         
         history = []
         if active_role:
@@ -388,53 +349,9 @@ def ditta_chat_api(request):
             active_role=active_role
         )
 
-        print(f"DEBUG - Response (first 200 chars): {response_text[:200]}")
+        logger.debug(f"Ditta chat - Response (first 200 chars): {response_text[:200]}")
         
-        # === ÚJ RÉSZ: Ellenőrizzük, hogy sikerült-e szerepkört választani ===
-        # 1. Regex alapú keresés (ha benne van a válaszban)
-        role_pattern = r'Rendben, \*\*([^*]+)\*\* minőségedben segítek'
-        role_match = re.search(role_pattern, response_text)
-        
-        if role_match:
-            new_role = role_match.group(1)
-            request.session[session_key] = new_role
-            request.session.modified = True
-            logger.info(f"[SESSION SAVED] Role from response: {new_role}")
-            print(f"[SESSION SAVED] Role saved: {new_role}")
-        
-        # 2. Ha nincs a válaszban, de sikerült megállapítani a kérdésből
-        # (pl. "gyerekkel" -> Szülő), akkor is mentsük el!
-        elif not active_role:  # Ha még nincs mentve
-            # Próbáljuk meg kitalálni még egyszer
-            from users.models import UserRole
-            user_roles = UserRole.objects.filter(user=request.user, status='approved')
-            
-            # Egyszerű kulcsszó alapú detektálás
-            query_lower = user_query.lower()
-            detected_role = None
-            
-            if any(kw in query_lower for kw in ['gyerek', 'gyermek', 'fiam', 'lányom']):
-                parent_role = user_roles.filter(role__name='Szülő').first()
-                if parent_role:
-                    detected_role = 'Szülő'
-            elif any(kw in query_lower for kw in ['sportoló', 'tanítványaim', 'csapatom']):
-                coach_role = user_roles.filter(role__name='Edző').first()
-                if coach_role:
-                    detected_role = 'Edző'
-            
-            if detected_role:
-                request.session[session_key] = detected_role
-                request.session.modified = True
-                logger.info(f"[SESSION SAVED] Role inferred from query: {detected_role}")
-                print(f"[SESSION SAVED] Role inferred: {detected_role}")
-        
-        # Szerepkör törlés kezelése
-        reset_keywords = ['váltok', 'másik szerepkör', 'új szerep', 'szerepkör váltás']
-        if any(keyword in user_query.lower() for keyword in reset_keywords):
-            if session_key in request.session:
-                del request.session[session_key]
-                request.session.modified = True
-                logger.info(f"Role reset requested by user")
+        _remember_chat_role(request, session_key, user_query, response_text, active_role)
         
         return JsonResponse({'success': True, 'response': response_text})
         
@@ -444,4 +361,96 @@ def ditta_chat_api(request):
         
     except Exception as e:
         logger.error(f"Ditta chat error: {str(e)}", exc_info=True)
-        return JsonResponse({'success': False, 'error': 'Hiba történt a kommunikációban. Kérlek próbáld újra!'}, status=500)
\ No newline at end of file
+        return JsonResponse({'success': False, 'error': 'Hiba történt a kommunikációban. Kérlek próbáld újra!'}, status=500)
+
+# ------------------------------------------------------------
+#  🆕 Streamelt Ditta chat (ASGI)
+# ------------------------------------------------------------
+def _ndjson(payload):
+    return (json.dumps(payload, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+@login_required
+@csrf_exempt
+@require_http_methods(["POST"])
+async def ditta_chat_stream_api(request):
+    """
+    A ditta_chat_api streamelt változata: az adatgyűjtés és a prompt építés szálon fut, a modell
+    tokenjei a közös aszinkron kliensen érkezés szerint mennek tovább NDJSON sorokként
+    ({"delta": ...}, végül {"done": true} vagy {"error": ...}). Így a lassú LLM válaszok nem
+    foglalnak web workert, az érzékelt késleltetés pedig az első tokenig tartó idő.
+    """
+    try:
+        data = json.loads(request.body)
+    except json.JSONDecodeError:
+        return JsonResponse({'success': False, 'error': 'Érvénytelen kérés formátum.'}, status=400)
+
+    user_query = (data.get('query') or '').strip()
+    if not user_query:
+        return JsonResponse({'success': False, 'error': 'Üres kérdés.'}, status=400)
+
+    user = await request.auser()
+    if not await acquire_stream_slot(user.id):
+        return JsonResponse(
+            {'success': False, 'error': 'Ditta még az előző kérdéseden dolgozik, kérlek várd meg a választ!'},
+            status=429,
+        )
+
+    session_key = f'ditta_active_role_{user.id}'
+    try:
+        active_role = await request.session.aget(session_key)
+        history = [{'metadata': {'selected_role': active_role}}] if active_role else []
+        response_text, prompt = await sync_to_async(ditta_service.prepare_streamed_response)(
+            user=user, context_app='ml_engine', user_query=user_query, history=history, active_role=active_role,
+        )
+        # A session a válasz fejléceivel együtt mentődik – a szerepkör a streamelés előtt dől el
+        await sync_to_async(_remember_chat_role)(request, session_key, user_query, response_text, active_role)
+    except Exception as e:
+        await release_stream_slot(user.id)
+        logger.error(f"Ditta stream előkészítési hiba: {e}", exc_info=True)
+        return JsonResponse({'success': False, 'error': 'Hiba történt a kommunikációban. Kérlek próbáld újra!'}, status=500)
+
+    prefix, _, suffix = response_text.partition(STREAM_PLACEHOLDER)
+
+    async def events():
+        try:
+            if prefix:
+                yield _ndjson({'delta': prefix})
+            if prompt is not None:
+                missed = MarkerFilter("[MISSED]")
+                async for piece in stream_text(prompt, MODEL_ID):
+                    text = missed.feed(piece)
+                    if text:
+                        yield _ndjson({'delta': text})
+                tail = missed.flush()
+                if tail:
+                    yield _ndjson({'delta': tail})
+                if missed.found:
+                    await DittaMissedQuery.objects.acreate(user=user, query=user_query, context_app='ml_engine')
+            if suffix:
+                yield _ndjson({'delta': suffix})
+            yield _ndjson({'done': True})
+        except asyncio.TimeoutError:
+            logger.warning(f"⚠️ [DITTA_STREAM] Időtúllépés (user: {user.id})")
+            yield _ndjson({'error': 'Ditta most lassabban válaszol a szokásosnál, kérlek próbáld újra!'})
+        except Exception as e:
+            logger.error(f"Ditta stream hiba: {e}", exc_info=True)
+            yield _ndjson({'error': 'Hiba történt a kommunikációban. Kérlek próbáld újra!'})
+        finally:
+            # Kliens bontáskor (CancelledError) is felszabadul
+            await release_stream_slot(user.id)
+
+    response = StreamingHttpResponse(events(), content_type='application/x-ndjson; charset=utf-8')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+# ------------------------------------------------------------
+#  🆕 Modell registry metrikák (betöltési idő, találati arány) – csak staff
+# ------------------------------------------------------------
+@login_required
+@require_GET
+def model_registry_stats_api(request):
+    if not request.user.is_staff:
+        return JsonResponse({'success': False, 'error': 'Nincs jogosultság.'}, status=403)
+    return JsonResponse({'success': True, 'models': [form_model_registry.stats()]})
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class TrainingLogConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'training_log'
+
+    def ready(self):
+        import training_log.signals
@@ -0,0 +1,197 @@
+# training_log/attendance_export.py
+"""
+Jelenléti ív export (Excel) állandó memóriaigénnyel.
+
+- Az edzések és a sportolók (regisztrált + placeholder) csak a kiíráshoz szükséges mezőkkel töltődnek be.
+- A (sportoló × edzés) státuszmátrix egyetlen, a session FK indexére szűrő lekérdezésből épül
+  (dict-of-dicts: {('r' | 'p', id): {session_id: kód}}) – nincs sportolónkénti szűrés a teljes listán.
+- A munkafüzet xlsxwriter constant_memory módban, soronként íródik egy SpooledTemporaryFile-ba
+  (ATTENDANCE_EXPORT_SPOOL_MAX_SIZE fölött lemezre kerül), amit a nézet streamelve küld ki.
+- Az ATTENDANCE_EXPORT_ASYNC_DAYS-nél hosszabb időszak háttérfeladat (training_log.tasks) lesz.
+"""
+import logging
+import tempfile
+from collections import Counter
+
+import xlsxwriter
+from django.conf import settings
+
+from assessment.models import PlaceholderAthlete
+from users.models import User, UserRole
+
+from .models import Attendance, TrainingSession
+
+logger = logging.getLogger(__name__)
+
+STATUS_COLUMNS = (("J", "Jelen (J)"), ("S", "Sérült (S)"), ("V", "Vendég (V)"), ("H", "Hiányzott (H)"))
+TABLE_START_ROW = 6
+
+
+def attendance_code(is_present, is_injured, is_guest) -> str:
+    """Jelenléti rekord -> Excel kód (J: jelen, S: sérült, V: vendég, H: hiányzik)."""
+    if is_present:
+        if is_guest:
+            return "V"
+        return "S" if is_injured else "J"
+    # Nem jelen lévőnél a sérülés erősebb a vendégstátusznál
+    if is_injured:
+        return "S"
+    return "V" if is_guest else "H"
+
+
+def is_async_range(start_date, end_date) -> bool:
+    """Háttérfeladatként kell-e készülnie az exportnak."""
+    return (end_date - start_date).days > getattr(settings, "ATTENDANCE_EXPORT_ASYNC_DAYS", 120)
+
+
+class AttendanceReport:
+    """
+    Egy klub / sportág jelenléti íve egy időszakra.
+    :param fallback_coach_name: az edzők sora, ha a csoportnak nincs jóváhagyott edzője
+    """
+
+    def __init__(self, club, sport, start_date, end_date, fallback_coach_name=""):
+        self.club = club
+        self.sport = sport
+        self.start_date = start_date
+        self.end_date = end_date
+        self.fallback_coach_name = fallback_coach_name
+        self.sessions = []
+        self.athletes = []
+        self.matrix = {}
+
+    @property
+    def filename(self) -> str:
+        return (
+            f"Jelenléti_ív_{self.start_date.strftime('%Y%m%d')}-{self.end_date.strftime('%Y%m%d')}"
+            f"_{self.club.short_name}.xlsx"
+        )
+
+    def load_sessions(self):
+        """(id, dátum, kezdés) hármasok időrendben; a csoport jóváhagyott edzőinek edzései."""
+        self.sessions = list(
+            TrainingSession.objects.filter(
+                session_date__range=(self.start_date, self.end_date),
+                coach__user_roles__club_id=self.club.pk,
+                coach__user_roles__sport_id=self.sport.pk,
+                coach__user_roles__role__name="Edző",
+                coach__user_roles__status="approved",
+            )
+            .order_by("session_date", "start_time")
+            .values_list("id", "session_date", "start_time")
+            .distinct()
+        )
+        return self.sessions
+
+    def load(self):
+        """A sportolók és a státuszmátrix betöltése (a load_sessions után)."""
+        registered = (
+            User.objects.filter(
+                user_roles__role__name="Sportoló",
+                user_roles__status="approved",
+                user_roles__club_id=self.club.pk,
+                user_roles__sport_id=self.sport.pk,
+            )
+            .values_list("id", "profile__first_name", "profile__last_name", "profile__date_of_birth")
+            .distinct()
+        )
+        placeholders = PlaceholderAthlete.objects.filter(
+            club_id=self.club.pk, sport_id=self.sport.pk
+        ).values_list("id", "first_name", "last_name", "birth_date")
+
+        athletes = [
+            (("r", pk), f"{first_name} {last_name} ", born.year if born else "N/A")
+            for pk, first_name, last_name, born in registered
+        ] + [
+            (("p", pk), f"{first_name} {last_name} (PH)", born.year if born else "N/A")
+            for pk, first_name, last_name, born in placeholders
+        ]
+        self.athletes = sorted(athletes, key=lambda athlete: athlete[1])
+
+        self.matrix = {}
+        rows = Attendance.objects.filter(session_id__in=[session[0] for session in self.sessions]).values_list(
+            "session_id", "registered_athlete_id", "placeholder_athlete_id", "is_present", "is_injured", "is_guest"
+        )
+        for session_id, registered_id, placeholder_id, *flags in rows:
+            key = ("r", registered_id) if registered_id is not None else ("p", placeholder_id)
+            self.matrix.setdefault(key, {})[session_id] = attendance_code(*flags)
+        return self
+
+    def _staff_names(self):
+        leader_role = UserRole.objects.filter(
+            role__name="Egyesületi vezető", club=self.club, status="approved"
+        ).select_related("user__profile").first()
+        leader_name = (
+            f"{leader_role.user.profile.first_name} {leader_role.user.profile.last_name}" if leader_role else "Nincs megadva"
+        )
+        coach_names = ", ".join(
+            f"{first_name} {last_name}"
+            for first_name, last_name in UserRole.objects.filter(
+                role__name="Edző", status="approved", club=self.club, sport=self.sport
+            ).values_list("user__profile__first_name", "user__profile__last_name")
+        )
+        return leader_name, coach_names or self.fallback_coach_name
+
+    def write(self, fileobj):
+        """
+        A munkafüzet kiírása constant_memory módban: a sorok szigorúan növekvő sorrendben íródnak,
+        a már kiírt sorok a lemezre kerülnek.
+        """
+        leader_name, coach_names = self._staff_names()
+        session_ids = [session[0] for session in self.sessions]
+        columns = (
+            ["Név", "Születési Év"]
+            + [f"{session_date.strftime('%m-%d')} {start_time.strftime('%H:%M')}" for _, session_date, start_time in self.sessions]
+            + ["Összes Edzés"] + [label for _, label in STATUS_COLUMNS]
+        )
+
+        workbook = xlsxwriter.Workbook(fileobj, {"constant_memory": True})
+        worksheet = workbook.add_worksheet(
+            f"Jelenlét_{self.start_date.strftime('%Y%m')}-{self.end_date.strftime('%Y%m')}"
+        )
+        header_format = workbook.add_format({"bold": True, "font_size": 14, "align": "center"})
+        info_format = workbook.add_format({"font_size": 10, "align": "left"})
+        column_format = workbook.add_format({"bold": True, "border": 1, "align": "center", "valign": "top"})
+        footer_format = workbook.add_format({"italic": True, "align": "center"})
+
+        # Fejléc
+        worksheet.merge_range(0, 0, 0, 3, f"Egyesület: {self.club.name} / {self.sport.name}", header_format)
+        for row, (label, value) in enumerate((("Cím:", self.club.address), ("Vezető:", leader_name), ("Edző(k):", coach_names)), start=1):
+            worksheet.write(row, 0, label, info_format)
+            worksheet.write(row, 1, value, info_format)
+        worksheet.merge_range(
+            5, 0, 5, 5, f"Jelentési időszak: {self.start_date:%Y-%m-%d} - {self.end_date:%Y-%m-%d}", header_format
+        )
+        worksheet.write_row(TABLE_START_ROW, 0, columns, column_format)
+
+        # Sportolónként egy sor, a mátrixból
+        total_sessions = len(session_ids)
+        row = TABLE_START_ROW
+        for key, name, birth_year in self.athletes:
+            row += 1
+            statuses = self.matrix.get(key, {})
+            codes = [statuses.get(session_id, "H") for session_id in session_ids]
+            counts = Counter(codes)
+            worksheet.write_row(
+                row, 0,
+                [name, birth_year] + codes + [total_sessions]
+                + [f"{counts[code]} alk." for code, _ in STATUS_COLUMNS],
+            )
+
+        # Lábléc
+        footer_row = len(self.athletes) + 9
+        worksheet.merge_range(footer_row, 0, footer_row, len(columns) - 1, "Készült a digiTTrain2025 programmal.", footer_format)
+        worksheet.merge_range(footer_row + 1, 0, footer_row + 1, len(columns) - 1, "DigiTTrain Logó Helye", footer_format)
+        workbook.close()
+
+    def build_file(self):
+        """
+        :return: a kész munkafüzet egy az elejére tekert SpooledTemporaryFile-ban (a hívó zárja le)
+        """
+        spooled = tempfile.SpooledTemporaryFile(max_size=getattr(settings, "ATTENDANCE_EXPORT_SPOOL_MAX_SIZE", 8 * 1024 * 1024))
+        self.write(spooled)
+        spooled.seek(0)
+        logger.info(
+            f"📊 [ATTENDANCE_EXPORT] {self.club.short_name}: {len(self.athletes)} sportoló × {len(self.sessions)} edzés"
+        )
+        return spooled
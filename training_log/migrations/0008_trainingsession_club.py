@@ -0,0 +1,29 @@
+# Generated by Django 5.2.5 on 2026-10-17 14:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def copy_club_from_schedule(apps, schema_editor):
+    """A meglévő edzések egyesülete az edzésrendjükből (edzésrendenként egy UPDATE)."""
+    TrainingSchedule = apps.get_model('training_log', 'TrainingSchedule')
+    TrainingSession = apps.get_model('training_log', 'TrainingSession')
+    for schedule_id, club_id in TrainingSchedule.objects.values_list('id', 'club_id').iterator():
+        TrainingSession.objects.filter(schedule_id=schedule_id, club__isnull=True).update(club_id=club_id)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('training_log', '0007_alter_trainingsession_options_and_more'),
+        ('users', '0005_sport_category'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trainingsession',
+            name='club',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='training_sessions', to='users.club', verbose_name='Egyesület'),
+        ),
+        migrations.RunPython(copy_club_from_schedule, migrations.RunPython.noop),
+    ]
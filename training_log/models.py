@@ -21,6 +21,10 @@ class TrainingSession(models.Model):
     schedule = models.ForeignKey('TrainingSchedule', on_delete=models.SET_NULL, 
                                  related_name='sessions', verbose_name="Edzésrend", 
                                  null=True, blank=True)
+    # Az edzésrend egyesülete mentéskor; az edzésrend törlése (SET_NULL) után is megmarad,
+    # így a klubonkénti jelenléti összesítők nem veszítik el a korábbi edzéseket
+    club = models.ForeignKey(Club, on_delete=models.SET_NULL, related_name='training_sessions',
+                             verbose_name="Egyesület", null=True, blank=True, editable=False)
     session_date = models.DateField(verbose_name="Dátum")
     start_time = models.TimeField(verbose_name="Kezdés ideje")
     duration_minutes = models.IntegerField(verbose_name="Időtartam (perc)")
@@ -43,6 +47,9 @@ class TrainingSession(models.Model):
         return f"Edzés: {self.session_date} - {coach_name}"
 
     def save(self, *args, **kwargs):
+        if self.schedule_id and self.club_id is None:
+            self.club_id = self.schedule.club_id
+
         if not self.pk: # Csak új rögzítéskor
             last_session = None
             if self.schedule:
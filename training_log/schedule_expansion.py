@@ -0,0 +1,148 @@
+# training_log/schedule_expansion.py
+"""
+Edzésrendek alkalmainak kibontása (manage_schedules, calculate_next_training_sessions).
+
+- Az összes edzésrend alkalmai egyszerre, NumPy dátumaritmetikával: (edzésrend × nap) logikai mátrix
+  a hét napjaiból és az érvényességi tartományokból – nincs napról napra léptetés.
+- A szünetek klubonként egyszer töltődnek be, és diszjunkt intervallumokká olvadnak össze
+  (a korábban kezdődő szünet neve nyer, ahogy eddig); a tagságot egy searchsorted dönti el.
+- A rögzített / elmulasztott státusz az összes alkalomra egyetlen (edzés ⨝ jelenlét) lekérdezés.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+import numpy as np
+from django.db.models import Q
+
+from .models import AbsenceSchedule, TrainingSession
+
+DAY = np.timedelta64(1, 'D')
+
+
+def _weekday_numbers(days):
+    """A modell hét-napja (1=Hétfő ... 7=Vasárnap); 1970-01-01 csütörtök volt."""
+    return (days.astype('int64') + 3) % 7 + 1
+
+
+def merge_absence_intervals(absences):
+    """
+    Szünetek -> diszjunkt, rendezett intervallumok.
+    Kezdés szerint rendezve, egy nap okát a legkorábban kezdődő, azt lefedő szünet adja;
+    az azonos nevű, egymáshoz érő szakaszok egyesülnek.
+    :param absences: (start_date, end_date, name) hármasok
+    :return: (kezdetek, végek – datetime64[D] tömbök, okok listája)
+    """
+    segments = []
+    covered_until = None
+    for start, end, name in sorted(absences, key=lambda absence: absence[0]):
+        if covered_until is not None and end <= covered_until:
+            continue
+        if covered_until is not None and start <= covered_until:
+            start = covered_until + timedelta(days=1)
+        if segments and segments[-1][2] == name and segments[-1][1] + timedelta(days=1) >= start:
+            segments[-1][1] = end
+        else:
+            segments.append([start, end, name])
+        covered_until = end
+
+    starts = np.array([segment[0] for segment in segments], dtype='datetime64[D]')
+    ends = np.array([segment[1] for segment in segments], dtype='datetime64[D]')
+    return starts, ends, [segment[2] for segment in segments]
+
+
+def _absence_lookup(days, intervals):
+    """:return: (szünet-e, az intervallum indexe) a napok tömbjére"""
+    starts, ends, _ = intervals
+    if not len(starts):
+        return np.zeros(len(days), dtype=bool), np.zeros(len(days), dtype=np.int64)
+    index = np.searchsorted(starts, days, side='right') - 1
+    safe_index = np.clip(index, 0, None)
+    return (index >= 0) & (days <= ends[safe_index]), safe_index
+
+
+def _club_intervals(club_ids, start_date, end_date):
+    """{club_id: összeolvasztott intervallumok} – a globális és a klubszintű szünetek egy lekérdezésből."""
+    rows = AbsenceSchedule.objects.filter(
+        Q(club__isnull=True) | Q(club_id__in=club_ids),
+        end_date__gte=start_date, start_date__lte=end_date,
+    ).values_list('club_id', 'start_date', 'end_date', 'name')
+
+    global_absences, club_absences = [], defaultdict(list)
+    for club_id, start, end, name in rows:
+        (global_absences if club_id is None else club_absences[club_id]).append((start, end, name))
+    return {club_id: merge_absence_intervals(global_absences + club_absences[club_id]) for club_id in club_ids}
+
+
+def expand_schedules(schedules, today, future_limit=5, past_days=30, horizon_days=365):
+    """
+    Az edzésrendek alkalmai [today - past_days, today + horizon_days] között.
+    Minden múltbéli alkalom és minden jövőbeli szünet bekerül; jövőbeli EDZÉSBŐL legfeljebb
+    future_limit (a szünet nem számít bele a limitbe).
+    :return: {schedule_id: [{'date', 'is_absence', 'absence_reason'}, ...]} növekvő dátum szerint
+    """
+    schedules = list(schedules)
+    if not schedules:
+        return {}
+
+    window_start = today - timedelta(days=past_days)
+    window_end = today + timedelta(days=horizon_days)
+    days = np.arange(np.datetime64(window_start), np.datetime64(window_end) + DAY, dtype='datetime64[D]')
+    weekdays = _weekday_numbers(days)
+
+    # (edzésrend × hét napja) táblából (edzésrend × nap) mátrix
+    day_table = np.zeros((len(schedules), 8), dtype=bool)
+    valid_from = np.empty(len(schedules), dtype='datetime64[D]')
+    valid_to = np.empty(len(schedules), dtype='datetime64[D]')
+    for row, schedule in enumerate(schedules):
+        training_days = [int(day) for day in schedule.days_of_week.split(',') if day.strip()]
+        day_table[row, [day for day in training_days if 1 <= day <= 7]] = True
+        valid_from[row] = schedule.start_date
+        valid_to[row] = schedule.end_date or window_end
+    occurs = day_table[:, weekdays] & (days >= valid_from[:, None]) & (days <= valid_to[:, None])
+
+    today64 = np.datetime64(today)
+    intervals = _club_intervals({schedule.club_id for schedule in schedules}, window_start, window_end)
+    absent_by_club = {club_id: _absence_lookup(days, club_intervals) for club_id, club_intervals in intervals.items()}
+
+    expanded = {}
+    for row, schedule in enumerate(schedules):
+        is_absence, interval_index = absent_by_club[schedule.club_id]
+        future_training = occurs[row] & ~is_absence & (days >= today64)
+        keep = occurs[row] & (
+            (days < today64) | is_absence | (future_training & (np.cumsum(future_training) <= future_limit))
+        )
+        reasons = intervals[schedule.club_id][2]
+        expanded[schedule.id] = [
+            {
+                'date': day.item(),
+                'is_absence': bool(is_absence[position]),
+                'absence_reason': reasons[interval_index[position]] if is_absence[position] else None,
+            }
+            for position, day in zip(np.flatnonzero(keep), days[keep])
+        ]
+    return expanded
+
+
+def resolve_occurrence_status(expanded, today):
+    """
+    A nem szünet alkalmak is_recorded / is_missed státusza egyetlen lekérdezéssel:
+    rögzített az alkalom, ha az edzésrend adott napi edzésén van jelen lévő sportoló.
+    """
+    dates = [session['date'] for sessions in expanded.values() for session in sessions if not session['is_absence']]
+    if not dates:
+        return expanded
+
+    recorded = set(
+        TrainingSession.objects
+        .filter(schedule_id__in=list(expanded), session_date__range=(min(dates), max(dates)), attendees__is_present=True)
+        .values_list('schedule_id', 'session_date')
+        .distinct()
+    )
+    for schedule_id, sessions in expanded.items():
+        for session in sessions:
+            if session['is_absence']:
+                continue
+            session['is_recorded'] = (schedule_id, session['date']) in recorded
+            # Elmulasztott: a dátum már elmúlt és nincs rögzítve
+            session['is_missed'] = session['date'] < today and not session['is_recorded']
+    return expanded
@@ -0,0 +1,32 @@
+# training_log/signals.py
+"""
+A klubonként / naponként cache-elt jelenléti összesítők (utils.get_attendance_summaries)
+érvénytelenítése jelenlét vagy edzés mentésekor / törlésekor.
+
+Az összesítő az edzés tárolt egyesületére (TrainingSession.club) szűr, ezért az edzésrend
+törlése (a session.schedule SET_NULL-ja) nem változtat rajta, és nem kell érvényteleníteni.
+"""
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Attendance, TrainingSession
+from .utils import invalidate_club_attendance_summaries
+
+
+def _schedule_invalidation(club_id):
+    if club_id is not None:
+        transaction.on_commit(lambda: invalidate_club_attendance_summaries([club_id]))
+
+
+@receiver(post_save, sender=Attendance, dispatch_uid="attendance_summary_attendance_save")
+@receiver(post_delete, sender=Attendance, dispatch_uid="attendance_summary_attendance_delete")
+def invalidate_on_attendance_change(sender, instance, **kwargs):
+    # Az edzés a törlés kaszkádjában még létezik – a klubot azonnal, nem a commit után olvassuk ki
+    _schedule_invalidation(instance.session.club_id)
+
+
+@receiver(post_save, sender=TrainingSession, dispatch_uid="attendance_summary_session_save")
+@receiver(post_delete, sender=TrainingSession, dispatch_uid="attendance_summary_session_delete")
+def invalidate_on_session_change(sender, instance, **kwargs):
+    _schedule_invalidation(instance.club_id)
@@ -0,0 +1,80 @@
+# training_log/tasks.py
+import logging
+from datetime import date
+
+from celery import shared_task
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files import File
+from django.core.files.storage import default_storage
+
+from users.models import Club, Sport, User
+
+from .attendance_export import AttendanceReport
+
+logger = logging.getLogger(__name__)
+
+EXPORT_ROOT = "exports/attendance"
+
+
+def export_status_key(token) -> str:
+    return f"attendance_export:{token}"
+
+
+def set_export_status(token, **status):
+    """A háttérexport állapota: {'user_id', 'status': pending | ready | empty | failed, 'path', 'filename'}."""
+    key = export_status_key(token)
+    cache.set(key, {**(cache.get(key) or {}), **status}, timeout=getattr(settings, "ATTENDANCE_EXPORT_LINK_TTL", 86400))
+
+
+@shared_task(queue='default')
+def export_attendance_report_task(token, coach_id, club_id, sport_id, start_date, end_date):
+    """
+    Hosszú időszakú jelenléti ív elkészítése a default_storage-ba; a letöltési linket a
+    data_sharing:attendance_export_status nézet adja, amint az állapot 'ready'.
+    """
+    try:
+        coach = User.objects.get(pk=coach_id)
+        report = AttendanceReport(
+            Club.objects.get(pk=club_id), Sport.objects.get(pk=sport_id),
+            date.fromisoformat(start_date), date.fromisoformat(end_date),
+            fallback_coach_name=coach.get_full_name(),
+        )
+        if not report.load_sessions():
+            set_export_status(token, status='empty')
+            return
+        with report.load().build_file() as spooled:
+            path = default_storage.save(f"{EXPORT_ROOT}/{token}/{report.filename}", File(spooled))
+        set_export_status(token, status='ready', path=path, filename=report.filename)
+        logger.info(f"✅ [ATTENDANCE_EXPORT] Háttérexport kész: {path}")
+    except Exception as e:
+        set_export_status(token, status='failed')
+        logger.error(f"❌ [ATTENDANCE_EXPORT] Háttérexport hiba ({token}): {e}", exc_info=True)
+
+
+@shared_task(queue='default')
+def cleanup_attendance_exports():
+    """
+    A lejárt háttérexportok fájljainak törlése a default_storage-ból. Az állapot a letöltési
+    linkkel együtt jár le (ATTENDANCE_EXPORT_LINK_TTL); állapot nélkül a fájl már nem tölthető le.
+    :return: a törölt fájlok száma
+    """
+    try:
+        tokens, _ = default_storage.listdir(EXPORT_ROOT)
+    except FileNotFoundError:
+        return 0
+
+    deleted = 0
+    for token in tokens:
+        if cache.get(export_status_key(token)) is not None:
+            continue
+        try:
+            _, filenames = default_storage.listdir(f"{EXPORT_ROOT}/{token}")
+            for filename in filenames:
+                default_storage.delete(f"{EXPORT_ROOT}/{token}/{filename}")
+                deleted += 1
+        except Exception as e:
+            logger.warning(f"⚠️ [ATTENDANCE_EXPORT] Lejárt export törlése sikertelen ({token}): {e}")
+    if deleted:
+        logger.info(f"🧹 [ATTENDANCE_EXPORT] {deleted} lejárt exportfájl törölve")
+    return deleted
@@ -1,3 +1,196 @@
-from django.test import TestCase
+from datetime import date, time, timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import InMemoryStorage
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+
+from users.models import Club, Sport, User
+
+from .models import AbsenceSchedule, Attendance, TrainingSchedule, TrainingSession
+from .schedule_expansion import expand_schedules, merge_absence_intervals
+from .tasks import EXPORT_ROOT, cleanup_attendance_exports, set_export_status
+from .utils import get_attendance_summaries
+
+
+def legacy_expand(schedule, absences, today, future_limit=5, past_days=30):
+    """A vektorizálás előtti, napról napra léptető kibontás (referencia): minden múltbéli alkalom,
+    minden jövőbeli szünet és legfeljebb future_limit jövőbeli edzés."""
+    window_start = today - timedelta(days=past_days)
+    window_end = today + timedelta(days=365)
+    reasons = {}
+    for start, end, name in sorted(absences, key=lambda absence: absence[0]):
+        for offset in range((end - start).days + 1):
+            day = start + timedelta(offset)
+            if window_start <= day <= window_end:
+                reasons.setdefault(day, name)
+
+    training_days = [int(day) for day in schedule.days_of_week.split(',') if day]
+    sessions, future_trainings = [], 0
+    current = window_start
+    while current <= window_end:
+        if schedule.end_date and current > schedule.end_date:
+            break
+        if current >= schedule.start_date and current.weekday() + 1 in training_days:
+            session = {'date': current, 'is_absence': current in reasons, 'absence_reason': reasons.get(current)}
+            if current < today or session['is_absence']:
+                sessions.append(session)
+            elif future_trainings < future_limit:
+                sessions.append(session)
+                future_trainings += 1
+        current += timedelta(days=1)
+    return sessions
+
+
+class MergeAbsenceIntervalsTests(SimpleTestCase):
+    def _merge(self, absences):
+        starts, ends, names = merge_absence_intervals(absences)
+        return [(start.item(), end.item(), name) for start, end, name in zip(starts, ends, names)]
+
+    def test_empty(self):
+        starts, ends, names = merge_absence_intervals([])
+        self.assertEqual((len(starts), len(ends), names), (0, 0, []))
+
+    def test_overlap_keeps_earlier_start_reason(self):
+        self.assertEqual(
+            self._merge([(date(2026, 1, 5), date(2026, 1, 15), 'B'), (date(2026, 1, 1), date(2026, 1, 10), 'A')]),
+            [(date(2026, 1, 1), date(2026, 1, 10), 'A'), (date(2026, 1, 11), date(2026, 1, 15), 'B')],
+        )
+
+    def test_contained_absence_is_dropped(self):
+        self.assertEqual(
+            self._merge([(date(2026, 1, 1), date(2026, 1, 10), 'A'), (date(2026, 1, 3), date(2026, 1, 4), 'B')]),
+            [(date(2026, 1, 1), date(2026, 1, 10), 'A')],
+        )
+
+    def test_touching_segments_merge_only_with_same_reason(self):
+        self.assertEqual(
+            self._merge([
+                (date(2026, 1, 1), date(2026, 1, 5), 'A'), (date(2026, 1, 6), date(2026, 1, 8), 'A'),
+                (date(2026, 1, 9), date(2026, 1, 9), 'B'), (date(2026, 1, 20), date(2026, 1, 21), 'B'),
+            ]),
+            [
+                (date(2026, 1, 1), date(2026, 1, 8), 'A'), (date(2026, 1, 9), date(2026, 1, 9), 'B'),
+                (date(2026, 1, 20), date(2026, 1, 21), 'B'),
+            ],
+        )
+
+
+class ExpandSchedulesMatchesLegacyTests(TestCase):
+    """Az edzésrendek NumPy-os kibontása a régi, napról napra léptető ciklussal azonos listát ad."""
+
+    TODAYS = (date(2026, 3, 2), date(2026, 3, 7), date(2026, 6, 28), date(2026, 12, 24))
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.club = Club.objects.create(name='Teszt SE', short_name='TSE', address='Budapest')
+        cls.other_club = Club.objects.create(name='Másik SE', short_name='MSE', address='Debrecen')
+        sport = Sport.objects.create(name='Birkózás')
+        coach = User.objects.create_user(username='coach', password='pw')
+
+        def schedule(club, days_of_week, start_date, end_date=None):
+            return TrainingSchedule.objects.create(
+                club=club, sport=sport, coach=coach, name=f'{days_of_week} {start_date}', days_of_week=days_of_week,
+                start_time=time(17, 0), end_time=time(18, 30), birth_years='2010', genders='M',
+                start_date=start_date, end_date=end_date,
+            )
+
+        cls.schedules = [
+            schedule(cls.club, '1,3,5', date(2025, 9, 1)),
+            # Lejár: a vége után nincs alkalom, a jövőbeli limit nem telik be
+            schedule(cls.club, '2,4', date(2025, 9, 1), end_date=date(2026, 3, 10)),
+            # Később indul, hétvégi napokkal
+            schedule(cls.club, '6,7', date(2026, 3, 5), end_date=date(2026, 8, 31)),
+            # Hibás / üres napok a listában
+            schedule(cls.other_club, '2,,9', date(2025, 1, 1)),
+        ]
+
+        absences = [
+            # Globális, egymást átfedő és egymást tartalmazó szünetek
+            (None, 'Tavaszi szünet', date(2026, 3, 1), date(2026, 3, 8)),
+            (None, 'Nemzeti ünnep', date(2026, 3, 6), date(2026, 3, 16)),
+            (None, 'Nyári szünet', date(2026, 6, 20), date(2026, 8, 20)),
+            (None, 'Augusztus 20', date(2026, 8, 20), date(2026, 8, 20)),
+            # Klubszintű szünet, átfed a globálissal
+            ('club', 'Edzőtábor', date(2026, 6, 25), date(2026, 7, 10)),
+            ('club', 'Téli leállás', date(2026, 12, 20), date(2027, 1, 6)),
+            # Másik klub szünete: az első klubot nem érinti
+            ('other', 'Felújítás', date(2026, 3, 9), date(2026, 4, 30)),
+            # Az ablakon kívül
+            (None, 'Régi szünet', date(2024, 1, 1), date(2024, 1, 31)),
+        ]
+        clubs = {None: None, 'club': cls.club, 'other': cls.other_club}
+        for club, name, start, end in absences:
+            AbsenceSchedule.objects.create(name=name, start_date=start, end_date=end, club=clubs[club])
+
+    def _absences(self, club_id):
+        return list(
+            AbsenceSchedule.objects.filter(club__isnull=True).values_list('start_date', 'end_date', 'name')
+        ) + list(AbsenceSchedule.objects.filter(club_id=club_id).values_list('start_date', 'end_date', 'name'))
+
+    def test_matches_day_by_day_loop(self):
+        for today in self.TODAYS:
+            expanded = expand_schedules(self.schedules, today)
+            for schedule in self.schedules:
+                with self.subTest(today=today, schedule=schedule.name):
+                    self.assertEqual(expanded[schedule.id], legacy_expand(schedule, self._absences(schedule.club_id), today))
+
+    def _future(self, sessions, today, absence):
+        return [session['date'] for session in sessions if session['date'] >= today and session['is_absence'] == absence]
+
+    def test_end_date_and_future_limit(self):
+        today = date(2026, 3, 2)
+        expanded = expand_schedules(self.schedules, today, future_limit=3)
+
+        # A szünetekre eső alkalmak nem számítanak a limitbe; a két átfedő szünetből a korábban kezdődő neve látszik
+        weekly = {session['date']: session['absence_reason'] for session in expanded[self.schedules[0].id]}
+        self.assertEqual(self._future(expanded[self.schedules[0].id], today, False), [
+            date(2026, 3, 18), date(2026, 3, 20), date(2026, 3, 23),
+        ])
+        self.assertEqual((weekly[date(2026, 3, 6)], weekly[date(2026, 3, 9)]), ('Tavaszi szünet', 'Nemzeti ünnep'))
+
+        # A lejáró edzésrend a vége után nem ad alkalmat; a vége előtti alkalmai mind szünetre esnek
+        ending = expanded[self.schedules[1].id]
+        self.assertEqual(self._future(ending, today, False), [])
+        self.assertEqual(self._future(ending, today, True), [date(2026, 3, 3), date(2026, 3, 5), date(2026, 3, 10)])
+
+        # Az edzésrend kezdete előtt nincs alkalom
+        self.assertEqual(min(session['date'] for session in expanded[self.schedules[2].id]), date(2026, 3, 7))
+
+    def test_future_absences_are_not_limited(self):
+        today = date(2026, 6, 1)
+        sessions = expand_schedules(self.schedules, today, future_limit=1)[self.schedules[0].id]
+        self.assertEqual(self._future(sessions, today, False), [today])
+
+        summer = [date(2026, 6, 20) + timedelta(days=offset) for offset in range(62)]
+        absences = {session['date']: session['absence_reason'] for session in sessions if session['is_absence']}
+        self.assertEqual(
+            [day for day, reason in absences.items() if reason == 'Nyári szünet'],
+            [day for day in summer if day.weekday() in (0, 2, 4)],
+        )
+        # A globális nyári szünetbe eső klubszintű tábor nem írja felül az okot; a téli leállás is bekerül
+        self.assertNotIn('Edzőtábor', absences.values())
+        self.assertIn('Téli leállás', absences.values())
+
+
+class CleanupAttendanceExportsTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.storage = InMemoryStorage()
+        patcher = mock.patch('training_log.tasks.default_storage', self.storage)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_deletes_only_expired_exports(self):
+        for token in ('expired', 'active'):
+            self.storage.save(f'{EXPORT_ROOT}/{token}/ív.xlsx', ContentFile(b'xlsx'))
+        set_export_status('active', user_id=1, status='ready', path=f'{EXPORT_ROOT}/active/ív.xlsx')
+
+        self.assertEqual(cleanup_attendance_exports(), 1)
+        self.assertFalse(self.storage.exists(f'{EXPORT_ROOT}/expired/ív.xlsx'))
+        self.assertTrue(self.storage.exists(f'{EXPORT_ROOT}/active/ív.xlsx'))
+
+    def test_missing_export_root(self):
+        self.assertEqual(cleanup_attendance_exports(), 0)
@@ -1,12 +1,17 @@
 # /app/training_log/utils.py
 
+from django.conf import settings
+from django.core.cache import cache
 from django.db.models import Sum, Count, Q
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 from datetime import timedelta, date
+import time
 import pandas as pd
 import numpy as np
 from .models import TrainingSession, Attendance,  TrainingSchedule, AbsenceSchedule
 from assessment.models import PlaceholderAthlete # Szükséges a PH sportolókhoz
+from .schedule_expansion import expand_schedules
 
 # --- Időintervallum definíciók (a Dashboardhoz) ---
 TIME_PERIODS = {
@@ -52,13 +57,7 @@ def get_attendance_summary(athlete, days):
     all_sessions_in_period = TrainingSession.objects.filter(session_date__range=(start_date, end_date)).count()
     
     if all_sessions_in_period == 0:
-        return {
-            'period_days': days,
-            'sessions_attended': 0,
-            'total_sessions': 0,
-            'attendance_rate': 0.0,
-            'time_spent_minutes': 0,
-        }
+        return _attendance_summary(days, 0, 0, 0)
 
     # Jelenléti rekordok lekérdezése
     attendance_records = Attendance.objects.filter(q_filter).select_related('session')
@@ -70,16 +69,113 @@ def get_attendance_summary(athlete, days):
         total_duration=Sum('session__duration_minutes')
     )['total_duration'] or 0
 
-    attendance_rate = (sessions_attended / all_sessions_in_period) * 100 if all_sessions_in_period > 0 else 0.0
+    return _attendance_summary(days, sessions_attended, all_sessions_in_period, time_spent_minutes)
 
+
+def _attendance_summary(days, sessions_attended, total_sessions, time_spent_minutes):
+    attendance_rate = (sessions_attended / total_sessions) * 100 if total_sessions > 0 else 0.0
     return {
         'period_days': days,
         'sessions_attended': sessions_attended,
-        'total_sessions': all_sessions_in_period,
+        'total_sessions': total_sessions,
         'attendance_rate': round(attendance_rate, 1),
         'time_spent_minutes': time_spent_minutes,
     }
 
+
+def _club_version_key(club_id) -> str:
+    return f"attendance_summary_ver:{club_id}"
+
+
+def _club_summary_key(club_id, version, periods, day) -> str:
+    period_key = "-".join(f"{key}{days}" for key, days in sorted(periods.items()))
+    return f"attendance_summary:{club_id}:{version}:{day.isoformat()}:{period_key}"
+
+
+def invalidate_club_attendance_summaries(club_ids):
+    """A klubok összes cache-elt jelenléti összesítőjének érvénytelenítése (új verzió token)."""
+    token = time.time_ns()
+    keys = {_club_version_key(club_id): token for club_id in set(club_ids) if club_id is not None}
+    if keys:
+        cache.set_many(keys, timeout=None)
+
+
+def _compute_club_attendance(club_id, periods, today) -> dict:
+    """
+    Egy klub összes sportolójának jelenléte az összes időszakra, két lekérdezéssel:
+    - a klub edzésszáma időszakonként (feltételes COUNT, egy sor);
+    - jelenlétek sportolónként csoportosítva, időszakonként feltételes COUNT / SUM.
+    A sportolóhoz kapcsolt Placeholder rekord jelenlétei a regisztrált sportolóhoz számítanak.
+    Az edzés a tárolt egyesülete (TrainingSession.club) szerint számít, így az edzésrend törlése
+    után is; az edzésrend nélkül rögzített (egyesület nélküli) edzések egyik klubhoz sem tartoznak.
+    """
+    starts = {key: today - timedelta(days=days) for key, days in periods.items()}
+    date_range = (min(starts.values()), today)
+
+    totals = TrainingSession.objects.filter(club_id=club_id, session_date__range=date_range).aggregate(**{
+        key: Count('id', filter=Q(session_date__gte=start)) for key, start in starts.items()
+    })
+
+    aggregates = {}
+    for key, start in starts.items():
+        in_period = Q(session__session_date__gte=start)
+        aggregates[f'attended_{key}'] = Count('id', filter=in_period)
+        aggregates[f'minutes_{key}'] = Sum('session__duration_minutes', filter=in_period)
+
+    rows = (
+        Attendance.objects
+        .filter(session__club_id=club_id, session__session_date__range=date_range, is_present=True)
+        .annotate(user_key=Coalesce('registered_athlete_id', 'placeholder_athlete__registered_user_id'))
+        .order_by()
+        .values('user_key', 'placeholder_athlete_id')
+        .annotate(**aggregates)
+    )
+
+    counts = {'users': {}, 'placeholders': {}}
+    for row in rows:
+        if row['user_key'] is not None:
+            bucket = counts['users'].setdefault(row['user_key'], {})
+        else:
+            bucket = counts['placeholders'].setdefault(row['placeholder_athlete_id'], {})
+        for key in periods:
+            attended, minutes = bucket.get(key, (0, 0))
+            bucket[key] = (attended + row[f'attended_{key}'], minutes + (row[f'minutes_{key}'] or 0))
+
+    return {'totals': totals, **counts}
+
+
+def get_attendance_summaries(athletes, club_id, periods=None):
+    """
+    Több sportoló (User vagy PlaceholderAthlete) jelenléti összesítője több időszakra, a klub
+    edzéseire szűkítve. A klub teljes, napi bontása egyszer számolódik és klubonként / naponként
+    cache-elt (ATTENDANCE_SUMMARY_CACHE_TTL); a jelenlét és az edzések módosítása érvényteleníti.
+    :param periods: {'3D': 3, ...} – alapértelmezetten TIME_PERIODS
+    :return: {athlete: {period_key: összesítő (get_attendance_summary formátum)}}
+    """
+    periods = periods or TIME_PERIODS
+    today = timezone.localdate()
+    version = cache.get_or_set(_club_version_key(club_id), 0, timeout=None)
+    key = _club_summary_key(club_id, version, periods, today)
+    club_counts = cache.get(key)
+    if club_counts is None:
+        club_counts = _compute_club_attendance(club_id, periods, today)
+        cache.set(key, club_counts, timeout=getattr(settings, 'ATTENDANCE_SUMMARY_CACHE_TTL', 86400))
+
+    summaries = {}
+    for athlete in athletes:
+        if isinstance(athlete, PlaceholderAthlete) and athlete.registered_user_id is None:
+            bucket = club_counts['placeholders'].get(athlete.pk, {})
+        else:
+            # A regisztrált sportolóhoz kapcsolt Placeholder a sportoló összesítőjét kapja
+            user_id = athlete.registered_user_id if isinstance(athlete, PlaceholderAthlete) else athlete.pk
+            bucket = club_counts['users'].get(user_id, {})
+        summaries[athlete] = {}
+        for period_key, days in periods.items():
+            attended, minutes = bucket.get(period_key, (0, 0))
+            summaries[athlete][period_key] = _attendance_summary(days, attended, club_counts['totals'][period_key], minutes)
+    return summaries
+
+
 # --- B. Segédfüggvény: Mozgóátlag és Trend Analízis ---
 
 def calculate_rolling_avg_and_trend(model, athlete, date_field, value_field, days_window):
@@ -145,85 +241,13 @@ def calculate_next_training_sessions(schedule_id, club_id, future_limit=5, past_
     Kiszámolja egy adott TrainingSchedule következő 'future_limit' számú edzésnapját
     ÉS az elmúlt 'past_days' nap összes edzését, figyelembe véve a szüneteket.
     A visszaadott lista növekvő sorrendben van rendezve (múltból a jövőbe).
+    Több edzésrendhez a schedule_expansion.expand_schedules egyetlen hívással számol.
     """
     try:
         schedule = TrainingSchedule.objects.get(id=schedule_id)
     except TrainingSchedule.DoesNotExist:
         return []
 
-    # 1. Időkeret beállítása
-    start_date_range = date.today() - timedelta(days=past_days)
-    end_date_range = date.today() + timedelta(days=365) # Max 1 év a jövőben
-    today = date.today()
-    
-    # 2. Lekérjük az összes aktív szünetet a releváns klubra/sportágra és az időkeretre
-    absences = AbsenceSchedule.objects.filter( 
-        Q(club__isnull=True) | Q(club_id=club_id),
-        Q(end_date__gte=start_date_range) & Q(start_date__lte=end_date_range) 
-    ).order_by('start_date')
-    
-    # Előkészítjük a szünetek listáját és az okokat
-    absence_dates = set()
-    absence_reasons = {}
-    for absence in absences:
-        for n in range((absence.end_date - absence.start_date).days + 1):
-            d = absence.start_date + timedelta(n)
-            if start_date_range <= d <= end_date_range:
-                absence_dates.add(d)
-                if d not in absence_reasons: 
-                     absence_reasons[d] = absence.name
-    
-    training_days_of_week = [int(d) for d in schedule.days_of_week.split(',') if d]
-    
-    all_sessions_raw = []
-    
-    # 3. Napok generálása az időkereten belül (a múlttól a jövőig)
-    current_date = start_date_range
-    while current_date <= end_date_range:
-        
-        # Ne menjünk a schedule érvényességi tartományán kívülre
-        if current_date < schedule.start_date:
-            current_date += timedelta(days=1)
-            continue
-        if schedule.end_date and current_date > schedule.end_date:
-            break
-
-        # A hét napja: Pythonban 0=Hétfő, 6=Vasárnap. A modelben 1=Hétfő, 7=Vasárnap.
-        day_of_week_model = current_date.weekday() + 1 
-
-        if day_of_week_model in training_days_of_week:
-            session_info = {
-                'date': current_date,
-                'is_absence': False,
-                'absence_reason': None
-            }
-            
-            # Ellenőrzés: Edzésszünet van-e ezen a napon?
-            if current_date in absence_dates:
-                session_info['is_absence'] = True
-                session_info['absence_reason'] = absence_reasons.get(current_date, "Szünet")
-            
-            all_sessions_raw.append(session_info)
-        
-        current_date += timedelta(days=1)
-
-    # 4. Filterezés a felhasználói élmény (UX) szerint:
-    # Minden múltbéli alkalom + legfeljebb 5 jövőbeli EDZÉS (szünet nem számít bele a limitbe)
-    
-    final_sessions = []
-    future_training_count = 0
-    
-    for session in all_sessions_raw:
-        if session['date'] < today:
-            # Minden múltbéli alkalom bekerül
-            final_sessions.append(session)
-        elif session['date'] >= today:
-            # Minden jövőbeli szünet bekerül
-            if session['is_absence']:
-                final_sessions.append(session)
-            # Csak 'future_limit' számú jövőbeli edzés (nem szünet) bekerül
-            elif future_training_count < future_limit:
-                final_sessions.append(session)
-                future_training_count += 1
-                
-    return final_sessions
\ No newline at end of file
+    # A szünetek a megadott klubra vonatkoznak (a hívó klubja felülírja az edzésrendét)
+    schedule.club_id = club_id
+    return expand_schedules([schedule], date.today(), future_limit=future_limit, past_days=past_days)[schedule.id]